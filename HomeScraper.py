@@ -10,6 +10,9 @@ import random
 from datetime import datetime
 from scraper_factory import ScraperFactory
 from base_scraper import PETICIONES_ANTES_CAMBIO_IP
+from ejecutor_zonas import (TrabajadorFotocasa, TrabajadorIdealista, TrabajoZona,
+                            cargar_config_paralela, ejecutar_zonas, mostrar_resumen, zonas_batch)
+from orquestador import orquestar
 
 
 def cargar_config():
@@ -68,8 +71,14 @@ def seleccionar_url(portal, config):
         seleccion = input(f"Elige una zona (0-{len(urls_disponibles)}, 0 = todas): ").strip()
         
         if seleccion == '0' or seleccion.lower() == 'todas':
-            print(f"\n[OK] Modo BATCH: se procesarán las {len(urls_disponibles)} zonas secuencialmente")
-            return [{'url': u['url'], 'nombre': u['nombre']} for u in urls_disponibles]
+            # Plan de analizar_zonas.py (sin zonas redundantes) y planificador_zonas.py (solo las que tocan)
+            zonas = zonas_batch(portal, config)
+            if len(zonas) != len(urls_disponibles):
+                print(f"\n[OK] Modo BATCH: {len(zonas)} zonas "
+                      f"({len(urls_disponibles) - len(zonas)} omitidas por solapamiento o aún no pendientes)")
+            else:
+                print(f"\n[OK] Modo BATCH: se procesarán las {len(zonas)} zonas")
+            return zonas
         
         try:
             idx = int(seleccion) - 1
@@ -83,6 +92,33 @@ def seleccionar_url(portal, config):
             print("[!] Por favor, introduce un número válido")
 
 
+def scrapear_batch_paralelo(zonas_por_portal, debug, num_paginas, usar_rotacion=False, vpn_provider=None):
+    """Procesa las zonas de uno o varios portales a la vez (ver ejecutor_zonas.py)."""
+    config_paralela = cargar_config_paralela()
+    fabricas = {
+        'idealista': lambda n: TrabajadorIdealista(n, debug, num_paginas, usar_rotacion, vpn_provider),
+        'fotocasa': lambda n: TrabajadorFotocasa(n, debug, num_paginas),
+    }
+    trabajos = [TrabajoZona(portal, zona['nombre'], zona['url'])
+                for portal, zonas in zonas_por_portal.items() for zona in zonas]
+    limites = dict(config_paralela['trabajadores'])
+    if usar_rotacion and limites.get('idealista', 1) > 1:
+        # La VPN cambia la IP de todo el sistema: cada trabajador rotándola por su
+        # cuenta cortaría la sesión de los demás
+        print("  ⚠️  Rotación de IP activa: un solo navegador de Idealista")
+        limites['idealista'] = 1
+    
+    print(f"\n\n{'#'*70}")
+    print(f"  BATCH PARALELO: {len(trabajos)} zonas")
+    for portal, zonas in zonas_por_portal.items():
+        print(f"  {portal}: {len(zonas)} zonas, hasta {limites.get(portal, 1)} navegador(es)")
+    print(f"{'#'*70}")
+    
+    inicio = time.monotonic()
+    resultados = ejecutar_zonas(trabajos, fabricas, limites, config_paralela['pausa_entre_zonas'])
+    mostrar_resumen(resultados, time.monotonic() - inicio)
+
+
 def scrapear_idealista_batch(urls_list, debug, usar_rotacion, vpn_provider, num_paginas):
     """Procesa todas las URLs de Idealista secuencialmente via CDP."""
     from idealista_scraper import IdealistaScraper
@@ -106,15 +142,8 @@ def scrapear_idealista_batch(urls_list, debug, usar_rotacion, vpn_provider, num_
         print(f"  🔗 {url[:80]}...")
         print(f"{'#'*70}")
         
-        # Configurar URL del scraper
-        scraper.search_url = url
-        
-        # Navegar a la URL
-        print(f"\n[*] Navegando a {nombre}...")
-        scraper.navegar_a_url()
-        
-        # Scrapear con filtrado (usa JSON persistente por ubicación)
-        viviendas = scraper.scrapear_con_filtrado(num_paginas, ubicacion=nombre)
+        # Scrapear la zona (fragmentos de precio, ventana de publicación y JSON persistente por ubicación)
+        viviendas = scraper.scrapear_zona(url, nombre, num_paginas)
         
         if viviendas:
             # Guardar en JSON persistente por ubicación
@@ -154,7 +183,7 @@ def scrapear_fotocasa_batch(urls_list, debug, num_paginas):
             print(f"  📅 Ordenado por fecha de publicación (más recientes primero)")
             print(f"{'#'*70}")
             
-            viviendas = scraper.scrapear(url, num_paginas, ubicacion=nombre)
+            viviendas = scraper.scrapear_zona(url, nombre, num_paginas)
             
             if viviendas:
                 scraper.guardar_resultados(viviendas, ubicacion=nombre, url_scrapeada=url)
@@ -173,6 +202,31 @@ def scrapear_fotocasa_batch(urls_list, debug, num_paginas):
     print(f"{'='*70}")
 
 
+def preguntar_debug_y_paginas():
+    """Pregunta el modo debug y el número de páginas por zona. Retorna (debug, num_paginas)"""
+    # Modo debug
+    print("\n[?] ¿Activar modo DEBUG?")
+    print("    (Mostrará cómo se detecta cada particular)")
+    debug = input("    s/n (Enter = no): ").strip().lower() == 's'
+    
+    # Número de páginas
+    print("\n[?] ¿Cuántas páginas quieres scrapear por zona?")
+    print("    (Deja vacío o escribe 'todas' para procesar todas las páginas)")
+    num_paginas_input = input("    Número (Enter = todas): ").strip().lower()
+    
+    if num_paginas_input == '' or num_paginas_input == 'todas' or num_paginas_input == 'all':
+        num_paginas = None
+        print("\n[*] Modo: TODAS LAS PÁGINAS (hasta detectar el final)")
+    else:
+        try:
+            num_paginas = int(num_paginas_input)
+            print(f"\n[*] Modo: {num_paginas} página(s) por zona")
+        except:
+            num_paginas = None
+            print("\n[*] Valor no válido, usando modo: TODAS LAS PÁGINAS")
+    return debug, num_paginas
+
+
 def main():
     print("""
     ╔══════════════════════════════════════════════════════╗
@@ -211,20 +265,35 @@ def main():
         num_urls = len(config.get(portal, {}).get('urls', []))
         print(f"  {idx}. {info['name']} ({num_urls} zona(s) configurada(s))")
     
+    # Todas las zonas de todos los portales a la vez, un proceso por portal (orquestador.py)
+    opciones = len(portales) + 1
+    print(f"  {opciones}. TODOS los portales a la vez (todas las zonas)")
+    
     print()
     portal_seleccionado = None
     while not portal_seleccionado:
-        seleccion = input(f"Elige un portal (1-{len(portales)}): ").strip()
+        seleccion = input(f"Elige un portal (1-{opciones}): ").strip()
         
         try:
             idx = int(seleccion) - 1
             if 0 <= idx < len(portales):
                 portal_seleccionado = portales[idx]
+            elif idx == len(portales):
+                portal_seleccionado = 'todos'
             else:
-                print(f"[!] Por favor, elige un número entre 1 y {len(portales)}")
+                print(f"[!] Por favor, elige un número entre 1 y {opciones}")
         except ValueError:
             print("[!] Por favor, introduce un número válido")
     
+    if portal_seleccionado == 'todos':
+        print("\n[OK] Todos los portales a la vez (Fotocasa abre sus propios navegadores)")
+        debug, num_paginas = preguntar_debug_y_paginas()
+        orquestar({p: zonas_batch(p, config) for p in portales if config.get(p, {}).get('urls')},
+                  debug, num_paginas)
+        print("\n✅ Scraping completado!")
+        input("\nPresiona Enter para salir...")
+        return
+    
     info_portal = ScraperFactory.get_portal_info(portal_seleccionado)
     print(f"\n[OK] Portal seleccionado: {info_portal['name']}")
     
@@ -234,29 +303,12 @@ def main():
         return
     
     is_batch = isinstance(seleccion_url, list)
+    # Batch de un portal con varios navegadores a la vez (ejecutor_zonas.py)
+    paralelo = cargar_config_paralela().get('activo')
     
     # ============== CONFIGURACIÓN COMÚN ==============
     
-    # Modo debug
-    print("\n[?] ¿Activar modo DEBUG?")
-    print("    (Mostrará cómo se detecta cada particular)")
-    debug = input("    s/n (Enter = no): ").strip().lower() == 's'
-    
-    # Número de páginas
-    print("\n[?] ¿Cuántas páginas quieres scrapear por zona?")
-    print("    (Deja vacío o escribe 'todas' para procesar todas las páginas)")
-    num_paginas_input = input("    Número (Enter = todas): ").strip().lower()
-    
-    if num_paginas_input == '' or num_paginas_input == 'todas' or num_paginas_input == 'all':
-        num_paginas = None
-        print("\n[*] Modo: TODAS LAS PÁGINAS (hasta detectar el final)")
-    else:
-        try:
-            num_paginas = int(num_paginas_input)
-            print(f"\n[*] Modo: {num_paginas} página(s) por zona")
-        except:
-            num_paginas = None
-            print("\n[*] Valor no válido, usando modo: TODAS LAS PÁGINAS")
+    debug, num_paginas = preguntar_debug_y_paginas()
     
     # ============== FOTOCASA: ANTI-DETECCIÓN ==============
     if portal_seleccionado == 'fotocasa':
@@ -279,7 +331,9 @@ def main():
         if metodo != "2":
             print("\n[*] Usando Playwright Chromium...")
             
-            if is_batch:
+            if is_batch and paralelo:
+                scrapear_batch_paralelo({'fotocasa': seleccion_url}, debug, num_paginas)
+            elif is_batch:
                 scrapear_fotocasa_batch(seleccion_url, debug, num_paginas)
             else:
                 scrapear_fotocasa_batch([seleccion_url], debug, num_paginas)
@@ -346,8 +400,11 @@ def main():
     # ============== MODO BATCH O INDIVIDUAL ==============
     
     if is_batch and portal_seleccionado == 'idealista':
-        # Batch mode para Idealista via CDP
-        scrapear_idealista_batch(seleccion_url, debug, usar_rotacion, vpn_provider, num_paginas)
+        # Batch mode para Idealista via CDP (una pestaña por trabajador si es paralelo)
+        if paralelo:
+            scrapear_batch_paralelo({'idealista': seleccion_url}, debug, num_paginas, usar_rotacion, vpn_provider)
+        else:
+            scrapear_idealista_batch(seleccion_url, debug, usar_rotacion, vpn_provider, num_paginas)
         print("\n✅ Scraping completado!")
         print("\n[!] El navegador Chrome sigue abierto. NO lo cierres si quieres seguir usándolo.")
         return
@@ -22,6 +22,11 @@ from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import TimeoutException, NoSuchElementException, NoAlertPresentException, UnexpectedAlertPresentException
 from bs4 import BeautifulSoup
 
+import captura_telefono
+import telefonos
+from almacen_viviendas import abrir_almacen
+from indice_global import abrir_indice
+
 
 # ============== CONFIGURACIÓN ANTI-DETECCIÓN ==============
 # Número de peticiones antes de cambiar IP (si usas proxy/VPN)
@@ -402,6 +407,7 @@ class ScraperPersonalizado:
             
             self.driver = webdriver.Chrome(options=options)
             print(f"[OK] Conectado - URL actual: {self.driver.current_url[:80]}...")
+            captura_telefono.registrar_hooks_telefono(self.driver)
             return True
             
         except Exception as e:
@@ -423,7 +429,15 @@ class ScraperPersonalizado:
     @staticmethod
     def _cargar_json_existente(ruta_json: str) -> dict:
         """Carga el JSON existente y devuelve {data, urls_conocidas}.
-        Si no existe, devuelve estructura vacía."""
+        Si no existe, devuelve estructura vacía.
+        Con el almacén SQLite solo se consultan las URLs (data es None)."""
+        almacen = abrir_almacen()
+        if almacen is not None:
+            urls = almacen.urls_conocidas(ruta_json)
+            print(f"\n📂 Zona cargada del almacén: {ruta_json}")
+            print(f"   {len(urls)} viviendas ya registradas")
+            return {'data': None, 'urls_conocidas': urls}
+        
         if not os.path.exists(ruta_json):
             return {'data': None, 'urls_conocidas': set()}
         
@@ -790,9 +804,10 @@ class ScraperPersonalizado:
         
         Estrategia multicapa:
         1. Verificar si ya hay un enlace tel: visible
-        2. Inyectar interceptores (setAttribute, href setter, XHR, fetch, MutationObserver)
+        2. Interceptores (setAttribute, href setter, XHR, fetch, MutationObserver) ya
+           registrados como script de nuevo documento (captura_telefono)
         3. Hacer clic JS en el botón "Llamar"
-        4. Esperar y comprobar todas las fuentes de datos
+        4. Esperar la captura (promesa en la página) y comprobar el DOM
         5. Segundo clic si el primero solo prepara el botón
         6. Llamada directa a API de Idealista como último recurso
         7. Validación estricta final: nunca devolver texto sin >= 7 dígitos
@@ -843,168 +858,13 @@ class ScraperPersonalizado:
             self.driver.execute_script("arguments[0].scrollIntoView({block: 'center'});", phone_button)
             time.sleep(0.5)
             
-            # ── Paso 3: Inyectar interceptores comprehensivos ──
-            # Esto captura el número de teléfono desde MÚLTIPLES fuentes antes de 
-            # que el navegador pueda intentar navegar a tel: (que causa error en Linux)
-            self.driver.execute_script("""
-                window.__capturedPhone = null;
-                window.__phoneAjaxResponse = null;
-                
-                // A) Override setAttribute para interceptar href='tel:...'
-                if (!window.__origSetAttribute) {
-                    window.__origSetAttribute = Element.prototype.setAttribute;
-                    Element.prototype.setAttribute = function(name, value) {
-                        if (name === 'href' && value && typeof value === 'string' && value.startsWith('tel:')) {
-                            window.__capturedPhone = value;
-                            return; // NO establecer el href - previene navegación tel:
-                        }
-                        return window.__origSetAttribute.call(this, name, value);
-                    };
-                }
-                
-                // B) Override HTMLAnchorElement.href property setter
-                if (!window.__hrefOverridden) {
-                    window.__hrefOverridden = true;
-                    var desc = Object.getOwnPropertyDescriptor(HTMLAnchorElement.prototype, 'href');
-                    if (desc && desc.set) {
-                        window.__origHrefSet = desc.set;
-                        window.__origHrefGet = desc.get;
-                        Object.defineProperty(HTMLAnchorElement.prototype, 'href', {
-                            set: function(val) {
-                                if (val && typeof val === 'string' && val.startsWith('tel:')) {
-                                    window.__capturedPhone = val;
-                                    return; // NO navegar
-                                }
-                                window.__origHrefSet.call(this, val);
-                            },
-                            get: function() { return window.__origHrefGet.call(this); },
-                            configurable: true
-                        });
-                    }
-                }
-                
-                // C) Interceptar XHR para capturar respuesta AJAX con teléfono
-                if (!window.__xhrIntercepted) {
-                    window.__xhrIntercepted = true;
-                    var OrigOpen = XMLHttpRequest.prototype.open;
-                    var OrigSend = XMLHttpRequest.prototype.send;
-                    
-                    XMLHttpRequest.prototype.open = function(method, url) {
-                        this.__reqUrl = url;
-                        return OrigOpen.apply(this, arguments);
-                    };
-                    
-                    XMLHttpRequest.prototype.send = function() {
-                        var xhr = this;
-                        this.addEventListener('load', function() {
-                            if (xhr.__reqUrl) {
-                                var u = xhr.__reqUrl.toLowerCase();
-                                if (u.includes('phone') || u.includes('contact') || 
-                                    u.includes('getphones') || u.includes('telefon')) {
-                                    window.__phoneAjaxResponse = xhr.responseText;
-                                }
-                                // Capturar CUALQUIER respuesta que contenga tel:+34
-                                if (xhr.responseText && xhr.responseText.includes('tel:')) {
-                                    window.__phoneAjaxResponse = xhr.responseText;
-                                }
-                            }
-                        });
-                        return OrigSend.apply(this, arguments);
-                    };
-                }
-                
-                // D) Interceptar fetch API
-                if (!window.__fetchIntercepted) {
-                    window.__fetchIntercepted = true;
-                    var origFetch = window.fetch;
-                    window.fetch = function(input, init) {
-                        var url = (typeof input === 'string') ? input : (input && input.url ? input.url : '');
-                        return origFetch.apply(this, arguments).then(function(response) {
-                            if (url) {
-                                var lower = url.toLowerCase();
-                                if (lower.includes('phone') || lower.includes('contact') || 
-                                    lower.includes('getphones') || lower.includes('telefon')) {
-                                    response.clone().text().then(function(text) {
-                                        window.__phoneAjaxResponse = text;
-                                    });
-                                }
-                            }
-                            return response;
-                        });
-                    };
-                }
-                
-                // E) MutationObserver para cambios DOM
-                if (window.__telObserver) {
-                    try { window.__telObserver.disconnect(); } catch(e) {}
-                }
-                window.__telObserver = new MutationObserver(function(mutations) {
-                    mutations.forEach(function(m) {
-                        if (m.type === 'attributes' && m.attributeName === 'href') {
-                            var href = m.target.getAttribute('href');
-                            if (href && href.startsWith('tel:')) {
-                                window.__capturedPhone = href;
-                                m.target.removeAttribute('href');
-                            }
-                        }
-                        if (m.type === 'childList') {
-                            m.addedNodes.forEach(function(node) {
-                                if (node.nodeType !== 1) return;
-                                var els = [node];
-                                if (node.querySelectorAll) {
-                                    els = els.concat(Array.from(node.querySelectorAll('a[href^="tel:"]')));
-                                }
-                                els.forEach(function(el) {
-                                    if (el.tagName === 'A') {
-                                        var h = el.getAttribute('href');
-                                        if (h && h.startsWith('tel:')) {
-                                            window.__capturedPhone = h;
-                                            el.removeAttribute('href');
-                                        }
-                                    }
-                                });
-                            });
-                        }
-                        // Observar también cambios de texto que contengan teléfonos
-                        if (m.type === 'childList' || m.type === 'characterData') {
-                            var target = m.target;
-                            if (target && target.textContent) {
-                                var match = target.textContent.match(/(\+34[\s]?[6789]\d{2}[\s]?\d{3}[\s]?\d{3})/);
-                                if (!match) match = target.textContent.match(/([6789]\d{2}[\s]?\d{2}[\s]?\d{2}[\s]?\d{2})/);
-                                if (match && !window.__capturedPhone) {
-                                    window.__capturedPhone = 'tel:' + match[1];
-                                }
-                            }
-                        }
-                    });
-                });
-                window.__telObserver.observe(document.body, {
-                    attributes: true, childList: true, subtree: true,
-                    characterData: true, attributeFilter: ['href']
-                });
-                
-                // F) Interceptor de clics en fase de captura
-                if (window.__telClickHandler) {
-                    document.removeEventListener('click', window.__telClickHandler, true);
-                }
-                window.__telClickHandler = function(e) {
-                    var a = e.target.closest ? e.target.closest('a') : e.target;
-                    if (a && a.getAttribute) {
-                        var href = a.getAttribute('href');
-                        if (href && href.startsWith('tel:')) {
-                            window.__capturedPhone = href;
-                            e.preventDefault();
-                            e.stopPropagation();
-                            e.stopImmediatePropagation();
-                            a.removeAttribute('href');
-                        }
-                    }
-                };
-                document.addEventListener('click', window.__telClickHandler, true);
-            """)
+            # ── Paso 3: Interceptores registrados una vez por sesión (nuevo documento) ──
+            # Capturan el teléfono desde MÚLTIPLES fuentes antes de que el navegador
+            # pueda intentar navegar a tel: (que causa error en Linux)
+            captura_telefono.registrar_hooks_telefono(self.driver)
             
             if self.modo_debug:
-                print("      [DEBUG] Interceptores inyectados, haciendo clic...")
+                print("      [DEBUG] Interceptores listos, haciendo clic...")
             
             # ── Paso 4: Primer clic usando JavaScript ──
             telefono = self._hacer_clic_y_capturar(phone_button)
@@ -1030,30 +890,8 @@ class ScraperPersonalizado:
             if not telefono:
                 telefono = self._intentar_api_telefono_directa()
             
-            # ── Limpieza de interceptores ──
-            try:
-                self.driver.execute_script("""
-                    if (window.__telObserver) window.__telObserver.disconnect();
-                    if (window.__telClickHandler) {
-                        document.removeEventListener('click', window.__telClickHandler, true);
-                    }
-                    // Restaurar setAttribute
-                    if (window.__origSetAttribute) {
-                        Element.prototype.setAttribute = window.__origSetAttribute;
-                        window.__origSetAttribute = null;
-                    }
-                    // Restaurar href setter
-                    if (window.__origHrefSet) {
-                        Object.defineProperty(HTMLAnchorElement.prototype, 'href', {
-                            set: window.__origHrefSet,
-                            get: window.__origHrefGet,
-                            configurable: true
-                        });
-                        window.__origHrefSet = null;
-                    }
-                """)
-            except:
-                pass
+            # ── Desarmar interceptores (siguen registrados para la próxima página) ──
+            captura_telefono.desarmar(self.driver)
                     
         except UnexpectedAlertPresentException:
             try:
@@ -1074,25 +912,15 @@ class ScraperPersonalizado:
         return self._validar_telefono_final(telefono)
     
     def _hacer_clic_y_capturar(self, phone_button) -> Optional[str]:
-        """Hace clic en el botón de teléfono y comprueba todas las fuentes de captura."""
+        """Hace clic en el botón de teléfono y espera a que los interceptores lo capturen.
+        
+        La página resuelve una promesa en cuanto captura un tel: o una respuesta
+        AJAX de contacto; no hay sondeo periódico desde Python.
+        """
+        captura = None
         try:
-            # Dispatch eventos completos de ratón (mousedown, mouseup, click)
-            # Algunos frameworks solo escuchan mousedown/pointerdown, no click
-            self.driver.execute_script("""
-                var btn = arguments[0];
-                var rect = btn.getBoundingClientRect();
-                var x = rect.left + rect.width / 2;
-                var y = rect.top + rect.height / 2;
-                
-                ['pointerdown', 'mousedown', 'pointerup', 'mouseup', 'click'].forEach(function(type) {
-                    var evt = new MouseEvent(type, {
-                        bubbles: true, cancelable: true, view: window,
-                        clientX: x, clientY: y,
-                        button: 0, buttons: 1
-                    });
-                    btn.dispatchEvent(evt);
-                });
-            """, phone_button)
+            # Dispatch de eventos completos de ratón + espera de la captura (un único round-trip)
+            captura = captura_telefono.clic_y_esperar(self.driver, phone_button)
         except UnexpectedAlertPresentException:
             try:
                 alert = self.driver.switch_to.alert
@@ -1109,74 +937,76 @@ class ScraperPersonalizado:
             if self.modo_debug:
                 print(f"      [DEBUG] Error en clic: {e}")
         
-        # Esperar y comprobar todas las fuentes de captura
-        for intento in range(8):
-            time.sleep(0.5)
-            
+        limite = time.time() + captura_telefono.TIMEOUT_CAPTURA
+        while captura:
             # A) Teléfono capturado por interceptores (setAttribute, href setter, Observer, click)
-            captured = self.driver.execute_script("return window.__capturedPhone;")
-            if captured:
-                telefono = captured.replace('tel:', '').strip()
+            if captura.get('tipo') == 'tel':
+                telefono = captura['valor'].replace('tel:', '').strip()
                 if self.modo_debug:
                     print(f"      [DEBUG] ✓ Teléfono capturado por interceptor: {telefono}")
                 return self._validar_telefono_final(telefono)
             
             # B) Respuesta AJAX interceptada
-            ajax_resp = self.driver.execute_script("return window.__phoneAjaxResponse;")
-            if ajax_resp:
-                telefono = self._extraer_telefono_de_texto(ajax_resp)
-                if telefono:
-                    if self.modo_debug:
-                        print(f"      [DEBUG] ✓ Teléfono del AJAX: {telefono}")
-                    return telefono
+            telefono = self._extraer_telefono_de_texto(captura.get('valor'))
+            if telefono:
+                if self.modo_debug:
+                    print(f"      [DEBUG] ✓ Teléfono del AJAX: {telefono}")
+                return telefono
             
-            # C) Enlaces tel: en el DOM
+            # AJAX de contacto sin teléfono: esperar la siguiente captura
+            restante = limite - time.time()
+            if restante <= 0:
+                break
             try:
-                tel_links = self.driver.find_elements(By.CSS_SELECTOR, "a[href^='tel:']")
-                for tl in tel_links:
-                    href = tl.get_attribute('href')
-                    if href and href.startswith('tel:') and len(href) > 6:
-                        telefono = href.replace('tel:', '').strip()
-                        if self.modo_debug:
-                            print(f"      [DEBUG] ✓ Teléfono del href DOM: {telefono}")
-                        return self._validar_telefono_final(telefono)
-            except:
-                pass
-            
-            # D) Texto visible que parezca teléfono (después de esperar un poco)
-            if intento >= 3:
-                try:
-                    # Buscar cualquier elemento que contenga un número de teléfono visible
-                    phone_text = self.driver.execute_script("""
-                        // Buscar en spans y enlaces cerca del botón de teléfono
-                        var selectors = [
-                            'span.hidden-contact-phones_text',
-                            '.phone-number span',
-                            '.see-phones-btn span',
-                            '.phone-details span',
-                            'a.phone-number'
-                        ];
-                        for (var i = 0; i < selectors.length; i++) {
-                            var els = document.querySelectorAll(selectors[i]);
-                            for (var j = 0; j < els.length; j++) {
-                                var text = els[j].textContent.trim();
-                                // Solo devolver si tiene al menos 7 dígitos
-                                var digits = text.replace(/[^0-9]/g, '');
-                                if (digits.length >= 7) {
-                                    return text;
-                                }
-                            }
+                captura = captura_telefono.esperar_captura(self.driver, restante)
+            except Exception:
+                captura = None
+        
+        # C) Enlaces tel: en el DOM
+        try:
+            tel_links = self.driver.find_elements(By.CSS_SELECTOR, "a[href^='tel:']")
+            for tl in tel_links:
+                href = tl.get_attribute('href')
+                if href and href.startswith('tel:') and len(href) > 6:
+                    telefono = href.replace('tel:', '').strip()
+                    if self.modo_debug:
+                        print(f"      [DEBUG] ✓ Teléfono del href DOM: {telefono}")
+                    return self._validar_telefono_final(telefono)
+        except:
+            pass
+        
+        # D) Texto visible que parezca teléfono
+        try:
+            phone_text = self.driver.execute_script("""
+                // Buscar en spans y enlaces cerca del botón de teléfono
+                var selectors = [
+                    'span.hidden-contact-phones_text',
+                    '.phone-number span',
+                    '.see-phones-btn span',
+                    '.phone-details span',
+                    'a.phone-number'
+                ];
+                for (var i = 0; i < selectors.length; i++) {
+                    var els = document.querySelectorAll(selectors[i]);
+                    for (var j = 0; j < els.length; j++) {
+                        var text = els[j].textContent.trim();
+                        // Solo devolver si tiene al menos 7 dígitos
+                        var digits = text.replace(/[^0-9]/g, '');
+                        if (digits.length >= 7) {
+                            return text;
                         }
-                        return null;
-                    """)
-                    if phone_text:
-                        telefono = self._extraer_telefono_de_texto(phone_text)
-                        if telefono:
-                            if self.modo_debug:
-                                print(f"      [DEBUG] ✓ Teléfono del texto visible: {telefono}")
-                            return telefono
-                except:
-                    pass
+                    }
+                }
+                return null;
+            """)
+            if phone_text:
+                telefono = self._extraer_telefono_de_texto(phone_text)
+                if telefono:
+                    if self.modo_debug:
+                        print(f"      [DEBUG] ✓ Teléfono del texto visible: {telefono}")
+                    return telefono
+        except:
+            pass
         
         if self.modo_debug:
             print("      [DEBUG] No se pudo capturar teléfono tras clic")
@@ -1266,31 +1096,8 @@ class ScraperPersonalizado:
         return None
     
     def _buscar_telefono_en_json(self, data) -> Optional[str]:
-        """Busca recursivamente un teléfono en una estructura JSON."""
-        if isinstance(data, str):
-            return self._extraer_telefono_de_texto(data)
-        elif isinstance(data, dict):
-            for key, value in data.items():
-                key_lower = key.lower()
-                if 'phone' in key_lower or 'telefon' in key_lower or 'tel' == key_lower or 'mobile' in key_lower:
-                    if isinstance(value, str):
-                        telefono = self._extraer_telefono_de_texto(value)
-                        if not telefono:
-                            # Puede ser directamente el número
-                            digitos = re.sub(r'[^\d]', '', value)
-                            if len(digitos) >= 7:
-                                return value.strip()
-                        return telefono
-                # Recurrir en valores
-                result = self._buscar_telefono_en_json(value)
-                if result:
-                    return result
-        elif isinstance(data, list):
-            for item in data:
-                result = self._buscar_telefono_en_json(item)
-                if result:
-                    return result
-        return None
+        """Busca un teléfono bajo las claves de teléfono de una estructura JSON."""
+        return telefonos.buscar_en_json(data)
     
     def _validar_telefono_final(self, telefono: Optional[str]) -> Optional[str]:
         """
@@ -1300,33 +1107,15 @@ class ScraperPersonalizado:
         if not telefono:
             return None
         
-        digitos = re.sub(r'[^\d]', '', telefono)
-        if len(digitos) < 7:
+        if telefonos.validar(telefono) is None:
             if self.modo_debug:
-                print(f"      [DEBUG] ✗ Rechazado (no es teléfono): '{telefono}' ({len(digitos)} dígitos)")
+                print(f"      [DEBUG] ✗ Rechazado (no es teléfono): '{telefono}' ({len(telefonos.digitos(telefono))} dígitos)")
             return None
-        
         return telefono
 
     def _extraer_telefono_de_texto(self, texto: str) -> Optional[str]:
-        """Extrae un número de teléfono de un texto usando regex"""
-        if not texto:
-            return None
-        
-        phone_patterns = [
-            r'\+34[\s]?[6789]\d{2}[\s]?\d{3}[\s]?\d{3}',  # +34 6XX XXX XXX
-            r'[6789]\d{2}[\s]?\d{2}[\s]?\d{2}[\s]?\d{2}',  # 6XX XX XX XX
-            r'[6789]\d{2}[\s]?\d{3}[\s]?\d{3}',            # 6XX XXX XXX
-            r'\d{3}[\s]?\d{3}[\s]?\d{3}',                  # XXX XXX XXX
-            r'\d{9}',                                        # 9 dígitos seguidos
-        ]
-        
-        for pattern in phone_patterns:
-            match = re.search(pattern, texto)
-            if match:
-                return match.group(0).strip()
-        
-        return None
+        """Extrae un número de teléfono de un texto (patrones precompilados)"""
+        return telefonos.extraer_de_texto(texto)
     
     def scrapear_con_filtrado(self, paginas=None, ubicacion=None):
         """Método NUEVO: Scrapea usando el filtrado de dos etapas
@@ -1681,6 +1470,16 @@ class ScraperPersonalizado:
         if not filename:
             filename = self._obtener_ruta_json_persistente(ubicacion)
         
+        almacen = abrir_almacen()
+        if almacen is not None:
+            total = almacen.guardar_zona(filename, [asdict(v) for v in particulares_nuevos],
+                                         ubicacion=ubicacion, url_busqueda=url_scrapeada)
+            print(f"\n[OK] Guardado en: {almacen.ruta} ({filename})")
+            print(f"     Nuevos añadidos: {len(particulares_nuevos)}")
+            print(f"     Total registros: {total}")
+            abrir_indice().registrar(v.url for v in particulares_nuevos)
+            return filename
+        
         # Cargar datos existentes
         viviendas_existentes = []
         if os.path.exists(filename):
@@ -1715,6 +1514,7 @@ class ScraperPersonalizado:
         print(f"\n[OK] Guardado en: {filename}")
         print(f"     Nuevos añadidos: {len(particulares_nuevos)}")
         print(f"     Total registros: {len(todas_viviendas)}")
+        abrir_indice().registrar(urls_nuevas)
         return filename
     
     def mostrar_resumen(self, viviendas: List[Vivienda]):
@@ -0,0 +1,423 @@
+"""
+Almacén SQLite de viviendas (alternativa a los viviendas_*.json por zona)
+Una sola base de datos en modo WAL: altas, bajas y "URLs conocidas de la zona"
+sin leer ni reescribir el archivo completo de la zona en cada ejecución.
+
+Cada zona se identifica por el nombre de su JSON histórico
+(viviendas_idealista_Anoia.json), así los scrapers y verificar_auto.py siguen
+usando las mismas rutas. La exportación reproduce el formato JSON actual
+(timestamp, ubicacion, url, total, viviendas) para la subida a InmoCapt.
+
+Backend en config.json:
+    "almacen": {"backend": "sqlite", "ruta": "viviendas.db"}    # por defecto "json"
+
+La marca de agua de cada zona (ver marca_agua.py) se guarda en la tabla
+marcas_agua, o en marcas_agua.json junto a los JSON con el backend "json".
+
+Uso:
+    python almacen_viviendas.py importar                  # todos los viviendas_*.json
+    python almacen_viviendas.py exportar --directorio out # regenera los JSON
+    python almacen_viviendas.py resumen
+"""
+
+import argparse
+import glob
+import json
+import os
+import sqlite3
+import sys
+import threading
+from datetime import datetime
+from typing import Iterable, List, Optional
+
+from escritura_atomica import bloqueo_archivo, escribir_json_atomico
+from indice_global import clave_anuncio
+
+
+DIRECTORIO = os.path.dirname(os.path.abspath(__file__))
+RUTA_BD = os.path.join(DIRECTORIO, 'viviendas.db')
+
+ARCHIVO_DESCATALOGADAS = 'viviendas_descatalogadas.json'
+ARCHIVO_MARCAS_AGUA = 'marcas_agua.json'
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS zonas (
+    archivo    TEXT PRIMARY KEY,
+    portal     TEXT NOT NULL,
+    ubicacion  TEXT NOT NULL DEFAULT '',
+    url        TEXT NOT NULL DEFAULT '',
+    timestamp  TEXT
+);
+CREATE TABLE IF NOT EXISTS viviendas (
+    archivo         TEXT NOT NULL REFERENCES zonas(archivo),
+    url             TEXT NOT NULL,
+    clave           TEXT NOT NULL,
+    portal          TEXT NOT NULL,
+    datos           TEXT NOT NULL,
+    fecha_scraping  TEXT,
+    orden           INTEGER NOT NULL,
+    descatalogada   TEXT,
+    PRIMARY KEY (archivo, url)
+);
+CREATE INDEX IF NOT EXISTS idx_viviendas_url ON viviendas(url);
+CREATE INDEX IF NOT EXISTS idx_viviendas_clave ON viviendas(clave);
+CREATE INDEX IF NOT EXISTS idx_viviendas_zona ON viviendas(archivo, descatalogada, orden);
+CREATE INDEX IF NOT EXISTS idx_viviendas_portal ON viviendas(portal, descatalogada);
+CREATE INDEX IF NOT EXISTS idx_viviendas_fecha ON viviendas(fecha_scraping);
+CREATE INDEX IF NOT EXISTS idx_viviendas_baja ON viviendas(descatalogada);
+CREATE TABLE IF NOT EXISTS marcas_agua (
+    archivo          TEXT PRIMARY KEY,
+    max_id           INTEGER NOT NULL,
+    max_publicacion  INTEGER,
+    timestamp        TEXT,
+    ultimo_completo  TEXT
+);
+"""
+
+CAMPOS_MARCA = ('max_id', 'max_publicacion', 'timestamp', 'ultimo_completo')
+
+
+def portal_de_archivo(archivo: str) -> str:
+    """'idealista' / 'fotocasa' según el prefijo viviendas_<portal>_"""
+    nombre = os.path.basename(archivo)
+    for portal in ('idealista', 'fotocasa'):
+        if nombre.startswith(f'viviendas_{portal}_'):
+            return portal
+    return 'desconocido'
+
+
+class AlmacenViviendas:
+    """Almacén de viviendas por zona sobre SQLite (WAL), compartible entre hilos"""
+
+    def __init__(self, ruta: str = RUTA_BD):
+        self.ruta = ruta
+        self._lock = threading.Lock()
+        self._conexion = sqlite3.connect(ruta, timeout=30, check_same_thread=False)
+        self._conexion.execute('PRAGMA journal_mode=WAL')
+        self._conexion.execute('PRAGMA synchronous=NORMAL')
+        self._conexion.executescript(ESQUEMA)
+        columnas = {fila[1] for fila in self._conexion.execute('PRAGMA table_info(marcas_agua)')}
+        if 'ultimo_completo' not in columnas:
+            self._conexion.execute('ALTER TABLE marcas_agua ADD COLUMN ultimo_completo TEXT')
+
+    def cerrar(self):
+        with self._lock:
+            self._conexion.close()
+
+    # ── Escritura ─────────────────────────────────────────────────
+
+    def guardar_zona(self, archivo: str, viviendas: List[dict], ubicacion: str = None,
+                     url_busqueda: str = None, timestamp: str = None) -> int:
+        """Inserta las viviendas nuevas de una zona al principio (más recientes primero).
+
+        Las ya existentes se actualizan y pasan delante, como en el JSON.
+        Retorna el total de viviendas activas de la zona.
+        """
+        archivo = os.path.basename(archivo)
+        portal = portal_de_archivo(archivo)
+        timestamp = timestamp or datetime.now().isoformat()
+        with self._lock, self._conexion:
+            self._conexion.execute(
+                """INSERT INTO zonas (archivo, portal, ubicacion, url, timestamp)
+                   VALUES (?, ?, ?, ?, ?)
+                   ON CONFLICT(archivo) DO UPDATE SET
+                       ubicacion = COALESCE(NULLIF(excluded.ubicacion, ''), ubicacion),
+                       url = COALESCE(NULLIF(excluded.url, ''), url),
+                       timestamp = excluded.timestamp""",
+                (archivo, portal, ubicacion or '', url_busqueda or '', timestamp),
+            )
+            (orden,) = self._conexion.execute(
+                'SELECT COALESCE(MAX(orden), 0) FROM viviendas WHERE archivo = ?', (archivo,)
+            ).fetchone()
+            filas = []
+            # El primero de la lista es el más reciente: recibe el orden más alto
+            for vivienda in reversed([v for v in viviendas if v.get('url')]):
+                orden += 1
+                filas.append((
+                    archivo, vivienda['url'], clave_anuncio(vivienda['url']), portal,
+                    json.dumps(vivienda, ensure_ascii=False), vivienda.get('fecha_scraping'), orden,
+                ))
+            self._conexion.executemany(
+                """INSERT INTO viviendas (archivo, url, clave, portal, datos, fecha_scraping, orden)
+                   VALUES (?, ?, ?, ?, ?, ?, ?)
+                   ON CONFLICT(archivo, url) DO UPDATE SET
+                       datos = excluded.datos,
+                       fecha_scraping = excluded.fecha_scraping,
+                       orden = excluded.orden,
+                       descatalogada = NULL""",
+                filas,
+            )
+            (total,) = self._conexion.execute(
+                'SELECT COUNT(*) FROM viviendas WHERE archivo = ? AND descatalogada IS NULL', (archivo,)
+            ).fetchone()
+        return total
+
+    def marcar_descatalogadas(self, urls: Iterable[str], archivo: str = None) -> int:
+        """Marca como descatalogadas las URLs (de una zona o de todas). Retorna las filas marcadas."""
+        ahora = datetime.now().isoformat()
+        urls = list(urls)
+        with self._lock, self._conexion:
+            if archivo:
+                cursor = self._conexion.executemany(
+                    """UPDATE viviendas SET descatalogada = ?
+                       WHERE archivo = ? AND url = ? AND descatalogada IS NULL""",
+                    [(ahora, os.path.basename(archivo), url) for url in urls],
+                )
+            else:
+                cursor = self._conexion.executemany(
+                    'UPDATE viviendas SET descatalogada = ? WHERE url = ? AND descatalogada IS NULL',
+                    [(ahora, url) for url in urls],
+                )
+            return cursor.rowcount
+
+    def guardar_marca_agua(self, archivo: str, marca: dict) -> None:
+        """Guarda la marca de agua de la zona: {max_id, max_publicacion, timestamp, ultimo_completo}"""
+        with self._lock, self._conexion:
+            self._conexion.execute(
+                f"""INSERT OR REPLACE INTO marcas_agua (archivo, {', '.join(CAMPOS_MARCA)})
+                   VALUES (?, ?, ?, ?, ?)""",
+                (os.path.basename(archivo), *(marca.get(campo) for campo in CAMPOS_MARCA)),
+            )
+
+    # ── Lectura ───────────────────────────────────────────────────
+
+    def marca_agua(self, archivo: str) -> Optional[dict]:
+        """Marca de agua de la zona, o None si aún no tiene"""
+        with self._lock:
+            fila = self._conexion.execute(
+                f"SELECT {', '.join(CAMPOS_MARCA)} FROM marcas_agua WHERE archivo = ?",
+                (os.path.basename(archivo),),
+            ).fetchone()
+        return dict(zip(CAMPOS_MARCA, fila)) if fila else None
+
+    def urls_conocidas(self, archivo: str) -> set:
+        """URLs activas de la zona (para parar al encontrar un anuncio ya conocido)"""
+        with self._lock:
+            filas = self._conexion.execute(
+                'SELECT url FROM viviendas WHERE archivo = ? AND descatalogada IS NULL',
+                (os.path.basename(archivo),),
+            ).fetchall()
+        return {url for (url,) in filas}
+
+    def urls_activas(self) -> List[str]:
+        """URLs activas de todas las zonas (para reconstruir el índice global)"""
+        with self._lock:
+            filas = self._conexion.execute(
+                'SELECT url FROM viviendas WHERE descatalogada IS NULL'
+            ).fetchall()
+        return [url for (url,) in filas]
+
+    def zonas(self, portal: str = None) -> List[dict]:
+        """Zonas registradas: [{archivo, portal, ubicacion, url, timestamp, total}]"""
+        consulta = """
+            SELECT z.archivo, z.portal, z.ubicacion, z.url, z.timestamp,
+                   (SELECT COUNT(*) FROM viviendas v
+                    WHERE v.archivo = z.archivo AND v.descatalogada IS NULL)
+            FROM zonas z"""
+        parametros = ()
+        if portal:
+            consulta += ' WHERE z.portal = ?'
+            parametros = (portal,)
+        with self._lock:
+            filas = self._conexion.execute(consulta + ' ORDER BY z.archivo', parametros).fetchall()
+        campos = ('archivo', 'portal', 'ubicacion', 'url', 'timestamp', 'total')
+        return [dict(zip(campos, fila)) for fila in filas]
+
+    def exportar_zona(self, archivo: str) -> Optional[dict]:
+        """La zona en el formato de los viviendas_*.json, o None si no existe"""
+        archivo = os.path.basename(archivo)
+        with self._lock:
+            zona = self._conexion.execute(
+                'SELECT ubicacion, url, timestamp FROM zonas WHERE archivo = ?', (archivo,)
+            ).fetchone()
+            if zona is None:
+                return None
+            filas = self._conexion.execute(
+                """SELECT datos FROM viviendas WHERE archivo = ? AND descatalogada IS NULL
+                   ORDER BY orden DESC""",
+                (archivo,),
+            ).fetchall()
+        viviendas = [json.loads(datos) for (datos,) in filas]
+        ubicacion, url, timestamp = zona
+        return {
+            'timestamp': timestamp,
+            'ubicacion': ubicacion,
+            'url': url,
+            'total': len(viviendas),
+            'viviendas': viviendas,
+        }
+
+    # ── Importación / exportación de JSON ─────────────────────────
+
+    def importar_json(self, ruta_json: str) -> int:
+        """Importa un viviendas_*.json (lista directa o dict con 'viviendas')"""
+        with open(ruta_json, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        if isinstance(data, list):
+            data = {'viviendas': data}
+        if not isinstance(data, dict) or 'viviendas' not in data:
+            raise ValueError("no es un JSON de viviendas por zona (falta 'viviendas')")
+        viviendas = data['viviendas'] or []
+        self.guardar_zona(ruta_json, viviendas, ubicacion=data.get('ubicacion'),
+                          url_busqueda=data.get('url'), timestamp=data.get('timestamp'))
+        return len(viviendas)
+
+    def exportar_json(self, directorio: str, portal: str = None) -> List[str]:
+        """Escribe cada zona como viviendas_*.json en el directorio. Retorna las rutas"""
+        os.makedirs(directorio, exist_ok=True)
+        rutas = []
+        for zona in self.zonas(portal):
+            ruta = os.path.join(directorio, zona['archivo'])
+            with open(ruta, 'w', encoding='utf-8') as f:
+                json.dump(self.exportar_zona(zona['archivo']), f, ensure_ascii=False, indent=2)
+            rutas.append(ruta)
+        return rutas
+
+
+# ── Configuración ─────────────────────────────────────────────────
+
+_almacenes = {}
+_lock_almacenes = threading.Lock()
+
+
+def cargar_config_almacen(config_file: str = "config.json") -> dict:
+    """Sección "almacen" de config.json ({} si no existe)"""
+    try:
+        with open(config_file, 'r', encoding='utf-8') as f:
+            return json.load(f).get('almacen', {})
+    except (OSError, ValueError, AttributeError):
+        return {}
+
+
+def abrir_almacen(config_file: str = "config.json") -> Optional[AlmacenViviendas]:
+    """El almacén SQLite si config.json lo activa (almacen.backend = "sqlite"), si no None.
+
+    Se abre una sola conexión por base de datos y proceso.
+    """
+    config = cargar_config_almacen(config_file)
+    if config.get('backend', 'json') != 'sqlite':
+        return None
+    ruta = config.get('ruta') or RUTA_BD
+    if not os.path.isabs(ruta):
+        ruta = os.path.join(DIRECTORIO, ruta)
+    with _lock_almacenes:
+        if ruta not in _almacenes:
+            _almacenes[ruta] = AlmacenViviendas(ruta)
+        return _almacenes[ruta]
+
+
+def leer_zona(ruta_json: str, config_file: str = "config.json") -> Optional[dict]:
+    """Datos de una zona en formato JSON desde el backend configurado (None si no hay)"""
+    almacen = abrir_almacen(config_file)
+    if almacen is not None:
+        return almacen.exportar_zona(ruta_json)
+    if not os.path.exists(ruta_json):
+        return None
+    with open(ruta_json, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+_lock_marcas = threading.Lock()
+
+
+def _ruta_marcas_agua(ruta_json: str) -> str:
+    return os.path.join(os.path.dirname(os.path.abspath(ruta_json)), ARCHIVO_MARCAS_AGUA)
+
+
+def _leer_marcas_json(ruta: str) -> dict:
+    try:
+        with open(ruta, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def leer_marca_agua(ruta_json: str, config_file: str = "config.json") -> Optional[dict]:
+    """Marca de agua de una zona desde el backend configurado (None si no hay)"""
+    almacen = abrir_almacen(config_file)
+    if almacen is not None:
+        return almacen.marca_agua(ruta_json)
+    return _leer_marcas_json(_ruta_marcas_agua(ruta_json)).get(os.path.basename(ruta_json))
+
+
+def guardar_marca_agua(ruta_json: str, marca: dict, config_file: str = "config.json") -> None:
+    """Guarda la marca de agua de una zona en el backend configurado"""
+    almacen = abrir_almacen(config_file)
+    if almacen is not None:
+        almacen.guardar_marca_agua(ruta_json, marca)
+        return
+    ruta = _ruta_marcas_agua(ruta_json)
+    with _lock_marcas, bloqueo_archivo(ruta):
+        marcas = _leer_marcas_json(ruta)
+        marcas[os.path.basename(ruta_json)] = marca
+        escribir_json_atomico(ruta, marcas)
+
+
+# ── Escritura concurrente de los JSON de zona ─────────────────────
+
+_locks_zona = {}
+_lock_locks_zona = threading.Lock()
+
+
+def bloqueo_zona(ruta_json: str) -> threading.Lock:
+    """Lock del JSON de una zona (uno por archivo y proceso).
+
+    Con el backend "json" varios hilos del batch paralelo (ejecutor_zonas.py)
+    pueden guardar a la vez: la lectura, fusión y escritura de cada zona van
+    dentro de este lock. SQLite ya serializa sus escrituras.
+    """
+    ruta = os.path.abspath(ruta_json)
+    with _lock_locks_zona:
+        if ruta not in _locks_zona:
+            _locks_zona[ruta] = threading.Lock()
+        return _locks_zona[ruta]
+
+
+# ── CLI ───────────────────────────────────────────────────────────
+
+def main():
+    parser = argparse.ArgumentParser(description='Almacén SQLite de viviendas')
+    parser.add_argument('--bd', default=None, help=f'Ruta de la base de datos (default: {RUTA_BD})')
+    comandos = parser.add_subparsers(dest='comando', required=True)
+
+    importar = comandos.add_parser('importar', help='Importar viviendas_*.json a la base de datos')
+    importar.add_argument('archivos', nargs='*', help='JSON a importar (default: todos los viviendas_*.json)')
+
+    exportar = comandos.add_parser('exportar', help='Regenerar los viviendas_*.json desde la base de datos')
+    exportar.add_argument('--directorio', default=DIRECTORIO, help='Directorio de salida')
+    exportar.add_argument('--portal', choices=['idealista', 'fotocasa'], default=None)
+
+    comandos.add_parser('resumen', help='Viviendas activas por zona')
+
+    args = parser.parse_args()
+    almacen = AlmacenViviendas(args.bd or RUTA_BD)
+
+    if args.comando == 'importar':
+        archivos = args.archivos or sorted(glob.glob(os.path.join(DIRECTORIO, 'viviendas_*.json')))
+        total = 0
+        for archivo in archivos:
+            if os.path.basename(archivo) == ARCHIVO_DESCATALOGADAS:
+                continue
+            try:
+                n = almacen.importar_json(archivo)
+            except (OSError, ValueError) as e:
+                print(f"⚠️  Error importando {archivo}: {e}")
+                continue
+            total += n
+            print(f"📥 {os.path.basename(archivo)}: {n} viviendas")
+        print(f"\n✅ Importadas {total} viviendas en {almacen.ruta}")
+
+    elif args.comando == 'exportar':
+        rutas = almacen.exportar_json(args.directorio, args.portal)
+        print(f"✅ Exportadas {len(rutas)} zonas a {args.directorio}")
+
+    else:
+        for zona in almacen.zonas():
+            print(f"  {zona['portal']:<10} {zona['ubicacion'] or zona['archivo']:<40} {zona['total']:>5}")
+
+    almacen.cerrar()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
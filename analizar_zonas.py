@@ -0,0 +1,452 @@
+"""
+Analizador de solapamiento de zonas de config.json
+config.json mezcla URLs de municipios, distritos, comarcas y polígonos
+(/areas/?shape=) que se solapan: los mismos anuncios se paginan, clasifican y
+se les extrae el teléfono varias veces por lote. Este análisis:
+  - resuelve cada URL a un área: ruta de ubicaciones (barcelona/eixample),
+    conjunto de códigos (/multi/) o polígono (shape decodificado como
+    polilínea codificada de Google)
+  - detecta contención estructural: URL idéntica, ruta que es prefijo de otra,
+    códigos incluidos o polígono dentro de otro (muestreo en rejilla), siempre
+    que la zona que contiene no tenga filtros (con-... de Idealista, query de
+    Fotocasa) que la otra no tenga
+  - mide el solapamiento observado con los IDs de anuncio guardados de cada
+    zona (JSON o almacén), de sus descatalogadas y de los particulares que
+    los scrapers vieron en su listado (anuncios_vistos.json): un anuncio ya
+    guardado en otra zona se omite y no llega al archivo de la zona
+  - omite, de una en una, las zonas cubiertas por el resto (estructuralmente o
+    con al menos UMBRAL_COBERTURA de sus anuncios en otras zonas) y ordena las
+    demás de mayor a menor, para que las pequeñas que solapan reutilicen el
+    índice global (indice_global.py) en lugar de extraer el teléfono de nuevo
+
+Genera un informe revisable y plan_rastreo.json, que HomeScraper.py usa en el
+modo batch (todas las zonas) si existe.
+
+Uso:
+    python analizar_zonas.py                       # ambos portales
+    python analizar_zonas.py --portal idealista --umbral 0.9 --informe informe_zonas.txt
+"""
+
+import argparse
+import json
+import math
+import os
+import re
+import sys
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Set, Tuple
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from almacen_viviendas import ARCHIVO_DESCATALOGADAS, leer_zona
+from escritura_atomica import bloqueo_archivo, escribir_json_atomico
+from indice_global import id_anuncio
+from ventana_reciente import PARAMETRO_FOTOCASA
+
+
+DIRECTORIO = os.path.dirname(os.path.abspath(__file__))
+RUTA_CONFIG = os.path.join(DIRECTORIO, 'config.json')
+RUTA_PLAN = os.path.join(DIRECTORIO, 'plan_rastreo.json')
+RUTA_VISTOS = os.path.join(DIRECTORIO, 'anuncios_vistos.json')
+
+PORTALES = ('idealista', 'fotocasa')
+
+# Fracción de anuncios de una zona presentes en otras para darla por cubierta,
+# y anuncios observados mínimos para fiarse de la muestra (solo se guardan particulares)
+UMBRAL_COBERTURA = 0.95
+MUESTRA_MINIMA = 20
+
+# Fracción del polígono dentro de otro para considerarlo contenido, y rejilla de muestreo
+UMBRAL_FORMA = 0.98
+PUNTOS_REJILLA = 60
+
+RADIO_TIERRA_KM = 6371.0
+
+# Días sin volver a ver un anuncio en el listado de una zona antes de olvidarlo
+DIAS_VISTOS = 90
+
+# Parámetros de Fotocasa que no filtran anuncios (orden, paginación, ventana de publicación)
+PARAMETROS_SIN_FILTRO = {'sortType', 'sortOrderDesc', 'page', 'from', 'searchArea', 'text', PARAMETRO_FOTOCASA}
+
+
+# ── Áreas a partir de la URL ──────────────────────────────────────
+
+def decodificar_polilinea(texto: str) -> List[Tuple[float, float]]:
+    """Decodifica una polilínea codificada de Google (precisión 1e-5) a [(lat, lon)]"""
+    puntos = []
+    indice = lat = lon = 0
+    while indice < len(texto):
+        valores = []
+        for _ in range(2):
+            resultado = desplazamiento = 0
+            while True:
+                byte = ord(texto[indice]) - 63
+                indice += 1
+                resultado |= (byte & 0x1f) << desplazamiento
+                desplazamiento += 5
+                if byte < 0x20:
+                    break
+            valores.append(~(resultado >> 1) if resultado & 1 else resultado >> 1)
+        lat += valores[0]
+        lon += valores[1]
+        puntos.append((lat / 1e5, lon / 1e5))
+    return puntos
+
+
+def poligonos_shape(url: str) -> List[List[Tuple[float, float]]]:
+    """Polígonos del parámetro shape de Idealista: ((poli1),(poli2))"""
+    shape = parse_qs(urlsplit(url).query).get('shape')
+    if not shape:
+        return []
+    texto = unquote(shape[0]).strip()
+    if texto.startswith('((') and texto.endswith('))'):
+        texto = texto[2:-2]
+    return [decodificar_polilinea(parte) for parte in texto.split('),(') if parte]
+
+
+def area_km2(poligono: List[Tuple[float, float]]) -> float:
+    """Área aproximada (proyección equirectangular y fórmula del área de Gauss)"""
+    if len(poligono) < 3:
+        return 0.0
+    lat_media = math.radians(sum(lat for lat, _ in poligono) / len(poligono))
+    xy = [(math.radians(lon) * math.cos(lat_media) * RADIO_TIERRA_KM, math.radians(lat) * RADIO_TIERRA_KM)
+          for lat, lon in poligono]
+    suma = sum(x1 * y2 - x2 * y1 for (x1, y1), (x2, y2) in zip(xy, xy[1:] + xy[:1]))
+    return abs(suma) / 2
+
+
+def _dentro(punto: Tuple[float, float], poligono: List[Tuple[float, float]]) -> bool:
+    """Punto en polígono por paridad de cruces"""
+    lat, lon = punto
+    dentro = False
+    for (lat1, lon1), (lat2, lon2) in zip(poligono, poligono[1:] + poligono[:1]):
+        if (lat1 > lat) != (lat2 > lat):
+            lon_cruce = lon1 + (lat - lat1) * (lon2 - lon1) / (lat2 - lat1)
+            if lon < lon_cruce:
+                dentro = not dentro
+    return dentro
+
+
+def fraccion_dentro(formas_a: list, formas_b: list, puntos: int = PUNTOS_REJILLA) -> float:
+    """Fracción del área de A que cae dentro de B (muestreo en rejilla sobre el rectángulo de A)"""
+    vertices = [p for forma in formas_a for p in forma]
+    if not vertices or not formas_b:
+        return 0.0
+    lat_min, lat_max = min(p[0] for p in vertices), max(p[0] for p in vertices)
+    lon_min, lon_max = min(p[1] for p in vertices), max(p[1] for p in vertices)
+    en_a = en_ambas = 0
+    for i in range(puntos):
+        for j in range(puntos):
+            punto = (lat_min + (i + 0.5) * (lat_max - lat_min) / puntos,
+                     lon_min + (j + 0.5) * (lon_max - lon_min) / puntos)
+            if any(_dentro(punto, forma) for forma in formas_a):
+                en_a += 1
+                en_ambas += any(_dentro(punto, forma) for forma in formas_b)
+    return en_ambas / en_a if en_a else 0.0
+
+
+def filtros_de_url(url: str) -> frozenset:
+    """Filtros de la búsqueda: 'precio-hasta_200000' (con-... de Idealista) o 'maxPrice=200000' (Fotocasa).
+
+    La ventana de publicación, el orden y la paginación no cuentan como filtros.
+    """
+    partes = urlsplit(url)
+    if 'idealista.com' in partes.netloc:
+        return frozenset(filtro for s in partes.path.split('/') if s.startswith('con-')
+                         for filtro in s[len('con-'):].split(',') if filtro and not filtro.startswith('publicado_'))
+    return frozenset(f"{nombre}={','.join(sorted(valores))}"
+                     for nombre, valores in parse_qs(partes.query).items() if nombre not in PARAMETROS_SIN_FILTRO)
+
+
+def area_de_url(url: str) -> dict:
+    """Área de búsqueda de la URL con sus filtros.
+
+    {'tipo': 'forma'|'multi'|'ruta'|'texto'|'desconocida', 'filtros': frozenset, ...}
+    """
+    area = _area_sin_filtros(url)
+    area['filtros'] = filtros_de_url(url)
+    return area
+
+
+def _area_sin_filtros(url: str) -> dict:
+    partes = urlsplit(url)
+    segmentos = [s for s in partes.path.split('/') if s and not s.startswith('con-')
+                 and not re.match(r'pagina-\d+', s)]
+    if 'idealista.com' in partes.netloc:
+        formas = poligonos_shape(url)
+        if formas:
+            return {'tipo': 'forma', 'formas': formas}
+        if 'multi' in segmentos and segmentos[-1] != 'venta-viviendas':
+            return {'tipo': 'multi', 'codigos': frozenset(segmentos[-1].split(','))}
+        if 'venta-viviendas' in segmentos:
+            return {'tipo': 'ruta', 'ruta': tuple(segmentos[segmentos.index('venta-viviendas') + 1:])}
+    elif 'fotocasa.es' in partes.netloc:
+        consulta = parse_qs(partes.query)
+        if consulta.get('searchArea'):
+            return {'tipo': 'desconocida'}  # polígono guardado en el portal, sin geometría en la URL
+        if consulta.get('text'):
+            return {'tipo': 'texto', 'texto': consulta['text'][0].lower()}
+        if 'viviendas' in segmentos:
+            ruta = segmentos[segmentos.index('viviendas') + 1:]
+            ruta = [s for s in ruta if s not in ('l', 'todas-las-zonas') and not s.isdigit()]
+            return {'tipo': 'ruta', 'ruta': tuple(ruta)}
+    return {'tipo': 'desconocida'}
+
+
+def contenida_en(area_a: dict, area_b: dict) -> Optional[str]:
+    """Motivo por el que el área A está contenida en B, o None si no se puede afirmar.
+
+    B no puede tener filtros que A no tenga: una zona sin filtros nunca está
+    contenida en la misma zona con filtros.
+    """
+    if area_a['tipo'] != area_b['tipo']:
+        return None
+    if not area_b.get('filtros', frozenset()) <= area_a.get('filtros', frozenset()):
+        return None
+    motivo = _contenida_sin_filtros(area_a, area_b)
+    extra = area_a.get('filtros', frozenset()) - area_b.get('filtros', frozenset())
+    if motivo and extra:
+        motivo += f" (con filtros {', '.join(sorted(extra))})"
+    return motivo
+
+
+def _contenida_sin_filtros(area_a: dict, area_b: dict) -> Optional[str]:
+    if area_a['tipo'] == 'ruta':
+        ruta_a, ruta_b = area_a['ruta'], area_b['ruta']
+        if ruta_a == ruta_b:
+            return 'misma ubicación'
+        if len(ruta_b) < len(ruta_a) and ruta_a[:len(ruta_b)] == ruta_b:
+            return f"{'/'.join(ruta_a)} está dentro de {'/'.join(ruta_b)}"
+    elif area_a['tipo'] == 'multi' and area_a['codigos'] <= area_b['codigos']:
+        return 'códigos de ubicación incluidos'
+    elif area_a['tipo'] == 'texto' and area_a['texto'] == area_b['texto']:
+        return 'misma búsqueda de texto'
+    elif area_a['tipo'] == 'forma':
+        fraccion = fraccion_dentro(area_a['formas'], area_b['formas'])
+        if fraccion >= UMBRAL_FORMA:
+            return f"polígono {fraccion:.0%} dentro"
+    return None
+
+
+# ── Anuncios observados ───────────────────────────────────────────
+
+def ruta_zona(portal: str, nombre: str) -> str:
+    """Archivo de la zona, como _obtener_ruta_json_persistente de los scrapers"""
+    return os.path.join(DIRECTORIO, f"viviendas_{portal}_{nombre.replace(' ', '_').replace('/', '-')}.json")
+
+
+_lock_vistos = threading.Lock()
+
+
+def _leer_vistos(ruta: str) -> dict:
+    try:
+        with open(ruta, 'r', encoding='utf-8') as f:
+            datos = json.load(f)
+        return datos if isinstance(datos, dict) else {}
+    except (OSError, ValueError):
+        return {}
+
+
+def registrar_vistos(portal: str, ubicacion: str, urls, ruta: str = RUTA_VISTOS,
+                     ahora: datetime = None) -> None:
+    """Anota los particulares vistos en el listado de la zona, también los omitidos por estar en otra.
+
+    Guarda {portal: {zona: {ID: fecha}}} y olvida los no vistos en DIAS_VISTOS días.
+    """
+    ahora = ahora or datetime.now()
+    hoy = ahora.date().isoformat()
+    limite = (ahora - timedelta(days=DIAS_VISTOS)).date().isoformat()
+    with _lock_vistos, bloqueo_archivo(ruta):
+        vistos = _leer_vistos(ruta)
+        zona = vistos.setdefault(portal, {}).get(ubicacion, {})
+        zona = {ident: fecha for ident, fecha in zona.items() if fecha >= limite}
+        for url in urls:
+            ident = id_anuncio(url)
+            if ident and ident[0] == portal:
+                zona[str(ident[1])] = hoy
+        vistos[portal][ubicacion] = zona
+        escribir_json_atomico(ruta, vistos)
+
+
+def ids_observados(portal: str, zonas: List[dict], config_file: str = RUTA_CONFIG,
+                   ruta_vistos: str = RUTA_VISTOS) -> Dict[str, Set[int]]:
+    """IDs de anuncio vistos en cada zona: guardados (JSON o almacén), descatalogados de ella
+    y particulares vistos en su listado (registrar_vistos)"""
+    ids = {}
+    for zona in zonas:
+        datos = leer_zona(ruta_zona(portal, zona['nombre']), config_file) or {}
+        ids[zona['nombre']] = {
+            ident[1] for ident in (id_anuncio(v.get('url', '')) for v in datos.get('viviendas', []))
+            if ident and ident[0] == portal
+        }
+    try:
+        with open(os.path.join(DIRECTORIO, ARCHIVO_DESCATALOGADAS), 'r', encoding='utf-8') as f:
+            detalle = json.load(f).get('detalle', [])
+    except (OSError, ValueError, AttributeError):
+        detalle = []
+    for entrada in detalle:
+        ident = id_anuncio(entrada.get('url', ''))
+        if ident and ident[0] == portal and entrada.get('ubicacion') in ids:
+            ids[entrada['ubicacion']].add(ident[1])
+    for nombre, vistos in _leer_vistos(ruta_vistos).get(portal, {}).items():
+        if nombre in ids:
+            ids[nombre].update(int(ident) for ident in vistos)
+    return ids
+
+
+# ── Plan ──────────────────────────────────────────────────────────
+
+def _cobertura(nombre: str, ids: Dict[str, Set[int]], restantes: List[str]) -> Tuple[float, List[str]]:
+    """Fracción de los anuncios de la zona presentes en otras zonas restantes, y cuáles"""
+    propios = ids.get(nombre) or set()
+    if len(propios) < MUESTRA_MINIMA:
+        return 0.0, []
+    otras = [otra for otra in restantes if otra != nombre and propios & ids.get(otra, set())]
+    cubiertos = set().union(*(propios & ids[otra] for otra in otras)) if otras else set()
+    otras.sort(key=lambda otra: -len(propios & ids[otra]))
+    return len(cubiertos) / len(propios), otras
+
+
+def planificar_portal(zonas: List[dict], ids: Dict[str, Set[int]],
+                      umbral: float = UMBRAL_COBERTURA) -> dict:
+    """Omite de una en una la zona más cubierta por las demás; ordena el resto por tamaño.
+
+    Retorna {'zonas': [...], 'omitidas': [...], 'solapes': [...]} para plan_rastreo.json.
+    """
+    por_nombre = {zona['nombre']: zona for zona in zonas}
+    areas = {zona['nombre']: area_de_url(zona['url']) for zona in zonas}
+    orden = {zona['nombre']: i for i, zona in enumerate(zonas)}
+    restantes = [zona['nombre'] for zona in zonas]
+    omitidas = []
+    contenciones = {}
+
+    def contenida(a: str, b: str) -> Optional[str]:
+        if (a, b) not in contenciones:
+            contenciones[(a, b)] = contenida_en(areas[a], areas[b])
+        return contenciones[(a, b)]
+
+    while True:
+        mejor = None
+        for nombre in restantes:
+            for otra in restantes:
+                if otra == nombre:
+                    continue
+                motivo = contenida(nombre, otra)
+                # Dos zonas iguales se contienen mutuamente: se omite la que va después en config.json
+                if motivo and not (contenida(otra, nombre) and orden[nombre] < orden[otra]):
+                    candidato = (2.0, orden[nombre], nombre, [otra], motivo)
+                    break
+            else:
+                # Solo cubren la zona las que no filtran más que ella
+                cobertura, otras = _cobertura(nombre, ids, [otra for otra in restantes
+                                                            if areas[otra]['filtros'] <= areas[nombre]['filtros']])
+                if cobertura < umbral:
+                    continue
+                candidato = (cobertura, orden[nombre], nombre, otras,
+                             f"{cobertura:.0%} de {len(ids[nombre])} anuncios ya en otras zonas")
+            if mejor is None or candidato[:2] > mejor[:2]:
+                mejor = candidato
+        if mejor is None:
+            break
+        _, _, nombre, cubierta_por, motivo = mejor
+        restantes.remove(nombre)
+        omitidas.append({**por_nombre[nombre], 'motivo': motivo, 'cubierta_por': cubierta_por})
+
+    restantes.sort(key=lambda nombre: (-len(ids.get(nombre, ())), orden[nombre]))
+    solapes = []
+    for i, a in enumerate(restantes):
+        for b in restantes[i + 1:]:
+            comunes = len(ids.get(a, set()) & ids.get(b, set()))
+            if comunes:
+                solapes.append({'zonas': [a, b], 'comunes': comunes,
+                                'fraccion': [round(comunes / len(ids[a]), 3), round(comunes / len(ids[b]), 3)]})
+    solapes.sort(key=lambda s: -s['comunes'])
+
+    return {
+        'zonas': [{**por_nombre[nombre], 'anuncios': len(ids.get(nombre, ()))} for nombre in restantes],
+        'omitidas': omitidas,
+        'solapes': solapes,
+    }
+
+
+def informe(plan: dict) -> str:
+    """Informe legible del plan"""
+    lineas = [f"PLAN DE RASTREO ({plan['generado']}, umbral {plan['umbral']:.0%})"]
+    for portal, datos in plan['portales'].items():
+        total = len(datos['zonas']) + len(datos['omitidas'])
+        lineas.append('')
+        lineas.append(f"== {portal.upper()}: {len(datos['zonas'])} de {total} zonas ==")
+        for omitida in datos['omitidas']:
+            lineas.append(f"  ✂️  {omitida['nombre']}: {omitida['motivo']} "
+                          f"(cubierta por {', '.join(omitida['cubierta_por'])})")
+        lineas.append('  Orden de rastreo:')
+        for i, zona in enumerate(datos['zonas'], 1):
+            lineas.append(f"    {i:>2}. {zona['nombre']} ({zona['anuncios']} anuncios observados)")
+        if datos['solapes']:
+            lineas.append('  Solapes parciales que se mantienen:')
+            for solape in datos['solapes'][:15]:
+                a, b = solape['zonas']
+                fa, fb = solape['fraccion']
+                lineas.append(f"    {a} ∩ {b}: {solape['comunes']} ({fa:.0%} / {fb:.0%})")
+    return '\n'.join(lineas)
+
+
+def generar_plan(config: dict, portales=PORTALES, umbral: float = UMBRAL_COBERTURA,
+                 config_file: str = RUTA_CONFIG) -> dict:
+    plan = {'generado': datetime.now().isoformat(timespec='seconds'), 'umbral': umbral, 'portales': {}}
+    for portal in portales:
+        zonas = [{'nombre': u['nombre'], 'url': u['url']} for u in config.get(portal, {}).get('urls', [])]
+        if zonas:
+            plan['portales'][portal] = planificar_portal(zonas, ids_observados(portal, zonas, config_file), umbral)
+    return plan
+
+
+def zonas_del_plan(portal: str, urls_config: List[dict], ruta: str = RUTA_PLAN) -> Optional[List[dict]]:
+    """Zonas de config.json en el orden del plan, sin las omitidas (None si no hay plan).
+
+    Las URLs salen de config.json; las zonas añadidas después del análisis van al final.
+    """
+    try:
+        with open(ruta, 'r', encoding='utf-8') as f:
+            datos = json.load(f)['portales'][portal]
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+    por_nombre = {u['nombre']: u for u in urls_config}
+    omitidas = {zona['nombre'] for zona in datos.get('omitidas', [])}
+    orden = [zona['nombre'] for zona in datos.get('zonas', []) if zona['nombre'] in por_nombre]
+    orden += [nombre for nombre in por_nombre if nombre not in orden and nombre not in omitidas]
+    return [{'url': por_nombre[nombre]['url'], 'nombre': nombre} for nombre in orden]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Solapamiento de zonas de config.json y plan de rastreo')
+    parser.add_argument('--portal', choices=PORTALES, help='Solo un portal (por defecto ambos)')
+    parser.add_argument('--umbral', type=float, default=UMBRAL_COBERTURA,
+                        help=f'Cobertura para omitir una zona (default: {UMBRAL_COBERTURA})')
+    parser.add_argument('--salida', default=RUTA_PLAN, help=f'Plan generado (default: {RUTA_PLAN})')
+    parser.add_argument('--informe', help='Guardar también el informe en este archivo')
+    args = parser.parse_args()
+
+    try:
+        with open(RUTA_CONFIG, 'r', encoding='utf-8') as f:
+            config = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"❌ No se pudo leer config.json: {e}")
+        return 1
+
+    plan = generar_plan(config, (args.portal,) if args.portal else PORTALES, args.umbral)
+    texto = informe(plan)
+    print(texto)
+
+    with open(args.salida, 'w', encoding='utf-8') as f:
+        json.dump(plan, f, ensure_ascii=False, indent=2)
+    print(f"\n💾 Plan guardado en {args.salida}")
+    if args.informe:
+        with open(args.informe, 'w', encoding='utf-8') as f:
+            f.write(texto + '\n')
+        print(f"📄 Informe guardado en {args.informe}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
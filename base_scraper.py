@@ -11,25 +11,27 @@ import subprocess
 import shutil
 import urllib.request
 from abc import ABC, abstractmethod
-from typing import List, Optional, Any
+from typing import Callable, List, Optional, Any
 from dataclasses import dataclass, asdict
 from datetime import datetime
 
+from bs4 import BeautifulSoup
+
 from selenium import webdriver
 from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.remote.webdriver import WebDriver
 from selenium.common.exceptions import WebDriverException, TimeoutException
 
+from almacen_viviendas import abrir_almacen, bloqueo_zona, escribir_json_atomico
+from indice_global import abrir_indice
+from marca_agua import MarcasPendientes
+from control_ritmo import ritmo_portal
+from consola import preguntar
+
 
 # ============== CONFIGURACIÓN ANTI-DETECCIÓN ==============
 PETICIONES_ANTES_CAMBIO_IP = 15
-DELAY_MIN_ENTRE_PAGINAS = 3
-DELAY_MAX_ENTRE_PAGINAS = 7
-DELAY_MIN_ENTRE_DETALLES = 2
-DELAY_MAX_ENTRE_DETALLES = 5
-PETICIONES_ANTES_PAUSA_LARGA = 10
-PAUSA_LARGA_MIN = 15
-PAUSA_LARGA_MAX = 30
+# Esperas entre peticiones y pausas largas: control_ritmo.py
 # ===========================================================
 
 
@@ -48,6 +50,96 @@ class Vivienda:
     telefono: Optional[str] = None  # Nuevo campo para el teléfono
 
 
+# Campos de Vivienda que devuelven los extractores JS de cada portal
+CAMPOS_REGISTRO = ('titulo', 'precio', 'ubicacion', 'habitaciones', 'metros', 'url', 'descripcion', 'telefono')
+
+
+def ejecutar_extractor_js(objetivo, js: str, arg: Any = None) -> Any:
+    """Ejecuta un extractor JS en el navegador con una única llamada.
+    
+    El extractor se declara como expresión de función: function (arg) { ... }
+      - Selenium (WebDriver): execute_script('return (<js>)(arguments[0]);', arg)
+      - Playwright (Page):    page.evaluate(<js>, arg)
+    Devuelve el resultado ya deserializado (listas/dicts de Python).
+    """
+    if hasattr(objetivo, 'execute_script'):
+        return objetivo.execute_script(f"return ({js})(arguments[0]);", arg)
+    return objetivo.evaluate(js, arg)
+
+
+class SnapshotDOM:
+    """Copia única del código fuente de la página actual.
+    
+    Cada page_source / page.content() es un round-trip completo al navegador.
+    El snapshot lo pide como mucho una vez por navegación (o mutación del DOM)
+    y entrega el mismo texto, su versión en minúsculas y el árbol parseado a
+    todos los consumidores. Se invalida con invalidar() tras get/goto/refresh,
+    scroll o clics que cambian el contenido.
+    """
+    
+    def __init__(self, leer_html: Callable[[], str], leer_url: Optional[Callable[[], str]] = None):
+        self._leer_html = leer_html
+        self._leer_url = leer_url
+        self.epoca = 0
+        self.lecturas = 0       # Fetches reales al navegador (HTML + URL)
+        self.reutilizadas = 0   # Peticiones servidas desde el snapshot
+        self._limpiar()
+    
+    def _limpiar(self):
+        self._html = None
+        self._html_minusculas = None
+        self._soup = None
+        self._url = None
+    
+    def invalidar(self):
+        """Descarta el snapshot (nueva navegación o DOM modificado)"""
+        self._limpiar()
+        self.epoca += 1
+    
+    def _fuente(self) -> str:
+        if self._html is None:
+            self._html = self._leer_html() or ''
+            self.lecturas += 1
+        else:
+            self.reutilizadas += 1
+        return self._html
+    
+    @property
+    def html(self) -> str:
+        return self._fuente()
+    
+    @property
+    def html_minusculas(self) -> str:
+        if self._html_minusculas is None:
+            self._html_minusculas = self._fuente().lower()
+        else:
+            self.reutilizadas += 1
+        return self._html_minusculas
+    
+    @property
+    def soup(self) -> BeautifulSoup:
+        """Árbol parseado compartido (solo lectura: no modificarlo)"""
+        if self._soup is None:
+            self._soup = BeautifulSoup(self._fuente(), 'html.parser')
+        else:
+            self.reutilizadas += 1
+        return self._soup
+    
+    @property
+    def url(self) -> str:
+        if self._leer_url is None:
+            raise AttributeError("SnapshotDOM sin lector de URL")
+        if self._url is None:
+            self._url = self._leer_url() or ''
+            self.lecturas += 1
+        else:
+            self.reutilizadas += 1
+        return self._url
+    
+    def resumen(self) -> str:
+        return f"{self.lecturas} lecturas del navegador, {self.reutilizadas} ahorradas ({self.epoca} invalidaciones)"
+
+
 class BaseScraper(ABC):
     """Clase base abstracta para scrapers de portales inmobiliarios"""
     
@@ -59,9 +151,14 @@ class BaseScraper(ABC):
         
         # Contadores para anti-detección
         self.peticiones_realizadas = 0
-        self.peticiones_desde_ultima_pausa = 0
         self.usar_rotacion_ip = usar_rotacion_ip
         self.vpn_provider = vpn_provider
+        
+        # Marcas de agua de los rastreos aún sin guardar (una por fragmento)
+        self.marcas_pendientes = MarcasPendientes()
+        
+        # Código fuente de la página actual, leído una vez por navegación
+        self.snapshot = SnapshotDOM(lambda: self.driver.page_source, lambda: self.driver.current_url)
     
     @abstractmethod
     def get_portal_name(self) -> str:
@@ -95,6 +192,47 @@ class BaseScraper(ABC):
     
     # ============== MÉTODOS COMUNES ==============
     
+    # ============================================================
+    # EXTRACCIÓN EN EL NAVEGADOR
+    # ============================================================
+    
+    def get_extractor_js(self) -> Optional[str]:
+        """Extractor JS del portal: función que devuelve una lista de registros
+        compactos (solo los campos de Vivienda). None = el portal no tiene extractor."""
+        return None
+    
+    def extraer_registros_navegador(self, arg: Any = None) -> Optional[List[dict]]:
+        """Ejecuta el extractor del portal en la página actual (un único round-trip).
+        
+        Retorna la lista de registros o None si no hay extractor o no aplica a la página.
+        """
+        js = self.get_extractor_js()
+        if not js or not self.driver:
+            return None
+        try:
+            registros = ejecutar_extractor_js(self.driver, js, arg)
+        except Exception as e:
+            if self.modo_debug:
+                print(f"      [DEBUG] Extractor JS no disponible: {e}")
+            return None
+        
+        if not isinstance(registros, list):
+            return None
+        
+        if self.modo_debug:
+            tamano = len(json.dumps(registros, ensure_ascii=False))
+            print(f"      [DEBUG] Extractor JS: {len(registros)} registros ({tamano / 1024:.1f} KB)")
+        return registros
+    
+    def vivienda_desde_registro(self, registro: dict, anunciante: str = "Particular") -> Vivienda:
+        """Construye una Vivienda a partir de un registro compacto del extractor"""
+        return Vivienda(
+            **{campo: registro.get(campo) for campo in CAMPOS_REGISTRO},
+            anunciante=anunciante,
+            fecha_scraping=datetime.now().isoformat(),
+            portal=self.get_portal_name()
+        )
+    
     def detectar_vpn_instalada(self):
         """Detecta qué VPN está instalada en el sistema"""
         vpns = {
@@ -227,28 +365,21 @@ class BaseScraper(ABC):
             except:
                 return False
     
+    @property
+    def ritmo(self):
+        """Control de ritmo del portal (compartido por los scrapers del proceso)"""
+        return ritmo_portal(self.get_portal_name().lower())
+    
     def delay_aleatorio(self, tipo='pagina'):
-        """Aplica un delay aleatorio para parecer más humano"""
-        if tipo == 'pagina':
-            delay = random.uniform(DELAY_MIN_ENTRE_PAGINAS, DELAY_MAX_ENTRE_PAGINAS)
-        else:
-            delay = random.uniform(DELAY_MIN_ENTRE_DETALLES, DELAY_MAX_ENTRE_DETALLES)
+        """Espera hasta la siguiente petición al ritmo del portal (con jitter y pausas largas)"""
+        delay = self.ritmo.esperar(tipo)
         
         if self.modo_debug:
-            print(f"      [DEBUG] Delay aleatorio: {delay:.1f}s")
-        
-        time.sleep(delay)
+            print(f"      [DEBUG] Delay aleatorio: {delay:.1f}s ({self.ritmo.ritmo:.1f} peticiones/min)")
     
     def incrementar_contador_peticiones(self):
-        """Incrementa contadores y gestiona pausas/cambios de IP"""
+        """Incrementa contadores y gestiona cambios de IP"""
         self.peticiones_realizadas += 1
-        self.peticiones_desde_ultima_pausa += 1
-        
-        if self.peticiones_desde_ultima_pausa >= PETICIONES_ANTES_PAUSA_LARGA:
-            pausa = random.uniform(PAUSA_LARGA_MIN, PAUSA_LARGA_MAX)
-            print(f"\n☕ Pausa de {pausa:.0f}s para evitar detección (petición #{self.peticiones_realizadas})...")
-            time.sleep(pausa)
-            self.peticiones_desde_ultima_pausa = 0
         
         if self.usar_rotacion_ip and self.peticiones_realizadas % PETICIONES_ANTES_CAMBIO_IP == 0:
             self.solicitar_cambio_ip()
@@ -277,7 +408,7 @@ class BaseScraper(ABC):
         print("\n⏳ El scraper está PAUSADO...")
         print("="*70)
         
-        input("\n>>> Presiona Enter cuando hayas cambiado la IP (o para continuar)... ")
+        preguntar("\n>>> Presiona Enter cuando hayas cambiado la IP (o para continuar)... ")
         print("[OK] Continuando con el scraping...\n")
     
     def manejar_error_conexion(self, error):
@@ -353,7 +484,7 @@ class BaseScraper(ABC):
             print("="*70)
             
             while True:
-                respuesta = input("\n>>> ¿Has resuelto el problema? (s/n): ").lower().strip()
+                respuesta = preguntar("\n>>> ¿Has resuelto el problema? (s/n): ").lower().strip()
                 if respuesta in ['s', 'si', 'sí', 'yes', 'y']:
                     print("\n[OK] Reintentando conexión...\n")
                     return True  # Reintentar
@@ -370,8 +501,8 @@ class BaseScraper(ABC):
         if not self.driver:
             return False
         
-        page_source = self.driver.page_source.lower()
-        current_url = self.driver.current_url.lower()
+        page_source = self.snapshot.html_minusculas
+        current_url = self.snapshot.url.lower()
         
         captcha_detectado = False
         razon_deteccion = ""
@@ -408,20 +539,28 @@ class BaseScraper(ABC):
             print("[!] El scraper esperará hasta que lo completes...")
             print("="*70)
             
-            input("\n>>> Presiona Enter cuando hayas resuelto el captcha... ")
+            self.ritmo.bloqueo(razon_deteccion)
+            preguntar("\n>>> Presiona Enter cuando hayas resuelto el captcha... ")
+            self.snapshot.invalidar()
             print("[OK] Continuando...\n")
             return True
         
         return False
     
-    def conectar_chrome(self):
-        """Conecta al Chrome en modo debug"""
+    def conectar_chrome(self, pestana_nueva: bool = False):
+        """Conecta al Chrome en modo debug.
+        
+        Con pestana_nueva la sesión trabaja en una pestaña propia (batch
+        paralelo: varios scrapers sobre el mismo Chrome, ver ejecutor_zonas.py).
+        """
         try:
             chrome_options = Options()
             chrome_options.add_experimental_option("debuggerAddress", "127.0.0.1:9222")
             
             print("[*] Conectando al Chrome en modo debug...")
             self.driver = webdriver.Chrome(options=chrome_options)
+            if pestana_nueva:
+                self.driver.switch_to.new_window('tab')
             print("[OK] Conectado correctamente!")
             return True
             
@@ -446,6 +585,7 @@ class BaseScraper(ABC):
         max_reintentos = 3
         for intento in range(max_reintentos):
             try:
+                self.snapshot.invalidar()
                 self.driver.get(url)
                 return  # Éxito
             except WebDriverException as e:
@@ -475,6 +615,7 @@ class BaseScraper(ABC):
         """
         for intento in range(max_reintentos):
             try:
+                self.snapshot.invalidar()
                 self.driver.get(url)
                 return True  # Éxito
             except WebDriverException as e:
@@ -496,44 +637,59 @@ class BaseScraper(ABC):
         """Guarda en JSON persistente, fusionando con datos existentes.
         
         Los nuevos registros se añaden al principio (más recientes primero).
+        Con almacen.backend = "sqlite" en config.json solo se insertan los nuevos.
         """
         import json
         
-        # Cargar datos existentes
-        viviendas_existentes = []
-        if os.path.exists(filename):
-            try:
-                with open(filename, 'r', encoding='utf-8') as f:
-                    data_existente = json.load(f)
-                # Soportar ambos formatos: lista directa o dict con 'viviendas'
-                if isinstance(data_existente, list):
-                    viviendas_existentes = data_existente
-                elif isinstance(data_existente, dict):
-                    viviendas_existentes = data_existente.get('viviendas', [])
-                print(f"\n📂 Cargando JSON existente: {len(viviendas_existentes)} registros previos")
-            except Exception as e:
-                print(f"\n⚠️  Error leyendo JSON existente: {e}")
-        
-        # Fusionar: nuevos al principio, existentes después (sin duplicados)
-        nuevos = [asdict(v) for v in viviendas]
-        urls_nuevas = {v['url'] for v in nuevos if 'url' in v}
-        existentes_filtrados = [v for v in viviendas_existentes if v.get('url') not in urls_nuevas]
-        todas_viviendas = nuevos + existentes_filtrados
-        
-        data = {
-            'timestamp': datetime.now().isoformat(),
-            'ubicacion': ubicacion or '',
-            'url': url_scrapeada or '',
-            'total': len(todas_viviendas),
-            'viviendas': todas_viviendas
-        }
+        almacen = abrir_almacen()
+        if almacen is not None:
+            nuevos = [asdict(v) for v in viviendas]
+            total = almacen.guardar_zona(filename, nuevos, ubicacion=ubicacion, url_busqueda=url_scrapeada)
+            print(f"\n[OK] Datos guardados en: {almacen.ruta} ({os.path.basename(filename)})")
+            print(f"     Nuevos añadidos: {len(nuevos)}")
+            print(f"     Total registros: {total}")
+            abrir_indice().registrar(v['url'] for v in nuevos if v.get('url'))
+            self.marcas_pendientes.confirmar(filename)
+            self.subir_a_api(almacen.exportar_zona(filename))
+            return
         
-        with open(filename, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
+        with bloqueo_zona(filename):
+            # Cargar datos existentes
+            viviendas_existentes = []
+            if os.path.exists(filename):
+                try:
+                    with open(filename, 'r', encoding='utf-8') as f:
+                        data_existente = json.load(f)
+                    # Soportar ambos formatos: lista directa o dict con 'viviendas'
+                    if isinstance(data_existente, list):
+                        viviendas_existentes = data_existente
+                    elif isinstance(data_existente, dict):
+                        viviendas_existentes = data_existente.get('viviendas', [])
+                    print(f"\n📂 Cargando JSON existente: {len(viviendas_existentes)} registros previos")
+                except Exception as e:
+                    print(f"\n⚠️  Error leyendo JSON existente: {e}")
+        
+            # Fusionar: nuevos al principio, existentes después (sin duplicados)
+            nuevos = [asdict(v) for v in viviendas]
+            urls_nuevas = {v['url'] for v in nuevos if 'url' in v}
+            existentes_filtrados = [v for v in viviendas_existentes if v.get('url') not in urls_nuevas]
+            todas_viviendas = nuevos + existentes_filtrados
+        
+            data = {
+                'timestamp': datetime.now().isoformat(),
+                'ubicacion': ubicacion or '',
+                'url': url_scrapeada or '',
+                'total': len(todas_viviendas),
+                'viviendas': todas_viviendas
+            }
+        
+            escribir_json_atomico(filename, data)
         
         print(f"\n[OK] Datos guardados en: {filename}")
         print(f"     Nuevos añadidos: {len(nuevos)}")
         print(f"     Total registros: {len(todas_viviendas)}")
+        abrir_indice().registrar(urls_nuevas)
+        self.marcas_pendientes.confirmar(filename)
         
         # Subir a la API si está configurado
         self.subir_a_api(data)
@@ -0,0 +1,251 @@
+"""
+Perfil de bloqueo de recursos para las páginas de Playwright
+Cada navegación de Fotocasa (listados del scraper y fichas de verificar_auto.py)
+descarga todas las imágenes, fuentes, vídeos, anuncios y scripts de analítica
+de la página: ancho de banda y memoria del renderer que no se usan para nada
+y que alimentan el crecimiento del heap que obliga a reciclar la página.
+
+Aquí cada portal tiene un perfil que se aplica con page.route: se cortan los
+tipos de recurso del perfil (imágenes, media, fuentes) y cualquier petición a
+dominios de rastreo o publicidad. Los scripts y documentos del propio portal
+y de los dominios permitidos (anti-bot: Reese84/Imperva, Cloudflare, captchas)
+pasan siempre. Los atributos src de las imágenes siguen en el DOM: las fotos
+de las viviendas se extraen igual.
+
+Cada sesión cuenta las peticiones cortadas por motivo, los bytes ahorrados
+(estimados por tipo de recurso), el tiempo de carga de cada navegación y los
+reciclajes de página, y al cerrarse los añade a medidas_recursos.json. Las
+sesiones sin perfil activo también se miden, así que se puede comparar:
+    python bloqueo_recursos.py              # carga media y reciclajes, con y sin bloqueo
+
+Configuración en config.json (desactivado por defecto):
+    "bloqueo_recursos": {
+        "activo": true,
+        "portales": {"fotocasa": {"tipos": ["image", "media", "font"]}}
+    }
+"""
+
+import json
+import os
+import threading
+from datetime import datetime
+from typing import Optional
+from urllib.parse import urlparse
+
+from escritura_atomica import bloqueo_archivo, escribir_json_atomico
+
+
+DIRECTORIO = os.path.dirname(os.path.abspath(__file__))
+RUTA_MEDIDAS = os.path.join(DIRECTORIO, 'medidas_recursos.json')
+MAX_MEDIDAS = 200
+
+# Dominios de analítica, publicidad y rastreo (se cortan en cualquier portal)
+RASTREADORES = [
+    'google-analytics.com', 'googletagmanager.com', 'googlesyndication.com',
+    'doubleclick.net', 'googleadservices.com', 'adservice.google.',
+    'facebook.net', 'facebook.com/tr', 'connect.facebook', 'hotjar.com',
+    'criteo.com', 'criteo.net', 'taboola.com', 'outbrain.com', 'adnxs.com',
+    'amazon-adsystem.com', 'scorecardresearch.com', 'chartbeat.', 'newrelic.com',
+    'nr-data.net', 'bing.com/bat', 'clarity.ms', 'tiktok.com', 'pinterest.com',
+    'smartadserver.com', 'rubiconproject.com', 'pubmatic.com', 'casalemedia.com',
+    'teads.tv', 'quantserve.com', 'segment.io', 'mpianalytics.com', 'omtrdc.net',
+    'demdex.net', 'sentry.io', 'didomi.io',
+]
+
+# Anti-bot y captchas: nunca se cortan (sin ellos el portal bloquea)
+PERMITIDOS = [
+    'captcha', 'challenge', 'cloudflare', 'cf-chl', 'imperva', 'incapsula',
+    'reese84', 'datadome', 'captcha-delivery', 'perimeterx', 'px-cdn',
+]
+
+PORTALES_POR_DEFECTO = {
+    'fotocasa': {'tipos': ['image', 'media', 'font']},
+    'idealista': {'tipos': ['image', 'media', 'font']},
+}
+
+CONFIG_POR_DEFECTO = {
+    'activo': False,
+    'rastreadores': RASTREADORES,
+    'permitidos': PERMITIDOS,
+    'portales': PORTALES_POR_DEFECTO,
+}
+
+# Tamaño medio por tipo de recurso (bytes) para estimar lo ahorrado: las
+# peticiones cortadas no llegan a tener tamaño
+TAMANO_MEDIO = {
+    'image': 60_000, 'media': 400_000, 'font': 35_000, 'script': 80_000,
+    'stylesheet': 30_000, 'xhr': 5_000, 'fetch': 5_000,
+}
+TAMANO_OTROS = 10_000
+
+
+def cargar_config_bloqueo(config_file: str = "config.json") -> dict:
+    """Sección "bloqueo_recursos" de config.json con los valores por defecto"""
+    config = dict(CONFIG_POR_DEFECTO)
+    try:
+        with open(config_file, 'r', encoding='utf-8') as f:
+            config.update(json.load(f).get('bloqueo_recursos', {}))
+    except (OSError, ValueError, AttributeError):
+        pass
+    portales = {nombre: dict(valores) for nombre, valores in PORTALES_POR_DEFECTO.items()}
+    for nombre, valores in (config.get('portales') or {}).items():
+        portales.setdefault(nombre, {'tipos': []}).update(valores)
+    config['portales'] = portales
+    return config
+
+
+class BloqueoRecursos:
+    """Perfil de bloqueo de un portal sobre una página, con sus contadores"""
+
+    def __init__(self, portal: str, config: dict = None, origen: str = 'scraper'):
+        self.portal = portal
+        self.origen = origen
+        self.config = config or cargar_config_bloqueo()
+        self.activo = bool(self.config.get('activo')) and portal in self.config['portales']
+        self.tipos = set(self.config['portales'].get(portal, {}).get('tipos', []))
+        self.bloqueadas = {}          # motivo → peticiones cortadas
+        self.bytes_ahorrados = 0
+        self.permitidas = 0
+        self.cargas = []              # segundos de cada navegación
+        self.reciclajes = 0
+        self._paginas = []
+
+    def motivo_bloqueo(self, url: str, tipo: str) -> Optional[str]:
+        """Motivo por el que se corta la petición (tipo de recurso o 'rastreador'), o None si pasa"""
+        url_minus = url.lower()
+        if url_minus.startswith(('data:', 'blob:')):
+            return None
+        if any(p in url_minus for p in self.config['permitidos']):
+            return None
+        partes = urlparse(url_minus)
+        destino = (partes.hostname or '') + partes.path
+        if any(r in destino for r in self.config['rastreadores']):
+            return 'rastreador'
+        if tipo in self.tipos:
+            return tipo
+        return None
+
+    def aplicar(self, page) -> None:
+        """Intercepta las peticiones de la página (solo con el perfil activo)"""
+        if not self.activo or any(p is page for p in self._paginas):
+            return
+        page.route('**/*', self._atender)
+        self._paginas.append(page)
+
+    def retirar(self, page) -> None:
+        """Deja de interceptar la página (cambio de portal en una pestaña compartida)"""
+        if not any(p is page for p in self._paginas):
+            return
+        self._paginas = [p for p in self._paginas if p is not page]
+        try:
+            page.unroute('**/*', self._atender)
+        except Exception:
+            pass
+
+    def _atender(self, route) -> None:
+        request = route.request
+        motivo = self.motivo_bloqueo(request.url, request.resource_type)
+        if motivo:
+            self.bloqueadas[motivo] = self.bloqueadas.get(motivo, 0) + 1
+            self.bytes_ahorrados += TAMANO_MEDIO.get(request.resource_type, TAMANO_OTROS)
+            route.abort('blockedbyclient')
+        else:
+            self.permitidas += 1
+            route.continue_()
+
+    def registrar_carga(self, segundos: float) -> None:
+        """Anota la duración de una navegación (goto hasta domcontentloaded)"""
+        self.cargas.append(segundos)
+
+    def registrar_reciclaje(self) -> None:
+        """Anota un reciclaje de página o de la conexión de Playwright"""
+        self.reciclajes += 1
+
+    def resumen(self) -> dict:
+        total = sum(self.bloqueadas.values())
+        return {
+            'timestamp': datetime.now().isoformat(),
+            'portal': self.portal,
+            'origen': self.origen,
+            'activo': self.activo,
+            'cargas': len(self.cargas),
+            'segundos_carga': round(sum(self.cargas) / len(self.cargas), 3) if self.cargas else None,
+            'reciclajes': self.reciclajes,
+            'bloqueadas': dict(self.bloqueadas),
+            'porcentaje_bloqueadas': round(100 * total / (total + self.permitidas), 1)
+                                     if total + self.permitidas else 0.0,
+            'bytes_ahorrados': self.bytes_ahorrados,
+        }
+
+    def texto_resumen(self) -> str:
+        r = self.resumen()
+        carga = f"{r['segundos_carga']:.2f}s de carga media" if r['cargas'] else "sin cargas"
+        if not self.activo:
+            return f"{carga}, {r['reciclajes']} reciclajes (bloqueo de recursos inactivo)"
+        return (f"{sum(self.bloqueadas.values())} peticiones cortadas ({r['porcentaje_bloqueadas']}%), "
+                f"~{self.bytes_ahorrados / 1_048_576:.1f} MB ahorrados, {carga}, {r['reciclajes']} reciclajes")
+
+    def guardar(self, ruta: str = RUTA_MEDIDAS) -> None:
+        """Añade las medidas de la sesión a medidas_recursos.json (si ha habido cargas)"""
+        if not self.cargas:
+            return
+        with _lock_medidas, bloqueo_archivo(ruta):
+            medidas = leer_medidas(ruta)
+            medidas.append(self.resumen())
+            try:
+                escribir_json_atomico(ruta, medidas[-MAX_MEDIDAS:])
+            except OSError as e:
+                print(f"    ⚠️  No se pudo guardar {os.path.basename(ruta)}: {e}")
+
+
+_lock_medidas = threading.Lock()
+
+
+def leer_medidas(ruta: str = RUTA_MEDIDAS) -> list:
+    try:
+        with open(ruta, 'r', encoding='utf-8') as f:
+            medidas = json.load(f)
+        return medidas if isinstance(medidas, list) else []
+    except (OSError, ValueError):
+        return []
+
+
+def comparar(medidas: list) -> dict:
+    """Carga media y reciclajes por 100 cargas de cada (portal, origen), con y sin bloqueo"""
+    grupos = {}
+    for m in medidas:
+        if not m.get('cargas'):
+            continue
+        g = grupos.setdefault((m['portal'], m['origen'], bool(m['activo'])),
+                              {'sesiones': 0, 'cargas': 0, 'segundos': 0.0, 'reciclajes': 0, 'bytes': 0})
+        g['sesiones'] += 1
+        g['cargas'] += m['cargas']
+        g['segundos'] += m['segundos_carga'] * m['cargas']
+        g['reciclajes'] += m['reciclajes']
+        g['bytes'] += m.get('bytes_ahorrados', 0)
+    return {
+        clave: {
+            'sesiones': g['sesiones'],
+            'cargas': g['cargas'],
+            'segundos_carga': round(g['segundos'] / g['cargas'], 3),
+            'reciclajes_por_100': round(100 * g['reciclajes'] / g['cargas'], 2),
+            'mb_ahorrados': round(g['bytes'] / 1_048_576, 1),
+        }
+        for clave, g in grupos.items()
+    }
+
+
+def main():
+    medidas = leer_medidas()
+    if not medidas:
+        print(f"[!] No hay medidas en {RUTA_MEDIDAS}: ejecuta el scraper o verificar_auto.py primero")
+        return
+    print(f"\n{'portal':10} {'origen':13} {'bloqueo':8} {'sesiones':>8} {'cargas':>7} "
+          f"{'carga (s)':>9} {'recicl./100':>11} {'MB ahorr.':>9}")
+    for (portal, origen, activo), g in sorted(comparar(medidas).items()):
+        print(f"{portal:10} {origen:13} {'sí' if activo else 'no':8} {g['sesiones']:8} {g['cargas']:7} "
+              f"{g['segundos_carga']:9.2f} {g['reciclajes_por_100']:11.2f} {g['mb_ahorrados']:9.1f}")
+
+
+if __name__ == "__main__":
+    main()
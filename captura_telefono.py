@@ -0,0 +1,280 @@
+"""
+Captura del teléfono en las páginas de detalle de Idealista
+Los interceptores (setAttribute/href, XHR/fetch, MutationObserver, clic) se
+registran una sola vez por sesión como script de nuevo documento (CDP
+Page.addScriptToEvaluateOnNewDocument), pero solo se instalan en las fichas
+(/inmueble/): los listados y el resto de páginas quedan sin tocar. Las
+funciones parcheadas conservan el toString, name y length de las nativas, y
+el MutationObserver solo observa mientras están armados, justo antes de
+pulsar el botón del teléfono.
+
+Cada captura se entrega a una promesa (window.__esperarTelefono) que Python
+espera con execute_async_script: sin sondeos periódicos ni reinyección por página.
+"""
+
+from typing import Optional
+
+from selenium.common.exceptions import WebDriverException
+
+
+# Tiempo máximo de espera tras el clic (antes: 8 sondeos de 0.5 s)
+TIMEOUT_CAPTURA = 4.0
+
+JS_HOOKS_TELEFONO = r"""
+(function () {
+    if (window.__telHooks || location.pathname.indexOf('/inmueble/') < 0) return;
+    window.__telHooks = true;
+
+    // Las funciones parcheadas se presentan como las nativas (toString, name, length)
+    var fuentes = new WeakMap();
+    var origToString = Function.prototype.toString;
+    function nativo(fn, orig) {
+        fuentes.set(fn, origToString.call(orig));
+        Object.defineProperty(fn, 'name', {value: orig.name, configurable: true});
+        Object.defineProperty(fn, 'length', {value: orig.length, configurable: true});
+        return fn;
+    }
+    Function.prototype.toString = nativo(function toString() {
+        return fuentes.has(this) ? fuentes.get(this) : origToString.call(this);
+    }, origToString);
+
+    var capturas = [];
+    var esperando = [];
+    var armado = false;
+
+    function capturar(tipo, valor) {
+        if (!armado || !valor) return false;
+        var captura = {tipo: tipo, valor: valor};
+        var resolver = esperando.shift();
+        if (resolver) resolver(captura);
+        else capturas.push(captura);
+        return true;
+    }
+
+    window.__armarTelefono = function () {
+        capturas = [];
+        armado = true;
+        observador.observe(document, {
+            attributes: true, childList: true, subtree: true,
+            characterData: true, attributeFilter: ['href']
+        });
+    };
+    window.__desarmarTelefono = function () {
+        armado = false;
+        observador.disconnect();
+        capturas = [];
+        esperando.splice(0).forEach(function (resolver) { resolver(null); });
+    };
+    window.__esperarTelefono = function (timeoutMs) {
+        if (capturas.length) return Promise.resolve(capturas.shift());
+        return new Promise(function (resolve) {
+            esperando.push(resolve);
+            setTimeout(function () {
+                var i = esperando.indexOf(resolve);
+                if (i >= 0) esperando.splice(i, 1);
+                resolve(null);
+            }, timeoutMs);
+        });
+    };
+
+    function esTel(valor) {
+        return valor && typeof valor === 'string' && valor.startsWith('tel:');
+    }
+    function urlDeTelefono(url) {
+        var u = (url || '').toLowerCase();
+        return u.includes('phone') || u.includes('contact') || u.includes('getphones') || u.includes('telefon');
+    }
+
+    // A) setAttribute('href', 'tel:...') - no se establece (evita navegar a tel:)
+    var origSetAttribute = Element.prototype.setAttribute;
+    Element.prototype.setAttribute = nativo(function (name, value) {
+        if (name === 'href' && esTel(value) && capturar('tel', value)) return;
+        return origSetAttribute.call(this, name, value);
+    }, origSetAttribute);
+
+    // B) Setter de HTMLAnchorElement.href
+    var desc = Object.getOwnPropertyDescriptor(HTMLAnchorElement.prototype, 'href');
+    if (desc && desc.set) {
+        Object.defineProperty(HTMLAnchorElement.prototype, 'href', {
+            set: nativo(function (val) {
+                if (esTel(val) && capturar('tel', val)) return;
+                desc.set.call(this, val);
+            }, desc.set),
+            get: desc.get,
+            enumerable: desc.enumerable,
+            configurable: true
+        });
+    }
+
+    // C) XHR
+    var origOpen = XMLHttpRequest.prototype.open;
+    var origSend = XMLHttpRequest.prototype.send;
+    XMLHttpRequest.prototype.open = nativo(function (method, url) {
+        this.__reqUrl = url;
+        return origOpen.apply(this, arguments);
+    }, origOpen);
+    XMLHttpRequest.prototype.send = nativo(function () {
+        var xhr = this;
+        this.addEventListener('load', function () {
+            if (!armado || !xhr.__reqUrl) return;
+            var texto = xhr.responseText;
+            if (urlDeTelefono(String(xhr.__reqUrl)) || (texto && texto.includes('tel:'))) {
+                capturar('ajax', texto);
+            }
+        });
+        return origSend.apply(this, arguments);
+    }, origSend);
+
+    // D) fetch
+    var origFetch = window.fetch;
+    window.fetch = nativo(function (input, init) {
+        var url = (typeof input === 'string') ? input : (input && input.url ? input.url : '');
+        return origFetch.apply(this, arguments).then(function (response) {
+            if (armado && urlDeTelefono(url)) {
+                response.clone().text().then(function (texto) { capturar('ajax', texto); });
+            }
+            return response;
+        });
+    }, origFetch);
+
+    // E) MutationObserver (solo observa con los hooks armados)
+    var patronMovil = /(\+34[\s]?[6789]\d{2}[\s]?\d{3}[\s]?\d{3})/;
+    var patronFijo = /([6789]\d{2}[\s]?\d{2}[\s]?\d{2}[\s]?\d{2})/;
+    var observador = new MutationObserver(function (mutations) {
+        if (!armado) return;
+        mutations.forEach(function (m) {
+            if (m.type === 'attributes' && m.attributeName === 'href') {
+                var href = m.target.getAttribute('href');
+                if (esTel(href) && capturar('tel', href)) m.target.removeAttribute('href');
+            }
+            if (m.type === 'childList') {
+                m.addedNodes.forEach(function (node) {
+                    if (node.nodeType !== 1) return;
+                    var els = [node];
+                    if (node.querySelectorAll) {
+                        els = els.concat(Array.from(node.querySelectorAll('a[href^="tel:"]')));
+                    }
+                    els.forEach(function (el) {
+                        if (el.tagName !== 'A') return;
+                        var h = el.getAttribute('href');
+                        if (esTel(h) && capturar('tel', h)) el.removeAttribute('href');
+                    });
+                });
+            }
+            if (m.type === 'childList' || m.type === 'characterData') {
+                var target = m.target;
+                if (target && target.textContent) {
+                    var match = target.textContent.match(patronMovil) || target.textContent.match(patronFijo);
+                    if (match) capturar('tel', 'tel:' + match[1]);
+                }
+            }
+        });
+    });
+
+    // F) Clics en enlaces tel: (fase de captura)
+    document.addEventListener('click', function (e) {
+        if (!armado) return;
+        var a = e.target.closest ? e.target.closest('a') : e.target;
+        if (a && a.getAttribute) {
+            var href = a.getAttribute('href');
+            if (esTel(href) && capturar('tel', href)) {
+                e.preventDefault();
+                e.stopPropagation();
+                e.stopImmediatePropagation();
+                a.removeAttribute('href');
+            }
+        }
+    }, true);
+})();
+"""
+
+# Arma los hooks, pulsa el botón (secuencia de eventos de ratón) y espera la primera captura
+JS_CLIC_Y_ESPERAR = """
+var boton = arguments[0], timeoutMs = arguments[1];
+var listo = arguments[arguments.length - 1];
+if (typeof window.__esperarTelefono !== 'function') { listo({tipo: 'sin_hooks'}); return; }
+window.__armarTelefono();
+try {
+    var rect = boton.getBoundingClientRect();
+    var x = rect.left + rect.width / 2;
+    var y = rect.top + rect.height / 2;
+    ['pointerdown', 'mousedown', 'pointerup', 'mouseup', 'click'].forEach(function(type) {
+        boton.dispatchEvent(new MouseEvent(type, {
+            bubbles: true, cancelable: true, view: window,
+            clientX: x, clientY: y, button: 0, buttons: 1
+        }));
+    });
+} catch (e) {}
+window.__esperarTelefono(timeoutMs).then(listo);
+"""
+
+JS_ESPERAR = """
+var listo = arguments[arguments.length - 1];
+if (typeof window.__esperarTelefono !== 'function') { listo(null); return; }
+window.__esperarTelefono(arguments[0]).then(listo);
+"""
+
+JS_DESARMAR = "if (window.__desarmarTelefono) window.__desarmarTelefono();"
+
+# Sesiones de WebDriver con los hooks ya registrados
+_sesiones_registradas = set()
+
+
+def registrar_hooks_telefono(driver) -> bool:
+    """Registra los interceptores para todos los documentos nuevos (una vez por sesión).
+
+    Retorna False si el navegador no admite comandos CDP: en ese caso los hooks
+    se inyectan en la página actual al primer clic.
+    """
+    sesion = getattr(driver, 'session_id', None)
+    if sesion in _sesiones_registradas:
+        return True
+    try:
+        driver.execute_cdp_cmd('Page.addScriptToEvaluateOnNewDocument', {'source': JS_HOOKS_TELEFONO})
+    except (AttributeError, WebDriverException):
+        return False
+    _sesiones_registradas.add(sesion)
+    return True
+
+
+def ejecutar_async(driver, js: str, timeout: float, *args):
+    """execute_async_script con el timeout de script ampliado solo durante la llamada"""
+    try:
+        anterior = driver.timeouts.script
+    except (AttributeError, WebDriverException):
+        anterior = None
+    driver.set_script_timeout(timeout + 5)
+    try:
+        return driver.execute_async_script(js, *args)
+    finally:
+        if anterior is not None:
+            try:
+                driver.set_script_timeout(anterior)
+            except WebDriverException:
+                pass
+
+
+def clic_y_esperar(driver, boton, timeout: float = TIMEOUT_CAPTURA) -> Optional[dict]:
+    """Pulsa el botón y espera la primera captura: {'tipo': 'tel'|'ajax', 'valor': str} o None.
+
+    Si la página se cargó antes de registrar los hooks, se inyectan una vez y se repite.
+    """
+    timeout_ms = int(timeout * 1000)
+    captura = ejecutar_async(driver, JS_CLIC_Y_ESPERAR, timeout, boton, timeout_ms)
+    if captura and captura.get('tipo') == 'sin_hooks':
+        driver.execute_script(JS_HOOKS_TELEFONO)
+        captura = ejecutar_async(driver, JS_CLIC_Y_ESPERAR, timeout, boton, timeout_ms)
+    return captura
+
+
+def esperar_captura(driver, timeout: float) -> Optional[dict]:
+    """Espera la siguiente captura (p. ej. si la anterior era un AJAX sin teléfono)"""
+    return ejecutar_async(driver, JS_ESPERAR, timeout, int(timeout * 1000))
+
+
+def desarmar(driver):
+    """Desactiva los interceptores en la página actual"""
+    try:
+        driver.execute_script(JS_DESARMAR)
+    except WebDriverException:
+        pass
@@ -0,0 +1,237 @@
+"""
+Clasificador particular / inmobiliaria para anuncios de Idealista
+Compila todas las palabras clave ponderadas en un único patrón multi-término que
+se construye una sola vez (al crear el scraper) y trabaja directamente sobre el
+elemento ya parseado (BeautifulSoup o lxml), sin serializar ni re-parsear HTML.
+"""
+
+import re
+from dataclasses import dataclass, field
+from itertools import chain
+from typing import Iterable, List, Optional, Tuple
+
+from bs4 import BeautifulSoup
+from bs4.element import NavigableString, Tag
+
+
+# Señales por texto: (id_señal, peso, palabras). Una señal suma su peso una sola vez
+# aunque aparezcan varias de sus palabras.
+SENALES_TEXTO = [
+    # Palabras clave fuertes de particular (+3 puntos)
+    *[(palabra, 3, (palabra,)) for palabra in (
+        'particular', 'propietario', 'dueño directo', 'vendo mi piso',
+        'vendo mi casa', 'sin comisión', 'sin intermediarios', 'trato directo',
+        'abstenerse agencias', 'no agencias'
+    )],
+    # Palabras clave medias de particular (+2 puntos)
+    *[(palabra, 2, (palabra,)) for palabra in (
+        'vendo', 'vendedor', 'contacto directo', 'llamar al propietario'
+    )],
+    # Palabras clave fuertes de inmobiliaria (-4 puntos)
+    *[(palabra, -4, (palabra,)) for palabra in (
+        'inmobiliaria', 'agencia', 'real estate', 'professional',
+        'red inmobiliaria', 'grupo inmobiliario', 'consultoría inmobiliaria',
+        'franquicia', 'remax', 'century 21', 'engel', 'tecnocasa',
+        'comprarcasa', 'donpiso'
+    )],
+    # Palabras medias de inmobiliaria (-2 puntos)
+    *[(palabra, -2, (palabra,)) for palabra in (
+        'honorarios', 'comisión del', 'nuestros servicios', 'visítenos',
+        'cartera de', 'profesional del sector', 'años de experiencia',
+        'equipo de profesionales'
+    )],
+    # Clases CSS específicas de Idealista
+    ('clase:professional-contact', -5, ('professional-contact',)),
+    ('clase:professional-logo', -5, ('professional-logo',)),
+    ('clase:particular', 5, ('owner-contact', 'particular-contact')),
+]
+
+# Elementos con el nombre del anunciante, por orden de prioridad
+SELECTORES_NOMBRE = [
+    ('div', 'advertiser-name'),
+    ('span', 'professional-name'),
+    ('div', 'item-multimedia-container'),
+]
+
+PALABRAS_NOMBRE_EMPRESA = ['s.l.', 's.a.', 'inmobiliaria', 'properties', 'homes', 'real estate']
+
+UMBRAL_PARTICULAR = 3
+UMBRAL_INMOBILIARIA = -3
+
+@dataclass
+class Clasificacion:
+    """Resultado de clasificar un anuncio"""
+    es_particular: bool
+    tipo: str
+    score: int
+    senales: List[Tuple[str, int]] = field(default_factory=list)
+
+
+class ClasificadorAnunciante:
+    """Clasificador compilado y reutilizable de anunciantes (particular vs inmobiliaria)"""
+
+    def __init__(self, senales=None):
+        senales = senales or SENALES_TEXTO
+
+        # palabra -> [(id_señal, peso)]
+        self._senales_por_palabra = {}
+        for id_senal, peso, palabras in senales:
+            for palabra in palabras:
+                self._senales_por_palabra.setdefault(palabra, []).append((id_senal, peso))
+
+        palabras = list(self._senales_por_palabra)
+
+        # Alternativa única factorizada como trie: en cada posición encuentra la
+        # palabra más larga que empieza ahí
+        self._patron = re.compile(self._regex_trie(palabras))
+
+        # Palabras contenidas en otra más larga: si aparece la larga, aparecen también
+        self._implicadas = {
+            p: [otra for otra in palabras if otra != p and otra in p]
+            for p in palabras
+        }
+
+    @staticmethod
+    def _regex_trie(palabras: List[str]) -> str:
+        """Construye una regex con prefijos comunes factorizados (más rápida que a|b|c)"""
+        raiz = {}
+        for palabra in palabras:
+            nodo = raiz
+            for caracter in palabra:
+                nodo = nodo.setdefault(caracter, {})
+            nodo[''] = True
+
+        def emitir(nodo):
+            alternativas = [re.escape(c) + emitir(hijo) for c, hijo in sorted(nodo.items()) if c != '']
+            if not alternativas:
+                return ''
+            cuerpo = alternativas[0] if len(alternativas) == 1 else '(?:' + '|'.join(alternativas) + ')'
+            # Fin de palabra opcional: el cuantificador voraz prefiere la palabra más larga
+            return f'(?:{cuerpo})?' if '' in nodo else cuerpo
+
+        return emitir(raiz)
+
+    # ============================================================
+    # RECORRIDO DEL ELEMENTO
+    # ============================================================
+
+    @staticmethod
+    def _es_nombre_bs4(nodo, prioridad_actual: int) -> Optional[int]:
+        """Prioridad del nodo como elemento de nombre (menor = mejor) o None"""
+        clases = nodo.get('class') or []
+        for prioridad, (tag, clase) in enumerate(SELECTORES_NOMBRE[:prioridad_actual]):
+            if nodo.name == tag and clase in clases:
+                return prioridad
+        return None
+
+    def _recorrer_bs4(self, raiz) -> Tuple[str, Optional[str]]:
+        """Un único recorrido: texto + atributos en minúsculas y elemento de nombre"""
+        partes = []
+        nombre_elem = None
+        prioridad_nombre = len(SELECTORES_NOMBRE)
+
+        nodos = raiz.descendants if isinstance(raiz, BeautifulSoup) else chain([raiz], raiz.descendants)
+        for nodo in nodos:
+            if isinstance(nodo, Tag):
+                for valor in nodo.attrs.values():
+                    partes.append(' '.join(valor) if isinstance(valor, list) else str(valor))
+                if prioridad_nombre:
+                    prioridad = self._es_nombre_bs4(nodo, prioridad_nombre)
+                    if prioridad is not None:
+                        nombre_elem, prioridad_nombre = nodo, prioridad
+            elif isinstance(nodo, NavigableString):
+                partes.append(str(nodo))
+
+        texto_nombre = nombre_elem.get_text(strip=True) if nombre_elem is not None else None
+        return '\n'.join(partes).lower(), texto_nombre
+
+    def _recorrer_lxml(self, raiz) -> Tuple[str, Optional[str]]:
+        """Equivalente a _recorrer_bs4 para elementos lxml"""
+        partes = []
+        nombre_elem = None
+        prioridad_nombre = len(SELECTORES_NOMBRE)
+
+        for nodo in raiz.iter():
+            if isinstance(nodo.tag, str):
+                partes.extend(nodo.attrib.values())
+                if prioridad_nombre:
+                    clases = (nodo.get('class') or '').split()
+                    for prioridad, (tag, clase) in enumerate(SELECTORES_NOMBRE[:prioridad_nombre]):
+                        if nodo.tag == tag and clase in clases:
+                            nombre_elem, prioridad_nombre = nodo, prioridad
+                            break
+            if nodo.text:
+                partes.append(nodo.text)
+            if nodo is not raiz and nodo.tail:
+                partes.append(nodo.tail)
+
+        texto_nombre = None
+        if nombre_elem is not None:
+            texto_nombre = ''.join(
+                t.strip() for t in nombre_elem.xpath(
+                    './/text()[not(ancestor::script or ancestor::style or ancestor::template)]'
+                )
+            )
+        return '\n'.join(partes).lower(), texto_nombre
+
+    def _recorrer(self, elemento) -> Tuple[str, Optional[str]]:
+        if isinstance(elemento, str):
+            # Compatibilidad: HTML serializado (se parsea una única vez)
+            return self._recorrer_bs4(BeautifulSoup(elemento, 'html.parser'))
+        if isinstance(elemento, Tag):
+            return self._recorrer_bs4(elemento)
+        if hasattr(elemento, 'iter') and hasattr(elemento, 'attrib'):
+            return self._recorrer_lxml(elemento)
+        raise TypeError(f"Elemento no soportado: {type(elemento).__name__}")
+
+    # ============================================================
+    # CLASIFICACIÓN
+    # ============================================================
+
+    def palabras_encontradas(self, texto: str) -> set:
+        """Palabras clave presentes en el texto (ya en minúsculas)"""
+        encontradas = set()
+        posicion = 0
+        while True:
+            match = self._patron.search(texto, posicion)
+            if not match:
+                return encontradas
+            palabra = match.group()
+            if palabra not in encontradas:
+                encontradas.add(palabra)
+                encontradas.update(self._implicadas[palabra])
+            # Reanudar en el carácter siguiente para detectar palabras solapadas
+            # ('agencia' dentro de 'no agencias')
+            posicion = match.start() + 1
+
+    def clasificar(self, elemento) -> Clasificacion:
+        """Clasifica un anuncio a partir de su elemento parseado (bs4 o lxml)"""
+        texto, nombre = self._recorrer(elemento)
+
+        senales = {}
+        for palabra in self.palabras_encontradas(texto):
+            for id_senal, peso in self._senales_por_palabra[palabra]:
+                senales[id_senal] = peso
+
+        # Análisis del nombre del anunciante
+        if nombre is not None:
+            nombre = nombre.lower()
+            if any(palabra in nombre for palabra in PALABRAS_NOMBRE_EMPRESA):
+                senales[f"nombre empresarial: {nombre[:30]}"] = -6
+            elif len(nombre.split()) <= 3 and nombre.replace(' ', '').isalpha():
+                senales[f"nombre personal: {nombre}"] = 3
+
+        score = sum(senales.values())
+
+        if score >= UMBRAL_PARTICULAR:
+            es_part, tipo = True, "Particular"
+        elif score <= UMBRAL_INMOBILIARIA:
+            es_part, tipo = False, "Inmobiliaria"
+        else:
+            es_part, tipo = False, "Desconocido" if score == 0 else f"Incierto (score: {score})"
+
+        return Clasificacion(es_part, tipo, score, sorted(senales.items(), key=lambda s: -abs(s[1])))
+
+    def classify_many(self, articulos: Iterable) -> List[Clasificacion]:
+        """Clasifica un lote de artículos (devuelve score y señales de cada uno)"""
+        return [self.clasificar(articulo) for articulo in articulos]
@@ -0,0 +1,38 @@
+"""
+Preguntas por la terminal desde trabajadores en paralelo
+Los scrapers y verificar_auto.py piden intervención con input() (captcha,
+cambio de IP, reintentar). En el batch paralelo (ejecutor_zonas.py) y en los
+carriles de verificar_auto.py varios hilos comparten la entrada estándar, y con
+el orquestador los procesos de cada portal leen la misma terminal: las
+preguntas se mezclaban y la respuesta a una podía ir a otra.
+
+preguntar() hace las preguntas de una en una: un lock entre los hilos del
+proceso y bloqueo_archivo entre procesos. Si el hilo tiene etiqueta (el
+trabajador del batch), la pregunta va precedida de ella.
+"""
+
+import os
+import threading
+
+from escritura_atomica import bloqueo_archivo
+
+
+DIRECTORIO = os.path.dirname(os.path.abspath(__file__))
+RUTA_CONSOLA = os.path.join(DIRECTORIO, 'consola')     # bloqueo en consola.lock
+
+_lock_consola = threading.Lock()
+_hilo = threading.local()
+
+
+def etiquetar(etiqueta: str) -> None:
+    """Etiqueta del trabajador del hilo actual (p. ej. '[idealista #2]') para sus preguntas"""
+    _hilo.etiqueta = etiqueta
+
+
+def preguntar(mensaje: str = '') -> str:
+    """input(mensaje) con una sola pregunta a la vez entre hilos y procesos"""
+    with _lock_consola, bloqueo_archivo(RUTA_CONSOLA):
+        etiqueta = getattr(_hilo, 'etiqueta', None)
+        if etiqueta:
+            print(f"\n🙋 {etiqueta} necesita respuesta:")
+        return input(mensaje)
@@ -0,0 +1,244 @@
+"""
+Control de ritmo adaptativo por portal (AIMD)
+Las esperas entre peticiones eran rangos fijos (3-7 s entre páginas, pausa
+larga cada 10 peticiones...) ajustados a mano para el peor caso. Aquí cada
+portal tiene un ritmo en peticiones por minuto que sube un poco con cada
+petición sin bloqueo (incremento aditivo) y se reduce a la mitad con cada
+señal de bloqueo (captcha, challenge de Cloudflare o Reese84, BLOCKED: de la
+API, HTTP 429/403), con un enfriamiento antes de la siguiente petición
+(decremento multiplicativo). El ritmo aprendido se guarda en
+ritmo_portales.json y la siguiente ejecución parte de él.
+
+Las esperas conservan el jitter aleatorio y la pausa larga periódica. Cada
+tipo de petición tiene un coste relativo a una página de listado: una ficha
+de Idealista cuesta 0,7 páginas y una petición de su API interna 0,5. Con el
+control activo la pausa larga llega cada descanso_cada unidades de coste y
+dura "descanso" intervalos de página al ritmo actual. El control es único por
+portal y proceso: los hilos del batch paralelo y los carriles de
+verificar_auto.py se reparten el ritmo.
+
+Las esperas de la interfaz que no son peticiones (pasos de scroll, revelar un
+teléfono tras el clic, esperar a que aparezca el contenido) siguen fijas.
+
+Desactivado ("activo": false) el ritmo queda fijo en el inicial de cada
+portal, que reproduce los rangos anteriores, y la pausa larga es la de siempre: cada
+descanso_cada peticiones, de cualquier tipo, una pausa de pausa_fija segundos
+(Idealista 15-30 s y Fotocasa 5-8 s cada 10). verificar_auto.py y
+scraper_agencia_idealista.py mantienen en ese caso su propia cadencia.
+
+Configuración en config.json (activo en el config.json del repositorio; se
+lee siempre el de este directorio, aunque cron lance los scripts desde otro):
+    "control_ritmo": {
+        "activo": true,
+        "incremento": 0.1,
+        "factor_bloqueo": 0.5,
+        "enfriamiento": 60,
+        "portales": {"idealista": {"inicial": 12, "minimo": 3, "maximo": 30}}
+    }
+"""
+
+import json
+import os
+import random
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Optional
+
+from escritura_atomica import bloqueo_archivo, escribir_json_atomico
+
+
+DIRECTORIO = os.path.dirname(os.path.abspath(__file__))
+RUTA_RITMOS = os.path.join(DIRECTORIO, 'ritmo_portales.json')
+RUTA_CONFIG = os.path.join(DIRECTORIO, 'config.json')
+
+# Ritmos en peticiones por minuto; costes relativos a una página de listado
+PORTALES_POR_DEFECTO = {
+    # 3-7 s entre páginas, 2-5 s entre fichas, 1,5-3,5 s en la API de verificación
+    'idealista': {'inicial': 12, 'minimo': 3, 'maximo': 30, 'descanso_cada': 10,
+                  'pausa_fija': [15, 30], 'costes': {'pagina': 1.0, 'detalle': 0.7, 'api': 0.5}},
+    # 1-2 s entre páginas, 2,5-5 s por ficha verificada (Reese84)
+    'fotocasa': {'inicial': 40, 'minimo': 6, 'maximo': 80, 'descanso_cada': 10,
+                 'pausa_fija': [5, 8], 'costes': {'pagina': 1.0, 'detalle': 2.5}},
+}
+
+CONFIG_POR_DEFECTO = {
+    'activo': False,
+    'jitter': 0.4,            # ± fracción del intervalo
+    'incremento': 0.1,        # peticiones/min que se suman por petición sin bloqueo
+    'factor_bloqueo': 0.5,
+    'enfriamiento': 60,       # segundos sin peticiones tras un bloqueo
+    'descanso': [3, 6],       # pausa larga en intervalos de página (control activo)
+    'guardar_cada': 50,
+    'portales': PORTALES_POR_DEFECTO,
+}
+
+
+def cargar_config_ritmo(config_file: str = "config.json") -> dict:
+    """Sección "control_ritmo" de config.json con los valores por defecto"""
+    config = dict(CONFIG_POR_DEFECTO)
+    try:
+        with open(config_file, 'r', encoding='utf-8') as f:
+            config.update(json.load(f).get('control_ritmo', {}))
+    except (OSError, ValueError, AttributeError):
+        pass
+    # Cada portal configurado se completa con sus valores por defecto
+    portales = {nombre: dict(valores) for nombre, valores in PORTALES_POR_DEFECTO.items()}
+    for nombre, valores in (config.get('portales') or {}).items():
+        portales.setdefault(nombre, dict(PORTALES_POR_DEFECTO['idealista'])).update(valores)
+    config['portales'] = portales
+    return config
+
+
+class ControlRitmo:
+    """Ritmo de peticiones de un portal: esperas con jitter, AIMD y persistencia"""
+
+    def __init__(self, portal: str, config: dict, ruta: Optional[str] = RUTA_RITMOS,
+                 reloj: Callable[[], float] = time.monotonic):
+        self.portal = portal
+        self.reloj = reloj
+        self.config = config
+        self.adaptativo = bool(config.get('activo'))
+        self.ruta = ruta if self.adaptativo else None
+        self.parametros = config['portales'].get(portal, PORTALES_POR_DEFECTO['idealista'])
+        self.ritmo = float(self.parametros['inicial'])
+        self.bloqueos = 0
+        self.peticiones = 0
+        self._unidades = 0.0          # coste (o peticiones, inactivo) desde la última pausa larga
+        self._siguiente = 0.0         # reloj() a partir del cual se puede pedir
+        self._fin_enfriamiento = 0.0
+        self._lock = threading.Lock()
+        if self.ruta:
+            guardado = _leer_ritmos(self.ruta).get(portal, {})
+            if guardado.get('ritmo'):
+                self.ritmo = self._acotar(float(guardado['ritmo']))
+                self.bloqueos = int(guardado.get('bloqueos', 0))
+
+    def _acotar(self, ritmo: float) -> float:
+        return min(max(ritmo, self.parametros['minimo']), self.parametros['maximo'])
+
+    def _coste(self, tipo: str) -> float:
+        return self.parametros.get('costes', {}).get(tipo, 1.0)
+
+    def intervalo(self, tipo: str = 'pagina') -> float:
+        """Segundos medios entre peticiones de este tipo al ritmo actual"""
+        return 60.0 / self.ritmo * self._coste(tipo)
+
+    def rango(self, tipo: str = 'pagina') -> tuple:
+        """(mínimo, máximo) de la espera con jitter, para espaciar peticiones fuera de Python"""
+        intervalo = self.intervalo(tipo)
+        return intervalo * (1 - self.config['jitter']), intervalo * (1 + self.config['jitter'])
+
+    def esperar(self, tipo: str = 'pagina', dormir: Callable[[float], object] = time.sleep,
+                descansar: bool = True) -> float:
+        """Espera el hueco de la siguiente petición y la cuenta. Retorna los segundos esperados.
+
+        Los hilos que comparten el control reservan huecos consecutivos: el
+        ritmo es el del portal, no el de cada hilo. Con descansar=False la
+        pausa larga la lleva quien llama.
+        """
+        descanso = 0.0
+        with self._lock:
+            self._contar(tipo)
+            if descansar and self._unidades >= self.parametros['descanso_cada']:
+                self._unidades = 0.0
+                descanso = self.descanso()
+            ahora = self.reloj()
+            espera = random.uniform(*self.rango(tipo)) + descanso
+            inicio = max(self._siguiente, ahora)
+            self._siguiente = inicio + espera
+            segundos = self._siguiente - ahora
+        if descanso:
+            print(f"\n☕ Pausa de {descanso:.0f}s para evitar detección ({self.portal}, "
+                  f"{self.ritmo:.1f} peticiones/min)")
+        dormir(segundos)
+        return segundos
+
+    def _contar(self, tipo: str, n: int = 1) -> None:
+        coste = self._coste(tipo) * n
+        self.peticiones += n
+        self._unidades += coste if self.adaptativo else n
+        if self.adaptativo:
+            self.ritmo = self._acotar(self.ritmo + self.config['incremento'] * coste)
+            if self.peticiones % self.config['guardar_cada'] < n:
+                self._guardar()
+
+    def exito(self, n: int = 1, tipo: str = 'pagina') -> bool:
+        """Cuenta n peticiones hechas sin esperar() (lotes en la página).
+
+        Retorna True si les toca pausa larga (la hace quien llama).
+        """
+        with self._lock:
+            self._contar(tipo, n)
+            if self._unidades >= self.parametros['descanso_cada']:
+                self._unidades = 0.0
+                return True
+        return False
+
+    def descanso(self) -> float:
+        """Segundos de una pausa larga: proporcional al ritmo actual o la fija del portal"""
+        if not self.adaptativo:
+            return random.uniform(*self.parametros['pausa_fija'])
+        return random.uniform(*self.config['descanso']) * self.intervalo('pagina')
+
+    def pendiente(self) -> float:
+        """Segundos que faltan para el hueco reservado más lejano (enfriamiento incluido)"""
+        return max(0.0, self._siguiente - self.reloj())
+
+    def bloqueo(self, motivo: str = '') -> None:
+        """Señal de bloqueo: reduce el ritmo (multiplicativo) y aplaza la siguiente petición.
+
+        Las señales que llegan durante el enfriamiento de un bloqueo son el
+        mismo episodio (los reintentos, los demás hilos): no vuelven a reducir.
+        """
+        with self._lock:
+            self.bloqueos += 1
+            ahora = self.reloj()
+            if not self.adaptativo or ahora < self._fin_enfriamiento:
+                return
+            anterior = self.ritmo
+            self.ritmo = self._acotar(self.ritmo * self.config['factor_bloqueo'])
+            self._fin_enfriamiento = ahora + self.config['enfriamiento']
+            self._siguiente = max(self._siguiente, self._fin_enfriamiento)
+            self._guardar()
+        print(f"    🐢 Bloqueo en {self.portal} ({motivo or 'sin detalle'}): "
+              f"{anterior:.1f} → {self.ritmo:.1f} peticiones/min")
+
+    def guardar(self) -> None:
+        with self._lock:
+            self._guardar()
+
+    def _guardar(self) -> None:
+        if not self.ruta:
+            return
+        with bloqueo_archivo(self.ruta):
+            ritmos = _leer_ritmos(self.ruta)
+            ritmos[self.portal] = {
+                'ritmo': round(self.ritmo, 2),
+                'bloqueos': self.bloqueos,
+                'timestamp': datetime.now().isoformat(),
+            }
+            try:
+                escribir_json_atomico(self.ruta, ritmos)
+            except OSError as e:
+                print(f"    ⚠️  No se pudo guardar {os.path.basename(self.ruta)}: {e}")
+
+
+def _leer_ritmos(ruta: str) -> dict:
+    try:
+        with open(ruta, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+_controles = {}
+_lock_controles = threading.Lock()
+
+
+def ritmo_portal(portal: str, config_file: str = RUTA_CONFIG) -> ControlRitmo:
+    """El control de ritmo del portal, uno por proceso (compartido entre hilos)"""
+    with _lock_controles:
+        if portal not in _controles:
+            _controles[portal] = ControlRitmo(portal, cargar_config_ritmo(config_file))
+        return _controles[portal]
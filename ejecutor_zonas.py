@@ -0,0 +1,230 @@
+"""
+Ejecución en paralelo de las zonas del modo batch
+El batch secuencial procesa una zona tras otra con una espera de 8-15 s entre
+ellas, y Idealista y Fotocasa nunca se ejecutan a la vez. Aquí cada portal
+tiene una cola de zonas y un número máximo de trabajadores; cada trabajador
+tiene su propio navegador y va sacando zonas de la cola de su portal, y los
+trabajadores de ambos portales corren a la vez en un mismo pool de hilos:
+  - Idealista: una pestaña propia en el Chrome de depuración (puerto 9222)
+  - Fotocasa: un Chrome propio por trabajador (CDP_PORT + n, perfil propio)
+
+Los resultados se guardan como en el batch secuencial: el almacén SQLite
+serializa las escrituras y, con el backend "json", cada zona se escribe bajo
+su lock (almacen_viviendas.bloqueo_zona). Índice global, marcas de agua y
+planes de fragmentos ya tienen su propio lock.
+
+Las preguntas de captcha o cambio de IP de cada trabajador van de una en una
+(consola.preguntar), precedidas de la etiqueta del trabajador.
+
+Con la rotación de IP activa Idealista usa un solo trabajador: la VPN cambia
+la IP de todo el sistema y cada trabajador la rotaría por su cuenta.
+
+Configuración en config.json (desactivado por defecto):
+    "ejecucion_paralela": {
+        "activo": true,
+        "trabajadores": {"idealista": 2, "fotocasa": 2},
+        "pausa_entre_zonas": [3, 8]
+    }
+"""
+
+import json
+import queue
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional
+
+from analizar_zonas import zonas_del_plan
+from consola import etiquetar
+from planificador_zonas import zonas_pendientes
+
+
+CONFIG_POR_DEFECTO = {
+    'activo': False,
+    'trabajadores': {'idealista': 2, 'fotocasa': 2},
+    'pausa_entre_zonas': [3, 8],
+}
+
+
+@dataclass
+class TrabajoZona:
+    portal: str
+    nombre: str
+    url: str
+
+
+@dataclass
+class ResultadoZona:
+    portal: str
+    nombre: str
+    nuevas: int = 0
+    segundos: float = 0.0
+    error: Optional[str] = None
+
+
+def cargar_config_paralela(config_file: str = "config.json") -> dict:
+    """Sección "ejecucion_paralela" de config.json con los valores por defecto"""
+    config = dict(CONFIG_POR_DEFECTO)
+    try:
+        with open(config_file, 'r', encoding='utf-8') as f:
+            config.update(json.load(f).get('ejecucion_paralela', {}))
+    except (OSError, ValueError, AttributeError):
+        pass
+    return config
+
+
+def zonas_batch(portal: str, config: dict) -> List[dict]:
+    """Zonas del modo batch: las de plan_rastreo.json si existe, si no todas las de config.json.
+
+    Con planificador_zonas activo solo las que ya toca rastrear.
+    """
+    urls_disponibles = config.get(portal, {}).get('urls', [])
+    zonas = zonas_del_plan(portal, urls_disponibles)
+    if zonas is None:
+        zonas = [{'url': u['url'], 'nombre': u['nombre']} for u in urls_disponibles]
+    return zonas_pendientes(portal, zonas)
+
+
+# ── Trabajadores (un navegador cada uno) ──────────────────────────
+
+class TrabajadorIdealista:
+    """Scraper de Idealista en una pestaña propia del Chrome de depuración"""
+
+    def __init__(self, indice: int, modo_debug=False, num_paginas=None,
+                 usar_rotacion_ip=False, vpn_provider=None):
+        from idealista_scraper import IdealistaScraper
+        self.scraper = IdealistaScraper(modo_debug=modo_debug, usar_rotacion_ip=usar_rotacion_ip,
+                                        vpn_provider=vpn_provider)
+        self.num_paginas = num_paginas
+
+    def iniciar(self) -> bool:
+        return self.scraper.conectar_chrome(pestana_nueva=True)
+
+    def procesar(self, trabajo: TrabajoZona) -> int:
+        viviendas = self.scraper.scrapear_zona(trabajo.url, trabajo.nombre, self.num_paginas)
+        if viviendas:
+            filename = self.scraper._obtener_ruta_json_persistente(trabajo.nombre)
+            self.scraper.guardar(viviendas, filename, ubicacion=trabajo.nombre, url_scrapeada=trabajo.url)
+        return len(viviendas)
+
+    def cerrar(self):
+        """Cierra la pestaña del trabajador; el Chrome de depuración sigue abierto"""
+        if self.scraper.driver is None:
+            return
+        try:
+            self.scraper.driver.close()
+            self.scraper.driver.quit()
+        except Exception:
+            pass
+
+
+class TrabajadorFotocasa:
+    """Scraper de Fotocasa con su propio Chrome (puerto CDP y perfil por trabajador)"""
+
+    def __init__(self, indice: int, modo_debug=False, num_paginas=None):
+        from fotocasa_scraper_firefox import CDP_PORT, FotocasaScraperFirefox
+        self.scraper = FotocasaScraperFirefox(modo_debug=modo_debug, cdp_port=CDP_PORT + indice)
+        self.num_paginas = num_paginas
+
+    def iniciar(self) -> bool:
+        return self.scraper.iniciar_navegador()
+
+    def procesar(self, trabajo: TrabajoZona) -> int:
+        url = self.scraper._asegurar_orden_fecha_fotocasa(trabajo.url)
+        viviendas = self.scraper.scrapear_zona(url, trabajo.nombre, self.num_paginas)
+        if viviendas:
+            self.scraper.guardar_resultados(viviendas, ubicacion=trabajo.nombre, url_scrapeada=url)
+        return len(viviendas)
+
+    def cerrar(self):
+        self.scraper.cerrar_navegador()
+
+
+# ── Pool ──────────────────────────────────────────────────────────
+
+def ejecutar_zonas(trabajos: List[TrabajoZona], fabricas: Dict[str, Callable[[int], object]],
+                   limites: Dict[str, int], pausa=(3, 8),
+                   al_terminar: Callable[[ResultadoZona], None] = None) -> List[ResultadoZona]:
+    """Procesa las zonas con hasta limites[portal] trabajadores por portal, todos a la vez.
+
+    fabricas[portal](n) crea el trabajador n del portal (iniciar/procesar/cerrar).
+    Un trabajador que no arranca deja sus zonas al resto; las zonas que se quedan
+    sin trabajador se devuelven con error. al_terminar(resultado) se llama al
+    acabar cada zona (progreso). Retorna los resultados en orden de fin.
+    """
+    colas: Dict[str, queue.Queue] = {}
+    for trabajo in trabajos:
+        colas.setdefault(trabajo.portal, queue.Queue()).put(trabajo)
+
+    resultados: List[ResultadoZona] = []
+    lock = threading.Lock()
+
+    def trabajar(portal: str, indice: int):
+        cola = colas[portal]
+        etiqueta = f"[{portal} #{indice + 1}]"
+        etiquetar(etiqueta)
+        # Arranque escalonado: los navegadores del mismo portal no piden a la vez
+        time.sleep(indice * pausa[0])
+        try:
+            trabajador = fabricas[portal](indice)
+            iniciado = trabajador.iniciar()
+        except Exception as e:
+            print(f"❌ {etiqueta} Error iniciando el trabajador: {e}")
+            return
+        if not iniciado:
+            print(f"❌ {etiqueta} No se pudo iniciar el navegador")
+            return
+        try:
+            while True:
+                try:
+                    trabajo = cola.get_nowait()
+                except queue.Empty:
+                    return
+                print(f"\n▶️  {etiqueta} {trabajo.nombre}")
+                inicio = time.monotonic()
+                resultado = ResultadoZona(portal, trabajo.nombre)
+                try:
+                    resultado.nuevas = trabajador.procesar(trabajo)
+                except Exception as e:
+                    resultado.error = f"{type(e).__name__}: {e}"
+                    print(f"❌ {etiqueta} {trabajo.nombre}: {resultado.error}")
+                resultado.segundos = time.monotonic() - inicio
+                with lock:
+                    resultados.append(resultado)
+                if al_terminar:
+                    al_terminar(resultado)
+                if not cola.empty():
+                    time.sleep(random.uniform(*pausa))
+        finally:
+            trabajador.cerrar()
+
+    puestos = [(portal, i) for portal, cola in colas.items()
+               for i in range(max(1, min(limites.get(portal, 1), cola.qsize())))]
+    if puestos:
+        with ThreadPoolExecutor(max_workers=len(puestos), thread_name_prefix='zona') as pool:
+            for futuro in [pool.submit(trabajar, portal, i) for portal, i in puestos]:
+                futuro.result()
+
+    for portal, cola in colas.items():
+        while not cola.empty():
+            trabajo = cola.get_nowait()
+            resultados.append(ResultadoZona(portal, trabajo.nombre, error='sin navegador disponible'))
+            if al_terminar:
+                al_terminar(resultados[-1])
+    return resultados
+
+
+def mostrar_resumen(resultados: List[ResultadoZona], segundos: float):
+    """Resumen del batch paralelo por portal"""
+    print(f"\n\n{'='*70}")
+    print(f"  ✅ BATCH PARALELO COMPLETADO en {segundos / 60:.1f} min")
+    print(f"{'='*70}")
+    for portal in sorted({r.portal for r in resultados}):
+        del_portal = [r for r in resultados if r.portal == portal]
+        errores = [r for r in del_portal if r.error]
+        print(f"  {portal}: {len(del_portal)} zonas, {sum(r.nuevas for r in del_portal)} viviendas nuevas, "
+              f"{sum(r.segundos for r in del_portal) / 60:.1f} min de navegador")
+        for r in errores:
+            print(f"     ❌ {r.nombre}: {r.error}")
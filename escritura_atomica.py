@@ -0,0 +1,73 @@
+"""
+Escritura atómica de archivos
+Los archivos que comparten los scrapers y los verificadores (zonas JSON, índice
+global, lápidas, registro de verificaciones, marcas de agua, planes...) se
+escriben en un temporal del mismo directorio que se renombra con os.replace:
+quien los lee nunca ve un archivo a medias y un fallo deja el anterior intacto.
+
+Los que varios procesos leen, modifican y vuelven a escribir (el orquestador
+lanza un proceso por portal) se actualizan además dentro de bloqueo_archivo,
+un bloqueo exclusivo entre procesos sobre ruta + '.lock'.
+"""
+
+import json
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+from typing import IO, Callable
+
+try:
+    import fcntl
+except ModuleNotFoundError:
+    fcntl = None
+    import msvcrt
+
+
+def escribir_atomico(ruta: str, escribir: Callable[[IO], None], binario: bool = False) -> None:
+    """Llama a escribir(f) sobre un temporal del directorio de ruta y lo renombra a ruta"""
+    directorio = os.path.dirname(os.path.abspath(ruta))
+    os.makedirs(directorio, exist_ok=True)
+    fd, temporal = tempfile.mkstemp(prefix=f'.{os.path.basename(ruta)}_', suffix='.tmp', dir=directorio)
+    try:
+        os.chmod(temporal, 0o644)  # mkstemp crea con 0600
+        with os.fdopen(fd, 'wb' if binario else 'w', **({} if binario else {'encoding': 'utf-8'})) as f:
+            escribir(f)
+        os.replace(temporal, ruta)
+    except BaseException:
+        try:
+            os.unlink(temporal)
+        except OSError:
+            pass
+        raise
+
+
+def escribir_json_atomico(ruta: str, datos) -> None:
+    """Escribe el JSON (indentado, UTF-8 sin escapar) de forma atómica"""
+    escribir_atomico(ruta, lambda f: json.dump(datos, f, ensure_ascii=False, indent=2))
+
+
+@contextmanager
+def bloqueo_archivo(ruta: str):
+    """Bloqueo exclusivo entre procesos sobre ruta + '.lock' mientras dura el with"""
+    ruta_lock = ruta + '.lock'
+    os.makedirs(os.path.dirname(os.path.abspath(ruta_lock)), exist_ok=True)
+    with open(ruta_lock, 'a+b') as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+                    break
+                except OSError:
+                    time.sleep(0.05)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
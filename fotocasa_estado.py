@@ -0,0 +1,179 @@
+"""
+Extracción de Fotocasa desde el estado embebido de la página
+Fotocasa serializa el resultado de la búsqueda en window.__INITIAL_PROPS__
+(initialSearch.result): anuncios, tipo de anunciante, teléfono y totales de
+paginación. Leerlo evita transferir y parsear el HTML completo (~1.8 MB).
+"""
+
+import json
+import math
+import re
+from typing import List, Optional
+
+from base_scraper import ejecutar_extractor_js
+
+
+URL_BASE_FOTOCASA = "https://www.fotocasa.es"
+
+# window.__INITIAL_PROPS__ = JSON.parse("...") (cadena JSON escapada dentro de JS)
+PATRON_INITIAL_PROPS = re.compile(
+    r'window\.__INITIAL_PROPS__\s*=\s*JSON\.parse\(("(?:[^"\\]|\\.)*")\)'
+)
+
+# Etiquetas que Fotocasa muestra en el título según buildingSubtype
+TIPOS_INMUEBLE = {
+    'Flat': 'Piso',
+    'Apartment': 'Apartamento',
+    'House_Chalet': 'Casa o chalet',
+    'CountryHouse': 'Finca rústica',
+    'Duplex': 'Dúplex',
+    'Penthouse': 'Ático',
+    'Studio': 'Estudio',
+    'Loft': 'Loft',
+    'GroundFloor': 'Planta baja',
+    'TerracedHouse': 'Casa adosada',
+    'SemidetachedHouse': 'Casa pareada',
+}
+
+CARACTERISTICAS = ('rooms', 'bathrooms', 'surface')
+
+# Extractor del portal: misma forma compacta que devuelve compactar_resultado() en Python
+JS_ESTADO_FOTOCASA = """
+() => {
+    const props = window.__INITIAL_PROPS__;
+    const result = props && props.initialSearch && props.initialSearch.result;
+    if (!result) return null;
+    const v2 = result.resultsV2 || {};
+    const claves = ['rooms', 'bathrooms', 'surface'];
+    return {
+        count: (result.count !== undefined) ? result.count : null,
+        totalItems: (v2.totalItems !== undefined) ? v2.totalItems : null,
+        page: v2.page || null,
+        realEstates: (result.realEstates || []).map(r => {
+            const features = {};
+            (r.features || []).forEach(f => { if (claves.includes(f.key)) features[f.key] = f.value; });
+            return {
+                id: r.id,
+                clientType: r.clientType || null,
+                clientTypeId: (r.clientTypeId !== undefined) ? r.clientTypeId : null,
+                phone: r.phone || null,
+                price: r.price || null,
+                location: r.location || null,
+                detail: (r.detail && r.detail['es-ES']) || null,
+                buildingSubtype: r.buildingSubtype || null,
+                timestamp: (r.date && r.date.timestamp) || null,
+                features: features,
+            };
+        }),
+    };
+}
+"""
+
+
+def compactar_resultado(result: dict) -> dict:
+    """Reduce initialSearch.result a los campos que necesita el scraper"""
+    v2 = result.get('resultsV2') or {}
+    inmuebles = []
+    for r in result.get('realEstates') or []:
+        features = {
+            f.get('key'): f.get('value')
+            for f in r.get('features') or []
+            if f.get('key') in CARACTERISTICAS
+        }
+        inmuebles.append({
+            'id': r.get('id'),
+            'clientType': r.get('clientType'),
+            'clientTypeId': r.get('clientTypeId'),
+            'phone': r.get('phone'),
+            'price': r.get('price'),
+            'location': r.get('location'),
+            'detail': (r.get('detail') or {}).get('es-ES'),
+            'buildingSubtype': r.get('buildingSubtype'),
+            'timestamp': (r.get('date') or {}).get('timestamp'),
+            'features': features,
+        })
+    return {
+        'count': result.get('count'),
+        'totalItems': v2.get('totalItems'),
+        'page': v2.get('page'),
+        'realEstates': inmuebles,
+    }
+
+
+def estado_desde_html(html: str) -> Optional[dict]:
+    """Extrae el estado compacto del HTML crudo (sin construir el DOM)"""
+    if not html:
+        return None
+    match = PATRON_INITIAL_PROPS.search(html)
+    if not match:
+        return None
+    try:
+        props = json.loads(json.loads(match.group(1)))
+        result = props['initialSearch']['result']
+    except (json.JSONDecodeError, KeyError, TypeError):
+        return None
+    if not isinstance(result, dict):
+        return None
+    return compactar_resultado(result)
+
+
+def leer_estado(page) -> Optional[dict]:
+    """Lee el estado compacto en el navegador con una única llamada (Playwright o Selenium)"""
+    estado = ejecutar_extractor_js(page, JS_ESTADO_FOTOCASA)
+    return estado if isinstance(estado, dict) else None
+
+
+def total_resultados(estado: dict) -> Optional[int]:
+    """Total de anuncios de la búsqueda (totalItems o count)"""
+    total = estado.get('totalItems')
+    return estado.get('count') if total is None else total
+
+
+def total_paginas(estado: dict) -> Optional[int]:
+    """Total de páginas a partir de totalItems / tamaño de página"""
+    pagina = estado.get('page') or {}
+    total = total_resultados(estado)
+    tamano = pagina.get('size') or len(estado.get('realEstates') or [])
+    if total is None or not tamano:
+        return None
+    return max(1, math.ceil(total / tamano))
+
+
+def es_particular(inmueble: dict) -> bool:
+    """Anunciante particular según clientType / clientTypeId"""
+    return inmueble.get('clientType') == 'particular' or inmueble.get('clientTypeId') == 1
+
+
+def _plural(valor, singular: str, plural: str) -> Optional[str]:
+    if not valor:
+        return None
+    return f"{valor} {singular if valor == 1 else plural}"
+
+
+def campos_vivienda(inmueble: dict) -> dict:
+    """Campos de Vivienda (formato del listado de Fotocasa) para un inmueble del estado"""
+    tipo = TIPOS_INMUEBLE.get(inmueble.get('buildingSubtype'), 'Vivienda')
+    location = inmueble.get('location') or ''
+    features = inmueble.get('features') or {}
+
+    url = inmueble.get('detail') or ''
+    if url and not url.startswith('http'):
+        url = f"{URL_BASE_FOTOCASA}{url}"
+
+    superficie = features.get('surface')
+
+    return {
+        'titulo': f"{tipo} en {location}" if location else tipo,
+        'precio': inmueble.get('price') or 'N/A',
+        'ubicacion': location or 'N/A',
+        'habitaciones': _plural(features.get('rooms'), 'hab', 'habs'),
+        'metros': f"{superficie} m²" if superficie else None,
+        'url': url,
+        'descripcion': _plural(features.get('bathrooms'), 'baño', 'baños'),
+        'telefono': inmueble.get('phone') or None,
+    }
+
+
+def particulares(estado: dict) -> List[dict]:
+    """Campos de Vivienda de los particulares, en el orden del listado"""
+    return [campos_vivienda(r) for r in estado.get('realEstates') or [] if es_particular(r)]
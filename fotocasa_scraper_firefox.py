@@ -12,22 +12,34 @@ import random
 import json
 import subprocess
 import signal
+import tempfile
 from typing import List, Optional, Tuple
 from datetime import datetime
 from dataclasses import dataclass, asdict
 
 from playwright.sync_api import sync_playwright, Page, Browser
-from bs4 import BeautifulSoup
+
+import fotocasa_estado
+from base_scraper import SnapshotDOM
+from almacen_viviendas import (abrir_almacen, bloqueo_zona, escribir_json_atomico, leer_zona,
+                               leer_marca_agua)
+from indice_global import abrir_indice, clave_anuncio, id_anuncio
+from lapidas import abrir_lapidas
+from marca_agua import CorteMarcaAgua, MarcaAgua, MarcasPendientes, clave_marca, tolerancia_ids
+from fragmentos_precio import fragmentos_zona, total_desde_titulo, url_fragmento
+from ventana_reciente import es_rastreo_completo, es_url_reciente, url_rastreo
+from planificador_zonas import registrar_rastreo
+from analizar_zonas import registrar_vistos
+from control_ritmo import ritmo_portal
+from consola import preguntar
+from bloqueo_recursos import BloqueoRecursos
+from salud_pagina import MOTIVO_CONTADOR, MonitorSalud
 
 
 # ============== CONFIGURACIÓN ==============
-DELAY_MIN_PAGINAS = 1
-DELAY_MAX_PAGINAS = 2
-DELAY_SCROLL = 0.3
-PAUSA_CADA_N_PAGINAS = 10
-PAUSA_LARGA_MIN = 5
-PAUSA_LARGA_MAX = 8
+DELAY_SCROLL = 0.3  # Esperas entre páginas y pausas largas: control_ritmo.py
 CDP_PORT = 9223
+MODO_EXTRACCION = 'json'  # 'json' = estado embebido (fallback DOM) | 'dom' = solo HTML
 CHROMIUM_PATH = os.path.expanduser('~/.cache/ms-playwright/chromium-1091/chrome-linux/chrome')
 # ===========================================
 
@@ -49,15 +61,34 @@ class Vivienda:
 class FotocasaScraperFirefox:
     """Scraper de Fotocasa usando Playwright con Firefox"""
     
-    def __init__(self, modo_debug=False, headless=False):
+    # Extractor en el navegador: estado compacto de la búsqueda (ver base_scraper.ejecutar_extractor_js)
+    EXTRACTOR_JS = fotocasa_estado.JS_ESTADO_FOTOCASA
+    
+    def __init__(self, modo_debug=False, headless=False, modo_extraccion=MODO_EXTRACCION, cdp_port=CDP_PORT):
         self.playwright = None
         self.browser: Browser = None
         self.page: Page = None
         self.chrome_process = None  # Proceso Chrome externo
+        self.cdp_port = cdp_port  # Un puerto (y un perfil) por navegador en el batch paralelo
         self.modo_debug = modo_debug
         self.headless = headless
         self.viviendas = []
-        self.paginas_sin_pausa = 0
+        self.modo_extraccion = modo_extraccion
+        self.omitidos = 0
+        self.ubicacion_actual = None
+        # Particulares vistos en el listado de la zona en curso, omitidos incluidos (analizar_zonas.py)
+        self.vistos_zona = set()
+        # Corte del rastreo en curso y marcas de agua pendientes de guardar con la zona
+        self.corte_marca = CorteMarcaAgua()
+        self.marcas_pendientes = MarcasPendientes()
+        # Rastreo completo en curso: los anuncios conocidos se saltan en lugar de parar
+        self.recorrer_todo = False
+        # Código fuente de la página actual, leído una vez por navegación
+        self.snapshot = SnapshotDOM(lambda: self.page.content(), lambda: self.page.url)
+        # Imágenes, fuentes y rastreadores cortados con page.route; tiempos de carga y reciclajes
+        self.recursos = BloqueoRecursos('fotocasa')
+        # Heap JS y objetos de Playwright: decide cuándo reciclar la conexión
+        self.salud = MonitorSalud('fotocasa', origen='scraper')
     
     @staticmethod
     def _obtener_ruta_json_persistente(ubicacion: str) -> str:
@@ -69,7 +100,14 @@ class FotocasaScraperFirefox:
     
     @staticmethod
     def _cargar_json_existente(ruta_json: str) -> dict:
-        """Carga el JSON existente y devuelve {data, urls_conocidas}."""
+        """Carga el JSON existente y devuelve {data, urls_conocidas}.
+        Con el almacén SQLite solo se consultan las URLs (data es None)."""
+        almacen = abrir_almacen()
+        if almacen is not None:
+            urls = almacen.urls_conocidas(ruta_json)
+            print(f"\n📂 Zona cargada del almacén: {ruta_json}")
+            print(f"   {len(urls)} viviendas ya registradas")
+            return {'data': None, 'urls_conocidas': urls}
         if not os.path.exists(ruta_json):
             return {'data': None, 'urls_conocidas': set()}
         try:
@@ -124,7 +162,7 @@ class FotocasaScraperFirefox:
         """Lanza Chrome como proceso externo con CDP habilitado."""
         args = [
             CHROMIUM_PATH,
-            f'--remote-debugging-port={CDP_PORT}',
+            f'--remote-debugging-port={self.cdp_port}',
             '--no-sandbox',
             '--disable-blink-features=AutomationControlled',
             '--disable-infobars',
@@ -133,6 +171,9 @@ class FotocasaScraperFirefox:
             '--no-first-run',
             '--no-default-browser-check',
         ]
+        if self.cdp_port != CDP_PORT:
+            # Con el perfil por defecto el segundo Chrome se uniría al primero
+            args.append(f'--user-data-dir={os.path.join(tempfile.gettempdir(), f"homescraper_chrome_{self.cdp_port}")}')
         if self.headless:
             args.append('--headless=new')
         
@@ -144,12 +185,12 @@ class FotocasaScraperFirefox:
         )
         # Esperar a que Chrome inicie y abra el puerto CDP
         time.sleep(2)
-        print(f"      Chrome lanzado (PID: {self.chrome_process.pid}, CDP: :{CDP_PORT})")
+        print(f"      Chrome lanzado (PID: {self.chrome_process.pid}, CDP: :{self.cdp_port})")
     
     def _conectar_playwright(self):
         """Conecta una instancia de Playwright al Chrome externo via CDP."""
         self.playwright = sync_playwright().start()
-        self.browser = self.playwright.chromium.connect_over_cdp(f'http://localhost:{CDP_PORT}')
+        self.browser = self.playwright.chromium.connect_over_cdp(f'http://localhost:{self.cdp_port}')
         
         # Usar el contexto y página existentes del navegador
         contexts = self.browser.contexts
@@ -168,8 +209,31 @@ class FotocasaScraperFirefox:
             )
             self.page = context.new_page()
         
+        # goto/reload/redirecciones invalidan el snapshot del DOM
+        self.page.on('framenavigated', self._al_navegar)
+        self.snapshot.invalidar()
+        self.recursos.aplicar(self.page)
+        self.salud.conectar(self.page)
+        
         self._inyectar_antideteccion()
     
+    def _al_navegar(self, frame):
+        if frame.parent_frame is None:
+            self.snapshot.invalidar()
+    
+    def _ir(self, url: str, timeout: int = 90000, contar: bool = True):
+        """page.goto hasta domcontentloaded, anotando el tiempo de carga.
+
+        Con contar=False (la vuelta a la URL tras reconectar) el goto no suma
+        operaciones a la página recién reciclada.
+        """
+        inicio = time.monotonic()
+        respuesta = self.page.goto(url, wait_until='domcontentloaded', timeout=timeout)
+        self.recursos.registrar_carga(time.monotonic() - inicio)
+        if contar:
+            self.salud.operacion()
+        return respuesta
+    
     def iniciar_navegador(self):
         """Inicia Chrome externo + conecta Playwright via CDP."""
         print("\n🌐 Iniciando Chrome con CDP...")
@@ -191,13 +255,17 @@ class FotocasaScraperFirefox:
         return ('has been collected' in msg or 'unbounded heap' in msg 
                 or "_object" in msg or "object has no attribute" in msg)
     
-    def reconectar_playwright(self, url_actual: str = None) -> bool:
+    def reconectar_playwright(self, url_actual: str = None, motivo: str = 'error de conexión') -> bool:
         """Desconecta y reconecta Playwright al MISMO Chrome (preserva sesión/cookies).
         
         Chrome sigue corriendo como proceso externo, solo se recicla la conexión
-        de Playwright que se corrompe después de muchas páginas.
+        de Playwright que se corrompe después de muchas páginas. El motivo queda
+        en la línea temporal de salud_pagina; los que no son del contador fijo
+        cuentan como reciclajes en las medidas de bloqueo_recursos.
         """
         print("      🔄 Reconectando Playwright al Chrome existente...")
+        if motivo != MOTIVO_CONTADOR:
+            self.recursos.registrar_reciclaje()
         try:
             # 1. Matar la conexión Playwright corrupta (Chrome sigue vivo)
             try:
@@ -216,11 +284,12 @@ class FotocasaScraperFirefox:
             
             # 2. Reconectar al mismo Chrome
             self._conectar_playwright()
+            self.salud.reciclado(motivo, self.page)
             
             # 3. Navegar a la URL
             if url_actual:
-                self.page.goto(url_actual, wait_until='domcontentloaded', timeout=90000)
-                time.sleep(random.uniform(2, 4))
+                self._ir(url_actual, contar=False)
+                self.delay_aleatorio()
             
             print("      ✅ Playwright reconectado correctamente")
             return True
@@ -233,14 +302,15 @@ class FotocasaScraperFirefox:
                 time.sleep(2)
                 self._lanzar_chrome_externo()
                 self._conectar_playwright()
+                self.salud.reciclado(motivo, self.page)
                 if url_actual:
-                    self.page.goto(url_actual, wait_until='domcontentloaded', timeout=90000)
-                    time.sleep(random.uniform(3, 5))
+                    self._ir(url_actual, contar=False)
+                    self.delay_aleatorio()
                 # Puede haber CAPTCHA tras relanzar
                 if self.verificar_bloqueo():
                     print("      ⚠️  CAPTCHA tras relanzar Chrome!")
                     print("      🔄 Resuelve el captcha en el navegador.")
-                    input("      Presiona Enter cuando esté listo...")
+                    preguntar("      Presiona Enter cuando esté listo...")
                 print("      ✅ Chrome relanzado correctamente")
                 return True
             except Exception as e2:
@@ -280,12 +350,18 @@ class FotocasaScraperFirefox:
         except:
             pass
         self._matar_chrome()
+        if self.recursos.cargas:
+            print(f"📉 Recursos: {self.recursos.texto_resumen()}")
+            self.recursos.guardar()
+        self.salud.guardar()
         print("🔒 Navegador cerrado")
     
     def scroll_humano(self):
         """Hace scroll rápido para cargar todo el contenido lazy-loaded.
         Usa keyboard (End/Home) como método principal.
         Lanza excepción si falla (para que el reintento recree la página)."""
+        # El lazy-loading cambia el DOM
+        self.snapshot.invalidar()
         try:
             for _ in range(12):
                 self.page.keyboard.press("PageDown")
@@ -302,17 +378,11 @@ class FotocasaScraperFirefox:
                 print(f"      [DEBUG] Error en scroll: {e}")
     
     def delay_aleatorio(self):
-        """Delay aleatorio entre páginas"""
-        delay = random.uniform(DELAY_MIN_PAGINAS, DELAY_MAX_PAGINAS)
+        """Espera hasta la siguiente página al ritmo del portal (con jitter y pausas largas)"""
+        ritmo = ritmo_portal('fotocasa')
+        delay = ritmo.esperar('pagina')
         if self.modo_debug:
-            print(f"      [DEBUG] Esperando {delay:.1f}s...")
-        time.sleep(delay)
-    
-    def pausa_larga(self):
-        """Pausa larga para evitar detección"""
-        pausa = random.uniform(PAUSA_LARGA_MIN, PAUSA_LARGA_MAX)
-        print(f"\n    ☕ Pausa anti-detección de {pausa:.0f}s...")
-        time.sleep(pausa)
+            print(f"      [DEBUG] Esperando {delay:.1f}s ({ritmo.ritmo:.1f} páginas/min)...")
     
     def es_particular(self, articulo_html: str) -> bool:
         """Detecta si es particular buscando el texto exacto"""
@@ -324,6 +394,10 @@ class FotocasaScraperFirefox:
     def verificar_sin_resultados(self) -> bool:
         """Verifica si la página muestra 'sin resultados' - MUY específico"""
         try:
+            # Sin la clase en el snapshot no hace falta preguntar al navegador
+            if 're-searchnoresults' not in self.snapshot.html_minusculas:
+                return False
+            
             # Buscar el div específico de sin resultados
             no_results = self.page.evaluate("document.querySelectorAll('div.re-SearchNoResults').length")
             if no_results > 0:
@@ -380,6 +454,14 @@ class FotocasaScraperFirefox:
         <li data-panot-component="pagination-button"> que tienen <a data-index="N">.
         El último botón numérico (mayor data-index) indica el total de páginas.
         """
+        # Método 0: totales del estado embebido (sin scroll ni HTML)
+        estado = self._leer_estado_pagina()
+        if estado:
+            total = fotocasa_estado.total_paginas(estado)
+            if total:
+                print(f"      📊 Total desde estado embebido: {total} páginas ({estado.get('totalItems') or estado.get('count')} anuncios)")
+                return total
+        
         try:
             # Scroll progresivo hasta el final para forzar lazy-loading del paginador
             for _ in range(5):
@@ -388,9 +470,10 @@ class FotocasaScraperFirefox:
             # Scroll final al fondo absoluto
             self.page.evaluate("window.scrollTo(0, document.body.scrollHeight)")
             time.sleep(2)
+            self.snapshot.invalidar()
             
             # Debug: mostrar si existe el nav en el DOM
-            content = self.page.content()
+            content = self.snapshot.html
             if 'data-panot-component="pagination"' in content:
                 print("      🔍 DEBUG: nav pagination encontrado en el DOM")
             else:
@@ -407,14 +490,15 @@ class FotocasaScraperFirefox:
                     }
                 """)
                 time.sleep(3)
-                content = self.page.content()
+                self.snapshot.invalidar()
+                content = self.snapshot.html
                 if 'data-panot-component="pagination"' in content:
                     print("      🔍 DEBUG: nav pagination encontrado tras scroll agresivo")
                 else:
                     print("      🔍 DEBUG: nav pagination sigue sin aparecer")
             
             # Método 1: Buscar directamente en el HTML con BeautifulSoup (más fiable)
-            soup = BeautifulSoup(content, 'html.parser')
+            soup = self.snapshot.soup
             nav = soup.find('nav', attrs={'data-panot-component': 'pagination'})
             if not nav:
                 nav = soup.find('nav', attrs={'aria-label': 'Paginación'})
@@ -481,7 +565,7 @@ class FotocasaScraperFirefox:
     def verificar_bloqueo(self) -> bool:
         """Verifica si hay bloqueo real (DataDome, Cloudflare, etc)"""
         try:
-            page_source = self.page.content().lower()
+            page_source = self.snapshot.html_minusculas
             
             # Solo señales muy específicas de bloqueo real
             bloqueo_signals = [
@@ -500,6 +584,9 @@ class FotocasaScraperFirefox:
                 if signal in page_source:
                     if self.modo_debug:
                         print(f"      [DEBUG] Bloqueo detectado: {signal}")
+                    ritmo_portal('fotocasa').bloqueo(signal)
+                    # El usuario resolverá el captcha: la página cambiará
+                    self.snapshot.invalidar()
                     return True
             
             return False
@@ -594,8 +681,104 @@ class FotocasaScraperFirefox:
                 print(f"      [DEBUG] Error extrayendo vivienda: {e}")
             return None
     
-    def _scrapear_pagina_interno(self, urls_conocidas=None) -> Tuple[List[Vivienda], bool]:
-        """Lógica interna de scraping de una página (sin reintentos)."""
+    def _leer_estado_pagina(self) -> Optional[dict]:
+        """Estado embebido (__INITIAL_PROPS__) de la página actual, o None.
+        
+        Un único page.evaluate que devuelve solo los campos necesarios.
+        """
+        if self.modo_extraccion != 'json':
+            return None
+        try:
+            return fotocasa_estado.leer_estado(self.page)
+        except Exception as e:
+            if self._es_error_heap(e):
+                raise
+            if self.modo_debug:
+                print(f"      [DEBUG] Estado embebido no disponible: {e}")
+            return None
+    
+    def _es_conocida(self, vivienda: Vivienda, claves_conocidas) -> bool:
+        """True si el anuncio está en el JSON de la zona o se descatalogó de ella hace poco"""
+        if claves_conocidas and clave_anuncio(vivienda.url) in claves_conocidas:
+            return True
+        return abrir_lapidas().parada(vivienda.url, self.ubicacion_actual)
+    
+    def _omitir(self, vivienda: Vivienda) -> bool:
+        """True si el anuncio ya está guardado en otra zona (índice global) o descatalogado (lápidas).
+        
+        El particular queda anotado como visto en la zona aunque se omita."""
+        self.vistos_zona.add(vivienda.url)
+        if vivienda.url not in abrir_indice() and vivienda.url not in abrir_lapidas():
+            return False
+        self.omitidos += 1
+        if self.modo_debug:
+            print(f"      [DEBUG] Ya registrado en otra zona o descatalogado: {vivienda.url}")
+        return True
+    
+    def _marca_alcanzada(self, anuncio_id, publicacion=None) -> bool:
+        """Anota un anuncio del listado (particular o no) en el corte por marca de agua"""
+        if not self.corte_marca.observar(anuncio_id, publicacion):
+            return False
+        print(f"\n    🛑 Marca de agua alcanzada: {self.corte_marca.consecutivos} anuncios seguidos anteriores a la última ejecución")
+        print("       Deteniendo búsqueda (los siguientes ya se vieron)")
+        return True
+    
+    def _viviendas_desde_estado(self, estado: dict, claves_conocidas=None) -> Tuple[List[Vivienda], bool]:
+        """Construye las viviendas de particulares desde el estado embebido."""
+        viviendas = []
+        encontrado_conocido = False
+        
+        for inmueble in estado.get('realEstates') or []:
+            if self._marca_alcanzada(inmueble.get('id'), inmueble.get('timestamp')):
+                encontrado_conocido = True
+                break
+            if not fotocasa_estado.es_particular(inmueble):
+                continue
+            vivienda = Vivienda(
+                anunciante="Particular",
+                fecha_scraping=datetime.now().isoformat(),
+                **fotocasa_estado.campos_vivienda(inmueble)
+            )
+            if self._es_conocida(vivienda, claves_conocidas):
+                if self.recorrer_todo:
+                    continue
+                print(f"\n    🛑 Anuncio ya conocido: {vivienda.titulo[:50]}...")
+                print("       Deteniendo búsqueda (los siguientes ya están registrados)")
+                encontrado_conocido = True
+                break
+            if self._omitir(vivienda):
+                continue
+            
+            viviendas.append(vivienda)
+            
+            if self.modo_debug:
+                print(f"      ✅ PARTICULAR: {vivienda.titulo[:50]}... - {vivienda.precio}")
+        
+        return viviendas, encontrado_conocido
+    
+    def _mostrar_resultado_pagina(self, viviendas: List[Vivienda], total_anuncios: int):
+        print(f"    📋 {total_anuncios} anuncios, {len(viviendas)} particulares")
+        
+        if viviendas:
+            for v in viviendas:
+                print(f"      🏠 {v.precio} | {v.ubicacion}")
+                if v.telefono:
+                    print(f"         📞 {v.telefono}")
+        
+        print(f"    ✅ {len(viviendas)} particulares encontrados\n")
+    
+    def _scrapear_pagina_interno(self, claves_conocidas=None) -> Tuple[List[Vivienda], bool]:
+        """Lógica interna de scraping de una página (sin reintentos).
+        
+        Modo 'json': lee el estado embebido (sin scroll ni HTML). Si no existe,
+        se usa el parseo del DOM.
+        """
+        estado = self._leer_estado_pagina()
+        if estado and estado.get('realEstates'):
+            viviendas, encontrado_conocido = self._viviendas_desde_estado(estado, claves_conocidas)
+            self._mostrar_resultado_pagina(viviendas, len(estado['realEstates']))
+            return viviendas, encontrado_conocido
+        
         viviendas = []
         encontrado_conocido = False
         
@@ -603,7 +786,15 @@ class FotocasaScraperFirefox:
         self.scroll_humano()
         
         # Obtener HTML
-        html_content = self.page.content()
+        html_content = self.snapshot.html
+        
+        # El estado puede venir en el HTML aunque no sea accesible desde JS
+        if self.modo_extraccion == 'json':
+            estado = fotocasa_estado.estado_desde_html(html_content)
+            if estado and estado.get('realEstates'):
+                viviendas, encontrado_conocido = self._viviendas_desde_estado(estado, claves_conocidas)
+                self._mostrar_resultado_pagina(viviendas, len(estado['realEstates']))
+                return viviendas, encontrado_conocido
         
         # Debug: guardar HTML si está activado
         if self.modo_debug:
@@ -611,8 +802,8 @@ class FotocasaScraperFirefox:
                 f.write(html_content)
             print("      [DEBUG] HTML guardado en debug_fotocasa.html")
         
-        # Parsear con BeautifulSoup
-        soup = BeautifulSoup(html_content, 'html.parser')
+        # Parsear con BeautifulSoup (árbol compartido del snapshot)
+        soup = self.snapshot.soup
         
         # Buscar el contenedor principal de resultados
         contenedor = soup.find('section', {'class': 're-SearchResult'})
@@ -626,43 +817,42 @@ class FotocasaScraperFirefox:
             articulos = soup.find_all('article')
         
         total_anuncios = len(articulos)
-        particulares_count = 0
         
         for articulo in articulos:
             vivienda = self.extraer_vivienda(articulo)
             if vivienda:
-                if urls_conocidas and vivienda.url in urls_conocidas:
+                # El DOM solo da los particulares: el ID de la URL alimenta la marca de agua
+                ident = id_anuncio(vivienda.url)
+                if self._marca_alcanzada(ident[1] if ident else None):
+                    encontrado_conocido = True
+                    break
+                if self._es_conocida(vivienda, claves_conocidas):
+                    if self.recorrer_todo:
+                        continue
                     print(f"\n    🛑 Anuncio ya conocido: {vivienda.titulo[:50]}...")
                     print("       Deteniendo búsqueda (los siguientes ya están registrados)")
                     encontrado_conocido = True
                     break
+                if self._omitir(vivienda):
+                    continue
                 
                 viviendas.append(vivienda)
-                particulares_count += 1
                 
                 if self.modo_debug:
                     print(f"      ✅ PARTICULAR: {vivienda.titulo[:50]}... - {vivienda.precio}")
         
-        print(f"    📋 {total_anuncios} anuncios, {particulares_count} particulares")
-        
-        if viviendas:
-            for v in viviendas:
-                print(f"      🏠 {v.precio} | {v.ubicacion}")
-                if v.telefono:
-                    print(f"         📞 {v.telefono}")
-        
-        print(f"    ✅ {len(viviendas)} particulares encontrados\n")
+        self._mostrar_resultado_pagina(viviendas, total_anuncios)
         
         return viviendas, encontrado_conocido
 
-    def scrapear_pagina(self, urls_conocidas=None) -> Tuple[List[Vivienda], bool]:
+    def scrapear_pagina(self, claves_conocidas=None) -> Tuple[List[Vivienda], bool]:
         """Scrapea la página actual con 3 reintentos (recarga la página si falla).
         
         Retorna (viviendas_nuevas, encontrado_conocido).
         """
         for intento in range(3):
             try:
-                return self._scrapear_pagina_interno(urls_conocidas)
+                return self._scrapear_pagina_interno(claves_conocidas)
             except Exception as e:
                 print(f"    ⚠️  Error en intento {intento + 1}/3: {e}")
                 # Siempre intentar obtener URL actual antes de cualquier acción
@@ -681,7 +871,7 @@ class FotocasaScraperFirefox:
                         print(f"    🔄 Recargando página e intentando de nuevo...")
                         try:
                             self.page.reload(wait_until='domcontentloaded', timeout=60000)
-                            time.sleep(random.uniform(2, 4))
+                            self.delay_aleatorio()
                         except Exception as reload_err:
                             print(f"    ⚠️  Error recargando: {reload_err}, renovando...")
                             self.renovar_pagina(url_actual)
@@ -721,7 +911,7 @@ class FotocasaScraperFirefox:
         url_siguiente = self.construir_url_pagina(url_base, pagina_siguiente)
         print(f"      📍 URL: {url_siguiente[:100]}...")
         
-        self.page.goto(url_siguiente, wait_until='domcontentloaded', timeout=60000)
+        self._ir(url_siguiente, timeout=60000)
         
         # Esperar a que aparezca contenido con múltiples selectores
         selectores = [
@@ -799,28 +989,51 @@ class FotocasaScraperFirefox:
                     return False
         return False
     
-    def scrapear(self, url: str, paginas: Optional[int] = None, ubicacion: str = None) -> List[Vivienda]:
+    def scrapear(self, url: str, paginas: Optional[int] = None, ubicacion: str = None,
+                 fragmento: str = None) -> List[Vivienda]:
         """Método principal de scraping.
         
         Si ubicacion se proporciona, carga el JSON persistente y para al encontrar
         un anuncio ya conocido (el listado se asume ordenado por fecha descendente).
+        Las descatalogadas recientes de la zona (lápidas) también cuentan como conocidas.
+        Si la zona (o el fragmento de precio) tiene marca de agua, se para con ella
+        sin cargar el JSON; la marca nueva se guarda con las viviendas
+        (guardar_resultados) o al final si no hay ninguna. En el rastreo completo
+        que marca la cadencia (URL sin ventana de publicación, ver
+        ventana_reciente.py) no se para: se recorre todo el listado saltando los
+        anuncios conocidos, y solo cuenta como completo si llega al final.
         """
         print("\n" + "="*70)
         print("  FOTOCASA SCRAPER (Chromium - Playwright)")
         print("="*70)
         
-        # Cargar URLs conocidas del JSON persistente
-        urls_conocidas = set()
+        # Anuncios conocidos de la zona, por ID (el slug de la URL puede cambiar)
+        claves_conocidas = set()
+        marca = None
+        ruta_json = None
+        self.recorrer_todo = False
         if ubicacion:
             ruta_json = self._obtener_ruta_json_persistente(ubicacion)
-            json_existente = self._cargar_json_existente(ruta_json)
-            urls_conocidas = json_existente['urls_conocidas']
-            if not urls_conocidas:
-                print("    📋 No hay datos previos, se hará búsqueda completa")
+            marca = MarcaAgua.desde_dict(leer_marca_agua(clave_marca(ruta_json, fragmento)))
+            self.recorrer_todo = es_rastreo_completo(url)
+            if self.recorrer_todo:
+                print("    🔁 Rastreo completo: se recorre todo el listado (sin parar en la marca de agua)")
+                json_existente = self._cargar_json_existente(ruta_json)
+                claves_conocidas = {clave_anuncio(url) for url in json_existente['urls_conocidas']}
+                marca = None
+            elif marca:
+                print(f"    📍 Marca de agua: ID {marca.max_id} ({marca.timestamp or 'sin fecha'})")
+            else:
+                json_existente = self._cargar_json_existente(ruta_json)
+                claves_conocidas = {clave_anuncio(url) for url in json_existente['urls_conocidas']}
+                if not claves_conocidas:
+                    print("    📋 No hay datos previos, se hará búsqueda completa")
+        self.corte_marca = CorteMarcaAgua(marca, tolerancia_ids=tolerancia_ids('fotocasa'))
         
         todas_viviendas = []
         paginas_procesadas = 1
-        self.paginas_sin_pausa = 0
+        self.omitidos = 0
+        self.ubicacion_actual = ubicacion
         
         print(f"\n🔗 URL: {url}")
         print(f"📄 Páginas: {'Todas' if paginas is None else paginas}")
@@ -832,8 +1045,8 @@ class FotocasaScraperFirefox:
         for intento in range(3):
             try:
                 print(f"    Navegando (intento {intento + 1}/3)...")
-                self.page.goto(url, wait_until='domcontentloaded', timeout=90000)
-                time.sleep(random.uniform(3, 5))
+                self._ir(url)
+                self.delay_aleatorio()
                 navegacion_exitosa = True
                 break
             except Exception as e:
@@ -850,7 +1063,7 @@ class FotocasaScraperFirefox:
         if not navegacion_exitosa:
             print("❌ No se pudo navegar después de 3 intentos")
             print("    Prueba a resolver el captcha manualmente si aparece")
-            input("    Presiona Enter cuando la página cargue...")
+            preguntar("    Presiona Enter cuando la página cargue...")
             try:
                 self.page.wait_for_load_state('domcontentloaded', timeout=30000)
             except:
@@ -878,7 +1091,8 @@ class FotocasaScraperFirefox:
         
         # Guardar HTML para debug (siempre en primera carga para diagnóstico)
         try:
-            html_content = self.page.content()
+            self.snapshot.invalidar()  # Tras el scroll
+            html_content = self.snapshot.html
             with open('debug_pagina1.html', 'w', encoding='utf-8') as f:
                 f.write(html_content)
             print("    📁 HTML guardado en debug_pagina1.html")
@@ -911,7 +1125,7 @@ class FotocasaScraperFirefox:
             print("    📁 Revisa debug_pagina1.html para ver qué cargó")
             
             # Preguntar al usuario
-            respuesta = input("    ¿La página muestra viviendas? Continuar? (s/n): ").strip().lower()
+            respuesta = preguntar("    ¿La página muestra viviendas? Continuar? (s/n): ").strip().lower()
             if respuesta != 's':
                 return todas_viviendas
         
@@ -929,18 +1143,12 @@ class FotocasaScraperFirefox:
         
         while paginas_procesadas <= paginas_a_scrapear:
             
-            # Pausa larga periódica
-            self.paginas_sin_pausa += 1
-            if self.paginas_sin_pausa >= PAUSA_CADA_N_PAGINAS:
-                self.pausa_larga()
-                self.paginas_sin_pausa = 0
-            
             # Verificar bloqueo
             try:
                 if self.verificar_bloqueo():
                     print("    ⚠️  Posible bloqueo detectado!")
                     print("    🔄 Resuelve el captcha en el navegador.")
-                    input("    Presiona Enter cuando esté listo...")
+                    preguntar("    Presiona Enter cuando esté listo...")
             except Exception as e:
                 if self._es_error_heap(e):
                     print(f"    🔄 Objeto corrupto detectado, renovando página...")
@@ -952,6 +1160,7 @@ class FotocasaScraperFirefox:
             try:
                 if self.verificar_sin_resultados():
                     print("    ⚠️  Página sin resultados. Fin del listado.")
+                    self.corte_marca.fin_listado = True
                     break
             except Exception as e:
                 if self._es_error_heap(e):
@@ -961,7 +1170,7 @@ class FotocasaScraperFirefox:
                     time.sleep(2)
             
             # Scrapear página actual
-            viviendas, encontrado_conocido = self.scrapear_pagina(urls_conocidas=urls_conocidas)
+            viviendas, encontrado_conocido = self.scrapear_pagina(claves_conocidas=claves_conocidas)
             
             todas_viviendas.extend(viviendas)
             print(f"[*] Total acumulado: {len(todas_viviendas)}")
@@ -971,9 +1180,9 @@ class FotocasaScraperFirefox:
                 if self.verificar_bloqueo():
                     print("    ⚠️  CAPTCHA/bloqueo detectado en esta página!")
                     print("    🔄 Resuelve el captcha en el navegador.")
-                    input("    Presiona Enter cuando esté listo...")
+                    preguntar("    Presiona Enter cuando esté listo...")
                     # Reintentar la página actual
-                    viviendas_retry, encontrado_retry = self.scrapear_pagina(urls_conocidas=urls_conocidas)
+                    viviendas_retry, encontrado_retry = self.scrapear_pagina(claves_conocidas=claves_conocidas)
                     todas_viviendas.extend(viviendas_retry)
                     print(f"[*] Total acumulado: {len(todas_viviendas)}")
                     if encontrado_retry:
@@ -990,22 +1199,24 @@ class FotocasaScraperFirefox:
             # Verificar si hay más páginas
             if paginas_procesadas >= paginas_a_scrapear:
                 print(f"\n✅ Completadas {paginas_procesadas} páginas")
+                self.corte_marca.fin_listado = paginas_a_scrapear >= total_paginas
                 break
             
-            # Reconexión preventiva cada 15 páginas (solo recicla conexión Playwright, Chrome sigue vivo)
-            if paginas_procesadas > 0 and paginas_procesadas % 15 == 0:
-                print(f"\n    🔄 Reconexión preventiva de Playwright (cada 15 páginas)...")
+            # Reconexión cuando la memoria de la página o de Playwright pasa del umbral
+            # (salud_pagina.py; sin métricas, cada 15 páginas). Chrome sigue vivo
+            motivo = self.salud.revisar()
+            if motivo:
+                print(f"\n    🔄 Reconexión preventiva de Playwright ({motivo})...")
                 url_actual = None
                 try:
                     url_actual = self.page.url
                 except:
                     pass
-                self.reconectar_playwright(url_actual)
+                self.reconectar_playwright(url_actual, motivo)
                 time.sleep(2)
             
-            # Delay antes de cambiar de página
-            delay_pagina = random.uniform(1, 2)
-            time.sleep(delay_pagina)
+            # Delay antes de cambiar de página (control_ritmo.py, con pausa larga periódica)
+            self.delay_aleatorio()
             
             # Navegar a siguiente página
             paginas_procesadas += 1
@@ -1017,48 +1228,105 @@ class FotocasaScraperFirefox:
         
         print(f"\n{'='*70}")
         print(f"  RESUMEN: {len(todas_viviendas)} particulares encontrados")
+        if self.omitidos:
+            print(f"  🔁 Omitidos (ya en otra zona o descatalogados): {self.omitidos}")
+        if self.modo_debug:
+            print(f"  Snapshot DOM: {self.snapshot.resumen()}")
         print(f"{'='*70}\n")
         
+        self.recorrer_todo = False
+        if ruta_json:
+            self.marcas_pendientes.registrar(ruta_json, clave_marca(ruta_json, fragmento),
+                                             self.corte_marca.nueva_marca(not es_url_reciente(url)), bool(todas_viviendas))
+        
         return todas_viviendas
     
+    def contar_resultados(self, url: str) -> Optional[int]:
+        """Total de resultados de una búsqueda: carga su primera página y lo lee del estado o del título"""
+        try:
+            self._ir(url)
+        except Exception as e:
+            print(f"    ⚠️  No se pudo cargar la búsqueda: {e}")
+            return None
+        self.delay_aleatorio()
+        estado = self._leer_estado_pagina()
+        total = fotocasa_estado.total_resultados(estado) if estado else None
+        return total if total is not None else total_desde_titulo(self.snapshot.html)
+    
+    def scrapear_zona(self, url: str, ubicacion: str, paginas: Optional[int] = None) -> List[Vivienda]:
+        """Rastrea una zona: cada fragmento de precio con su ventana de publicación y su marca de agua.
+        
+        Sin fragmentos_precio activo en config.json la zona es un único fragmento.
+        """
+        ruta_json = self._obtener_ruta_json_persistente(ubicacion)
+        self.marcas_pendientes.descartar(ruta_json)
+        fragmentos = fragmentos_zona('fotocasa', url, ruta_json, self.contar_resultados)
+        
+        viviendas = []
+        self.vistos_zona = set()
+        for i, fragmento in enumerate(fragmentos, 1):
+            if len(fragmentos) > 1:
+                print(f"\n🧩 Fragmento {i}/{len(fragmentos)}: {fragmento.descripcion()}")
+            url_busqueda = url_rastreo('fotocasa', url_fragmento('fotocasa', url, fragmento),
+                                       ruta_json, fragmento.nombre)
+            viviendas.extend(self.scrapear(url_busqueda, paginas, ubicacion=ubicacion, fragmento=fragmento.nombre))
+        registrar_rastreo(ruta_json, len(viviendas))
+        registrar_vistos('fotocasa', ubicacion, self.vistos_zona)
+        return viviendas
+    
     def guardar_resultados(self, viviendas: List[Vivienda], ubicacion: str, url_scrapeada: str, filename: str = None):
         """Guarda en JSON persistente por ubicación, fusionando con datos existentes.
         
         Los nuevos registros se añaden al principio (más recientes primero).
+        Con almacen.backend = "sqlite" en config.json solo se insertan los nuevos.
         """
         if not filename:
             filename = self._obtener_ruta_json_persistente(ubicacion)
         
-        # Cargar datos existentes
-        viviendas_existentes = []
-        if os.path.exists(filename):
-            try:
-                with open(filename, 'r', encoding='utf-8') as f:
-                    data_existente = json.load(f)
-                viviendas_existentes = data_existente.get('viviendas', [])
-                print(f"\n📂 Cargando JSON existente: {len(viviendas_existentes)} registros previos")
-            except Exception as e:
-                print(f"\n⚠️  Error leyendo JSON existente: {e}")
-        
-        # Fusionar: nuevos al principio, existentes después (sin duplicados)
-        urls_nuevas = {asdict(v)['url'] for v in viviendas}
-        existentes_filtrados = [v for v in viviendas_existentes if v.get('url') not in urls_nuevas]
-        todas_viviendas = [asdict(v) for v in viviendas] + existentes_filtrados
-        
-        data = {
-            "timestamp": datetime.now().isoformat(),
-            "ubicacion": ubicacion,
-            "url": url_scrapeada,
-            "total": len(todas_viviendas),
-            "viviendas": todas_viviendas
-        }
-        
-        with open(filename, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
+        almacen = abrir_almacen()
+        if almacen is not None:
+            total = almacen.guardar_zona(filename, [asdict(v) for v in viviendas],
+                                         ubicacion=ubicacion, url_busqueda=url_scrapeada)
+            print(f"💾 Resultados guardados en: {almacen.ruta} ({filename})")
+            print(f"   Nuevos añadidos: {len(viviendas)}")
+            print(f"   Total registros: {total}")
+            abrir_indice().registrar(v.url for v in viviendas)
+            self.marcas_pendientes.confirmar(filename)
+            self._subir_a_api(almacen.exportar_zona(filename))
+            return filename
+        
+        with bloqueo_zona(filename):
+            # Cargar datos existentes
+            viviendas_existentes = []
+            if os.path.exists(filename):
+                try:
+                    with open(filename, 'r', encoding='utf-8') as f:
+                        data_existente = json.load(f)
+                    viviendas_existentes = data_existente.get('viviendas', [])
+                    print(f"\n📂 Cargando JSON existente: {len(viviendas_existentes)} registros previos")
+                except Exception as e:
+                    print(f"\n⚠️  Error leyendo JSON existente: {e}")
+        
+            # Fusionar: nuevos al principio, existentes después (sin duplicados)
+            urls_nuevas = {asdict(v)['url'] for v in viviendas}
+            existentes_filtrados = [v for v in viviendas_existentes if v.get('url') not in urls_nuevas]
+            todas_viviendas = [asdict(v) for v in viviendas] + existentes_filtrados
+        
+            data = {
+                "timestamp": datetime.now().isoformat(),
+                "ubicacion": ubicacion,
+                "url": url_scrapeada,
+                "total": len(todas_viviendas),
+                "viviendas": todas_viviendas
+            }
+        
+            escribir_json_atomico(filename, data)
         
         print(f"💾 Resultados guardados en: {filename}")
         print(f"   Nuevos añadidos: {len(viviendas)}")
         print(f"   Total registros: {len(todas_viviendas)}")
+        abrir_indice().registrar(v.url for v in viviendas)
+        self.marcas_pendientes.confirmar(filename)
         
         # Subir a la API
         self._subir_a_api(data)
@@ -1232,7 +1500,7 @@ def main():
             print(f"  📅 Ordenado por fecha de publicación (más recientes primero)")
             print(f"{'='*70}")
             
-            viviendas = scraper.scrapear(url, paginas, ubicacion=nombre)
+            viviendas = scraper.scrapear_zona(url, nombre, paginas)
             
             # Guardar resultados de esta URL
             if viviendas:
@@ -1241,18 +1509,17 @@ def main():
                 print(f"\n⚠️  No se encontraron viviendas nuevas de particulares en {nombre}")
                 # Subir JSON existente a la API igualmente
                 ruta_json = scraper._obtener_ruta_json_persistente(nombre)
-                if os.path.exists(ruta_json):
-                    try:
-                        with open(ruta_json, 'r', encoding='utf-8') as f:
-                            data_existente = json.load(f)
+                try:
+                    data_existente = leer_zona(ruta_json)
+                    if data_existente:
                         print(f"☁️  Subiendo JSON existente ({data_existente.get('total', 0)} registros) a la API...")
                         FotocasaScraperFirefox._subir_a_api(data_existente)
-                    except Exception as e:
-                        print(f"⚠️  Error al leer JSON existente para subir: {e}")
+                except Exception as e:
+                    print(f"⚠️  Error al leer JSON existente para subir: {e}")
             
             if i < len(urls_a_procesar):
                 print("\n⏳ Esperando antes de la siguiente URL...")
-                time.sleep(random.uniform(5, 10))
+                time.sleep(ritmo_portal('fotocasa').descanso())
         
     finally:
         scraper.cerrar_navegador()
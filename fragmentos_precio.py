@@ -0,0 +1,238 @@
+"""
+Fragmentos de precio para zonas más grandes que la paginación del portal
+Los portales solo sirven un número máximo de páginas por búsqueda: en zonas
+grandes (Barcelona - Eixample, áreas por shape) el final del listado se corta.
+El planificador lee el total de resultados de la primera página y, si supera
+la capacidad (máximo de páginas x anuncios por página x margen), divide la
+zona en franjas de precio por bisección, sondeando el total de cada mitad,
+hasta que todas caben. Cada fragmento se rastrea como una búsqueda
+independiente con su propia marca de agua (marca_agua.clave_marca), así que
+un fragmento sin novedades se despacha en la primera página.
+
+El plan de cada zona se guarda en fragmentos_precio.json, junto a los JSON de
+las zonas, y se reutiliza hasta que caduca.
+
+Configuración en config.json (desactivado por defecto):
+    "fragmentos_precio": {
+        "activo": true,
+        "max_paginas": {"idealista": 60, "fotocasa": 100},
+        "margen": 0.8,
+        "caducidad_horas": 168
+    }
+"""
+
+import json
+import os
+import re
+import threading
+from dataclasses import asdict, dataclass
+from datetime import datetime, timedelta
+from typing import Callable, List, Optional
+
+from escritura_atomica import bloqueo_archivo, escribir_json_atomico
+from ventana_reciente import url_fotocasa_parametros, url_idealista_filtros
+
+
+ARCHIVO_FRAGMENTOS = 'fragmentos_precio.json'
+
+ANUNCIOS_POR_PAGINA = 30
+
+CONFIG_POR_DEFECTO = {
+    'activo': False,
+    'max_paginas': {'idealista': 60, 'fotocasa': 100},
+    'margen': 0.8,
+    'caducidad_horas': 24 * 7,
+}
+
+# Primer corte de la franja abierta, último corte posible y anchura mínima de una franja (euros)
+PRECIO_CORTE_INICIAL = 200000
+PRECIO_CORTE_MAXIMO = 20000000
+PASO_MINIMO = 5000
+
+# Límites de la bisección: cada sondeo es una página cargada en el portal
+MAX_PROFUNDIDAD = 12
+MAX_SONDEOS = 40
+
+# "1.793 Viviendas y casas en venta en Gironès" (h1 del listado en ambos portales)
+PATRON_TOTAL_TITULO = re.compile(r'<h1[^>]*>\s*(?:<[^>]+>\s*)*(\d{1,3}(?:\.\d{3})*|\d+)\s')
+
+
+@dataclass
+class Fragmento:
+    """Franja de precio [desde, hasta) en euros; hasta None = sin límite superior"""
+    desde: int = 0
+    hasta: Optional[int] = None
+    total: Optional[int] = None
+
+    @property
+    def completo(self) -> bool:
+        """True si no filtra por precio (la zona entera)"""
+        return self.desde == 0 and self.hasta is None
+
+    @property
+    def nombre(self) -> Optional[str]:
+        """Identificador del fragmento para su marca de agua (None para la zona entera)"""
+        if self.completo:
+            return None
+        return f"precio-{self.desde}-{self.hasta - 1 if self.hasta else ''}"
+
+    def descripcion(self) -> str:
+        if self.hasta is None:
+            return f"desde {self.desde:,} €".replace(',', '.')
+        return f"{self.desde:,} - {self.hasta - 1:,} €".replace(',', '.')
+
+
+def url_fragmento(portal: str, url: str, fragmento: Fragmento) -> str:
+    """URL de búsqueda restringida a la franja de precio (límites inclusivos en el portal)"""
+    if fragmento.completo:
+        return url
+    if portal == 'idealista':
+        filtros = [f"precio-desde_{fragmento.desde}"] if fragmento.desde else []
+        if fragmento.hasta is not None:
+            filtros.append(f"precio-hasta_{fragmento.hasta - 1}")
+        return url_idealista_filtros(url, filtros)
+    parametros = {'minPrice': fragmento.desde} if fragmento.desde else {}
+    if fragmento.hasta is not None:
+        parametros['maxPrice'] = fragmento.hasta - 1
+    return url_fotocasa_parametros(url, parametros)
+
+
+def total_desde_titulo(html: str) -> Optional[int]:
+    """Total de resultados del título del listado, o None si no aparece"""
+    match = PATRON_TOTAL_TITULO.search(html or '')
+    return int(match.group(1).replace('.', '')) if match else None
+
+
+def _partir(fragmento: Fragmento) -> Optional[int]:
+    """Precio de corte de la franja, o None si ya es demasiado estrecha"""
+    if fragmento.hasta is None:
+        corte = max(2 * fragmento.desde, PRECIO_CORTE_INICIAL)
+        return corte if corte <= PRECIO_CORTE_MAXIMO else None
+    if fragmento.hasta - fragmento.desde < 2 * PASO_MINIMO:
+        return None
+    medio = (fragmento.desde + fragmento.hasta) // 2
+    return medio - medio % PASO_MINIMO or PASO_MINIMO
+
+
+def planificar(contar: Callable[[Fragmento], Optional[int]], capacidad: int,
+               total: Optional[int] = None) -> List[Fragmento]:
+    """Divide por bisección hasta que cada franja tiene como mucho capacidad resultados.
+
+    contar(fragmento) sondea el total de una franja (una página cargada). Una
+    franja que no se puede estrechar más, o cuyo total no se puede leer, se
+    queda tal cual; las vacías se descartan (si una mitad sale vacía se sigue
+    partiendo la otra). También se queda tal cual si el filtro de precio se
+    ignora (las dos mitades con el total de la franja), a MAX_PROFUNDIDAD
+    cortes o cuando se agotan los MAX_SONDEOS.
+    Retorna las franjas ordenadas por precio.
+    """
+    sondeos = 0
+    if total is None:
+        total = contar(Fragmento())
+        sondeos += 1
+    pendientes = [(Fragmento(total=total), 0)]
+    fragmentos = []
+    while pendientes:
+        fragmento, profundidad = pendientes.pop()
+        corte = None
+        if (fragmento.total is not None and fragmento.total > capacidad
+                and profundidad < MAX_PROFUNDIDAD and sondeos + 2 <= MAX_SONDEOS):
+            corte = _partir(fragmento)
+        mitades = []
+        if corte is not None:
+            mitades = [Fragmento(fragmento.desde, corte), Fragmento(corte, fragmento.hasta)]
+            for mitad in mitades:
+                mitad.total = contar(mitad)
+                sondeos += 1
+            if all(mitad.total == fragmento.total for mitad in mitades):
+                mitades = []
+            else:
+                mitades = [mitad for mitad in mitades if mitad.total != 0]
+        if not mitades:
+            if fragmento.total != 0:
+                fragmentos.append(fragmento)
+            continue
+        pendientes.extend((mitad, profundidad + 1) for mitad in mitades)
+    return sorted(fragmentos, key=lambda f: f.desde) or [Fragmento()]
+
+
+def cargar_config_fragmentos(config_file: str = "config.json") -> dict:
+    """Sección "fragmentos_precio" de config.json con los valores por defecto"""
+    config = dict(CONFIG_POR_DEFECTO)
+    try:
+        with open(config_file, 'r', encoding='utf-8') as f:
+            config.update(json.load(f).get('fragmentos_precio', {}))
+    except (OSError, ValueError, AttributeError):
+        pass
+    return config
+
+
+def _ruta_planes(ruta_json: str) -> str:
+    return os.path.join(os.path.dirname(os.path.abspath(ruta_json)), ARCHIVO_FRAGMENTOS)
+
+
+def _leer_planes(ruta: str) -> dict:
+    try:
+        with open(ruta, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+_lock_planes = threading.Lock()
+
+
+def guardar_plan(ruta_json: str, fragmentos: List[Fragmento]) -> None:
+    """Guarda el plan de la zona en fragmentos_precio.json (escritura atómica)"""
+    ruta = _ruta_planes(ruta_json)
+    with _lock_planes, bloqueo_archivo(ruta):
+        planes = _leer_planes(ruta)
+        planes[os.path.basename(ruta_json)] = {
+            'timestamp': datetime.now().isoformat(),
+            'fragmentos': [asdict(f) for f in fragmentos],
+        }
+        escribir_json_atomico(ruta, planes)
+
+
+def cargar_plan(ruta_json: str, caducidad_horas: float, ahora: datetime = None) -> Optional[List[Fragmento]]:
+    """Plan guardado de la zona, o None si no hay o ha caducado"""
+    plan = _leer_planes(_ruta_planes(ruta_json)).get(os.path.basename(ruta_json))
+    if not plan:
+        return None
+    try:
+        antiguedad = (ahora or datetime.now()) - datetime.fromisoformat(plan['timestamp'])
+        fragmentos = [Fragmento(**f) for f in plan['fragmentos']]
+    except (KeyError, TypeError, ValueError):
+        return None
+    if antiguedad >= timedelta(hours=caducidad_horas) or not fragmentos:
+        return None
+    return fragmentos
+
+
+def fragmentos_zona(portal: str, url: str, ruta_json: str,
+                    contar_url: Callable[[str], Optional[int]],
+                    config_file: str = "config.json") -> List[Fragmento]:
+    """Fragmentos a rastrear de la zona: el plan guardado, uno nuevo o la zona entera.
+
+    contar_url(url) carga la URL en el navegador y lee el total de resultados.
+    """
+    config = cargar_config_fragmentos(config_file)
+    if not config.get('activo'):
+        return [Fragmento()]
+
+    fragmentos = cargar_plan(ruta_json, config['caducidad_horas'])
+    if fragmentos is not None:
+        if len(fragmentos) > 1:
+            print(f"    🧩 Plan de fragmentos de precio guardado: {len(fragmentos)} fragmentos")
+        return fragmentos
+
+    capacidad = int(config['max_paginas'].get(portal, CONFIG_POR_DEFECTO['max_paginas'][portal])
+                    * ANUNCIOS_POR_PAGINA * config['margen'])
+    print(f"    🧩 Planificando fragmentos de precio (máx. {capacidad} resultados por búsqueda)...")
+    fragmentos = planificar(lambda f: contar_url(url_fragmento(portal, url, f)), capacidad)
+    for fragmento in fragmentos:
+        print(f"       {fragmento.descripcion()}: {fragmento.total if fragmento.total is not None else '?'} resultados")
+    # Un total sin leer (captcha, página vacía) no se guarda: se vuelve a planificar la próxima vez
+    if all(f.total is not None for f in fragmentos):
+        guardar_plan(ruta_json, fragmentos)
+    return fragmentos
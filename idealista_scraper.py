@@ -10,21 +10,195 @@ import time
 import random
 from typing import List, Optional
 from datetime import datetime
-from bs4 import BeautifulSoup
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import TimeoutException, NoSuchElementException, NoAlertPresentException, UnexpectedAlertPresentException
 
 from base_scraper import BaseScraper, Vivienda
+from almacen_viviendas import abrir_almacen, leer_zona, leer_marca_agua
+from indice_global import abrir_indice
+from lapidas import abrir_lapidas
+from marca_agua import CorteMarcaAgua, MarcaAgua, clave_marca, tolerancia_ids
+from fragmentos_precio import fragmentos_zona, total_desde_titulo, url_fragmento
+from ventana_reciente import es_rastreo_completo, es_url_reciente, url_rastreo
+from planificador_zonas import registrar_rastreo
+from analizar_zonas import registrar_vistos
+from parser_idealista import PaginaListado, parsear_listado, motor_por_defecto, extraer_utag_data
+from clasificador_anunciante import ClasificadorAnunciante
+import captura_telefono
+from consola import preguntar
+import telefonos
+
+
+# Campos de un particular del listado (registro compacto -> Vivienda)
+CAMPOS_PARTICULAR = ('id', 'url', 'titulo', 'precio', 'habitaciones', 'metros', 'ubicacion', 'descripcion')
+
+# Extractor del listado: un registro por anuncio de utag_data (en orden). Los datos
+# visibles solo se leen del DOM para los particulares. Replica parser_idealista:
+# textoPlano() equivale a get_text(strip=True).
+EXTRACTOR_JS = r"""
+function () {
+    if (typeof utag_data === 'undefined' || !utag_data || !utag_data.list || !utag_data.list.ads) {
+        return null;
+    }
+    var textoPlano = function (el) {
+        var partes = [];
+        var walker = document.createTreeWalker(el, NodeFilter.SHOW_TEXT, {
+            acceptNode: function (nodo) {
+                for (var p = nodo.parentNode; p && p !== el.parentNode; p = p.parentNode) {
+                    if (/^(SCRIPT|STYLE|TEMPLATE)$/.test(p.nodeName)) return NodeFilter.FILTER_REJECT;
+                }
+                return NodeFilter.FILTER_ACCEPT;
+            }
+        });
+        while (walker.nextNode()) {
+            var t = walker.currentNode.nodeValue.trim();
+            if (t) partes.push(t);
+        }
+        return partes.join('');
+    };
+    var formatearPrecio = function (valor) {
+        return Math.round(valor).toString().replace(/\B(?=(\d{3})+(?!\d))/g, '.') + '€';
+    };
+    return utag_data.list.ads.map(function (ad) {
+        var id = String(ad.adId !== undefined ? ad.adId : '');
+        var owner = String((ad.owner && ad.owner.type !== undefined) ? ad.owner.type : '');
+        var reg = {id: id, url: 'https://www.idealista.com/inmueble/' + id + '/',
+                   particular: owner === '1', owner_type: owner};
+        if (!reg.particular) return reg;
+
+        var art = document.querySelector('article[data-element-id="' + id + '"]');
+        if (art) {
+            var link = art.querySelector('a.item-link');
+            reg.titulo = (link && link.hasAttribute('title')) ? link.getAttribute('title') : 'Sin título';
+            var precio = art.querySelector('span.item-price');
+            reg.precio = precio ? textoPlano(precio) : 'N/A';
+            reg.habitaciones = null;
+            reg.metros = null;
+            art.querySelectorAll('span.item-detail').forEach(function (d) {
+                var t = textoPlano(d);
+                if (t.indexOf('hab.') !== -1) reg.habitaciones = t;
+                else if (t.indexOf('m²') !== -1) reg.metros = t;
+            });
+            var desc = art.querySelector('div.item-description');
+            reg.descripcion = desc ? textoPlano(desc) : null;
+            var coma = reg.titulo.indexOf(',');
+            reg.ubicacion = coma !== -1 ? reg.titulo.slice(coma + 1).trim() : '';
+        } else {
+            // Fallback: datos mínimos de utag_data
+            reg.titulo = ('title' in ad) ? ad.title : 'Sin título';
+            reg.precio = (typeof ad.price === 'number') ? formatearPrecio(ad.price)
+                       : String(('price' in ad) ? ad.price : 'N/A');
+            reg.habitaciones = ad.rooms ? ad.rooms + ' hab.' : null;
+            reg.metros = ad.size ? ad.size + ' m²' : null;
+            reg.ubicacion = ('address' in ad) ? ad.address : (('neighborhood' in ad) ? ad.neighborhood : '');
+            reg.descripcion = ('description' in ad) ? ad.description : null;
+        }
+        return reg;
+    });
+}
+"""
+
+# utag_data desde el contexto de la página (se serializa solo el objeto, no el HTML)
+JS_UTAG_DATA = "return (typeof utag_data !== 'undefined' && utag_data) ? utag_data : null;"
+
+# outerHTML de los article indicados: {adId: html}
+JS_ARTICULOS_POR_ID = """
+var resultado = {};
+arguments[0].forEach(function(id) {
+    var art = document.querySelector('article[data-element-id="' + id + '"]');
+    if (art) resultado[id] = art.outerHTML;
+});
+return resultado;
+"""
+
+# Teléfonos del listado en lote (execute_async_script): pool de promesas con
+# concurrencia limitada contra la API de contacto y arranques espaciados con el
+# ritmo de la API (control_ritmo). Devuelve {adId: data} para las respuestas OK
+# y null para las demás; un 403/429 o una página de captcha se marca con
+# MARCA_BLOQUEO y no arranca ninguna petición más. Los IDs sin teléfono se
+# resuelven con clic (salvo bloqueo).
+CONCURRENCIA_TELEFONOS = 4
+TIMEOUT_TELEFONO_MS = 8000
+MARCA_BLOQUEO = 'BLOCKED:'
+JS_TELEFONOS_LOTE = """
+var ids = arguments[0], concurrencia = arguments[1], timeoutMs = arguments[2];
+var espaciadoMin = arguments[3], espaciadoMax = arguments[4];
+var listo = arguments[arguments.length - 1];
+var resultado = {};
+var pendientes = ids.slice();
+var siguiente = 0;
+var bloqueado = false;
+
+function dormir(ms) {
+    return new Promise(function(r) { setTimeout(r, ms); });
+}
+
+function pedir(id) {
+    var control = new AbortController();
+    var temporizador = setTimeout(function() { control.abort(); }, timeoutMs);
+    return fetch('/es/ajax/listingController/adContactInfoForDetail.ajax?adId=' + id, {
+        method: 'GET',
+        credentials: 'include',
+        headers: {'X-Requested-With': 'XMLHttpRequest'},
+        signal: control.signal
+    }).then(function(r) {
+        return r.text().then(function(t) {
+            var inicio = t.slice(0, 3000).toLowerCase();
+            if (r.status === 403 || r.status === 429 || inicio.indexOf('please enable js') >= 0 ||
+                    inicio.indexOf('var dd=') >= 0 || inicio.indexOf('_cf_chl') >= 0) {
+                bloqueado = true;
+                resultado[id] = '""" + MARCA_BLOQUEO + """';
+                return;
+            }
+            var json = r.ok ? JSON.parse(t) : null;
+            resultado[id] = (json && json.result === 'OK' && json.data) ? json.data : null;
+        });
+    }).catch(function() {
+        resultado[id] = null;
+    }).then(function() {
+        clearTimeout(temporizador);
+    });
+}
+
+function trabajador() {
+    if (!pendientes.length || bloqueado) return Promise.resolve();
+    var id = pendientes.shift();
+    var ahora = Date.now();
+    var espera = Math.max(0, siguiente - ahora);
+    siguiente = Math.max(siguiente, ahora) + espaciadoMin + Math.random() * (espaciadoMax - espaciadoMin);
+    return dormir(espera).then(function() {
+        return bloqueado ? null : pedir(id);
+    }).then(trabajador);
+}
+
+var trabajadores = [];
+for (var i = 0; i < Math.min(concurrencia, ids.length); i++) trabajadores.push(trabajador());
+Promise.all(trabajadores).then(function() { listo(resultado); });
+"""
 
 
 class IdealistaScraper(BaseScraper):
     """Scraper específico para el portal Idealista"""
     
-    def __init__(self, modo_debug=False, usar_rotacion_ip=False, vpn_provider=None, search_url=None):
+    def __init__(self, modo_debug=False, usar_rotacion_ip=False, vpn_provider=None, search_url=None,
+                 motor_html=None):
         super().__init__(modo_debug, usar_rotacion_ip, vpn_provider)
         self.search_url = search_url or "https://www.idealista.com/venta-viviendas/barcelona/anoia/"
+        # Motor para parsear listados: 'lxml' (si está instalado) o 'bs4'
+        self.motor_html = motor_html or motor_por_defecto()
+        # Clasificador particular/inmobiliaria (patrones compilados una sola vez)
+        self.clasificador = ClasificadorAnunciante()
+        # Particulares vistos en el listado de la zona en curso, omitidos incluidos (analizar_zonas.py)
+        self.vistos_zona = set()
+    
+    def conectar_chrome(self, pestana_nueva: bool = False):
+        """Conecta al Chrome en modo debug y registra los interceptores de teléfono"""
+        if not super().conectar_chrome(pestana_nueva):
+            return False
+        captura_telefono.registrar_hooks_telefono(self.driver)
+        return True
     
     def get_portal_name(self) -> str:
         return "Idealista"
@@ -40,7 +214,14 @@ class IdealistaScraper(BaseScraper):
     
     @staticmethod
     def _cargar_json_existente(ruta_json: str) -> dict:
-        """Carga el JSON existente y devuelve {data, urls_conocidas}."""
+        """Carga el JSON existente y devuelve {data, urls_conocidas}.
+        Con el almacén SQLite solo se consultan las URLs (data es None)."""
+        almacen = abrir_almacen()
+        if almacen is not None:
+            urls = almacen.urls_conocidas(ruta_json)
+            print(f"\n📂 Zona cargada del almacén: {ruta_json}")
+            print(f"   {len(urls)} viviendas ya registradas")
+            return {'data': None, 'urls_conocidas': urls}
         if not os.path.exists(ruta_json):
             return {'data': None, 'urls_conocidas': set()}
         try:
@@ -65,105 +246,20 @@ class IdealistaScraper(BaseScraper):
         else:
             return f"{url}?{param}"
     
-    def es_particular(self, html_texto: str) -> tuple[bool, str]:
+    def es_particular(self, html_texto) -> tuple[bool, str]:
         """
         Detecta si es particular usando múltiples señales específicas de Idealista
+        Acepta el elemento ya parseado (bs4/lxml) o, por compatibilidad, HTML en texto
         Retorna: (es_particular: bool, tipo: str)
         """
-        texto = html_texto.lower()
-        score = 0
-        
-        # Palabras clave fuertes de particular (+3 puntos)
-        palabras_particular_fuertes = [
-            'particular', 'propietario', 'dueño directo', 'vendo mi piso',
-            'vendo mi casa', 'sin comisión', 'sin intermediarios', 'trato directo',
-            'abstenerse agencias', 'no agencias'
-        ]
-        for palabra in palabras_particular_fuertes:
-            if palabra in texto:
-                score += 3
-                if self.modo_debug:
-                    print(f"      [DEBUG] +3 por '{palabra}'")
-        
-        # Palabras clave medias de particular (+2 puntos)
-        palabras_particular_medias = ['vendo', 'vendedor', 'contacto directo', 'llamar al propietario']
-        for palabra in palabras_particular_medias:
-            if palabra in texto:
-                score += 2
-                if self.modo_debug:
-                    print(f"      [DEBUG] +2 por '{palabra}'")
-        
-        # Palabras clave fuertes de inmobiliaria (-4 puntos)
-        palabras_inmobiliaria_fuertes = [
-            'inmobiliaria', 'agencia', 'real estate', 'professional',
-            'red inmobiliaria', 'grupo inmobiliario', 'consultoría inmobiliaria',
-            'franquicia', 'remax', 'century 21', 'engel', 'tecnocasa',
-            'comprarcasa', 'donpiso'
-        ]
-        for palabra in palabras_inmobiliaria_fuertes:
-            if palabra in texto:
-                score -= 4
-                if self.modo_debug:
-                    print(f"      [DEBUG] -4 por '{palabra}'")
-        
-        # Palabras medias de inmobiliaria (-2 puntos)
-        palabras_inmobiliaria_medias = [
-            'honorarios', 'comisión del', 'nuestros servicios', 'visítenos',
-            'cartera de', 'profesional del sector', 'años de experiencia',
-            'equipo de profesionales'
-        ]
-        for palabra in palabras_inmobiliaria_medias:
-            if palabra in texto:
-                score -= 2
-                if self.modo_debug:
-                    print(f"      [DEBUG] -2 por '{palabra}'")
-        
-        # Clases CSS específicas de Idealista
-        if 'professional-contact' in texto:
-            score -= 5
-            if self.modo_debug:
-                print(f"      [DEBUG] -5 por clase 'professional-contact'")
-        
-        if 'professional-logo' in texto:
-            score -= 5
-            if self.modo_debug:
-                print(f"      [DEBUG] -5 por clase 'professional-logo'")
-        
-        if 'owner-contact' in texto or 'particular-contact' in texto:
-            score += 5
-            if self.modo_debug:
-                print(f"      [DEBUG] +5 por clase de particular")
-        
-        # Análisis del nombre del anunciante
-        soup = BeautifulSoup(html_texto, 'html.parser')
-        anunciante_elem = (
-            soup.find('div', class_='advertiser-name') or
-            soup.find('span', class_='professional-name') or
-            soup.find('div', class_='item-multimedia-container')
-        )
-        
-        if anunciante_elem:
-            nombre_anunciante = anunciante_elem.get_text(strip=True).lower()
-            
-            if any(palabra in nombre_anunciante for palabra in ['s.l.', 's.a.', 'inmobiliaria', 'properties', 'homes', 'real estate']):
-                score -= 6
-                if self.modo_debug:
-                    print(f"      [DEBUG] -6 por nombre empresarial: {nombre_anunciante[:30]}")
-            
-            elif len(nombre_anunciante.split()) <= 3 and nombre_anunciante.replace(' ', '').isalpha():
-                score += 3
-                if self.modo_debug:
-                    print(f"      [DEBUG] +3 por nombre personal: {nombre_anunciante}")
+        resultado = self.clasificador.clasificar(html_texto)
         
         if self.modo_debug:
-            print(f"      [DEBUG] Score final: {score}")
+            for senal, peso in resultado.senales:
+                print(f"      [DEBUG] {peso:+d} por '{senal}'")
+            print(f"      [DEBUG] Score final: {resultado.score}")
         
-        if score >= 3:
-            return True, "Particular"
-        elif score <= -3:
-            return False, "Inmobiliaria"
-        else:
-            return False, "Desconocido" if score == 0 else f"Incierto (score: {score})"
+        return resultado.es_particular, resultado.tipo
     
     def _extraer_telefono_detalle(self) -> Optional[str]:
         """
@@ -171,15 +267,19 @@ class IdealistaScraper(BaseScraper):
         
         Estrategia multicapa:
         1. Verificar si ya hay un enlace tel: visible
-        2. Inyectar interceptores (setAttribute, href setter, XHR, fetch, MutationObserver)
+        2. Interceptores (setAttribute, href setter, XHR, fetch, MutationObserver) ya
+           registrados como script de nuevo documento (captura_telefono)
         3. Hacer clic JS en el botón "Llamar"
-        4. Esperar y comprobar todas las fuentes de datos
+        4. Esperar la captura (promesa en la página) y comprobar el DOM
         5. Segundo clic si el primero solo prepara el botón
         6. Llamada directa a API de Idealista como último recurso
         7. Validación estricta final: nunca devolver texto sin >= 7 dígitos
         """
         telefono = None
         
+        # Los clics e interceptores modifican el DOM: el snapshot deja de ser válido
+        self.snapshot.invalidar()
+        
         try:
             # ── Paso 1: ¿Ya hay un enlace tel: visible? ──
             try:
@@ -224,162 +324,11 @@ class IdealistaScraper(BaseScraper):
             self.driver.execute_script("arguments[0].scrollIntoView({block: 'center'});", phone_button)
             time.sleep(0.5)
             
-            # ── Paso 3: Inyectar interceptores comprehensivos ──
-            self.driver.execute_script("""
-                window.__capturedPhone = null;
-                window.__phoneAjaxResponse = null;
-                
-                // A) Override setAttribute
-                if (!window.__origSetAttribute) {
-                    window.__origSetAttribute = Element.prototype.setAttribute;
-                    Element.prototype.setAttribute = function(name, value) {
-                        if (name === 'href' && value && typeof value === 'string' && value.startsWith('tel:')) {
-                            window.__capturedPhone = value;
-                            return;
-                        }
-                        return window.__origSetAttribute.call(this, name, value);
-                    };
-                }
-                
-                // B) Override href property setter
-                if (!window.__hrefOverridden) {
-                    window.__hrefOverridden = true;
-                    var desc = Object.getOwnPropertyDescriptor(HTMLAnchorElement.prototype, 'href');
-                    if (desc && desc.set) {
-                        window.__origHrefSet = desc.set;
-                        window.__origHrefGet = desc.get;
-                        Object.defineProperty(HTMLAnchorElement.prototype, 'href', {
-                            set: function(val) {
-                                if (val && typeof val === 'string' && val.startsWith('tel:')) {
-                                    window.__capturedPhone = val;
-                                    return;
-                                }
-                                window.__origHrefSet.call(this, val);
-                            },
-                            get: function() { return window.__origHrefGet.call(this); },
-                            configurable: true
-                        });
-                    }
-                }
-                
-                // C) Interceptar XHR
-                if (!window.__xhrIntercepted) {
-                    window.__xhrIntercepted = true;
-                    var OrigOpen = XMLHttpRequest.prototype.open;
-                    var OrigSend = XMLHttpRequest.prototype.send;
-                    XMLHttpRequest.prototype.open = function(method, url) {
-                        this.__reqUrl = url;
-                        return OrigOpen.apply(this, arguments);
-                    };
-                    XMLHttpRequest.prototype.send = function() {
-                        var xhr = this;
-                        this.addEventListener('load', function() {
-                            if (xhr.__reqUrl) {
-                                var u = xhr.__reqUrl.toLowerCase();
-                                if (u.includes('phone') || u.includes('contact') || 
-                                    u.includes('getphones') || u.includes('telefon')) {
-                                    window.__phoneAjaxResponse = xhr.responseText;
-                                }
-                                if (xhr.responseText && xhr.responseText.includes('tel:')) {
-                                    window.__phoneAjaxResponse = xhr.responseText;
-                                }
-                            }
-                        });
-                        return OrigSend.apply(this, arguments);
-                    };
-                }
-                
-                // D) Interceptar fetch
-                if (!window.__fetchIntercepted) {
-                    window.__fetchIntercepted = true;
-                    var origFetch = window.fetch;
-                    window.fetch = function(input, init) {
-                        var url = (typeof input === 'string') ? input : (input && input.url ? input.url : '');
-                        return origFetch.apply(this, arguments).then(function(response) {
-                            if (url) {
-                                var lower = url.toLowerCase();
-                                if (lower.includes('phone') || lower.includes('contact') || 
-                                    lower.includes('getphones') || lower.includes('telefon')) {
-                                    response.clone().text().then(function(text) {
-                                        window.__phoneAjaxResponse = text;
-                                    });
-                                }
-                            }
-                            return response;
-                        });
-                    };
-                }
-                
-                // E) MutationObserver
-                if (window.__telObserver) {
-                    try { window.__telObserver.disconnect(); } catch(e) {}
-                }
-                window.__telObserver = new MutationObserver(function(mutations) {
-                    mutations.forEach(function(m) {
-                        if (m.type === 'attributes' && m.attributeName === 'href') {
-                            var href = m.target.getAttribute('href');
-                            if (href && href.startsWith('tel:')) {
-                                window.__capturedPhone = href;
-                                m.target.removeAttribute('href');
-                            }
-                        }
-                        if (m.type === 'childList') {
-                            m.addedNodes.forEach(function(node) {
-                                if (node.nodeType !== 1) return;
-                                var els = [node];
-                                if (node.querySelectorAll) {
-                                    els = els.concat(Array.from(node.querySelectorAll('a[href^="tel:"]')));
-                                }
-                                els.forEach(function(el) {
-                                    if (el.tagName === 'A') {
-                                        var h = el.getAttribute('href');
-                                        if (h && h.startsWith('tel:')) {
-                                            window.__capturedPhone = h;
-                                            el.removeAttribute('href');
-                                        }
-                                    }
-                                });
-                            });
-                        }
-                        if (m.type === 'childList' || m.type === 'characterData') {
-                            var target = m.target;
-                            if (target && target.textContent) {
-                                var match = target.textContent.match(/(\\+34[\\s]?[6789]\\d{2}[\\s]?\\d{3}[\\s]?\\d{3})/);
-                                if (!match) match = target.textContent.match(/([6789]\\d{2}[\\s]?\\d{2}[\\s]?\\d{2}[\\s]?\\d{2})/);
-                                if (match && !window.__capturedPhone) {
-                                    window.__capturedPhone = 'tel:' + match[1];
-                                }
-                            }
-                        }
-                    });
-                });
-                window.__telObserver.observe(document.body, {
-                    attributes: true, childList: true, subtree: true,
-                    characterData: true, attributeFilter: ['href']
-                });
-                
-                // F) Click interceptor
-                if (window.__telClickHandler) {
-                    document.removeEventListener('click', window.__telClickHandler, true);
-                }
-                window.__telClickHandler = function(e) {
-                    var a = e.target.closest ? e.target.closest('a') : e.target;
-                    if (a && a.getAttribute) {
-                        var href = a.getAttribute('href');
-                        if (href && href.startsWith('tel:')) {
-                            window.__capturedPhone = href;
-                            e.preventDefault();
-                            e.stopPropagation();
-                            e.stopImmediatePropagation();
-                            a.removeAttribute('href');
-                        }
-                    }
-                };
-                document.addEventListener('click', window.__telClickHandler, true);
-            """)
+            # ── Paso 3: Interceptores registrados una vez por sesión (nuevo documento) ──
+            captura_telefono.registrar_hooks_telefono(self.driver)
             
             if self.modo_debug:
-                print("      [DEBUG] Interceptores inyectados, haciendo clic...")
+                print("      [DEBUG] Interceptores listos, haciendo clic...")
             
             # ── Paso 4: Primer clic ──
             telefono = self._hacer_clic_y_capturar(phone_button)
@@ -403,19 +352,8 @@ class IdealistaScraper(BaseScraper):
             if not telefono:
                 telefono = self._intentar_api_telefono_directa()
             
-            # Limpieza
-            try:
-                self.driver.execute_script("""
-                    if (window.__telObserver) window.__telObserver.disconnect();
-                    if (window.__telClickHandler) document.removeEventListener('click', window.__telClickHandler, true);
-                    if (window.__origSetAttribute) { Element.prototype.setAttribute = window.__origSetAttribute; window.__origSetAttribute = null; }
-                    if (window.__origHrefSet) {
-                        Object.defineProperty(HTMLAnchorElement.prototype, 'href', { set: window.__origHrefSet, get: window.__origHrefGet, configurable: true });
-                        window.__origHrefSet = null;
-                    }
-                """)
-            except:
-                pass
+            # Desarmar interceptores (siguen registrados para la próxima página)
+            captura_telefono.desarmar(self.driver)
                     
         except UnexpectedAlertPresentException:
             try:
@@ -435,21 +373,14 @@ class IdealistaScraper(BaseScraper):
         return self._validar_telefono_final(telefono)
     
     def _hacer_clic_y_capturar(self, phone_button) -> Optional[str]:
-        """Hace clic en el botón de teléfono y comprueba todas las fuentes de captura."""
+        """Hace clic en el botón de teléfono y espera a que los interceptores lo capturen.
+        
+        La página resuelve una promesa en cuanto captura un tel: o una respuesta
+        AJAX de contacto; no hay sondeo periódico desde Python.
+        """
+        captura = None
         try:
-            self.driver.execute_script("""
-                var btn = arguments[0];
-                var rect = btn.getBoundingClientRect();
-                var x = rect.left + rect.width / 2;
-                var y = rect.top + rect.height / 2;
-                ['pointerdown', 'mousedown', 'pointerup', 'mouseup', 'click'].forEach(function(type) {
-                    var evt = new MouseEvent(type, {
-                        bubbles: true, cancelable: true, view: window,
-                        clientX: x, clientY: y, button: 0, buttons: 1
-                    });
-                    btn.dispatchEvent(evt);
-                });
-            """, phone_button)
+            captura = captura_telefono.clic_y_esperar(self.driver, phone_button)
         except UnexpectedAlertPresentException:
             try:
                 alert = self.driver.switch_to.alert
@@ -464,59 +395,64 @@ class IdealistaScraper(BaseScraper):
             if self.modo_debug:
                 print(f"      [DEBUG] Error en clic: {e}")
         
-        for intento in range(8):
-            time.sleep(0.5)
-            
-            captured = self.driver.execute_script("return window.__capturedPhone;")
-            if captured:
-                telefono = captured.replace('tel:', '').strip()
+        limite = time.time() + captura_telefono.TIMEOUT_CAPTURA
+        while captura:
+            if captura.get('tipo') == 'tel':
+                telefono = captura['valor'].replace('tel:', '').strip()
                 if self.modo_debug:
                     print(f"      [DEBUG] ✓ Teléfono capturado por interceptor: {telefono}")
                 return self._validar_telefono_final(telefono)
             
-            ajax_resp = self.driver.execute_script("return window.__phoneAjaxResponse;")
-            if ajax_resp:
-                telefono = self._extraer_telefono_de_texto(ajax_resp)
+            telefono = self._extraer_telefono_de_texto(captura.get('valor'))
+            if telefono:
+                if self.modo_debug:
+                    print(f"      [DEBUG] ✓ Teléfono del AJAX: {telefono}")
+                return telefono
+            
+            # AJAX de contacto sin teléfono: esperar la siguiente captura
+            restante = limite - time.time()
+            if restante <= 0:
+                break
+            try:
+                captura = captura_telefono.esperar_captura(self.driver, restante)
+            except Exception:
+                captura = None
+        
+        # Sin captura: comprobar una vez el DOM (href tel: o texto visible)
+        try:
+            tel_links = self.driver.find_elements(By.CSS_SELECTOR, "a[href^='tel:']")
+            for tl in tel_links:
+                href = tl.get_attribute('href')
+                if href and href.startswith('tel:') and len(href) > 6:
+                    telefono = href.replace('tel:', '').strip()
+                    if self.modo_debug:
+                        print(f"      [DEBUG] ✓ Teléfono del href DOM: {telefono}")
+                    return self._validar_telefono_final(telefono)
+        except:
+            pass
+        
+        try:
+            phone_text = self.driver.execute_script("""
+                var selectors = ['span.hidden-contact-phones_text', '.phone-number span',
+                    '.see-phones-btn span', '.phone-details span', 'a.phone-number'];
+                for (var i = 0; i < selectors.length; i++) {
+                    var els = document.querySelectorAll(selectors[i]);
+                    for (var j = 0; j < els.length; j++) {
+                        var text = els[j].textContent.trim();
+                        var digits = text.replace(/[^0-9]/g, '');
+                        if (digits.length >= 7) return text;
+                    }
+                }
+                return null;
+            """)
+            if phone_text:
+                telefono = self._extraer_telefono_de_texto(phone_text)
                 if telefono:
                     if self.modo_debug:
-                        print(f"      [DEBUG] ✓ Teléfono del AJAX: {telefono}")
+                        print(f"      [DEBUG] ✓ Teléfono del texto visible: {telefono}")
                     return telefono
-            
-            try:
-                tel_links = self.driver.find_elements(By.CSS_SELECTOR, "a[href^='tel:']")
-                for tl in tel_links:
-                    href = tl.get_attribute('href')
-                    if href and href.startswith('tel:') and len(href) > 6:
-                        telefono = href.replace('tel:', '').strip()
-                        if self.modo_debug:
-                            print(f"      [DEBUG] ✓ Teléfono del href DOM: {telefono}")
-                        return self._validar_telefono_final(telefono)
-            except:
-                pass
-            
-            if intento >= 3:
-                try:
-                    phone_text = self.driver.execute_script("""
-                        var selectors = ['span.hidden-contact-phones_text', '.phone-number span',
-                            '.see-phones-btn span', '.phone-details span', 'a.phone-number'];
-                        for (var i = 0; i < selectors.length; i++) {
-                            var els = document.querySelectorAll(selectors[i]);
-                            for (var j = 0; j < els.length; j++) {
-                                var text = els[j].textContent.trim();
-                                var digits = text.replace(/[^0-9]/g, '');
-                                if (digits.length >= 7) return text;
-                            }
-                        }
-                        return null;
-                    """)
-                    if phone_text:
-                        telefono = self._extraer_telefono_de_texto(phone_text)
-                        if telefono:
-                            if self.modo_debug:
-                                print(f"      [DEBUG] ✓ Teléfono del texto visible: {telefono}")
-                            return telefono
-                except:
-                    pass
+        except:
+            pass
         
         if self.modo_debug:
             print("      [DEBUG] No se pudo capturar teléfono tras clic")
@@ -587,57 +523,22 @@ class IdealistaScraper(BaseScraper):
         return None
     
     def _buscar_telefono_en_json(self, data) -> Optional[str]:
-        """Busca recursivamente un teléfono en una estructura JSON."""
-        if isinstance(data, str):
-            return self._extraer_telefono_de_texto(data)
-        elif isinstance(data, dict):
-            for key, value in data.items():
-                key_lower = key.lower()
-                if 'phone' in key_lower or 'telefon' in key_lower or 'tel' == key_lower or 'mobile' in key_lower:
-                    if isinstance(value, str):
-                        telefono = self._extraer_telefono_de_texto(value)
-                        if not telefono:
-                            digitos = re.sub(r'[^\d]', '', value)
-                            if len(digitos) >= 7:
-                                return value.strip()
-                        return telefono
-                result = self._buscar_telefono_en_json(value)
-                if result:
-                    return result
-        elif isinstance(data, list):
-            for item in data:
-                result = self._buscar_telefono_en_json(item)
-                if result:
-                    return result
-        return None
+        """Busca un teléfono bajo las claves de teléfono de una estructura JSON."""
+        return telefonos.buscar_en_json(data)
     
     def _validar_telefono_final(self, telefono: Optional[str]) -> Optional[str]:
         """Validación estricta: nunca devolver texto sin al menos 7 dígitos."""
         if not telefono:
             return None
-        digitos = re.sub(r'[^\d]', '', telefono)
-        if len(digitos) < 7:
+        if telefonos.validar(telefono) is None:
             if self.modo_debug:
-                print(f"      [DEBUG] ✗ Rechazado (no es teléfono): '{telefono}' ({len(digitos)} dígitos)")
+                print(f"      [DEBUG] ✗ Rechazado (no es teléfono): '{telefono}' ({len(telefonos.digitos(telefono))} dígitos)")
             return None
         return telefono
     
     def _extraer_telefono_de_texto(self, texto: str) -> Optional[str]:
-        """Extrae un número de teléfono de un texto usando regex"""
-        if not texto:
-            return None
-        phone_patterns = [
-            r'\+34[\s]?[6789]\d{2}[\s]?\d{3}[\s]?\d{3}',
-            r'[6789]\d{2}[\s]?\d{2}[\s]?\d{2}[\s]?\d{2}',
-            r'[6789]\d{2}[\s]?\d{3}[\s]?\d{3}',
-            r'\d{3}[\s]?\d{3}[\s]?\d{3}',
-            r'\d{9}',
-        ]
-        for pattern in phone_patterns:
-            match = re.search(pattern, texto)
-            if match:
-                return match.group(0).strip()
-        return None
+        """Extrae un número de teléfono de un texto (patrones precompilados)"""
+        return telefonos.extraer_de_texto(texto)
     
     def extraer_vivienda(self, articulo) -> Optional[Vivienda]:
         """Extrae datos de un artículo de Idealista"""
@@ -677,7 +578,7 @@ class IdealistaScraper(BaseScraper):
             descripcion = desc_elem.get_text(strip=True) if desc_elem else None
             
             # Determinar tipo de anunciante
-            es_part, tipo_anunciante = self.es_particular(str(articulo))
+            es_part, tipo_anunciante = self.es_particular(articulo)
             
             return Vivienda(
                 titulo=titulo,
@@ -702,7 +603,7 @@ class IdealistaScraper(BaseScraper):
         """Scrapea la página actual de Idealista"""
         print("\n[*] Analizando página de Idealista...")
         
-        soup = BeautifulSoup(self.driver.page_source, 'html.parser')
+        soup = self.snapshot.soup
         
         # Buscar artículos
         articulos = soup.find_all('article', class_='item')
@@ -750,8 +651,8 @@ class IdealistaScraper(BaseScraper):
             # Verificar si hay captcha
             self.detectar_captcha()
             
-            # Parsear la página
-            soup = BeautifulSoup(self.driver.page_source, 'html.parser')
+            # Parsear la página (mismo snapshot que usó detectar_captcha)
+            soup = self.snapshot.soup
             
             # Buscar el div sticky-contact-user-info (selector correcto de Idealista)
             contact_info = soup.find('div', class_='sticky-contact-user-info')
@@ -795,11 +696,11 @@ class IdealistaScraper(BaseScraper):
         """Extrae datos completos de una vivienda desde su página de detalle"""
         try:
             # Si ya estamos en la URL, no navegar de nuevo
-            if self.driver.current_url != url:
+            if self.snapshot.url != url:
                 self._navegar_con_reintentos(url)
                 self.delay_aleatorio('detalle')
             
-            soup = BeautifulSoup(self.driver.page_source, 'html.parser')
+            soup = self.snapshot.soup
             
             # Título
             titulo_elem = soup.find('h1', class_='main-info__title-main')
@@ -840,7 +741,7 @@ class IdealistaScraper(BaseScraper):
             telefono = self._extraer_telefono_detalle()
             
             # Tipo de anunciante
-            _, tipo_anunciante = self.es_particular(str(soup))
+            _, tipo_anunciante = self.es_particular(soup)
             
             return Vivienda(
                 titulo=titulo,
@@ -860,7 +761,8 @@ class IdealistaScraper(BaseScraper):
             print(f"    ⚠️ Error extrayendo datos: {e}")
             return None
     
-    def filtrar_listado_particulares(self, paginas=None, urls_conocidas=None):
+    def filtrar_listado_particulares(self, paginas=None, urls_conocidas=None, ubicacion=None, marca_agua=None,
+                                     recorrer_todo=False):
         """Filtra viviendas de particulares usando utag_data del HTML.
         
         Extrae la variable JavaScript utag_data que contiene datos estructurados
@@ -869,8 +771,15 @@ class IdealistaScraper(BaseScraper):
           - type "2" = Profesional (Agencia/Banco)
         
         Si urls_conocidas contiene URLs, se detiene al encontrar un anuncio ya conocido
-        (el listado se asume ordenado por fecha descendente).
+        (el listado se asume ordenado por fecha descendente). Con ubicacion, las
+        descatalogadas recientes de la zona (lápidas) también cuentan como conocidas.
+        Con marca_agua se detiene tras CONSECUTIVOS_PARADA anuncios seguidos
+        anteriores a la marca; la marca nueva queda en self.corte_marca.
+        Con recorrer_todo (rastreo completo) los anuncios conocidos se saltan en
+        lugar de parar, y se llega hasta el final del listado.
         """
+        self.corte_marca = CorteMarcaAgua(marca_agua, tolerancia_ids=tolerancia_ids('idealista'))
+        
         if not self.driver:
             print("[ERROR] Driver no inicializado")
             return []
@@ -884,17 +793,24 @@ class IdealistaScraper(BaseScraper):
             print(f"    Modo: {paginas} página(s)")
         
         if urls_conocidas:
-            print(f"    📂 URLs ya conocidas: {len(urls_conocidas)} (se parará al encontrar una)")
+            accion = 'se saltarán' if recorrer_todo else 'se parará al encontrar una'
+            print(f"    📂 URLs ya conocidas: {len(urls_conocidas)} ({accion})")
+        
+        # Anuncios ya guardados en otras zonas o descatalogados: sin teléfono ni guardado
+        indice = abrir_indice()
+        lapidas = abrir_lapidas()
+        omitidos = 0
         
         particulares = []
         pagina_actual = 1
         primer_articulo_id = None
-        urls_primera_pagina = set()
+        ids_primera_pagina = set()
         encontrado_conocido = False
         
         # Limpiar URL base: quitar parámetros, extensión .htm y paginación existente
-        url_base = self.driver.current_url.split('?')[0]
-        parametros = '?' + self.driver.current_url.split('?')[1] if '?' in self.driver.current_url else ''
+        url_inicial = self.snapshot.url
+        url_base = url_inicial.split('?')[0]
+        parametros = '?' + url_inicial.split('?')[1] if '?' in url_inicial else ''
         
         # Detectar si es URL de tipo "areas" (formato diferente de paginación)
         es_url_areas = '/areas/' in url_base
@@ -937,10 +853,11 @@ class IdealistaScraper(BaseScraper):
             self.detectar_captcha()
             
             # Detectar si nos redirigió a página-1 (significa que llegamos al final)
-            url_actual = self.driver.current_url
+            url_actual = self.snapshot.url
             if pagina_actual > 1:
                 if re.search(r'pagina-1(\?|$|\.htm)', url_actual):
                     print(f"\n✅ Detectado final del listado (redirigió a página-1)")
+                    self.corte_marca.fin_listado = True
                     break
                 
                 pagina_en_url = re.search(r'pagina-(\d+)', url_actual)
@@ -948,41 +865,33 @@ class IdealistaScraper(BaseScraper):
                     numero_en_url = int(pagina_en_url.group(1))
                     if numero_en_url < pagina_actual:
                         print(f"\n✅ Detectado final del listado (URL muestra página {numero_en_url}, esperábamos {pagina_actual})")
+                        self.corte_marca.fin_listado = True
                         break
                 else:
                     print(f"\n✅ Detectado final del listado (URL sin paginación, redirigido desde página {pagina_actual})")
+                    self.corte_marca.fin_listado = True
                     break
             
             # Scroll para cargar contenido
-            for i in range(5):
-                self.driver.execute_script(f"window.scrollTo(0, {300 * (i + 1)});")
-                time.sleep(random.uniform(0.3, 0.8))
-            time.sleep(random.uniform(1, 2))
+            self._scroll_listado()
             
-            # Parsear HTML
-            soup = BeautifulSoup(self.driver.page_source, 'html.parser')
+            # Leer el listado: registros compactos desde el navegador o DOM completo
+            registros, pagina = self._leer_listado()
             
-            # Buscar artículos para comprobar que la página cargó
-            articulos = soup.find_all('article', class_='item')
-            
-            if not articulos:
+            if not registros and not pagina.articulos:
                 print("[!] No se encontraron artículos - recargando página...")
-                time.sleep(random.uniform(2, 4))
+                self.snapshot.invalidar()
                 self.driver.refresh()
-                time.sleep(random.uniform(3, 5))
+                self.delay_aleatorio('pagina')
                 
-                for i in range(5):
-                    self.driver.execute_script(f"window.scrollTo(0, {300 * (i + 1)});")
-                    time.sleep(random.uniform(0.3, 0.8))
-                time.sleep(random.uniform(1, 2))
+                self._scroll_listado()
                 
-                soup = BeautifulSoup(self.driver.page_source, 'html.parser')
-                articulos = soup.find_all('article', class_='item')
+                registros, pagina = self._leer_listado()
                 
-                if not articulos:
+                if not registros and not pagina.articulos:
                     print("    ⚠️  Sigue sin artículos tras recargar")
                     print("    📁 Verifica el navegador manualmente (posible captcha/bloqueo)")
-                    respuesta = input("    ¿Reintentar? (s/n, Enter=s): ").strip().lower()
+                    respuesta = preguntar("    ¿Reintentar? (s/n, Enter=s): ").strip().lower()
                     if respuesta != 'n':
                         print("    🔄 Reintentando...")
                         continue
@@ -990,44 +899,40 @@ class IdealistaScraper(BaseScraper):
                         print("    ⏭️  Saltando a la siguiente URL...")
                         break
                 else:
-                    print(f"    ✅ Recarga exitosa, {len(articulos)} artículos encontrados")
+                    print(f"    ✅ Recarga exitosa, {len(registros or pagina.articulos)} artículos encontrados")
             
-            # Extraer URLs de artículos actuales para detectar fin de listado
-            urls_articulos_actuales = set()
-            for art in articulos:
-                link = art.find('a', class_='item-link')
-                if link:
-                    url_art = link.get('href', '')
-                    if url_art:
-                        urls_articulos_actuales.add(url_art)
+            # IDs de los anuncios actuales para detectar fin de listado
+            if registros:
+                ids_actuales = [r['id'] for r in registros]
+            else:
+                ids_actuales = [art['id'] for art in pagina.articulos]
+            ids_articulos_actuales = {ad_id for ad_id in ids_actuales if ad_id}
             
             # Detectar fin de listado comparando con página 1
-            primer_articulo_actual = articulos[0].get('data-element-id') if articulos else None
+            primer_articulo_actual = ids_actuales[0] if ids_actuales else None
             
             if pagina_actual == 1:
                 primer_articulo_id = primer_articulo_actual
-                urls_primera_pagina = urls_articulos_actuales.copy()
+                ids_primera_pagina = ids_articulos_actuales.copy()
             elif pagina_actual > 1:
                 if primer_articulo_actual and primer_articulo_actual == primer_articulo_id:
                     print(f"\n✅ Detectado final del listado (primer artículo repetido)")
+                    self.corte_marca.fin_listado = True
                     break
                 
-                if urls_primera_pagina and urls_articulos_actuales:
-                    coincidentes = len(urls_articulos_actuales.intersection(urls_primera_pagina))
-                    porcentaje = (coincidentes / len(urls_articulos_actuales)) * 100
+                if ids_primera_pagina and ids_articulos_actuales:
+                    coincidentes = len(ids_articulos_actuales.intersection(ids_primera_pagina))
+                    porcentaje = (coincidentes / len(ids_articulos_actuales)) * 100
                     if porcentaje >= 80:
                         print(f"\n✅ Detectado final del listado ({porcentaje:.0f}% artículos coinciden con página 1)")
+                        self.corte_marca.fin_listado = True
                         break
             
-            # ============================================================
-            # EXTRAER utag_data: datos estructurados con owner.type
-            # ============================================================
-            script_tag = soup.find('script', string=re.compile(r'var\s+utag_data\s*='))
-            
-            if not script_tag:
+            if not registros:
                 print("    ⚠️  No se encontró utag_data, usando método fallback (logo-branding)")
                 # Fallback: método antiguo con logo
-                particulares_en_pagina = self._filtrar_por_logo(articulos, urls_conocidas)
+                particulares_en_pagina = self._filtrar_por_logo(pagina.articulos, urls_conocidas, ubicacion,
+                                                                recorrer_todo)
                 if particulares_en_pagina is None:
                     encontrado_conocido = True
                     break
@@ -1036,128 +941,46 @@ class IdealistaScraper(BaseScraper):
                 pagina_actual += 1
                 continue
             
-            # Extraer el JSON de utag_data
-            try:
-                script_text = script_tag.string
-                match = re.search(r'utag_data\s*=\s*(\{.*?\})\s*;', script_text, re.DOTALL)
-                if not match:
-                    print("    ⚠️  No se pudo parsear utag_data")
-                    pagina_actual += 1
-                    continue
-                
-                json_str = match.group(1)
-                data = json.loads(json_str)
-            except (json.JSONDecodeError, AttributeError) as e:
-                print(f"    ⚠️  Error parseando utag_data: {e}")
-                pagina_actual += 1
-                continue
-            
-            # Extraer anuncios del listado
-            ads = data.get('list', {}).get('ads', [])
+            print(f"📊 utag_data ads: {len(registros)}")
             
-            if not ads:
-                print(f"    📊 utag_data encontrado pero sin anuncios en list.ads")
-                if self.modo_debug:
-                    keys = list(data.keys())
-                    print(f"      [DEBUG] Claves disponibles en utag_data: {keys[:10]}")
-                pagina_actual += 1
-                continue
-            
-            # Crear un índice de artículos HTML por data-element-id para extraer datos visuales
-            articulos_por_id = {}
-            for art in articulos:
-                art_id = art.get('data-element-id')
-                if art_id:
-                    articulos_por_id[art_id] = art
-            
-            print(f"📊 Total artículos: {len(articulos)} | utag_data ads: {len(ads)}")
-            
-            # Identificar IDs de particulares con utag_data
-            ids_particulares_pagina = set()
+            # Particulares según owner.type (los registros vienen en el orden del listado)
             particulares_en_pagina = 0
             profesionales_en_pagina = 0
             
-            for ad in ads:
-                ad_id = str(ad.get('adId', ''))
-                owner_type = ad.get('owner', {}).get('type', '')
+            for registro in registros:
+                ad_id = registro['id']
                 
-                # Construir URL del anuncio
-                url_detalle = f"https://www.idealista.com/inmueble/{ad_id}/"
+                if self.corte_marca.observar(ad_id):
+                    print(f"\n🛑 Marca de agua alcanzada: {self.corte_marca.consecutivos} anuncios seguidos anteriores a la última ejecución")
+                    print("    Deteniendo búsqueda (los siguientes ya se vieron)")
+                    encontrado_conocido = True
+                    break
                 
-                # Comprobar si ya conocido
-                if urls_conocidas and url_detalle in urls_conocidas:
-                    print(f"\n🛑 Anuncio ya conocido: {url_detalle}")
+                # Comprobar si ya conocido (en el JSON de la zona o descatalogado de ella)
+                if (urls_conocidas and registro['url'] in urls_conocidas) or lapidas.parada(registro['url'], ubicacion):
+                    if recorrer_todo:
+                        continue
+                    print(f"\n🛑 Anuncio ya conocido: {registro['url']}")
                     print("    Deteniendo búsqueda (los siguientes ya están registrados)")
                     encontrado_conocido = True
                     break
                 
-                if owner_type == "1":
-                    ids_particulares_pagina.add(ad_id)
-                    
-                    # Extraer datos del HTML del listado
-                    art_html = articulos_por_id.get(ad_id)
-                    
-                    if art_html:
-                        # Título
-                        link = art_html.find('a', class_='item-link')
-                        titulo = link.get('title', 'Sin título') if link else 'Sin título'
-                        
-                        # Precio
-                        precio_elem = art_html.find('span', class_='item-price')
-                        precio = precio_elem.get_text(strip=True) if precio_elem else 'N/A'
-                        
-                        # Habitaciones y metros desde item-detail
-                        habitaciones = None
-                        metros = None
-                        detalles = art_html.find_all('span', class_='item-detail')
-                        for detalle in detalles:
-                            texto = detalle.get_text(strip=True)
-                            if 'hab.' in texto:
-                                habitaciones = texto
-                            elif 'm²' in texto:
-                                metros = texto
-                        
-                        # Descripción
-                        desc_elem = art_html.find('div', class_='item-description')
-                        descripcion = desc_elem.get_text(strip=True) if desc_elem else None
-                        
-                        # Ubicación (del título, tras la coma: "Piso en X, UBICACION")
-                        ubicacion = ''
-                        if titulo and ',' in titulo:
-                            # "Piso en Calle de Sants, Sants - Badal, Barcelona" -> "Sants - Badal, Barcelona"
-                            partes = titulo.split(',', 1)
-                            ubicacion = partes[1].strip() if len(partes) > 1 else ''
-                    else:
-                        # Fallback: datos mínimos de utag_data
-                        titulo = ad.get('title', 'Sin título')
-                        precio_val = ad.get('price', 'N/A')
-                        precio = f"{precio_val:,.0f}€".replace(',', '.') if isinstance(precio_val, (int, float)) else str(precio_val)
-                        hab_val = ad.get('rooms', None)
-                        met_val = ad.get('size', None)
-                        habitaciones = f"{hab_val} hab." if hab_val else None
-                        metros = f"{met_val} m²" if met_val else None
-                        ubicacion = ad.get('address', ad.get('neighborhood', ''))
-                        descripcion = ad.get('description', None)
-                    
-                    particulares.append({
-                        'id': ad_id,
-                        'url': url_detalle,
-                        'titulo': titulo,
-                        'precio': precio,
-                        'habitaciones': habitaciones,
-                        'metros': metros,
-                        'ubicacion': ubicacion,
-                        'descripcion': descripcion,
-                    })
-                    
+                if registro['particular']:
+                    self.vistos_zona.add(registro['url'])
+                if registro['particular'] and (registro['url'] in indice or registro['url'] in lapidas):
+                    omitidos += 1
+                    if self.modo_debug:
+                        print(f"      [DEBUG] Ya registrado en otra zona o descatalogado: ID {ad_id}")
+                elif registro['particular']:
+                    particulares.append({campo: registro.get(campo) for campo in CAMPOS_PARTICULAR})
                     particulares_en_pagina += 1
                     
                     if self.modo_debug:
-                        print(f"      [DEBUG] ✓ PARTICULAR: ID {ad_id} - {titulo[:50]}")
+                        print(f"      [DEBUG] ✓ PARTICULAR: ID {ad_id} - {registro['titulo'][:50]}")
                 else:
                     profesionales_en_pagina += 1
                     if self.modo_debug:
-                        print(f"      [DEBUG] ✗ Profesional: ID {ad_id} (owner.type={owner_type})")
+                        print(f"      [DEBUG] ✗ Profesional: ID {ad_id} (owner.type={registro.get('owner_type')})")
             
             if encontrado_conocido:
                 break
@@ -1167,11 +990,11 @@ class IdealistaScraper(BaseScraper):
             # Extraer teléfonos de los particulares en esta página
             if particulares_en_pagina > 0:
                 ids_particulares_pagina = [p['id'] for p in particulares[-particulares_en_pagina:]]
-                telefonos = self._extraer_telefonos_listado(ids_particulares_pagina)
+                lista_telefonos = self._extraer_telefonos_listado(ids_particulares_pagina)
                 
                 # Asignar teléfonos a los particulares
                 for p in particulares[-particulares_en_pagina:]:
-                    p['telefono'] = telefonos.get(p['id'], None)
+                    p['telefono'] = lista_telefonos.get(p['id'], None)
             
             pagina_actual += 1
         
@@ -1179,12 +1002,14 @@ class IdealistaScraper(BaseScraper):
         print(f"[RESUMEN]")
         print(f"  Páginas procesadas: {pagina_actual}")
         print(f"  Particulares encontrados: {len(particulares)}")
+        if omitidos:
+            print(f"  🔁 Omitidos (ya en otra zona o descatalogados): {omitidos}")
         if encontrado_conocido:
             print(f"  🛑 Se detuvo al encontrar un anuncio ya registrado")
         print(f"{'='*70}")
         
         if not particulares:
-            if urls_conocidas:
+            if urls_conocidas or marca_agua:
                 print("\n✅ No hay viviendas nuevas desde la última búsqueda")
             else:
                 print("\n[!] No se encontraron particulares en el listado")
@@ -1196,19 +1021,7 @@ class IdealistaScraper(BaseScraper):
         
         for info in particulares:
             telefono = info.get('telefono')
-            vivienda = Vivienda(
-                titulo=info['titulo'],
-                precio=info['precio'],
-                ubicacion=info.get('ubicacion', ''),
-                habitaciones=info.get('habitaciones'),
-                metros=info.get('metros'),
-                url=info['url'],
-                descripcion=info.get('descripcion'),
-                anunciante="Particular",
-                fecha_scraping=datetime.now().isoformat(),
-                portal="Idealista",
-                telefono=telefono
-            )
+            vivienda = self._construir_vivienda_particular(info)
             todas_viviendas.append(vivienda)
             
             print(f"    ✅ {info['titulo'][:50]}... | 💰 {info['precio']} | 📞 {telefono or 'N/A'}")
@@ -1219,15 +1032,208 @@ class IdealistaScraper(BaseScraper):
         print(f"Particulares encontrados:  {len(todas_viviendas)}")
         con_telefono = sum(1 for v in todas_viviendas if v.telefono)
         print(f"Con teléfono extraído:     {con_telefono}")
+        if self.modo_debug:
+            print(f"Snapshot DOM:              {self.snapshot.resumen()}")
         
         return todas_viviendas
     
+    def _scroll_listado(self):
+        """Scroll progresivo para cargar el contenido del listado"""
+        for i in range(5):
+            self.driver.execute_script(f"window.scrollTo(0, {300 * (i + 1)});")
+            time.sleep(random.uniform(0.3, 0.8))
+        time.sleep(random.uniform(1, 2))
+        # El lazy-loading cambia el DOM
+        self.snapshot.invalidar()
+    
+    def get_extractor_js(self) -> Optional[str]:
+        return EXTRACTOR_JS
+    
+    def _leer_listado(self) -> tuple:
+        """Lee el listado actual evitando transferir y parsear el DOM.
+        
+        1. Extractor JS del portal: registros compactos en un único execute_script
+        2. utag_data (JS o código fuente) + outerHTML solo de los particulares
+        3. Parseo completo del DOM (solo si no hay datos estructurados)
+        
+        Retorna (registros | None, PaginaListado) - la página está vacía si no hizo falta parsear.
+        """
+        registros = self.extraer_registros_navegador()
+        if registros:
+            return registros, PaginaListado()
+        
+        data = None
+        try:
+            data = self.driver.execute_script(JS_UTAG_DATA)
+        except Exception as e:
+            if self.modo_debug:
+                print(f"      [DEBUG] utag_data no accesible vía JS: {e}")
+        
+        if not isinstance(data, dict):
+            data = extraer_utag_data(self.snapshot.html)
+        
+        ads = self._ads_de_utag(data)
+        if not ads:
+            return None, parsear_listado(self.snapshot.html, self.motor_html)
+        return self._registros_desde_utag(ads), PaginaListado()
+    
+    def _registros_desde_utag(self, ads: list) -> List[dict]:
+        """Registros compactos (mismo formato que EXTRACTOR_JS) a partir de utag_data.
+        
+        Solo se leen del DOM los artículos de los particulares.
+        """
+        ids_particulares = [str(ad.get('adId', '')) for ad in ads
+                            if str(ad.get('owner', {}).get('type', '')) == "1"]
+        articulos_por_id = self._articulos_por_id(ids_particulares)
+        
+        registros = []
+        for ad in ads:
+            ad_id = str(ad.get('adId', ''))
+            owner_type = str(ad.get('owner', {}).get('type', ''))
+            registro = {
+                'id': ad_id,
+                'url': f"https://www.idealista.com/inmueble/{ad_id}/",
+                'particular': owner_type == "1",
+                'owner_type': owner_type,
+            }
+            if registro['particular']:
+                art_html = articulos_por_id.get(ad_id)
+                if art_html:
+                    registro.update({
+                        'titulo': art_html['titulo'],
+                        'precio': art_html['precio'],
+                        'habitaciones': art_html['habitaciones'],
+                        'metros': art_html['metros'],
+                        'descripcion': art_html['descripcion'],
+                        'ubicacion': self._ubicacion_desde_titulo(art_html['titulo']),
+                    })
+                else:
+                    # Fallback: datos mínimos de utag_data
+                    precio_val = ad.get('price', 'N/A')
+                    hab_val = ad.get('rooms', None)
+                    met_val = ad.get('size', None)
+                    registro.update({
+                        'titulo': ad.get('title', 'Sin título'),
+                        'precio': f"{precio_val:,.0f}€".replace(',', '.') if isinstance(precio_val, (int, float)) else str(precio_val),
+                        'habitaciones': f"{hab_val} hab." if hab_val else None,
+                        'metros': f"{met_val} m²" if met_val else None,
+                        'ubicacion': ad.get('address', ad.get('neighborhood', '')),
+                        'descripcion': ad.get('description', None),
+                    })
+            registros.append(registro)
+        return registros
+    
+    @staticmethod
+    def _ads_de_utag(data) -> list:
+        """Lista de anuncios (list.ads) de utag_data"""
+        if not isinstance(data, dict):
+            return []
+        return (data.get('list') or {}).get('ads') or []
+    
+    def _articulos_por_id(self, ids: list) -> dict:
+        """Registros del listado solo para los IDs indicados (outerHTML de sus article)"""
+        if not ids:
+            return {}
+        try:
+            fragmentos = self.driver.execute_script(JS_ARTICULOS_POR_ID, ids) or {}
+        except Exception as e:
+            if self.modo_debug:
+                print(f"      [DEBUG] Error leyendo artículos del DOM: {e}")
+            return {}
+        pagina = parsear_listado(''.join(fragmentos.values()), self.motor_html)
+        return {art['id']: art for art in pagina.articulos if art['id']}
+    
+    @staticmethod
+    def _ubicacion_desde_titulo(titulo: str) -> str:
+        """Ubicación del título, tras la coma: "Piso en X, UBICACION"."""
+        # "Piso en Calle de Sants, Sants - Badal, Barcelona" -> "Sants - Badal, Barcelona"
+        if titulo and ',' in titulo:
+            return titulo.split(',', 1)[1].strip()
+        return ''
+    
+    def _construir_vivienda_particular(self, info: dict) -> Vivienda:
+        """Construye la Vivienda de un particular detectado en el listado."""
+        return self.vivienda_desde_registro({**info, 'ubicacion': info.get('ubicacion', '')})
+    
     def _extraer_telefonos_listado(self, ids_particulares: list) -> dict:
+        """Extrae los teléfonos de los particulares del listado.
+        
+        Primero en lote (una única llamada asíncrona a la API de contacto); solo
+        los IDs que fallan se resuelven haciendo clic en 'Ver teléfono'.
+        Retorna dict {ad_id: telefono_str}
+        """
+        lista_telefonos, bloqueado = self._telefonos_lote(ids_particulares)
+        
+        pendientes = [ad_id for ad_id in ids_particulares if ad_id not in lista_telefonos]
+        if pendientes and bloqueado:
+            # Cada clic vuelve a llamar a la misma API: con bloqueo solo se duplicaría el tráfico
+            print(f"    🛑 API de contacto bloqueada: {len(pendientes)} teléfonos sin resolver")
+        elif pendientes:
+            if lista_telefonos and self.modo_debug:
+                print(f"      [DEBUG] {len(pendientes)} teléfonos pendientes, usando clic...")
+            lista_telefonos.update(self._telefonos_por_clic(pendientes))
+        
+        print(f"    📞 Teléfonos extraídos: {len(lista_telefonos)}/{len(ids_particulares)}")
+        return lista_telefonos
+    
+    def _telefonos_lote(self, ids_particulares: list) -> tuple:
+        """Resuelve los teléfonos de varios anuncios en un único round-trip.
+        
+        Las peticiones a adContactInfoForDetail se lanzan desde la página (misma
+        sesión y cookies) con concurrencia limitada y espaciadas al ritmo de la
+        API del portal. Retorna ({ad_id: telefono} de los anuncios con teléfono
+        válido, True si la API respondió con bloqueo).
+        """
+        lista_telefonos = {}
+        if not ids_particulares:
+            return lista_telefonos, False
+        
+        espaciado = self.ritmo.rango('api')
+        # Respeta el hueco reservado por el control (enfriamiento tras un bloqueo incluido)
+        time.sleep(self.ritmo.pendiente())
+        # Peor caso: todos los arranques espaciados al máximo y todas las
+        # peticiones agotando el timeout en serie por trabajador
+        tandas = -(-len(ids_particulares) // CONCURRENCIA_TELEFONOS)
+        try:
+            respuestas = captura_telefono.ejecutar_async(
+                self.driver, JS_TELEFONOS_LOTE,
+                len(ids_particulares) * espaciado[1] + tandas * TIMEOUT_TELEFONO_MS / 1000,
+                ids_particulares, CONCURRENCIA_TELEFONOS, TIMEOUT_TELEFONO_MS,
+                int(espaciado[0] * 1000), int(espaciado[1] * 1000)
+            ) or {}
+        except Exception as e:
+            if self.modo_debug:
+                print(f"      [DEBUG] Teléfonos en lote no disponibles: {e}")
+            return lista_telefonos, False
+        
+        bloqueado = MARCA_BLOQUEO in respuestas.values()
+        if bloqueado:
+            self.ritmo.bloqueo('BLOCKED: en los teléfonos del listado')
+        elif self.ritmo.adaptativo and self.ritmo.exito(len(respuestas), 'api'):
+            descanso = self.ritmo.descanso()
+            print(f"\n☕ Pausa de {descanso:.0f}s para evitar detección ({self.ritmo.ritmo:.1f} peticiones/min)")
+            time.sleep(descanso)
+        
+        for ad_id, data in respuestas.items():
+            telefono = None
+            if isinstance(data, dict):
+                telefono = data.get('formattedContactPhone1') or self._buscar_telefono_en_json(data)
+            telefono = self._validar_telefono_final(telefono)
+            if telefono:
+                lista_telefonos[ad_id] = telefono
+                if self.modo_debug:
+                    print(f"      [DEBUG] 📞 ID {ad_id}: {telefono} (API)")
+        return lista_telefonos, bloqueado
+    
+    def _telefonos_por_clic(self, ids_particulares: list) -> dict:
         """Extrae teléfonos haciendo clic en 'Ver teléfono' de cada particular en el listado.
         
         Retorna dict {ad_id: telefono_str}
         """
-        telefonos = {}
+        lista_telefonos = {}
+        
+        # Los clics revelan teléfonos en el DOM: el snapshot deja de ser válido
+        self.snapshot.invalidar()
         
         for ad_id in ids_particulares:
             try:
@@ -1269,59 +1275,133 @@ class IdealistaScraper(BaseScraper):
                     texto = elem.text.strip()
                     # Verificar que es un número de teléfono (contiene dígitos)
                     if texto and any(c.isdigit() for c in texto):
-                        telefonos[ad_id] = texto
+                        lista_telefonos[ad_id] = texto
                         if self.modo_debug:
                             print(f"      [DEBUG] 📞 ID {ad_id}: {texto}")
                         break
                 
-                # Pequeña pausa entre clics
-                time.sleep(random.uniform(0.3, 0.8))
+                # Cada clic pide el teléfono a la API de contacto: al ritmo de la API
+                self.delay_aleatorio('api')
                 
             except Exception as e:
                 if self.modo_debug:
                     print(f"      [DEBUG] Error extrayendo teléfono de {ad_id}: {e}")
         
-        print(f"    📞 Teléfonos extraídos: {len(telefonos)}/{len(ids_particulares)}")
-        return telefonos
+        return lista_telefonos
     
-    def _filtrar_por_logo(self, articulos, urls_conocidas=None):
+    def _filtrar_por_logo(self, articulos, urls_conocidas=None, ubicacion=None, recorrer_todo=False):
         """Método fallback: filtra por ausencia de logo-branding.
+        Recibe los registros de parser_idealista. Omite los anuncios ya registrados
+        en otra zona (índice global) o descatalogados (lápidas), y con recorrer_todo
+        también los conocidos de la zona.
         Retorna lista de particulares o None si se encontró uno conocido."""
+        indice = abrir_indice()
+        lapidas = abrir_lapidas()
         resultado = []
         for articulo in articulos:
-            tiene_logo = articulo.find('picture', class_='logo-branding')
-            if not tiene_logo:
-                element_id = articulo.get('data-element-id')
-                link = articulo.find('a', class_='item-link')
-                if element_id and link:
-                    url_detalle = link.get('href', '')
+            if self.corte_marca.observar(articulo['id']):
+                return None  # Marca de agua alcanzada
+            if not articulo['tiene_logo']:
+                element_id = articulo['id']
+                if element_id and articulo['href'] is not None:
+                    url_detalle = articulo['href']
                     if url_detalle and not url_detalle.startswith('http'):
                         url_detalle = "https://www.idealista.com" + url_detalle
-                    if urls_conocidas and url_detalle in urls_conocidas:
+                    conocido = (urls_conocidas and url_detalle in urls_conocidas) or lapidas.parada(url_detalle, ubicacion)
+                    if conocido and not recorrer_todo:
                         return None  # Señal de que se encontró conocido
-                    titulo = link.get('title', 'Sin título')
+                    self.vistos_zona.add(url_detalle)
+                    if conocido or url_detalle in indice or url_detalle in lapidas:
+                        continue
                     resultado.append({
                         'id': element_id,
                         'url': url_detalle,
-                        'titulo': titulo,
+                        'titulo': articulo['titulo'],
                     })
         return resultado
     
-    def scrapear_con_filtrado(self, paginas=None, ubicacion=None):
+    def scrapear_con_filtrado(self, paginas=None, ubicacion=None, fragmento=None):
         """Método principal de scraping con filtrado de dos etapas.
         
-        Si ubicacion se proporciona, carga el JSON persistente y para al encontrar
-        un anuncio ya conocido.
+        Si ubicacion se proporciona, para en la marca de agua de la zona (o del
+        fragmento de precio) o, si aún no tiene, al encontrar un anuncio del JSON
+        persistente. En el rastreo completo que marca la cadencia (search_url sin
+        ventana de publicación, ver ventana_reciente.py) no se para: se recorre
+        todo el listado saltando los anuncios conocidos. La marca nueva se guarda
+        con las viviendas (guardar) o aquí mismo si no hay ninguna nueva; el
+        rastreo cuenta como completo si search_url no lleva ventana y se llegó al
+        final del listado.
         """
         urls_conocidas = set()
+        marca = None
+        ruta_json = None
+        recorrer_todo = False
         if ubicacion:
             ruta_json = self._obtener_ruta_json_persistente(ubicacion)
-            json_existente = self._cargar_json_existente(ruta_json)
-            urls_conocidas = json_existente['urls_conocidas']
-            if not urls_conocidas:
-                print("    📋 No hay datos previos, se hará búsqueda completa")
+            marca = MarcaAgua.desde_dict(leer_marca_agua(clave_marca(ruta_json, fragmento)))
+            recorrer_todo = es_rastreo_completo(self.search_url)
+            if recorrer_todo:
+                print("    🔁 Rastreo completo: se recorre todo el listado (sin parar en la marca de agua)")
+                urls_conocidas = self._cargar_json_existente(ruta_json)['urls_conocidas']
+                marca = None
+            elif marca:
+                print(f"    📍 Marca de agua: ID {marca.max_id} ({marca.timestamp or 'sin fecha'})")
+            else:
+                json_existente = self._cargar_json_existente(ruta_json)
+                urls_conocidas = json_existente['urls_conocidas']
+                if not urls_conocidas:
+                    print("    📋 No hay datos previos, se hará búsqueda completa")
+        
+        viviendas = self.filtrar_listado_particulares(paginas, urls_conocidas=urls_conocidas,
+                                                      ubicacion=ubicacion, marca_agua=marca,
+                                                      recorrer_todo=recorrer_todo)
+        if ruta_json:
+            completo = not es_url_reciente(self.search_url)
+            self.marcas_pendientes.registrar(ruta_json, clave_marca(ruta_json, fragmento),
+                                             self.corte_marca.nueva_marca(completo), bool(viviendas))
+        return viviendas
+    
+    def contar_resultados(self, url: str) -> Optional[int]:
+        """Total de resultados de una búsqueda: carga su primera página y lo lee de utag_data o del título"""
+        self._navegar_con_reintentos(url)
+        self.delay_aleatorio('pagina')
+        self.detectar_captcha()
+        html = self.snapshot.html
+        total = ((extraer_utag_data(html) or {}).get('list') or {}).get('totalAds')
+        try:
+            return int(total)
+        except (TypeError, ValueError):
+            return total_desde_titulo(html)
+    
+    def scrapear_zona(self, url: str, ubicacion: str, paginas=None) -> List[Vivienda]:
+        """Rastrea una zona: cada fragmento de precio con su ventana de publicación y su marca de agua.
         
-        return self.filtrar_listado_particulares(paginas, urls_conocidas=urls_conocidas)
+        Sin fragmentos_precio activo en config.json la zona es un único fragmento.
+        """
+        ruta_json = self._obtener_ruta_json_persistente(ubicacion)
+        self.marcas_pendientes.descartar(ruta_json)
+        fragmentos = fragmentos_zona('idealista', url, ruta_json, self.contar_resultados)
+        
+        viviendas = []
+        self.vistos_zona = set()
+        for i, fragmento in enumerate(fragmentos, 1):
+            if len(fragmentos) > 1:
+                print(f"\n🧩 Fragmento {i}/{len(fragmentos)}: {fragmento.descripcion()}")
+            self.search_url = url_rastreo('idealista', url_fragmento('idealista', url, fragmento),
+                                          ruta_json, fragmento.nombre)
+            
+            # Navegar primero a la URL antes de scrapear
+            print(f"\n[*] Navegando a: {self.search_url[:80]}...")
+            self._navegar_con_reintentos(self.search_url)
+            self.delay_aleatorio('pagina')
+            
+            # Verificar si hay captcha
+            self.detectar_captcha()
+            
+            viviendas.extend(self.scrapear_con_filtrado(paginas, ubicacion=ubicacion, fragmento=fragmento.nombre))
+        registrar_rastreo(ruta_json, len(viviendas))
+        registrar_vistos('idealista', ubicacion, self.vistos_zona)
+        return viviendas
 
 
 def cargar_urls_idealista(config_file: str = "config.json") -> list:
@@ -1421,23 +1501,12 @@ def main():
             url = IdealistaScraper._asegurar_orden_fecha_idealista(item['url'])
             nombre = item['nombre']
             
-            # Actualizar la URL de búsqueda del scraper
-            scraper.search_url = url
-            
             print(f"\n\n{'='*70}")
             print(f"  PROCESANDO: {nombre} ({i}/{len(urls_a_procesar)})")
             print(f"  📅 Ordenado por fecha de publicación (más recientes primero)")
             print(f"{'='*70}")
             
-            # Navegar primero a la URL antes de scrapear
-            print(f"\n[*] Navegando a: {url[:80]}...")
-            scraper._navegar_con_reintentos(url)
-            time.sleep(random.uniform(2, 4))
-            
-            # Verificar si hay captcha
-            scraper.detectar_captcha()
-            
-            viviendas = scraper.scrapear_con_filtrado(paginas, ubicacion=nombre)
+            viviendas = scraper.scrapear_zona(url, nombre, paginas)
             
             # Guardar resultados de esta URL
             if viviendas:
@@ -1447,18 +1516,17 @@ def main():
                 print(f"\n⚠️  No se encontraron viviendas nuevas de particulares en {nombre}")
                 # Subir JSON existente a la API igualmente
                 ruta_json = scraper._obtener_ruta_json_persistente(nombre)
-                if os.path.exists(ruta_json):
-                    try:
-                        with open(ruta_json, 'r', encoding='utf-8') as f:
-                            data_existente = json.load(f)
+                try:
+                    data_existente = leer_zona(ruta_json)
+                    if data_existente:
                         print(f"☁️  Subiendo JSON existente ({data_existente.get('total', 0)} registros) a la API...")
                         BaseScraper.subir_a_api(data_existente)
-                    except Exception as e:
-                        print(f"⚠️  Error al leer JSON existente para subir: {e}")
+                except Exception as e:
+                    print(f"⚠️  Error al leer JSON existente para subir: {e}")
             
             if i < len(urls_a_procesar):
                 print("\n⏳ Esperando antes de la siguiente URL...")
-                time.sleep(random.uniform(10, 20))
+                time.sleep(scraper.ritmo.descanso())
         
     except KeyboardInterrupt:
         print("\n\n[!] Scraping interrumpido por el usuario")
@@ -0,0 +1,273 @@
+"""
+Índice global de anuncios por (portal, ID numérico)
+Un mismo anuncio aparece en varias zonas que se solapan (Catalunya Central /
+Igualada / Anoia) y en Fotocasa la URL lleva un slug que cambia antes del ID.
+El índice identifica cada anuncio por su ID, sea cual sea la URL, y lo comparten:
+  - los scrapers: no se extrae el teléfono ni se guarda / sube un anuncio ya
+    registrado en otra zona (la parada por anuncio conocido sigue siendo por zona)
+  - verificar_auto.py y verificar_anuncios.py: cada anuncio se verifica una vez
+    aunque esté en varios archivos, y las bajas salen del índice
+
+Formato en disco (indice_global.bin): cabecera con el número de IDs de cada
+portal y, a continuación, los IDs ordenados como enteros de 64 bits
+little-endian (array('Q')). Se carga con array.fromfile, sin parsear texto.
+
+El orquestador lanza un proceso por portal y todos escriben el mismo archivo:
+guardar() relee el índice de disco bajo un bloqueo entre procesos y le aplica
+solo las altas y bajas de este proceso desde el último guardado, así que
+ninguno borra los IDs que han añadido los demás.
+
+Uso:
+    python indice_global.py reconstruir    # desde los viviendas_*.json o el almacén
+    python indice_global.py resumen
+"""
+
+import argparse
+import glob
+import json
+import os
+import re
+import struct
+import sys
+import threading
+from array import array
+from typing import Iterable, List, Optional, Tuple
+
+from escritura_atomica import bloqueo_archivo, escribir_atomico
+
+
+DIRECTORIO = os.path.dirname(os.path.abspath(__file__))
+RUTA_INDICE = os.path.join(DIRECTORIO, 'indice_global.bin')
+
+PORTALES = ('idealista', 'fotocasa')
+
+PATRON_ID_IDEALISTA = re.compile(r'idealista\.com/(?:.*/)?inmueble/(\d+)')
+PATRON_ID_FOTOCASA = re.compile(r'fotocasa\.es/.*?/(\d{6,})/d')
+
+# Firma + versión y un contador uint64 por portal (en el orden de PORTALES)
+MAGIA = b'IGA1'
+_CABECERA = struct.Struct('<4s' + 'Q' * len(PORTALES))
+
+
+def id_anuncio(url: str) -> Optional[Tuple[str, int]]:
+    """(portal, ID) del anuncio, o None si la URL no es de un anuncio con ID"""
+    if not url:
+        return None
+    match = PATRON_ID_IDEALISTA.search(url)
+    if match:
+        return 'idealista', int(match.group(1))
+    match = PATRON_ID_FOTOCASA.search(url)
+    if match:
+        return 'fotocasa', int(match.group(1))
+    return None
+
+
+def clave_anuncio(url: str) -> str:
+    """Clave estable del anuncio: 'idealista:110805744', 'fotocasa:184629394' o la URL"""
+    ident = id_anuncio(url)
+    return f"{ident[0]}:{ident[1]}" if ident else url
+
+
+class IndiceGlobal:
+    """Conjunto de (portal, ID) persistido en binario, seguro entre hilos"""
+
+    def __init__(self, ruta: str = RUTA_INDICE):
+        self.ruta = ruta
+        self._lock = threading.Lock()
+        # Altas y bajas desde el último guardado (se aplican sobre lo que haya en disco)
+        self._altas = {portal: set() for portal in PORTALES}
+        self._bajas = {portal: set() for portal in PORTALES}
+        self._reemplazado = False
+        ids = self._leer()
+        self.cargado = ids is not None
+        self._ids = ids if ids is not None else {portal: set() for portal in PORTALES}
+
+    def _leer(self) -> Optional[dict]:
+        """IDs por portal del archivo. None si no existe o no es un índice válido"""
+        ids_portal = {}
+        try:
+            with open(self.ruta, 'rb') as f:
+                cabecera = f.read(_CABECERA.size)
+                if len(cabecera) != _CABECERA.size:
+                    return None
+                magia, *cuentas = _CABECERA.unpack(cabecera)
+                if magia != MAGIA:
+                    return None
+                for portal, cuenta in zip(PORTALES, cuentas):
+                    ids = array('Q')
+                    ids.fromfile(f, cuenta)
+                    if sys.byteorder != 'little':
+                        ids.byteswap()
+                    ids_portal[portal] = set(ids)
+        except (OSError, EOFError):
+            return None
+        return ids_portal
+
+    def __len__(self) -> int:
+        return sum(len(ids) for ids in self._ids.values())
+
+    def __contains__(self, url: str) -> bool:
+        ident = id_anuncio(url)
+        return ident is not None and ident[1] in self._ids[ident[0]]
+
+    def total(self, portal: str) -> int:
+        return len(self._ids.get(portal, ()))
+
+    def agregar(self, urls: Iterable[str]) -> int:
+        """Añade los anuncios de las URLs. Retorna cuántos eran nuevos"""
+        nuevos = 0
+        with self._lock:
+            for url in urls:
+                ident = id_anuncio(url)
+                if ident and ident[1] not in self._ids[ident[0]]:
+                    self._ids[ident[0]].add(ident[1])
+                    self._altas[ident[0]].add(ident[1])
+                    self._bajas[ident[0]].discard(ident[1])
+                    nuevos += 1
+        return nuevos
+
+    def registrar(self, urls: Iterable[str]) -> int:
+        """Añade las URLs recién guardadas y escribe el índice si hay nuevas"""
+        nuevos = self.agregar(urls)
+        if nuevos:
+            self.guardar()
+        return nuevos
+
+    def quitar(self, urls: Iterable[str]) -> int:
+        """Quita los anuncios de las URLs (p. ej. descatalogados). Retorna cuántos había"""
+        quitados = 0
+        with self._lock:
+            for url in urls:
+                ident = id_anuncio(url)
+                if ident and ident[1] in self._ids[ident[0]]:
+                    self._ids[ident[0]].discard(ident[1])
+                    self._bajas[ident[0]].add(ident[1])
+                    self._altas[ident[0]].discard(ident[1])
+                    quitados += 1
+        return quitados
+
+    def reemplazar(self, urls: Iterable[str]) -> None:
+        """Sustituye el contenido por los anuncios de las URLs (el próximo guardar() no mezcla)"""
+        with self._lock:
+            self._ids = {portal: set() for portal in PORTALES}
+            self._reemplazado = True
+        self.agregar(urls)
+
+    def guardar(self) -> None:
+        """Aplica las altas y bajas al índice de disco y lo escribe de forma atómica.
+
+        La lectura y la escritura van bajo el bloqueo entre procesos del
+        archivo; el índice en memoria queda igual que el guardado.
+        """
+        with self._lock, bloqueo_archivo(self.ruta):
+            en_disco = None if self._reemplazado else self._leer()
+            if en_disco is not None:
+                self._ids = {portal: (en_disco[portal] | self._altas[portal]) - self._bajas[portal]
+                             for portal in PORTALES}
+            bloques = [array('Q', sorted(self._ids[portal])) for portal in PORTALES]
+            if sys.byteorder != 'little':
+                for ids in bloques:
+                    ids.byteswap()
+
+            def escribir(f):
+                f.write(_CABECERA.pack(MAGIA, *(len(ids) for ids in bloques)))
+                for ids in bloques:
+                    ids.tofile(f)
+
+            escribir_atomico(self.ruta, escribir, binario=True)
+            self._altas = {portal: set() for portal in PORTALES}
+            self._bajas = {portal: set() for portal in PORTALES}
+            self._reemplazado = False
+
+
+def urls_registradas(directorio: str = DIRECTORIO) -> List[str]:
+    """URLs activas de todas las zonas (almacén SQLite si está activo, si no los JSON)"""
+    # Import diferido: almacen_viviendas importa clave_anuncio de este módulo
+    from almacen_viviendas import ARCHIVO_DESCATALOGADAS, abrir_almacen
+
+    almacen = abrir_almacen(os.path.join(directorio, 'config.json'))
+    if almacen is not None:
+        return almacen.urls_activas()
+
+    urls = []
+    for archivo in sorted(glob.glob(os.path.join(directorio, 'viviendas_*.json'))):
+        if os.path.basename(archivo) == ARCHIVO_DESCATALOGADAS:
+            continue
+        try:
+            with open(archivo, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            continue
+        viviendas = data if isinstance(data, list) else data.get('viviendas', [])
+        urls.extend(v['url'] for v in viviendas if isinstance(v, dict) and v.get('url'))
+    return urls
+
+
+_indices = {}
+_lock_indices = threading.Lock()
+
+
+def abrir_indice(ruta: str = RUTA_INDICE) -> IndiceGlobal:
+    """El índice compartido del proceso; si no existe en disco se construye con las zonas"""
+    with _lock_indices:
+        if ruta not in _indices:
+            indice = IndiceGlobal(ruta)
+            if not indice.cargado:
+                indice.reemplazar(urls_registradas(os.path.dirname(ruta) or DIRECTORIO))
+                indice.guardar()
+            _indices[ruta] = indice
+        return _indices[ruta]
+
+
+def copias_descatalogadas(duplicadas: dict, urls_descatalogadas: Iterable[str]) -> list:
+    """Copias en otras zonas de los anuncios descatalogados: [(datos_json, vivienda)]"""
+    claves = {clave_anuncio(url) for url in urls_descatalogadas}
+    return [copia for clave in claves for copia in duplicadas.get(clave, [])]
+
+
+def separar_duplicadas(datos: list) -> dict:
+    """Deja cada anuncio solo en el primer archivo en que aparece.
+
+    datos es la lista [{archivo, portal, ubicacion, viviendas, ...}] de los
+    verificadores; las copias se quitan de 'viviendas' y se devuelven como
+    {clave: [(datos_json, vivienda)]} para aplicarles el resultado del original.
+    """
+    vistas = set()
+    duplicadas = {}
+    for datos_json in datos:
+        unicas = []
+        for vivienda in datos_json['viviendas']:
+            clave = clave_anuncio(vivienda.get('url', ''))
+            if clave and clave in vistas:
+                duplicadas.setdefault(clave, []).append((datos_json, vivienda))
+                continue
+            vistas.add(clave)
+            unicas.append(vivienda)
+        datos_json['viviendas'] = unicas
+    return duplicadas
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Índice global de anuncios (portal, ID)')
+    parser.add_argument('--ruta', default=RUTA_INDICE, help=f'Archivo del índice (default: {RUTA_INDICE})')
+    comandos = parser.add_subparsers(dest='comando', required=True)
+    comandos.add_parser('reconstruir', help='Reconstruir desde los viviendas_*.json o el almacén')
+    comandos.add_parser('resumen', help='Anuncios indexados por portal')
+    args = parser.parse_args()
+
+    indice = IndiceGlobal(args.ruta)
+    if args.comando == 'reconstruir':
+        indice.reemplazar(urls_registradas(os.path.dirname(os.path.abspath(args.ruta))))
+        indice.guardar()
+        print(f"✅ Índice reconstruido: {len(indice)} anuncios en {indice.ruta}")
+    elif not indice.cargado:
+        print(f"⚠️  No hay índice en {indice.ruta} (python indice_global.py reconstruir)")
+        return 1
+
+    for portal in PORTALES:
+        print(f"  {portal:<10} {indice.total(portal):>7}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
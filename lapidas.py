@@ -0,0 +1,189 @@
+"""
+Lápidas de anuncios descatalogados
+verificar_auto.py borra las descatalogadas de los viviendas_*.json, así que el
+conjunto de URLs conocidas de cada zona (parada temprana de los scrapers) se
+vacía con el tiempo y algún anuncio antiguo vuelve a entrar. Las lápidas
+conservan esos anuncios, construidas desde viviendas_descatalogadas.json:
+  - Filtro de Bloom (blake2b) con la clave portal:id de todas las descatalogadas:
+    el scraper no vuelve a guardar un anuncio dado de baja.
+  - Conjunto exacto de las LAPIDAS_RECIENTES más recientes por zona (hash de
+    64 bits de "zona|clave"): cuentan como anuncio conocido para la parada
+    temprana. Es exacto porque un falso positivo pararía antes de tiempo.
+
+Formato en disco (lapidas.bin): cabecera (firma, bits y hashes del filtro,
+elementos, tamaño del conjunto exacto), bits del filtro y los hashes del
+conjunto como array('Q') little-endian. Se reconstruye cuando
+viviendas_descatalogadas.json es más reciente.
+"""
+
+import hashlib
+import json
+import math
+import os
+import struct
+import sys
+import threading
+from array import array
+from typing import Iterable, Optional
+
+from escritura_atomica import escribir_atomico
+from indice_global import clave_anuncio
+
+
+DIRECTORIO = os.path.dirname(os.path.abspath(__file__))
+RUTA_LAPIDAS = os.path.join(DIRECTORIO, 'lapidas.bin')
+RUTA_DESCATALOGADAS = os.path.join(DIRECTORIO, 'viviendas_descatalogadas.json')
+
+# Probabilidad de falso positivo del filtro y capacidad mínima (deja margen de crecimiento)
+FALSO_POSITIVO = 0.001
+CAPACIDAD_MINIMA = 10000
+
+# Descatalogadas más recientes que sirven de marca de parada
+LAPIDAS_RECIENTES = 5000
+
+MAGIA = b'LAP1'
+_CABECERA = struct.Struct('<4sQIQQ')  # firma, bits, hashes, elementos, recientes
+
+
+def _hash(texto: str, digest_size: int = 8) -> bytes:
+    return hashlib.blake2b(texto.encode('utf-8'), digest_size=digest_size).digest()
+
+
+def _hash_zona(url: str, zona: str) -> int:
+    return int.from_bytes(_hash(f"{zona}|{clave_anuncio(url)}"), 'little')
+
+
+class FiltroBloom:
+    """Filtro de Bloom con doble hash sobre blake2b (16 bytes -> k posiciones)"""
+
+    def __init__(self, bits: int, hashes: int, datos: bytearray = None, elementos: int = 0):
+        self.bits = bits
+        self.hashes = hashes
+        self.datos = datos if datos is not None else bytearray((bits + 7) // 8)
+        self.elementos = elementos
+
+    @classmethod
+    def para(cls, capacidad: int, falso_positivo: float = FALSO_POSITIVO) -> 'FiltroBloom':
+        """Filtro dimensionado para capacidad elementos con la tasa de falsos positivos dada"""
+        capacidad = max(1, capacidad)
+        bits = math.ceil(-capacidad * math.log(falso_positivo) / math.log(2) ** 2)
+        hashes = max(1, round(bits / capacidad * math.log(2)))
+        return cls(bits, hashes)
+
+    def _posiciones(self, clave: str):
+        digest = _hash(clave, 16)
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return ((h1 + i * h2) % self.bits for i in range(self.hashes))
+
+    def agregar(self, clave: str) -> None:
+        for posicion in self._posiciones(clave):
+            self.datos[posicion >> 3] |= 1 << (posicion & 7)
+        self.elementos += 1
+
+    def __contains__(self, clave: str) -> bool:
+        return all(self.datos[posicion >> 3] & (1 << (posicion & 7)) for posicion in self._posiciones(clave))
+
+
+class Lapidas:
+    """Filtro de bajas históricas + conjunto exacto de bajas recientes por zona"""
+
+    def __init__(self, filtro: FiltroBloom, recientes: Iterable[int] = ()):
+        self.filtro = filtro
+        self.recientes = set(recientes)
+
+    @classmethod
+    def desde_descatalogadas(cls, detalle: list) -> 'Lapidas':
+        """Construye las lápidas desde el 'detalle' de viviendas_descatalogadas.json (más antiguas primero)"""
+        filtro = FiltroBloom.para(max(CAPACIDAD_MINIMA, 2 * len(detalle)))
+        for entrada in detalle:
+            if entrada.get('url'):
+                filtro.agregar(clave_anuncio(entrada['url']))
+        recientes = [
+            _hash_zona(entrada['url'], entrada.get('ubicacion', ''))
+            for entrada in detalle[-LAPIDAS_RECIENTES:] if entrada.get('url')
+        ]
+        return cls(filtro, recientes)
+
+    def __len__(self) -> int:
+        return self.filtro.elementos
+
+    def __contains__(self, url: str) -> bool:
+        """True si el anuncio se descatalogó alguna vez (con falsos positivos acotados)"""
+        return bool(url) and clave_anuncio(url) in self.filtro
+
+    def parada(self, url: str, zona: Optional[str]) -> bool:
+        """True si el anuncio se descatalogó hace poco de esa zona (exacto)"""
+        return bool(url) and zona is not None and _hash_zona(url, zona) in self.recientes
+
+    def guardar(self, ruta: str = RUTA_LAPIDAS) -> None:
+        """Escribe las lápidas de forma atómica (archivo temporal + os.replace)"""
+        recientes = array('Q', sorted(self.recientes))
+        if sys.byteorder != 'little':
+            recientes.byteswap()
+
+        def escribir(f):
+            f.write(_CABECERA.pack(MAGIA, self.filtro.bits, self.filtro.hashes,
+                                   self.filtro.elementos, len(recientes)))
+            f.write(self.filtro.datos)
+            recientes.tofile(f)
+
+        escribir_atomico(ruta, escribir, binario=True)
+
+    @classmethod
+    def cargar(cls, ruta: str = RUTA_LAPIDAS) -> Optional['Lapidas']:
+        """Lee lapidas.bin, o None si no existe o no es válido"""
+        try:
+            with open(ruta, 'rb') as f:
+                cabecera = f.read(_CABECERA.size)
+                if len(cabecera) != _CABECERA.size:
+                    return None
+                magia, bits, hashes, elementos, n_recientes = _CABECERA.unpack(cabecera)
+                if magia != MAGIA:
+                    return None
+                datos = bytearray(f.read((bits + 7) // 8))
+                if len(datos) != (bits + 7) // 8:
+                    return None
+                recientes = array('Q')
+                recientes.fromfile(f, n_recientes)
+        except (OSError, EOFError):
+            return None
+        if sys.byteorder != 'little':
+            recientes.byteswap()
+        return cls(FiltroBloom(bits, hashes, datos, elementos), recientes)
+
+
+def _mtime(ruta: str) -> float:
+    try:
+        return os.path.getmtime(ruta)
+    except OSError:
+        return 0.0
+
+
+_lapidas = {}
+_lock_lapidas = threading.Lock()
+
+
+def abrir_lapidas(ruta_descatalogadas: str = RUTA_DESCATALOGADAS,
+                  ruta: str = RUTA_LAPIDAS) -> Lapidas:
+    """Las lápidas del proceso; se reconstruyen si el JSON de descatalogadas es más reciente"""
+    with _lock_lapidas:
+        version = _mtime(ruta_descatalogadas)
+        clave = (ruta_descatalogadas, ruta)
+        if clave in _lapidas and _lapidas[clave][0] == version:
+            return _lapidas[clave][1]
+
+        lapidas = Lapidas.cargar(ruta) if _mtime(ruta) >= version else None
+        if lapidas is None:
+            detalle = []
+            try:
+                with open(ruta_descatalogadas, 'r', encoding='utf-8') as f:
+                    detalle = json.load(f).get('detalle', [])
+            except (OSError, ValueError, AttributeError):
+                pass
+            lapidas = Lapidas.desde_descatalogadas(detalle)
+            if version:
+                lapidas.guardar(ruta)
+        _lapidas[clave] = (version, lapidas)
+        return lapidas
+
@@ -0,0 +1,164 @@
+"""
+Marca de agua por zona para el rastreo incremental
+Cada zona recuerda el ID de anuncio más alto y la publicación más reciente
+vistos en la última ejecución. Con el listado ordenado por fecha, el rastreo se
+detiene cuando aparecen CONSECUTIVOS_PARADA anuncios seguidos anteriores a la
+marca (menos una tolerancia): un destacado o un anuncio reordenado suelto no
+corta el rastreo, y no hace falta cargar todas las URLs conocidas de la zona.
+
+La marca se guarda en el almacén de viviendas (almacen_viviendas.leer_marca_agua /
+guardar_marca_agua) después de guardar las viviendas de la zona (MarcasPendientes).
+Una zona dividida en fragmentos de precio (fragmentos_precio.py) tiene una marca
+por fragmento: clave_marca("viviendas_idealista_X.json", "precio-0-199999").
+
+La tolerancia de IDs es por portal y configurable en config.json:
+    "marca_agua": {"tolerancia_ids": {"idealista": 20000, "fotocasa": 1000}}
+"""
+
+import json
+import os
+from dataclasses import asdict, dataclass
+from datetime import datetime
+from typing import Optional
+
+from almacen_viviendas import guardar_marca_agua
+
+
+# Anuncios seguidos anteriores a la marca para dar el listado por visto
+CONSECUTIVOS_PARADA = 5
+
+# Un anuncio creado poco antes de la última ejecución puede publicarse después:
+# los IDs y fechas dentro de la tolerancia se tratan como nuevos. Idealista numera
+# los anuncios de todo el portal y su listado no da fecha (solo el ID): su margen
+# de IDs es mayor
+TOLERANCIA_IDS = 1000
+TOLERANCIA_IDS_PORTAL = {'idealista': 20000, 'fotocasa': TOLERANCIA_IDS}
+TOLERANCIA_HORAS = 6
+
+
+def tolerancia_ids(portal: str, config_file: str = "config.json") -> int:
+    """Tolerancia de IDs del portal: "marca_agua.tolerancia_ids" de config.json o la de por defecto"""
+    tolerancias = dict(TOLERANCIA_IDS_PORTAL)
+    try:
+        with open(config_file, 'r', encoding='utf-8') as f:
+            tolerancias.update(json.load(f).get('marca_agua', {}).get('tolerancia_ids', {}))
+    except (OSError, ValueError, AttributeError):
+        pass
+    return int(tolerancias.get(portal, TOLERANCIA_IDS))
+
+
+@dataclass
+class MarcaAgua:
+    max_id: int = 0
+    max_publicacion: Optional[int] = None  # epoch en ms (fecha de publicación del portal)
+    timestamp: Optional[str] = None
+    ultimo_completo: Optional[str] = None  # último rastreo sin ventana de publicación (ISO)
+
+    @classmethod
+    def desde_dict(cls, datos: Optional[dict]) -> Optional['MarcaAgua']:
+        if not datos or not datos.get('max_id'):
+            return None
+        return cls(int(datos['max_id']), datos.get('max_publicacion'), datos.get('timestamp'),
+                   datos.get('ultimo_completo'))
+
+    def a_dict(self) -> dict:
+        return asdict(self)
+
+
+def clave_marca(ruta_json: str, fragmento: Optional[str] = None) -> str:
+    """Clave de la marca de agua: el archivo de la zona, con '#fragmento' si lo hay"""
+    return f"{ruta_json}#{fragmento}" if fragmento else ruta_json
+
+
+def _entero(valor) -> Optional[int]:
+    try:
+        return int(valor)
+    except (TypeError, ValueError):
+        return None
+
+
+class CorteMarcaAgua:
+    """Recorre el listado en orden, decide cuándo parar y acumula la marca nueva"""
+
+    def __init__(self, marca: Optional[MarcaAgua] = None, consecutivos: int = CONSECUTIVOS_PARADA,
+                 tolerancia_ids: int = TOLERANCIA_IDS):
+        self.marca = marca
+        self.consecutivos = consecutivos
+        self.tolerancia_ids = tolerancia_ids
+        self.anteriores = 0
+        self.max_id = marca.max_id if marca else 0
+        self.max_publicacion = marca.max_publicacion if marca else None
+        # El scraper lo pone a True al llegar al final del listado (sin parar antes)
+        self.fin_listado = False
+
+    def _es_anterior(self, anuncio_id: Optional[int], publicacion: Optional[int]) -> bool:
+        if publicacion is not None and self.marca.max_publicacion is not None:
+            return publicacion < self.marca.max_publicacion - TOLERANCIA_HORAS * 3600 * 1000
+        return anuncio_id is not None and anuncio_id < self.marca.max_id - self.tolerancia_ids
+
+    def observar(self, anuncio_id, publicacion=None) -> bool:
+        """Anota un anuncio del listado (particular o no). True si hay que parar"""
+        anuncio_id, publicacion = _entero(anuncio_id), _entero(publicacion)
+        if anuncio_id is not None:
+            self.max_id = max(self.max_id, anuncio_id)
+        if publicacion is not None:
+            self.max_publicacion = max(self.max_publicacion or 0, publicacion)
+
+        if self.marca is None:
+            return False
+        if self._es_anterior(anuncio_id, publicacion):
+            self.anteriores += 1
+        else:
+            self.anteriores = 0
+        return self.anteriores >= self.consecutivos
+
+    def nueva_marca(self, completo: bool = True) -> Optional[MarcaAgua]:
+        """Marca para la próxima ejecución (None si no se ha visto ningún anuncio).
+
+        completo indica que el listado no llevaba ventana de publicación (ver
+        ventana_reciente.py); el rastreo solo cuenta como completo si además
+        llegó al final del listado (fin_listado). Si no, se conserva la fecha
+        del último completo.
+        """
+        if not self.max_id:
+            return None
+        ahora = datetime.now().isoformat()
+        ultimo_completo = ahora if completo and self.fin_listado else (self.marca.ultimo_completo if self.marca else None)
+        return MarcaAgua(self.max_id, self.max_publicacion, ahora, ultimo_completo)
+
+
+class MarcasPendientes:
+    """Marcas nuevas de un scraper, pendientes de guardar con el JSON de su zona.
+
+    Si la zona tiene viviendas nuevas la marca solo se guarda después de ellas
+    (confirmar): un fallo al guardar no deja una marca por delante de los datos.
+    """
+
+    def __init__(self, config_file: str = "config.json"):
+        self.config_file = config_file
+        self._marcas = []             # [(ruta_json, clave_marca, MarcaAgua)]
+
+    def registrar(self, ruta_json: str, clave: str, marca: Optional[MarcaAgua], hay_viviendas: bool) -> None:
+        """Deja la marca nueva pendiente hasta guardar la zona, o la guarda ya si no hay viviendas"""
+        if marca is None:
+            return
+        if hay_viviendas:
+            self._marcas.append((ruta_json, clave, marca))
+        else:
+            guardar_marca_agua(clave, marca.a_dict(), self.config_file)
+
+    def confirmar(self, filename: str) -> None:
+        """Guarda las marcas pendientes de la zona (tras guardar su JSON)"""
+        zona = os.path.basename(filename)
+        for ruta_json, clave, marca in self._marcas:
+            if os.path.basename(ruta_json) == zona:
+                guardar_marca_agua(clave, marca.a_dict(), self.config_file)
+        self.descartar(filename)
+
+    def descartar(self, ruta_json: str) -> None:
+        """Olvida las marcas pendientes de la zona (se va a rastrear de nuevo)"""
+        zona = os.path.basename(ruta_json)
+        self._marcas = [p for p in self._marcas if os.path.basename(p[0]) != zona]
+
+    def __len__(self) -> int:
+        return len(self._marcas)
@@ -0,0 +1,167 @@
+"""
+Orquestador de portales: Idealista y Fotocasa a la vez, cada uno en su proceso
+Idealista (Selenium sobre el Chrome de depuración, puerto 9222) y Fotocasa
+(Chromium propio vía CDP, puerto 9223) son navegadores independientes con
+límites de peticiones independientes. Aquí cada portal ejecuta su batch en un
+proceso propio (ejecutor_zonas.ejecutar_zonas, con los trabajadores de
+"ejecucion_paralela" si está activo, si no uno) y envía el progreso de cada
+zona por una cola. El proceso principal muestra el progreso y un informe
+conjunto: la duración total es la del portal más lento, no la suma.
+
+Los prompts de captcha o de cambio de IP siguen funcionando: cada proceso
+reabre la terminal como entrada estándar.
+
+Uso:
+    python orquestador.py                                  # todos los portales, todas las páginas
+    python orquestador.py --portales fotocasa --paginas 5 --informe informe_ejecucion.json
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import queue
+import sys
+import time
+from dataclasses import asdict
+from datetime import datetime
+from typing import Dict, List
+
+from ejecutor_zonas import (ResultadoZona, TrabajadorFotocasa, TrabajadorIdealista, TrabajoZona,
+                            cargar_config_paralela, ejecutar_zonas, mostrar_resumen, zonas_batch)
+
+
+DIRECTORIO = os.path.dirname(os.path.abspath(__file__))
+RUTA_CONFIG = os.path.join(DIRECTORIO, 'config.json')
+
+PORTALES = ('idealista', 'fotocasa')
+
+# Terminal desde la que los hijos leen los input() de captcha y cambio de IP
+TERMINAL = 'CON' if os.name == 'nt' else '/dev/tty'
+
+# Cada cuánto comprueba el proceso principal si algún portal ha muerto sin avisar
+INTERVALO_SONDEO = 5
+
+
+def _fabrica(portal: str, modo_debug: bool, num_paginas):
+    if portal == 'idealista':
+        return lambda n: TrabajadorIdealista(n, modo_debug, num_paginas)
+    return lambda n: TrabajadorFotocasa(n, modo_debug, num_paginas)
+
+
+def proceso_portal(portal: str, zonas: List[dict], modo_debug: bool, num_paginas, cola):
+    """Batch de un portal (proceso hijo): envía ('zona', portal, ResultadoZona) y ('fin', portal, segundos)"""
+    # multiprocessing cierra la entrada estándar del hijo (la deja en /dev/null)
+    try:
+        sys.stdin = open(TERMINAL)
+    except OSError:
+        pass
+    inicio = time.monotonic()
+    try:
+        config_paralela = cargar_config_paralela()
+        limite = config_paralela['trabajadores'].get(portal, 1) if config_paralela.get('activo') else 1
+        trabajos = [TrabajoZona(portal, zona['nombre'], zona['url']) for zona in zonas]
+        ejecutar_zonas(trabajos, {portal: _fabrica(portal, modo_debug, num_paginas)}, {portal: limite},
+                       config_paralela['pausa_entre_zonas'],
+                       al_terminar=lambda resultado: cola.put(('zona', portal, resultado)))
+    except BaseException as e:
+        cola.put(('error', portal, f"{type(e).__name__}: {e}"))
+    finally:
+        cola.put(('fin', portal, time.monotonic() - inicio))
+
+
+def orquestar(zonas_por_portal: Dict[str, List[dict]], modo_debug: bool = False, num_paginas=None,
+              ruta_informe: str = None) -> dict:
+    """Lanza un proceso por portal, muestra el progreso y retorna el informe conjunto"""
+    cola = multiprocessing.Queue()
+    procesos = {}
+    for portal, zonas in zonas_por_portal.items():
+        if not zonas:
+            continue
+        procesos[portal] = multiprocessing.Process(
+            target=proceso_portal, args=(portal, zonas, modo_debug, num_paginas, cola),
+            name=f"homescraper-{portal}")
+        procesos[portal].start()
+        print(f"🚀 {portal}: {len(zonas)} zonas (PID {procesos[portal].pid})")
+
+    inicio = time.monotonic()
+    resultados: List[ResultadoZona] = []
+    duraciones, errores = {}, {}
+    hechas = {portal: 0 for portal in procesos}
+    try:
+        while len(duraciones) < len(procesos):
+            try:
+                tipo, portal, valor = cola.get(timeout=INTERVALO_SONDEO)
+            except queue.Empty:
+                # Un proceso muerto sin 'fin' (kill, fallo del intérprete) no bloquea el informe
+                for portal, proceso in procesos.items():
+                    if portal not in duraciones and not proceso.is_alive():
+                        duraciones[portal] = time.monotonic() - inicio
+                        errores[portal] = f"el proceso terminó con código {proceso.exitcode}"
+                continue
+            if tipo == 'zona':
+                resultados.append(valor)
+                hechas[portal] += 1
+                estado = f"❌ {valor.error}" if valor.error else f"{valor.nuevas} nuevas"
+                print(f"📊 [{portal} {hechas[portal]}/{len(zonas_por_portal[portal])}] "
+                      f"{valor.nombre}: {estado} ({valor.segundos / 60:.1f} min)")
+            elif tipo == 'error':
+                errores[portal] = valor
+            elif tipo == 'fin':
+                duraciones[portal] = valor
+    except KeyboardInterrupt:
+        print("\n⚠️  Interrumpido: cerrando los procesos de los portales...")
+        for proceso in procesos.values():
+            proceso.join(timeout=15)
+            if proceso.is_alive():
+                proceso.terminate()
+        raise
+    for proceso in procesos.values():
+        proceso.join()
+
+    segundos = time.monotonic() - inicio
+    mostrar_resumen(resultados, segundos)
+    for portal, duracion in duraciones.items():
+        print(f"  ⏱️  {portal}: {duracion / 60:.1f} min")
+    for portal, error in errores.items():
+        print(f"  ❌ {portal}: {error}")
+
+    informe = {
+        'timestamp': datetime.now().isoformat(),
+        'segundos': round(segundos, 1),
+        'portales': {
+            portal: {
+                'segundos': round(duraciones.get(portal, 0), 1),
+                'zonas': len(zonas_por_portal[portal]),
+                'nuevas': sum(r.nuevas for r in resultados if r.portal == portal),
+                'error': errores.get(portal),
+            }
+            for portal in procesos
+        },
+        'zonas': [asdict(r) for r in resultados],
+    }
+    if ruta_informe:
+        with open(ruta_informe, 'w', encoding='utf-8') as f:
+            json.dump(informe, f, ensure_ascii=False, indent=2)
+        print(f"\n📄 Informe guardado en {ruta_informe}")
+    return informe
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Batch de todos los portales a la vez, un proceso por portal')
+    parser.add_argument('--portales', nargs='+', choices=PORTALES, default=list(PORTALES))
+    parser.add_argument('--paginas', type=int, default=None, help='páginas por zona (por defecto todas)')
+    parser.add_argument('--debug', action='store_true')
+    parser.add_argument('--informe', help='guarda el informe conjunto en este JSON')
+    args = parser.parse_args()
+
+    with open(RUTA_CONFIG, 'r', encoding='utf-8') as f:
+        config = json.load(f)
+    zonas_por_portal = {portal: zonas_batch(portal, config) for portal in args.portales}
+    if 'idealista' in zonas_por_portal:
+        print("[!] Idealista usa el Chrome de depuración (start_chrome_debug.bat) en el puerto 9222")
+    orquestar(zonas_por_portal, args.debug, args.paginas, args.informe)
+
+
+if __name__ == "__main__":
+    main()
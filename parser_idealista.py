@@ -0,0 +1,226 @@
+"""
+Motores de extracción para los listados de Idealista
+Convierte el HTML de una página de resultados en registros planos (uno por
+article.item) para que el scraper no dependa de un parser concreto.
+
+Motores disponibles:
+  - 'bs4':  BeautifulSoup + html.parser (siempre disponible)
+  - 'lxml': un único parseo con lxml.html y XPath precompilados (opcional)
+"""
+
+import json
+import re
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+from bs4 import BeautifulSoup
+
+try:
+    from lxml import etree
+    from lxml import html as lxml_html
+    LXML_DISPONIBLE = True
+except ImportError:
+    LXML_DISPONIBLE = False
+
+
+PATRON_UTAG_DATA = re.compile(r'var\s+utag_data\s*=')
+PATRON_UTAG_INICIO = re.compile(r'utag_data\s*=\s*(?=\{)')
+
+_DECODIFICADOR_JSON = json.JSONDecoder()
+
+MOTORES = ('bs4', 'lxml')
+
+
+@dataclass
+class PaginaListado:
+    """Resultado de parsear una página de listado"""
+    articulos: List[dict] = field(default_factory=list)
+    script_utag: Optional[str] = None
+
+
+def _registro_vacio(element_id: Optional[str]) -> dict:
+    """Registro de artículo con los valores por defecto del scraper"""
+    return {
+        'id': element_id,
+        'href': None,           # None = el artículo no tiene a.item-link
+        'titulo': 'Sin título',
+        'precio': 'N/A',
+        'habitaciones': None,
+        'metros': None,
+        'descripcion': None,
+        'tiene_logo': False,
+    }
+
+
+def _aplicar_detalle(registro: dict, texto: str):
+    """Clasifica el texto de un span.item-detail (habitaciones o metros)"""
+    if 'hab.' in texto:
+        registro['habitaciones'] = texto
+    elif 'm²' in texto:
+        registro['metros'] = texto
+
+
+# ============================================================
+# utag_data DIRECTO DEL CÓDIGO FUENTE
+# ============================================================
+
+def extraer_utag_data(html: str) -> Optional[dict]:
+    """Decodifica utag_data directamente del HTML (o del texto del script) sin parsear el DOM.
+    
+    Localiza la asignación con una regex y decodifica solo el objeto JSON con
+    raw_decode, que se detiene al cerrar la llave (no depende del ';' final).
+    """
+    if not html:
+        return None
+    for match in PATRON_UTAG_INICIO.finditer(html):
+        try:
+            data, _ = _DECODIFICADOR_JSON.raw_decode(html, match.end())
+        except json.JSONDecodeError:
+            continue
+        if isinstance(data, dict):
+            return data
+    return None
+
+
+# ============================================================
+# MOTOR BS4
+# ============================================================
+
+def parsear_listado_bs4(html: str) -> PaginaListado:
+    """Parsea un listado con BeautifulSoup (comportamiento original del scraper)"""
+    soup = BeautifulSoup(html, 'html.parser')
+    pagina = PaginaListado()
+
+    for art in soup.find_all('article', class_='item'):
+        registro = _registro_vacio(art.get('data-element-id'))
+
+        link = art.find('a', class_='item-link')
+        if link:
+            registro['href'] = link.get('href', '')
+            registro['titulo'] = link.get('title', 'Sin título')
+
+        precio_elem = art.find('span', class_='item-price')
+        if precio_elem:
+            registro['precio'] = precio_elem.get_text(strip=True)
+
+        for detalle in art.find_all('span', class_='item-detail'):
+            _aplicar_detalle(registro, detalle.get_text(strip=True))
+
+        desc_elem = art.find('div', class_='item-description')
+        if desc_elem:
+            registro['descripcion'] = desc_elem.get_text(strip=True)
+
+        registro['tiene_logo'] = art.find('picture', class_='logo-branding') is not None
+        pagina.articulos.append(registro)
+
+    script_tag = soup.find('script', string=PATRON_UTAG_DATA)
+    if script_tag:
+        pagina.script_utag = script_tag.string
+
+    return pagina
+
+
+# ============================================================
+# MOTOR LXML
+# ============================================================
+
+def _xpath_clase(tag: str, clase: str, relativo: bool = True) -> str:
+    """XPath equivalente a find(tag, class_=clase) de BeautifulSoup"""
+    prefijo = './/' if relativo else '//'
+    return f"{prefijo}{tag}[contains(concat(' ', normalize-space(@class), ' '), ' {clase} ')]"
+
+
+if LXML_DISPONIBLE:
+    _XP_ARTICULOS = etree.XPath(_xpath_clase('article', 'item', relativo=False))
+    _XP_LINK = etree.XPath(_xpath_clase('a', 'item-link'))
+    _XP_PRECIO = etree.XPath(_xpath_clase('span', 'item-price'))
+    _XP_DETALLES = etree.XPath(_xpath_clase('span', 'item-detail'))
+    _XP_DESCRIPCION = etree.XPath(_xpath_clase('div', 'item-description'))
+    _XP_LOGO = etree.XPath(_xpath_clase('picture', 'logo-branding'))
+    _XP_SCRIPTS = etree.XPath('//script')
+
+_TAGS_SIN_TEXTO = {'script', 'style', 'template'}
+
+
+def _texto_lxml(elem) -> str:
+    """Equivalente a get_text(strip=True): ignora comentarios y script/style"""
+    partes = []
+
+    def recorrer(nodo):
+        if nodo.text and nodo.tag not in _TAGS_SIN_TEXTO:
+            partes.append(nodo.text.strip())
+        for hijo in nodo:
+            if isinstance(hijo.tag, str):
+                recorrer(hijo)
+            if hijo.tail:
+                partes.append(hijo.tail.strip())
+
+    if isinstance(elem.tag, str) and elem.tag in _TAGS_SIN_TEXTO:
+        return ''
+    recorrer(elem)
+    return ''.join(partes)
+
+
+def _primero(resultados):
+    return resultados[0] if resultados else None
+
+
+def parsear_listado_lxml(html: str) -> PaginaListado:
+    """Parsea un listado con un único árbol lxml y XPath precompilados"""
+    if not LXML_DISPONIBLE:
+        raise ImportError("lxml no está instalado (pip install lxml)")
+
+    pagina = PaginaListado()
+    if not html or not html.strip():
+        return pagina
+
+    arbol = lxml_html.fromstring(html)
+
+    for art in _XP_ARTICULOS(arbol):
+        registro = _registro_vacio(art.get('data-element-id'))
+
+        link = _primero(_XP_LINK(art))
+        if link is not None:
+            registro['href'] = link.get('href', '')
+            registro['titulo'] = link.get('title', 'Sin título')
+
+        precio_elem = _primero(_XP_PRECIO(art))
+        if precio_elem is not None:
+            registro['precio'] = _texto_lxml(precio_elem)
+
+        for detalle in _XP_DETALLES(art):
+            _aplicar_detalle(registro, _texto_lxml(detalle))
+
+        desc_elem = _primero(_XP_DESCRIPCION(art))
+        if desc_elem is not None:
+            registro['descripcion'] = _texto_lxml(desc_elem)
+
+        registro['tiene_logo'] = bool(_XP_LOGO(art))
+        pagina.articulos.append(registro)
+
+    for script in _XP_SCRIPTS(arbol):
+        # BeautifulSoup solo compara script.string (un único nodo de texto)
+        if len(script) == 0 and script.text and PATRON_UTAG_DATA.search(script.text):
+            pagina.script_utag = script.text
+            break
+
+    return pagina
+
+
+# ============================================================
+# SELECCIÓN DE MOTOR
+# ============================================================
+
+def motor_por_defecto() -> str:
+    """lxml si está instalado, si no BeautifulSoup"""
+    return 'lxml' if LXML_DISPONIBLE else 'bs4'
+
+
+def parsear_listado(html: str, motor: Optional[str] = None) -> PaginaListado:
+    """Parsea un listado de Idealista con el motor indicado (o el por defecto)"""
+    motor = motor or motor_por_defecto()
+    if motor == 'lxml':
+        return parsear_listado_lxml(html)
+    if motor == 'bs4':
+        return parsear_listado_bs4(html)
+    raise ValueError(f"Motor HTML desconocido: {motor} (usa uno de {MOTORES})")
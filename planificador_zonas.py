@@ -0,0 +1,239 @@
+"""
+Frecuencia de rastreo adaptativa por zona
+El batch rastrea todas las zonas en cada ejecución, tanto si dan 20
+particulares nuevas al día (distritos de Barcelona) como una al mes (Moianès).
+El planificador guarda, por zona, la media exponencial de particulares nuevas
+por día (observada en cada rastreo) y la fecha del último rastreo y del último
+acierto, y calcula cuándo toca la siguiente visita: el tiempo esperado hasta
+objetivo_nuevas anuncios nuevos, entre min_horas y max_horas. El modo batch
+solo rastrea las zonas a las que ya les toca, las más atrasadas primero.
+
+Una zona sin estadísticas parte del historial del almacén (fecha_scraping de
+sus viviendas, sin contar el primer rastreo, que trae todo el stock) y una
+zona sin historial se rastrea siempre. Las estadísticas se guardan en
+frecuencia_zonas.json, junto a los JSON de las zonas.
+
+Configuración en config.json (desactivado por defecto):
+    "planificador_zonas": {
+        "activo": true,
+        "objetivo_nuevas": 1,
+        "min_horas": 6,
+        "max_horas": 168,
+        "alfa": 0.3,
+        "dias_historial": 30
+    }
+
+Uso:
+    python planificador_zonas.py                    # próxima visita de cada zona
+    python planificador_zonas.py --portal fotocasa
+"""
+
+import argparse
+import json
+import os
+import threading
+from dataclasses import asdict, dataclass
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from almacen_viviendas import leer_marca_agua, leer_zona
+from analizar_zonas import DIRECTORIO, PORTALES, RUTA_CONFIG, ruta_zona
+from escritura_atomica import bloqueo_archivo, escribir_json_atomico
+
+
+ARCHIVO_FRECUENCIAS = 'frecuencia_zonas.json'
+
+CONFIG_POR_DEFECTO = {
+    'activo': False,
+    'objetivo_nuevas': 1,
+    'min_horas': 6,
+    'max_horas': 24 * 7,
+    'alfa': 0.3,
+    'dias_historial': 30,
+}
+
+
+@dataclass
+class FrecuenciaZona:
+    tasa: float = 0.0                      # particulares nuevas por día (media exponencial)
+    rastreos: int = 0
+    ultimo_rastreo: Optional[str] = None   # ISO
+    ultimo_acierto: Optional[str] = None   # último rastreo (o vivienda) con alguna nueva
+
+    def observar(self, nuevas: int, ahora: datetime, config: dict) -> None:
+        """Anota un rastreo: la tasa se actualiza con nuevas / días desde el anterior.
+
+        El primer rastreo anotado solo fija la fecha: la tasa inicial es la del historial.
+        """
+        if self.rastreos and self.ultimo_rastreo:
+            dias = (ahora - datetime.fromisoformat(self.ultimo_rastreo)).total_seconds() / 86400
+            tasa = nuevas / max(dias, config['min_horas'] / 24)
+            self.tasa = config['alfa'] * tasa + (1 - config['alfa']) * self.tasa
+        self.rastreos += 1
+        self.ultimo_rastreo = ahora.isoformat()
+        if nuevas:
+            self.ultimo_acierto = self.ultimo_rastreo
+
+    def intervalo_horas(self, config: dict, ahora: datetime) -> float:
+        """Horas esperadas hasta objetivo_nuevas anuncios, entre min_horas y max_horas.
+
+        El último acierto pone un suelo a la tasa (al menos un anuncio desde
+        entonces): una zona que acaba de dar un anuncio no se deja una semana.
+        """
+        tasa = self.tasa
+        if self.ultimo_acierto:
+            dias = (ahora - datetime.fromisoformat(self.ultimo_acierto)).total_seconds() / 86400
+            tasa = max(tasa, 1 / max(dias, config['min_horas'] / 24))
+        if tasa <= 0:
+            return config['max_horas']
+        horas = 24 * config['objetivo_nuevas'] / tasa
+        return min(max(horas, config['min_horas']), config['max_horas'])
+
+    def proxima(self, config: dict, ahora: datetime) -> Optional[datetime]:
+        """Próxima visita (None si nunca se ha rastreado: toca ya)"""
+        if not self.ultimo_rastreo:
+            return None
+        return datetime.fromisoformat(self.ultimo_rastreo) + timedelta(hours=self.intervalo_horas(config, ahora))
+
+
+def cargar_config_planificador(config_file: str = "config.json") -> dict:
+    """Sección "planificador_zonas" de config.json con los valores por defecto"""
+    config = dict(CONFIG_POR_DEFECTO)
+    try:
+        with open(config_file, 'r', encoding='utf-8') as f:
+            config.update(json.load(f).get('planificador_zonas', {}))
+    except (OSError, ValueError, AttributeError):
+        pass
+    return config
+
+
+def _ruta_frecuencias(ruta_json: str) -> str:
+    return os.path.join(os.path.dirname(os.path.abspath(ruta_json)), ARCHIVO_FRECUENCIAS)
+
+
+def _leer_frecuencias(ruta: str) -> dict:
+    try:
+        with open(ruta, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def frecuencia_historica(ruta_json: str, config: dict, ahora: datetime,
+                         config_file: str = "config.json") -> FrecuenciaZona:
+    """Estimación inicial desde las viviendas guardadas de la zona (fecha_scraping)"""
+    try:
+        datos = leer_zona(ruta_json, config_file) or {}
+    except (OSError, ValueError):
+        datos = {}
+    fechas = []
+    for vivienda in datos.get('viviendas', []):
+        try:
+            fechas.append(datetime.fromisoformat(vivienda['fecha_scraping']))
+        except (KeyError, TypeError, ValueError):
+            continue
+    if not fechas:
+        return FrecuenciaZona()
+    # Un rastreo sin novedades no deja viviendas: la marca de agua tiene el último
+    marca = leer_marca_agua(ruta_json, config_file) or {}
+    # El primer día de la zona es el stock inicial, no ritmo de publicación
+    primer_dia = min(fechas).date()
+    desde = max(ahora - timedelta(days=config['dias_historial']),
+                datetime.combine(primer_dia + timedelta(days=1), datetime.min.time()))
+    dias = (ahora - desde).total_seconds() / 86400
+    nuevas = sum(1 for fecha in fechas if fecha >= desde)
+    ultima = max(fechas).isoformat()
+    tasa = nuevas / dias if dias >= 1 else 0.0
+    return FrecuenciaZona(tasa=tasa, ultimo_rastreo=max(ultima, marca.get('timestamp') or ''),
+                          ultimo_acierto=ultima)
+
+
+_lock_frecuencias = threading.Lock()
+
+
+def leer_frecuencia(ruta_json: str, config: dict = None, ahora: datetime = None,
+                    config_file: str = "config.json") -> FrecuenciaZona:
+    """Estadísticas guardadas de la zona, o la estimación del historial si no hay"""
+    config = config or cargar_config_planificador(config_file)
+    ahora = ahora or datetime.now()
+    datos = _leer_frecuencias(_ruta_frecuencias(ruta_json)).get(os.path.basename(ruta_json))
+    if datos:
+        try:
+            return FrecuenciaZona(**datos)
+        except TypeError:
+            pass
+    return frecuencia_historica(ruta_json, config, ahora, config_file)
+
+
+def registrar_rastreo(ruta_json: str, nuevas: int, config_file: str = "config.json",
+                      ahora: datetime = None, directorio: str = DIRECTORIO) -> None:
+    """Anota las particulares nuevas de un rastreo de la zona (solo con el planificador activo).
+
+    El archivo de la zona se resuelve en directorio, como en zonas_pendientes:
+    los scrapers pasan la ruta relativa (viviendas_idealista_X.json).
+    """
+    config = cargar_config_planificador(config_file)
+    if not config.get('activo'):
+        return
+    ahora = ahora or datetime.now()
+    ruta_json = os.path.join(directorio, os.path.basename(ruta_json))
+    ruta = _ruta_frecuencias(ruta_json)
+    with _lock_frecuencias, bloqueo_archivo(ruta):
+        frecuencia = leer_frecuencia(ruta_json, config, ahora, config_file)
+        frecuencia.observar(nuevas, ahora, config)
+        frecuencias = _leer_frecuencias(ruta)
+        frecuencias[os.path.basename(ruta_json)] = asdict(frecuencia)
+        escribir_json_atomico(ruta, frecuencias)
+
+
+def zonas_pendientes(portal: str, zonas: List[dict], config_file: str = "config.json",
+                     ahora: datetime = None, directorio: str = DIRECTORIO) -> List[dict]:
+    """Zonas del batch a las que ya les toca, las más atrasadas primero (todas si está desactivado)"""
+    config = cargar_config_planificador(config_file)
+    if not config.get('activo'):
+        return zonas
+    ahora = ahora or datetime.now()
+    pendientes, aplazadas = [], []
+    for zona in zonas:
+        ruta = os.path.join(directorio, os.path.basename(ruta_zona(portal, zona['nombre'])))
+        frecuencia = leer_frecuencia(ruta, config, ahora, config_file)
+        proxima = frecuencia.proxima(config, ahora)
+        if proxima is None or proxima <= ahora:
+            # Retraso relativo al intervalo: las zonas rápidas atrasadas van delante
+            retraso = float('inf') if proxima is None else \
+                (ahora - proxima).total_seconds() / 3600 / frecuencia.intervalo_horas(config, ahora)
+            pendientes.append((retraso, zona))
+        else:
+            aplazadas.append((proxima, zona))
+    pendientes.sort(key=lambda p: p[0], reverse=True)
+    if aplazadas:
+        siguiente = min(proxima for proxima, _ in aplazadas)
+        print(f"    📆 Planificador: {len(pendientes)} zonas pendientes, {len(aplazadas)} aplazadas "
+              f"(la siguiente a las {siguiente:%d/%m %H:%M})")
+    return [zona for _, zona in pendientes]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Próxima visita de cada zona según su ritmo de anuncios nuevos')
+    parser.add_argument('--portal', choices=PORTALES, help='Solo un portal (por defecto ambos)')
+    args = parser.parse_args()
+
+    with open(RUTA_CONFIG, 'r', encoding='utf-8') as f:
+        config_zonas = json.load(f)
+    config = cargar_config_planificador(RUTA_CONFIG)
+    ahora = datetime.now()
+    for portal in ([args.portal] if args.portal else PORTALES):
+        print(f"\n{'='*70}\n{portal.upper()}\n{'='*70}")
+        print(f"  {'zona':40} {'nuevas/día':>10} {'cada (h)':>9}  próxima")
+        for zona in config_zonas.get(portal, {}).get('urls', []):
+            frecuencia = leer_frecuencia(ruta_zona(portal, zona['nombre']), config, ahora, RUTA_CONFIG)
+            proxima = frecuencia.proxima(config, ahora)
+            cuando = 'ya' if proxima is None or proxima <= ahora else f"{proxima:%d/%m %H:%M}"
+            print(f"  {zona['nombre'][:40]:40} {frecuencia.tasa:10.2f} "
+                  f"{frecuencia.intervalo_horas(config, ahora):9.0f}  {cuando}")
+    if not config.get('activo'):
+        print("\n[!] planificador_zonas no está activo en config.json: el batch rastrea todas las zonas")
+
+
+if __name__ == "__main__":
+    main()
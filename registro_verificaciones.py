@@ -0,0 +1,123 @@
+"""
+Registro persistente de verificaciones de anuncios
+Por anuncio (clave portal:id, o la URL si no tiene ID) guarda la última
+comprobación, el último estado y las comprobaciones activas consecutivas.
+verificar_auto.py salta los anuncios comprobados dentro del TTL y verifica
+el resto por prioridad: los más olvidados y con más probabilidad de baja primero.
+"""
+
+import json
+import os
+import threading
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from escritura_atomica import escribir_json_atomico
+from indice_global import clave_anuncio
+
+
+RUTA_REGISTRO = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'registro_verificaciones.json')
+
+# Horas durante las que un anuncio comprobado activo no se vuelve a comprobar
+TTL_HORAS = 48
+
+# Prioridad: los anuncios más antiguos tienen más probabilidad de baja, y cada
+# comprobación activa consecutiva la reduce un poco
+EDAD_REFERENCIA_DIAS = 30
+PESO_ACTIVAS_CONSECUTIVAS = 0.25
+
+
+def _fecha(texto: Optional[str]) -> Optional[datetime]:
+    try:
+        return datetime.fromisoformat(texto) if texto else None
+    except (TypeError, ValueError):
+        return None
+
+
+class RegistroVerificaciones:
+    """Registro JSON de verificaciones, seguro entre hilos y con escritura atómica"""
+
+    def __init__(self, ruta: str = RUTA_REGISTRO, ttl_horas: float = TTL_HORAS):
+        self.ruta = ruta
+        self.ttl_horas = ttl_horas
+        self._lock = threading.Lock()
+        self._entradas = self._cargar()
+
+    def _cargar(self) -> dict:
+        if not os.path.isfile(self.ruta):
+            return {}
+        try:
+            with open(self.ruta, 'r', encoding='utf-8') as f:
+                return json.load(f).get('anuncios', {})
+        except (OSError, ValueError, AttributeError):
+            return {}
+
+    def __len__(self) -> int:
+        return len(self._entradas)
+
+    def entrada(self, url: str) -> Optional[dict]:
+        return self._entradas.get(clave_anuncio(url))
+
+    def horas_sin_verificar(self, url: str, ahora: datetime = None) -> Optional[float]:
+        """Horas desde la última comprobación, o None si nunca se ha comprobado"""
+        entrada = self.entrada(url)
+        ultima = _fecha(entrada.get('ultima_verificacion')) if entrada else None
+        if ultima is None:
+            return None
+        return ((ahora or datetime.now()) - ultima).total_seconds() / 3600
+
+    def vigente(self, url: str, ahora: datetime = None) -> bool:
+        """True si el anuncio se comprobó activo hace menos de ttl_horas"""
+        horas = self.horas_sin_verificar(url, ahora)
+        return horas is not None and horas < self.ttl_horas and self.entrada(url).get('estado') == 'activa'
+
+    def prioridad(self, vivienda: dict, ahora: datetime = None) -> float:
+        """Horas sin verificar ponderadas por la probabilidad de baja (mayor = antes).
+
+        La probabilidad crece con la antigüedad del anuncio (fecha_scraping) y
+        baja con las comprobaciones activas consecutivas. Los nunca verificados
+        van primero.
+        """
+        ahora = ahora or datetime.now()
+        url = vivienda.get('url', '')
+        horas = self.horas_sin_verificar(url, ahora)
+        if horas is None:
+            horas = float('inf')
+
+        publicado = _fecha(vivienda.get('fecha_scraping'))
+        dias = max(0.0, (ahora - publicado).total_seconds() / 86400) if publicado else 0.0
+        consecutivas = (self.entrada(url) or {}).get('activas_consecutivas', 0)
+
+        return horas * (1 + dias / EDAD_REFERENCIA_DIAS) / (1 + PESO_ACTIVAS_CONSECUTIVAS * consecutivas)
+
+    def planificar(self, viviendas: List[dict], ahora: datetime = None) -> Tuple[List[dict], int]:
+        """Viviendas a verificar ordenadas por prioridad, y cuántas se saltan por TTL"""
+        ahora = ahora or datetime.now()
+        pendientes = [v for v in viviendas if not self.vigente(v.get('url', ''), ahora)]
+        # sorted es estable: a igual prioridad se mantiene el orden del archivo
+        pendientes.sort(key=lambda v: self.prioridad(v, ahora), reverse=True)
+        return pendientes, len(viviendas) - len(pendientes)
+
+    def registrar(self, url: str, activa: bool, ahora: datetime = None) -> None:
+        """Anota el resultado de una comprobación"""
+        clave = clave_anuncio(url)
+        with self._lock:
+            previa = self._entradas.get(clave) or {}
+            self._entradas[clave] = {
+                'url': url,
+                'ultima_verificacion': (ahora or datetime.now()).isoformat(),
+                'estado': 'activa' if activa else 'descatalogada',
+                'activas_consecutivas': previa.get('activas_consecutivas', 0) + 1 if activa else 0,
+            }
+
+    def guardar(self) -> None:
+        """Escribe el registro de forma atómica (archivo temporal + os.replace)"""
+        # Bajo el lock: dos carriles guardando a la vez no se pisan con una copia antigua
+        with self._lock:
+            datos = {
+                'timestamp': datetime.now().isoformat(),
+                'ttl_horas': self.ttl_horas,
+                'total': len(self._entradas),
+                'anuncios': self._entradas,
+            }
+            escribir_json_atomico(self.ruta, datos)
@@ -0,0 +1,235 @@
+"""
+Reciclaje de páginas de Playwright según su memoria real
+Las páginas se reciclaban por contadores fijos (verificar_auto.py navegaba a
+about:blank cada 50 evaluate(), el scraper de Fotocasa reconectaba Playwright
+cada 15 páginas) y los fallos de heap se detectaban después, por el texto del
+error ("has been collected", "unbounded heap growth"), con varios minutos
+perdidos en cada recuperación.
+
+El monitor muestrea cada pocas operaciones, por CDP, Performance.getMetrics de
+la página (heap JS usado, nodos del DOM, listeners, documentos) y el número de
+objetos que la conexión de Playwright mantiene vivos en Python, y pide reciclar
+solo cuando alguno pasa de su umbral (o tras max_operaciones, por seguridad).
+Si no se pueden leer las métricas, o con el monitor desactivado, se recicla
+con el contador fijo de siempre.
+
+Cada ejecución guarda su línea temporal (muestras y reciclajes con su motivo)
+en salud_paginas.json:
+    python salud_pagina.py                  # resumen de las últimas ejecuciones
+
+Configuración en config.json (desactivado por defecto):
+    "salud_pagina": {
+        "activo": true,
+        "muestrear_cada": 5,
+        "umbrales": {"heap_mb": 256, "nodos": 100000, "listeners": 10000, "objetos": 10000}
+    }
+"""
+
+import json
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Optional
+
+from escritura_atomica import bloqueo_archivo, escribir_json_atomico
+
+
+DIRECTORIO = os.path.dirname(os.path.abspath(__file__))
+RUTA_SALUD = os.path.join(DIRECTORIO, 'salud_paginas.json')
+MAX_EJECUCIONES = 50
+MAX_MUESTRAS = 2000
+
+# Motivo de los reciclajes por contador fijo (monitor inactivo o sin métricas)
+MOTIVO_CONTADOR = 'contador'
+
+CONFIG_POR_DEFECTO = {
+    'activo': False,
+    'muestrear_cada': 5,          # operaciones (goto, evaluate, página) entre muestras
+    'umbrales': {
+        'heap_mb': 256,           # JSHeapUsedSize de la página
+        'nodos': 100_000,         # nodos del DOM
+        'listeners': 10_000,      # JSEventListeners
+        'objetos': 10_000,        # objetos vivos en la conexión de Playwright
+    },
+    'max_operaciones': 1000,      # reciclaje de seguridad aunque las métricas estén bien
+    # Contador fijo por origen (monitor inactivo o sin métricas)
+    'reciclar_cada': {'verificacion': 50, 'scraper': 15},
+}
+
+# Performance.getMetrics → nombre en la muestra (y divisor)
+METRICAS = {
+    'JSHeapUsedSize': ('heap_mb', 1_048_576),
+    'JSHeapTotalSize': ('heap_total_mb', 1_048_576),
+    'Nodes': ('nodos', 1),
+    'JSEventListeners': ('listeners', 1),
+    'Documents': ('documentos', 1),
+}
+
+
+def cargar_config_salud(config_file: str = "config.json") -> dict:
+    """Sección "salud_pagina" de config.json con los valores por defecto"""
+    config = dict(CONFIG_POR_DEFECTO)
+    try:
+        with open(config_file, 'r', encoding='utf-8') as f:
+            config.update(json.load(f).get('salud_pagina', {}))
+    except (OSError, ValueError, AttributeError):
+        pass
+    config['umbrales'] = {**CONFIG_POR_DEFECTO['umbrales'], **config.get('umbrales', {})}
+    config['reciclar_cada'] = {**CONFIG_POR_DEFECTO['reciclar_cada'], **config.get('reciclar_cada', {})}
+    return config
+
+
+def objetos_playwright(page) -> Optional[int]:
+    """Objetos que la conexión de Playwright mantiene vivos (crecen con cada evaluate/goto)"""
+    try:
+        return len(page._impl_obj._connection._objects)
+    except AttributeError:
+        return None
+
+
+class MonitorSalud:
+    """Métricas de memoria de una página y decisión de reciclarla"""
+
+    def __init__(self, portal: str, origen: str = 'scraper', config: dict = None):
+        self.portal = portal
+        self.origen = origen
+        self.config = config or cargar_config_salud()
+        self.activo = bool(self.config.get('activo'))
+        self.fijo = self.config['reciclar_cada'].get(origen, 50)
+        self.operaciones = 0          # desde el último reciclaje
+        self.muestras = []
+        self.reciclajes = []
+        self._page = None
+        self._cdp = None
+        self._ultima_muestra = 0
+        self._inicio = time.monotonic()
+        self._inicio_iso = datetime.now().isoformat()
+
+    def conectar(self, page) -> None:
+        """Abre la sesión CDP de la página (tras crearla o tras cada reconexión)"""
+        self._page = page
+        self._cdp = None
+        if not self.activo:
+            return
+        try:
+            self._cdp = page.context.new_cdp_session(page)
+            self._cdp.send('Performance.enable')
+        except Exception as e:
+            print(f"    ⚠️  Métricas de la página no disponibles ({e}): reciclaje cada {self.fijo} operaciones")
+            self._cdp = None
+
+    def operacion(self, n: int = 1) -> None:
+        """Cuenta n operaciones sobre la página (un goto cuenta como varias)"""
+        self.operaciones += n
+
+    def muestrear(self) -> Optional[dict]:
+        """Una muestra de las métricas actuales (None si no se pueden leer)"""
+        if self._cdp is None:
+            return None
+        try:
+            metricas = self._cdp.send('Performance.getMetrics')['metrics']
+        except Exception:
+            return None
+        muestra = {'t': round(time.monotonic() - self._inicio, 1), 'operaciones': self.operaciones}
+        for metrica in metricas:
+            if metrica['name'] in METRICAS:
+                nombre, divisor = METRICAS[metrica['name']]
+                muestra[nombre] = round(metrica['value'] / divisor, 1)
+        muestra['objetos'] = objetos_playwright(self._page)
+        if len(self.muestras) < MAX_MUESTRAS:
+            self.muestras.append(muestra)
+        return muestra
+
+    def excedido(self, muestra: dict) -> Optional[str]:
+        """Primer umbral superado por la muestra, como 'heap_mb=300>256'"""
+        for nombre, limite in self.config['umbrales'].items():
+            valor = muestra.get(nombre)
+            if valor is not None and valor > limite:
+                return f"{nombre}={valor:g}>{limite:g}"
+        return None
+
+    def revisar(self) -> Optional[str]:
+        """Motivo para reciclar la página ahora, o None si está sana.
+
+        Con métricas se muestrea cada muestrear_cada operaciones; sin ellas
+        (o con el monitor inactivo) el motivo es MOTIVO_CONTADOR cada fijo.
+        """
+        if self._cdp is None:
+            return MOTIVO_CONTADOR if self.operaciones >= self.fijo else None
+        if self.operaciones >= self.config['max_operaciones']:
+            return f"max_operaciones={self.operaciones}"
+        if self.operaciones - self._ultima_muestra < self.config['muestrear_cada']:
+            return None
+        self._ultima_muestra = self.operaciones
+        muestra = self.muestrear()
+        if muestra is None:
+            return MOTIVO_CONTADOR if self.operaciones >= self.fijo else None
+        return self.excedido(muestra)
+
+    def reciclado(self, motivo: str, page=None) -> None:
+        """Anota un reciclaje y empieza a contar de nuevo (con la página nueva si la hay)"""
+        self.reciclajes.append({'t': round(time.monotonic() - self._inicio, 1),
+                                'motivo': motivo, 'operaciones': self.operaciones})
+        self.operaciones = 0
+        self._ultima_muestra = 0
+        if page is not None and page is not self._page:
+            self.conectar(page)
+
+    def resumen(self) -> dict:
+        heaps = [m['heap_mb'] for m in self.muestras if m.get('heap_mb') is not None]
+        return {
+            'timestamp': self._inicio_iso,
+            'portal': self.portal,
+            'origen': self.origen,
+            'activo': self.activo,
+            'segundos': round(time.monotonic() - self._inicio, 1),
+            'heap_mb_max': max(heaps) if heaps else None,
+            'reciclajes': self.reciclajes,
+            'muestras': self.muestras,
+        }
+
+    def guardar(self, ruta: str = RUTA_SALUD) -> None:
+        """Añade la línea temporal de la ejecución a salud_paginas.json"""
+        if not self.muestras and not self.reciclajes:
+            return
+        with _lock_salud, bloqueo_archivo(ruta):
+            ejecuciones = leer_ejecuciones(ruta)
+            ejecuciones.append(self.resumen())
+            try:
+                escribir_json_atomico(ruta, ejecuciones[-MAX_EJECUCIONES:])
+            except OSError as e:
+                print(f"    ⚠️  No se pudo guardar {os.path.basename(ruta)}: {e}")
+
+
+_lock_salud = threading.Lock()
+
+
+def leer_ejecuciones(ruta: str = RUTA_SALUD) -> list:
+    try:
+        with open(ruta, 'r', encoding='utf-8') as f:
+            ejecuciones = json.load(f)
+        return ejecuciones if isinstance(ejecuciones, list) else []
+    except (OSError, ValueError):
+        return []
+
+
+def main():
+    ejecuciones = leer_ejecuciones()
+    if not ejecuciones:
+        print(f"[!] No hay ejecuciones en {RUTA_SALUD}")
+        return
+    print(f"\n{'inicio':19} {'portal':10} {'origen':13} {'min':>5} {'heap máx':>9} {'muestras':>8}  reciclajes")
+    for e in ejecuciones[-20:]:
+        motivos = {}
+        for r in e['reciclajes']:
+            clave = r['motivo'].split('=')[0]
+            motivos[clave] = motivos.get(clave, 0) + 1
+        heap = f"{e['heap_mb_max']:.0f} MB" if e.get('heap_mb_max') is not None else '-'
+        print(f"{e['timestamp'][:19]:19} {e['portal']:10} {e['origen']:13} {e['segundos'] / 60:5.1f} "
+              f"{heap:>9} {len(e['muestras']):8}  "
+              f"{', '.join(f'{m}: {n}' for m, n in motivos.items()) or '-'}")
+
+
+if __name__ == "__main__":
+    main()
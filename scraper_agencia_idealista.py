@@ -34,6 +34,8 @@ from datetime import datetime
 from typing import Optional
 from urllib.parse import urljoin
 
+from control_ritmo import ritmo_portal
+
 try:
     from playwright.sync_api import sync_playwright, TimeoutError as PWTimeoutError
 except ImportError:
@@ -58,11 +60,8 @@ CHROMIUM_PATH = os.path.expanduser(
 # URL por defecto de la agencia
 AGENCY_URL = "https://www.idealista.com/pro/finquestrimar/"
 
-# Delays anti-detección (segundos)
-DELAY_MIN_PAGINA = 3
-DELAY_MAX_PAGINA = 6
-DELAY_MIN_DETALLE = 2
-DELAY_MAX_DETALLE = 4
+# Delays anti-detección y pausas largas: control_ritmo.py (ritmo de Idealista).
+# Con el control inactivo se mantiene la pausa larga propia de este scraper
 PAUSA_LARGA_CADA = 12          # Cada N peticiones, pausa larga
 PAUSA_LARGA_MIN = 12
 PAUSA_LARGA_MAX = 25
@@ -79,12 +78,9 @@ def chrome_disponible(port: int) -> bool:
 
 
 def delay(tipo='pagina'):
-    """Espera aleatoria para parecer humano."""
-    if tipo == 'pagina':
-        t = random.uniform(DELAY_MIN_PAGINA, DELAY_MAX_PAGINA)
-    else:
-        t = random.uniform(DELAY_MIN_DETALLE, DELAY_MAX_DETALLE)
-    time.sleep(t)
+    """Espera aleatoria para parecer humano, al ritmo de Idealista (control_ritmo.py)."""
+    ritmo = ritmo_portal('idealista')
+    ritmo.esperar(tipo, descansar=ritmo.adaptativo)
 
 
 def limpiar_texto(texto: str) -> str:
@@ -172,8 +168,9 @@ class AgencyScraperIdealista:
         """Navega a una URL con control de rate-limit."""
         self.peticiones += 1
 
-        # Pausa larga periódica
-        if self.peticiones > 1 and self.peticiones % PAUSA_LARGA_CADA == 0:
+        # Pausa larga periódica (con el control de ritmo activo la decide él)
+        if (not ritmo_portal('idealista').adaptativo
+                and self.peticiones > 1 and self.peticiones % PAUSA_LARGA_CADA == 0):
             pausa = random.uniform(PAUSA_LARGA_MIN, PAUSA_LARGA_MAX)
             print(f"   ☕ Pausa anti-detección: {pausa:.0f}s (petición #{self.peticiones})")
             time.sleep(pausa)
@@ -210,6 +207,7 @@ class AgencyScraperIdealista:
             'verificación de seguridad',
         ]
         if any(s in url or s in html for s in signals):
+            ritmo_portal('idealista').bloqueo('captcha')
             print("\n" + "=" * 60)
             print("🤖 CAPTCHA DETECTADO")
             print("=" * 60)
@@ -0,0 +1,129 @@
+"""
+Extracción y normalización de teléfonos (común a todos los portales)
+  - Una única alternancia compilada con los patrones en orden de prioridad
+  - Recorrido acotado de JSON que solo mira valores bajo claves de teléfono
+  - Clave canónica E.164 (+34609124605) junto al texto mostrado ("609 12 46 05")
+"""
+
+import re
+from typing import Optional
+
+
+# Patrones en orden de prioridad (el primero que aparece en el texto gana)
+_PATRONES = (
+    r'\+34[\s]?[6789]\d{2}[\s]?\d{3}[\s]?\d{3}',
+    r'[6789]\d{2}[\s]?\d{2}[\s]?\d{2}[\s]?\d{2}',
+    r'[6789]\d{2}[\s]?\d{3}[\s]?\d{3}',
+    r'\d{3}[\s]?\d{3}[\s]?\d{3}',
+    r'\d{9}',
+)
+
+# Una sola alternancia compilada: localiza el primer candidato de cualquier patrón.
+# Solo si no es del patrón prioritario se buscan los de mayor prioridad a partir
+# de esa posición (antes no puede haber ninguno). El lookahead inicial descarta
+# sin probar las alternativas las posiciones que no empiezan por dígito o '+'.
+PATRON_TELEFONO = re.compile(r'(?=[\d+])(?:' + '|'.join(f'({patron})' for patron in _PATRONES) + ')')
+_PATRONES_COMPILADOS = tuple(re.compile(patron) for patron in _PATRONES)
+
+_NO_DIGITOS = re.compile(r'\D')
+
+CLAVES_TELEFONO = ('phone', 'telefon', 'mobile')
+
+MIN_DIGITOS = 7
+PREFIJO_ESPANA = '34'
+
+# Límites del recorrido de JSON
+PROFUNDIDAD_MAX_JSON = 8
+NODOS_MAX_JSON = 2000
+
+
+def extraer_de_texto(texto: Optional[str]) -> Optional[str]:
+    """Primer teléfono del texto según la prioridad de los patrones"""
+    if not texto:
+        return None
+    match = PATRON_TELEFONO.search(texto)
+    if not match:
+        return None
+    prioridad = match.lastindex
+    for patron in _PATRONES_COMPILADOS[:prioridad - 1]:
+        mejor = patron.search(texto, match.start())
+        if mejor:
+            return mejor.group(0).strip()
+    return match.group(prioridad).strip()
+
+
+def digitos(texto: str) -> str:
+    return _NO_DIGITOS.sub('', texto or '')
+
+
+def validar(telefono: Optional[str]) -> Optional[str]:
+    """El teléfono si tiene al menos MIN_DIGITOS dígitos, si no None"""
+    if not telefono or len(digitos(telefono)) < MIN_DIGITOS:
+        return None
+    return telefono
+
+
+def es_clave_telefono(clave: str) -> bool:
+    clave = clave.lower()
+    return clave == 'tel' or any(parte in clave for parte in CLAVES_TELEFONO)
+
+
+def buscar_en_json(data) -> Optional[str]:
+    """Busca un teléfono en una respuesta JSON.
+
+    Solo se examinan los textos que cuelgan de una clave de teléfono (phone,
+    telefono, mobile, tel); el resto de claves solo se recorren. El recorrido
+    está acotado en profundidad y número de nodos.
+    """
+    nodos = 0
+
+    def recorrer(valor, bajo_clave: bool, profundidad: int) -> Optional[str]:
+        nonlocal nodos
+        nodos += 1
+        if nodos > NODOS_MAX_JSON or profundidad > PROFUNDIDAD_MAX_JSON:
+            return None
+
+        if isinstance(valor, str):
+            if not bajo_clave:
+                return None
+            # Valores como "+34 609 12 46 05" o formatos extranjeros
+            return extraer_de_texto(valor) or (valor.strip() if validar(valor) else None)
+        if isinstance(valor, dict):
+            for clave, hijo in valor.items():
+                encontrado = recorrer(hijo, bajo_clave or es_clave_telefono(str(clave)), profundidad + 1)
+                if encontrado:
+                    return encontrado
+        elif isinstance(valor, list):
+            for hijo in valor:
+                encontrado = recorrer(hijo, bajo_clave, profundidad + 1)
+                if encontrado:
+                    return encontrado
+        return None
+
+    return recorrer(data, False, 0)
+
+
+def normalizar(telefono: Optional[str]) -> Optional[str]:
+    """Clave canónica E.164 para comparar teléfonos entre portales.
+
+    "609 12 46 05", "+34 609124605" y "0034609124605" -> "+34609124605".
+    Los números sin prefijo se asumen españoles. None si no es un teléfono.
+    """
+    if not telefono:
+        return None
+    texto = telefono.strip().replace('tel:', '')
+    numero = digitos(texto)
+
+    if texto.startswith('+'):
+        pass
+    elif numero.startswith('00'):
+        numero = numero[2:]
+    elif len(numero) == 9:
+        numero = PREFIJO_ESPANA + numero
+    elif not (len(numero) == 11 and numero.startswith(PREFIJO_ESPANA)):
+        return None
+
+    # E.164: máximo 15 dígitos
+    if not MIN_DIGITOS <= len(numero) <= 15:
+        return None
+    return f"+{numero}"
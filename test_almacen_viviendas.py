@@ -0,0 +1,65 @@
+"""
+Pruebas del almacén SQLite de viviendas
+Orden más recientes primero, bajas, URLs conocidas e ida y vuelta JSON -> SQLite -> JSON
+"""
+
+import json
+
+from almacen_viviendas import AlmacenViviendas
+
+
+ARCHIVO = 'viviendas_idealista_Anoia.json'
+
+
+def _vivienda(anuncio_id, titulo='Piso'):
+    return {
+        'titulo': titulo,
+        'url': f'https://www.idealista.com/inmueble/{anuncio_id}/',
+        'fecha_scraping': '2026-03-04T11:13:56',
+        'portal': 'Idealista',
+    }
+
+
+def test_nuevas_primero_y_bajas(tmp_path):
+    """Las nuevas van delante, las repetidas se actualizan y las bajas dejan de ser conocidas"""
+    almacen = AlmacenViviendas(str(tmp_path / 'viviendas.db'))
+    almacen.guardar_zona(ARCHIVO, [_vivienda(2), _vivienda(1)], ubicacion='Anoia', url_busqueda='https://x')
+    total = almacen.guardar_zona(ARCHIVO, [_vivienda(3), _vivienda(1, 'Piso rebajado')], ubicacion='Anoia')
+
+    assert total == 3
+    data = almacen.exportar_zona(ARCHIVO)
+    assert [v['url'][-2] for v in data['viviendas']] == ['3', '1', '2']
+    assert data['viviendas'][1]['titulo'] == 'Piso rebajado'
+    assert data['url'] == 'https://x'
+
+    assert almacen.marcar_descatalogadas({_vivienda(2)['url']}, ARCHIVO) == 1
+    assert almacen.urls_conocidas(ARCHIVO) == {_vivienda(3)['url'], _vivienda(1)['url']}
+    assert almacen.zonas('idealista')[0]['total'] == 2
+    assert almacen.zonas('fotocasa') == []
+
+    # Si vuelve a aparecer en el listado deja de estar descatalogada
+    almacen.guardar_zona(ARCHIVO, [_vivienda(2)])
+    assert len(almacen.urls_conocidas(ARCHIVO)) == 3
+    almacen.cerrar()
+
+
+def test_importar_exportar_mismo_json(tmp_path):
+    """Exportar una zona importada reproduce el JSON original"""
+    original = {
+        'timestamp': '2026-03-04T11:13:56.721448',
+        'ubicacion': 'Anoia',
+        'url': 'https://www.idealista.com/venta-viviendas/barcelona/anoia/',
+        'total': 3,
+        'viviendas': [_vivienda(9, 'Ático'), _vivienda(8, 'Casa'), _vivienda(7)],
+    }
+    ruta = tmp_path / ARCHIVO
+    ruta.write_text(json.dumps(original, ensure_ascii=False), encoding='utf-8')
+
+    almacen = AlmacenViviendas(str(tmp_path / 'viviendas.db'))
+    assert almacen.importar_json(str(ruta)) == 3
+    salida = tmp_path / 'salida'
+    rutas = almacen.exportar_json(str(salida))
+
+    assert [p.rsplit('/', 1)[-1] for p in rutas] == [ARCHIVO]
+    assert json.loads((salida / ARCHIVO).read_text(encoding='utf-8')) == original
+    almacen.cerrar()
@@ -0,0 +1,90 @@
+"""
+Pruebas del analizador de solapamiento de zonas
+Polilínea de shape, contención por URL y plan con las zonas cubiertas omitidas
+"""
+
+import json
+
+from datetime import datetime, timedelta
+
+from analizar_zonas import (
+    DIAS_VISTOS, area_de_url, contenida_en, decodificar_polilinea, fraccion_dentro, ids_observados,
+    planificar_portal, registrar_vistos, zonas_del_plan,
+)
+
+
+def _zona(nombre, ruta):
+    return {'nombre': nombre, 'url': f'https://www.idealista.com/venta-viviendas/{ruta}/'}
+
+
+def test_areas_desde_url():
+    """Polilínea codificada, rutas anidadas y polígonos contenidos"""
+    puntos = decodificar_polilinea('_p~iF~ps|U_ulLnnqC_mqNvxq`@')
+    assert puntos == [(38.5, -120.2), (40.7, -120.95), (43.252, -126.453)]
+
+    shape = area_de_url('https://www.idealista.com/areas/venta-viviendas/?shape=%28%28_p%7EiF%7Eps%7CU_ulLnnqC_mqNvxq%60%40%29%29')
+    assert shape['tipo'] == 'forma' and shape['formas'][0] == puntos
+
+    eixample = area_de_url('https://www.idealista.com/venta-viviendas/barcelona/eixample/con-precio-hasta_200000/')
+    assert eixample == {'tipo': 'ruta', 'ruta': ('barcelona', 'eixample'), 'filtros': {'precio-hasta_200000'}}
+    assert contenida_en(eixample, area_de_url('https://www.idealista.com/venta-viviendas/barcelona/'))
+    assert not contenida_en(area_de_url('https://www.idealista.com/venta-viviendas/barcelona/'), eixample)
+    assert area_de_url('https://www.fotocasa.es/es/comprar/viviendas/barcelona-capital/eixample/l') == \
+        {'tipo': 'ruta', 'ruta': ('barcelona-capital', 'eixample'), 'filtros': frozenset()}
+
+    # Los filtros cuentan: la zona sin filtros no está contenida en la filtrada
+    igualada = 'https://www.fotocasa.es/es/comprar/viviendas/igualada/todas-las-zonas/l?sortType=publicationDate'
+    barata = area_de_url(f'{igualada}&maxPrice=150000&publicationDate=7')
+    assert barata['filtros'] == {'maxPrice=150000'}
+    assert contenida_en(barata, area_de_url(igualada)) == 'misma ubicación (con filtros maxPrice=150000)'
+    assert not contenida_en(area_de_url(igualada), barata)
+
+    cuadrado = [(0, 0), (0, 2), (2, 2), (2, 0)]
+    assert fraccion_dentro([[(0.5, 0.5), (0.5, 1.5), (1.5, 1.5), (1.5, 0.5)]], [cuadrado]) == 1.0
+    assert 0.2 < fraccion_dentro([[(1, 1), (1, 3), (3, 3), (3, 1)]], [cuadrado]) < 0.3
+
+
+def test_plan_omite_cubiertas(tmp_path):
+    """Se omiten duplicadas y zonas cuyos anuncios ya están en otras; el plan respeta config.json"""
+    zonas = [_zona('Anoia', 'barcelona/anoia'), _zona('Igualada', 'igualada-barcelona'),
+             _zona('Urgell', 'lleida/urgell'), _zona('Alt Urgell', 'lleida/urgell')]
+    ids = {'Anoia': set(range(100)), 'Igualada': set(range(40)),
+           'Urgell': set(range(1000, 1010)), 'Alt Urgell': set(range(1000, 1010))}
+
+    plan = planificar_portal(zonas, ids)
+    assert [z['nombre'] for z in plan['zonas']] == ['Anoia', 'Urgell']
+    assert {o['nombre']: o['cubierta_por'] for o in plan['omitidas']} == {'Igualada': ['Anoia'], 'Alt Urgell': ['Urgell']}
+    assert plan['solapes'] == []
+
+    # Con los mismos anuncios observados se omite la zona filtrada, nunca la que no filtra
+    filtrada = planificar_portal([_zona('Anoia barata', 'barcelona/anoia/con-precio-hasta_100000'),
+                                  _zona('Anoia', 'barcelona/anoia')],
+                                 {'Anoia barata': set(range(30)), 'Anoia': set(range(30))})
+    assert [z['nombre'] for z in filtrada['zonas']] == ['Anoia']
+
+    ruta = tmp_path / 'plan_rastreo.json'
+    ruta.write_text(json.dumps({'portales': {'idealista': plan}}), encoding='utf-8')
+    config = zonas + [_zona('Bages', 'barcelona/bages')]
+    assert [z['nombre'] for z in zonas_del_plan('idealista', config, str(ruta))] == ['Anoia', 'Urgell', 'Bages']
+    assert zonas_del_plan('fotocasa', config, str(ruta)) is None
+
+
+def test_vistos_en_el_listado_cuentan_para_la_cobertura(tmp_path):
+    """Los particulares omitidos por estar ya en otra zona cuentan como observados en esta"""
+    ruta = str(tmp_path / 'anuncios_vistos.json')
+    url = 'https://www.idealista.com/inmueble/{}/'
+    ahora = datetime(2026, 10, 1)
+    zonas = [_zona('Prueba Anoia', 'barcelona/anoia'), _zona('Prueba Igualada', 'igualada-barcelona')]
+
+    registrar_vistos('idealista', 'Prueba Anoia', [url.format(i) for i in range(100)], ruta, ahora)
+    registrar_vistos('idealista', 'Prueba Igualada', [url.format(i) for i in range(40)], ruta, ahora)
+    registrar_vistos('idealista', 'Prueba Igualada', ['https://www.fotocasa.es/x/184629394/d'], ruta, ahora)
+    ids = ids_observados('idealista', zonas, ruta_vistos=ruta)
+    assert ids == {'Prueba Anoia': set(range(100)), 'Prueba Igualada': set(range(40))}
+    plan = planificar_portal(zonas, ids)
+    assert {o['nombre']: o['cubierta_por'] for o in plan['omitidas']} == {'Prueba Igualada': ['Prueba Anoia']}
+
+    # Los que no se vuelven a ver en DIAS_VISTOS días se olvidan
+    despues = ahora + timedelta(days=DIAS_VISTOS + 1)
+    registrar_vistos('idealista', 'Prueba Igualada', [url.format(500)], ruta, despues)
+    assert ids_observados('idealista', zonas, ruta_vistos=ruta)['Prueba Igualada'] == {500}
@@ -0,0 +1,109 @@
+"""
+Pruebas del perfil de bloqueo de recursos
+Qué peticiones se cortan, contadores de lo ahorrado y comparación de cargas con y sin bloqueo
+"""
+
+import json
+
+from bloqueo_recursos import BloqueoRecursos, cargar_config_bloqueo, comparar, leer_medidas
+
+
+class RutaFalsa:
+    """Route de Playwright sin navegador: anota si se corta o continúa"""
+
+    class Peticion:
+        def __init__(self, url, tipo):
+            self.url = url
+            self.resource_type = tipo
+
+    def __init__(self, url, tipo):
+        self.request = self.Peticion(url, tipo)
+        self.resultado = None
+
+    def abort(self, motivo):
+        self.resultado = motivo
+
+    def continue_(self):
+        self.resultado = 'continuada'
+
+
+class PaginaFalsa:
+    def __init__(self):
+        self.rutas = []
+
+    def route(self, patron, manejador):
+        self.rutas.append((patron, manejador))
+
+    def unroute(self, patron, manejador):
+        self.rutas.remove((patron, manejador))
+
+
+def _config(tmp_path, activo=True):
+    ruta_config = tmp_path / 'config.json'
+    ruta_config.write_text(json.dumps({'bloqueo_recursos': {
+        'activo': activo, 'portales': {'fotocasa': {'tipos': ['image', 'font']}}}}), encoding='utf-8')
+    return cargar_config_bloqueo(str(ruta_config))
+
+
+def test_que_se_corta(tmp_path):
+    """Imágenes, fuentes y rastreadores fuera; documentos, scripts del portal y anti-bot dentro"""
+    perfil = BloqueoRecursos('fotocasa', _config(tmp_path))
+    assert perfil.motivo_bloqueo('https://static.fotocasa.es/images/ads/1.jpg', 'image') == 'image'
+    assert perfil.motivo_bloqueo('https://fonts.gstatic.com/s/roboto.woff2', 'font') == 'font'
+    assert perfil.motivo_bloqueo('https://www.googletagmanager.com/gtm.js?id=1', 'script') == 'rastreador'
+    assert perfil.motivo_bloqueo('https://www.facebook.com/tr?id=1', 'image') == 'rastreador'
+    assert perfil.motivo_bloqueo('https://www.fotocasa.es/es/comprar/viviendas/l', 'document') is None
+    assert perfil.motivo_bloqueo('https://www.fotocasa.es/static/js/app.js', 'script') is None
+    assert perfil.motivo_bloqueo('https://www.fotocasa.es/Reese84-challenge.js', 'script') is None
+    assert perfil.motivo_bloqueo('https://geo.captcha-delivery.com/captcha/logo.png', 'image') is None
+    assert perfil.motivo_bloqueo('data:image/png;base64,AAAA', 'image') is None
+    # Los perfiles de config.json completan los de por defecto
+    assert 'media' not in perfil.tipos and perfil.config['portales']['idealista']['tipos']
+
+
+def test_rutas_y_contadores(tmp_path):
+    """Con el perfil activo se intercepta la página y se cuentan peticiones y bytes; inactivo, nada"""
+    pagina = PaginaFalsa()
+    perfil = BloqueoRecursos('fotocasa', _config(tmp_path))
+    perfil.aplicar(pagina)
+    perfil.aplicar(pagina)
+    assert len(pagina.rutas) == 1
+
+    rutas = [RutaFalsa('https://static.fotocasa.es/1.jpg', 'image'),
+             RutaFalsa('https://static.fotocasa.es/2.jpg', 'image'),
+             RutaFalsa('https://www.google-analytics.com/collect', 'xhr'),
+             RutaFalsa('https://www.fotocasa.es/es/', 'document')]
+    for ruta in rutas:
+        pagina.rutas[0][1](ruta)
+    assert [r.resultado for r in rutas] == ['blockedbyclient'] * 3 + ['continuada']
+    assert perfil.bloqueadas == {'image': 2, 'rastreador': 1}
+    assert perfil.bytes_ahorrados == 2 * 60_000 + 5_000
+    assert perfil.resumen()['porcentaje_bloqueadas'] == 75.0
+
+    perfil.retirar(pagina)
+    assert not pagina.rutas
+
+    inactivo = BloqueoRecursos('fotocasa', _config(tmp_path, activo=False))
+    inactivo.aplicar(pagina)
+    assert not pagina.rutas and not inactivo.activo
+
+
+def test_medidas_con_y_sin_bloqueo(tmp_path):
+    """Las sesiones se acumulan en el JSON y se comparan por portal, origen y bloqueo"""
+    ruta = str(tmp_path / 'medidas.json')
+    for activo, cargas, reciclajes in ((False, [4.0, 6.0], 1), (True, [2.0, 3.0, 4.0, 3.0], 0),
+                                       (True, [1.0, 1.0], 1)):
+        perfil = BloqueoRecursos('fotocasa', _config(tmp_path, activo))
+        for segundos in cargas:
+            perfil.registrar_carga(segundos)
+        for _ in range(reciclajes):
+            perfil.registrar_reciclaje()
+        perfil.guardar(ruta)
+    BloqueoRecursos('fotocasa', _config(tmp_path)).guardar(ruta)   # sin cargas: no se guarda
+
+    medidas = leer_medidas(ruta)
+    assert len(medidas) == 3
+    tabla = comparar(medidas)
+    assert tabla[('fotocasa', 'scraper', False)]['segundos_carga'] == 5.0
+    assert tabla[('fotocasa', 'scraper', True)] == {
+        'sesiones': 2, 'cargas': 6, 'segundos_carga': 2.333, 'reciclajes_por_100': 16.67, 'mb_ahorrados': 0.0}
@@ -0,0 +1,60 @@
+"""
+Pruebas de la captura del teléfono en las fichas de Idealista
+Registro de los hooks una vez por sesión (solo en fichas) y timeout de script restaurado
+"""
+
+from types import SimpleNamespace
+
+from selenium.common.exceptions import WebDriverException
+
+import captura_telefono
+
+
+class DriverFalso:
+    """WebDriver sin navegador: anota los comandos CDP y los timeouts de script"""
+
+    def __init__(self, session_id, cdp=True):
+        self.session_id = session_id
+        self.cdp = cdp
+        self.scripts_nuevo_documento = []
+        self.timeouts = SimpleNamespace(script=30)
+        self.timeouts_durante = []
+
+    def execute_cdp_cmd(self, comando, parametros):
+        if not self.cdp:
+            raise WebDriverException('sin CDP')
+        self.scripts_nuevo_documento.append(parametros['source'])
+
+    def set_script_timeout(self, segundos):
+        self.timeouts.script = segundos
+
+    def execute_async_script(self, js, *args):
+        self.timeouts_durante.append(self.timeouts.script)
+        if args and args[0] == 'falla':
+            raise WebDriverException('script abortado')
+        return {'tipo': 'tel', 'valor': 'tel:+34600000000'}
+
+
+def test_hooks_una_vez_por_sesion_y_solo_en_fichas():
+    """El script se registra una vez por sesión y no se instala fuera de /inmueble/"""
+    driver = DriverFalso('sesion-hooks')
+    assert captura_telefono.registrar_hooks_telefono(driver)
+    assert captura_telefono.registrar_hooks_telefono(driver)
+    assert len(driver.scripts_nuevo_documento) == 1
+    assert "location.pathname.indexOf('/inmueble/') < 0) return" in driver.scripts_nuevo_documento[0]
+
+    assert not captura_telefono.registrar_hooks_telefono(DriverFalso('sesion-sin-cdp', cdp=False))
+
+
+def test_timeout_de_script_restaurado():
+    """El timeout ampliado solo dura la llamada, también si el script falla"""
+    driver = DriverFalso('sesion-timeout')
+    captura = captura_telefono.clic_y_esperar(driver, boton=None, timeout=4.0)
+    assert captura['valor'] == 'tel:+34600000000'
+    assert driver.timeouts_durante == [9.0] and driver.timeouts.script == 30
+
+    try:
+        captura_telefono.ejecutar_async(driver, 'js', 60, 'falla')
+    except WebDriverException:
+        pass
+    assert driver.timeouts_durante[-1] == 65 and driver.timeouts.script == 30
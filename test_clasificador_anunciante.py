@@ -0,0 +1,96 @@
+"""
+Pruebas del clasificador compilado de anunciantes
+Compara el resultado con la implementación original (búsqueda de subcadenas
+sobre str(articulo) + re-parseo con BeautifulSoup)
+"""
+
+import os
+
+import pytest
+from bs4 import BeautifulSoup
+
+from clasificador_anunciante import ClasificadorAnunciante, SENALES_TEXTO, PALABRAS_NOMBRE_EMPRESA
+from parser_idealista import LXML_DISPONIBLE
+
+
+RUTA_DEBUG = os.path.join(os.path.dirname(os.path.abspath(__file__)), "debug_pagina1.html")
+
+ARTICULOS = [
+    # Particular explícito con contacto de propietario
+    """<article class="item" data-element-id="1"><div class="owner-contact">
+       <a class="item-link" title="Piso en Sants">Piso</a>
+       <div class="item-description">Vendo mi piso, sin intermediarios. Abstenerse agencias.</div>
+       <div class="advertiser-name">Marta Puig</div></div></article>""",
+    # Agencia con logo y nombre de empresa
+    """<article class="item item-multimedia-container" data-element-id="2">
+       <picture class="logo-branding professional-logo"><img alt="Tecnocasa"></picture>
+       <span class="professional-name">Fincas Anoia S.L.</span>
+       <div class="item-description">Nuestros servicios: 20 años de experiencia. Honorarios aparte.</div></article>""",
+    # Sin señales
+    """<article class="item" data-element-id="3"><span class="item-price">100.000€</span></article>""",
+    # Señales mezcladas y solapadas
+    """<article class="item" data-element-id="4"><!-- particular -->
+       <div class="item-description">Red inmobiliaria con comisión del 3%. Llamar al propietario.</div>
+       <script>var x = "vendedor";</script></article>""",
+]
+
+
+def _es_particular_original(html_texto):
+    """Implementación original de IdealistaScraper.es_particular (solo el score)"""
+    texto = html_texto.lower()
+    score = 0
+    for id_senal, peso, palabras in SENALES_TEXTO:
+        if any(p in texto for p in palabras):
+            score += peso
+    soup = BeautifulSoup(html_texto, 'html.parser')
+    anunciante_elem = (
+        soup.find('div', class_='advertiser-name') or
+        soup.find('span', class_='professional-name') or
+        soup.find('div', class_='item-multimedia-container')
+    )
+    if anunciante_elem:
+        nombre = anunciante_elem.get_text(strip=True).lower()
+        if any(p in nombre for p in PALABRAS_NOMBRE_EMPRESA):
+            score -= 6
+        elif len(nombre.split()) <= 3 and nombre.replace(' ', '').isalpha():
+            score += 3
+    return score
+
+
+def test_equivalente_a_original():
+    """El score coincide con el método original sobre elementos bs4"""
+    clasificador = ClasificadorAnunciante()
+    articulos = [BeautifulSoup(html, 'html.parser').article for html in ARTICULOS]
+    resultados = clasificador.classify_many(articulos)
+
+    for html, resultado in zip(ARTICULOS, resultados):
+        assert resultado.score == _es_particular_original(html)
+
+    assert resultados[0].es_particular and resultados[0].tipo == "Particular"
+    assert resultados[1].tipo == "Inmobiliaria"
+    assert resultados[2].tipo == "Desconocido" and resultados[2].senales == []
+    assert dict(resultados[3].senales)['red inmobiliaria'] == -4
+    assert dict(resultados[3].senales)['inmobiliaria'] == -4
+
+
+@pytest.mark.skipif(not LXML_DISPONIBLE, reason="lxml no instalado")
+def test_elementos_lxml():
+    """Los elementos lxml dan el mismo resultado que los de bs4"""
+    from lxml import html as lxml_html
+    clasificador = ClasificadorAnunciante()
+    for html in ARTICULOS:
+        bs4 = clasificador.clasificar(BeautifulSoup(html, 'html.parser').article)
+        lxml = clasificador.clasificar(lxml_html.fragment_fromstring(html))
+        assert lxml == bs4
+
+
+@pytest.mark.skipif(not os.path.exists(RUTA_DEBUG), reason="debug_pagina1.html no disponible")
+def test_pagina_real():
+    """Mismo score que el método original en los artículos de una página real"""
+    with open(RUTA_DEBUG, 'r', encoding='utf-8') as f:
+        soup = BeautifulSoup(f.read(), 'html.parser')
+    clasificador = ClasificadorAnunciante()
+    articulos = soup.find_all('article')
+    assert articulos
+    for articulo, resultado in zip(articulos, clasificador.classify_many(articulos)):
+        assert resultado.score == _es_particular_original(str(articulo))
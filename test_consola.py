@@ -0,0 +1,43 @@
+"""
+Pruebas de las preguntas por la terminal
+Una pregunta a la vez entre hilos, precedida de la etiqueta del trabajador
+"""
+
+import builtins
+import threading
+import time
+
+import consola
+
+
+def test_preguntas_de_una_en_una(tmp_path, monkeypatch, capsys):
+    """Dos trabajadores que preguntan a la vez no mezclan sus preguntas"""
+    monkeypatch.setattr(consola, 'RUTA_CONSOLA', str(tmp_path / 'consola'))
+    activas, maximo, respuestas = [], [], []
+
+    def input_falso(mensaje):
+        activas.append(mensaje)
+        maximo.append(len(activas))
+        time.sleep(0.05)
+        activas.remove(mensaje)
+        return f'ok {mensaje}'
+
+    monkeypatch.setattr(builtins, 'input', input_falso)
+
+    def trabajador(etiqueta):
+        consola.etiquetar(etiqueta)
+        respuestas.append(consola.preguntar(f'captcha {etiqueta}'))
+
+    hilos = [threading.Thread(target=trabajador, args=(f'[idealista #{n}]',)) for n in (1, 2)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+
+    assert max(maximo) == 1
+    assert sorted(respuestas) == ['ok captcha [idealista #1]', 'ok captcha [idealista #2]']
+    salida = capsys.readouterr().out
+    assert '[idealista #1] necesita respuesta' in salida and '[idealista #2] necesita respuesta' in salida
+    # Sin etiqueta (hilo principal) la pregunta va tal cual
+    assert consola.preguntar('¿Reintentar? ') == 'ok ¿Reintentar? '
+    assert 'necesita respuesta' not in capsys.readouterr().out
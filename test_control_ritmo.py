@@ -0,0 +1,104 @@
+"""
+Pruebas del control de ritmo adaptativo por portal
+Incremento aditivo y reducción por bloqueo, persistencia del ritmo aprendido y esperas con pausa larga
+"""
+
+import json
+
+import pytest
+
+from control_ritmo import ControlRitmo, cargar_config_ritmo
+
+
+class RelojFalso:
+    """Reloj monotónico que solo avanza cuando se le dice"""
+
+    def __init__(self):
+        self.t = 1000.0
+
+    def __call__(self):
+        return self.t
+
+    def avanzar(self, segundos):
+        self.t += segundos
+
+
+def _config(tmp_path, activo=True, **extra):
+    ruta_config = tmp_path / 'config.json'
+    ruta_config.write_text(json.dumps({'control_ritmo': dict(activo=activo, **extra)}), encoding='utf-8')
+    return cargar_config_ritmo(str(ruta_config))
+
+
+def test_aumento_aditivo_y_reduccion_por_bloqueo(tmp_path):
+    """Cada petición sube el ritmo hasta el máximo; un bloqueo lo reduce una vez por episodio"""
+    config = _config(tmp_path, incremento=1, enfriamiento=60,
+                     portales={'idealista': {'inicial': 10, 'minimo': 4, 'maximo': 14}})
+    assert config['portales']['fotocasa']['inicial'] == 40
+    reloj = RelojFalso()
+    control = ControlRitmo('idealista', config, ruta=str(tmp_path / 'ritmos.json'), reloj=reloj)
+
+    control.exito(3)
+    assert control.ritmo == 13
+    control.exito(5)
+    assert control.ritmo == 14
+
+    control.bloqueo('captcha')
+    assert control.ritmo == 7 and control.pendiente() > 50
+    control.bloqueo('reintento del mismo bloqueo')
+    assert control.ritmo == 7 and control.bloqueos == 2
+
+    reloj.avanzar(61)
+    control.bloqueo('otro bloqueo')
+    assert control.ritmo == 4
+
+    # Desactivado: ritmo fijo en el inicial, sin guardar nada
+    fijo = ControlRitmo('idealista', _config(tmp_path, activo=False), ruta=str(tmp_path / 'fijo.json'))
+    fijo.exito(10)
+    fijo.bloqueo('captcha')
+    assert fijo.ritmo == 12 and not (tmp_path / 'fijo.json').exists()
+
+
+def test_ritmo_aprendido_persiste(tmp_path):
+    """La siguiente ejecución parte del ritmo guardado (acotado a los límites del portal)"""
+    ruta = str(tmp_path / 'ritmos.json')
+    config = _config(tmp_path)
+    control = ControlRitmo('fotocasa', config, ruta=ruta)
+    control.bloqueo('Reese84')
+    assert json.loads((tmp_path / 'ritmos.json').read_text(encoding='utf-8'))['fotocasa']['ritmo'] == 20
+
+    assert ControlRitmo('fotocasa', config, ruta=ruta).ritmo == 20
+    assert ControlRitmo('idealista', config, ruta=ruta).ritmo == 12
+
+    config['portales']['fotocasa']['minimo'] = 30
+    assert ControlRitmo('fotocasa', config, ruta=ruta).ritmo == 30
+
+
+def test_esperas_con_jitter_y_pausa_larga(tmp_path):
+    """Las esperas siguen el coste de cada tipo; la pausa larga es la fija de siempre o la del ritmo"""
+    config = _config(tmp_path, activo=False, jitter=0.4, descanso=[3, 3])
+    reloj = RelojFalso()
+    control = ControlRitmo('idealista', config, ruta=None, reloj=reloj)
+    dormidos = []
+
+    def dormir(segundos):
+        dormidos.append(segundos)
+        reloj.avanzar(segundos)
+
+    for _ in range(10):
+        control.esperar('pagina', dormir=dormir)
+    assert all(3 <= s <= 7 for s in dormidos[:9])
+    assert 15 + 3 <= dormidos[9] <= 30 + 7
+
+    control.esperar('api', dormir=dormir)
+    assert 1.5 <= dormidos[10] <= 3.5
+    assert control.rango('detalle') == pytest.approx((2.1, 4.9))
+
+    # Inactivo: pausa cada descanso_cada peticiones de cualquier tipo (Fotocasa, 5-8 s)
+    fijo = ControlRitmo('fotocasa', config, ruta=None)
+    assert [fijo.exito(1, 'detalle') for _ in range(10)] == [False] * 9 + [True]
+    assert 5 <= fijo.descanso() <= 8
+
+    # Activo: cada descanso_cada unidades de coste, proporcional al ritmo
+    adaptativo = ControlRitmo('idealista', _config(tmp_path, incremento=0, descanso=[3, 3]), ruta=None)
+    assert [adaptativo.exito(1, 'api') for _ in range(20)] == [False] * 19 + [True]
+    assert adaptativo.descanso() == pytest.approx(15)
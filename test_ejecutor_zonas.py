@@ -0,0 +1,100 @@
+"""
+Pruebas de la ejecución en paralelo de zonas
+Límite de trabajadores por portal, portales simultáneos y reparto de zonas si un navegador no arranca
+"""
+
+import json
+import threading
+import time
+
+from almacen_viviendas import bloqueo_zona, escribir_json_atomico
+from ejecutor_zonas import TrabajoZona, ejecutar_zonas
+
+
+class TrabajadorFalso:
+    """Trabajador sin navegador: cuenta cuántos procesan a la vez por portal"""
+
+    activos = {}
+    maximos = {}
+    lock = threading.Lock()
+
+    def __init__(self, portal, indice, arranca=True):
+        self.portal = portal
+        self.arranca = arranca
+        self.cerrado = False
+
+    def iniciar(self):
+        return self.arranca
+
+    def procesar(self, trabajo):
+        with self.lock:
+            self.activos[self.portal] = self.activos.get(self.portal, 0) + 1
+            self.maximos[self.portal] = max(self.maximos.get(self.portal, 0), self.activos[self.portal])
+            ambos = len([p for p, n in self.activos.items() if n])
+            self.maximos['ambos'] = max(self.maximos.get('ambos', 0), ambos)
+        time.sleep(0.02)
+        with self.lock:
+            self.activos[self.portal] -= 1
+        if trabajo.nombre == 'rota':
+            raise RuntimeError('captcha')
+        return 1
+
+    def cerrar(self):
+        self.cerrado = True
+
+
+def _trabajos(portal, n):
+    return [TrabajoZona(portal, f'{portal}-{i}', f'https://{portal}/{i}') for i in range(n)]
+
+
+def test_limites_por_portal_y_portales_simultaneos():
+    """Nunca más trabajadores que el límite del portal, y ambos portales a la vez"""
+    TrabajadorFalso.activos.clear()
+    TrabajadorFalso.maximos.clear()
+    fabricas = {p: (lambda n, p=p: TrabajadorFalso(p, n)) for p in ('idealista', 'fotocasa')}
+    trabajos = _trabajos('idealista', 6) + _trabajos('fotocasa', 6) + [TrabajoZona('fotocasa', 'rota', '')]
+
+    resultados = ejecutar_zonas(trabajos, fabricas, {'idealista': 2, 'fotocasa': 3}, pausa=(0, 0))
+
+    assert len(resultados) == 13
+    assert TrabajadorFalso.maximos['idealista'] <= 2 and TrabajadorFalso.maximos['fotocasa'] <= 3
+    assert TrabajadorFalso.maximos['ambos'] == 2
+    assert [r.nombre for r in resultados if r.error] == ['rota']
+    assert sum(r.nuevas for r in resultados) == 12
+
+
+def test_navegador_que_no_arranca():
+    """Las zonas de un trabajador caído las hace otro; sin ninguno se devuelven con error"""
+    creados = []
+
+    def fabrica(n):
+        creados.append(TrabajadorFalso('idealista', n, arranca=n > 0))
+        return creados[-1]
+
+    resultados = ejecutar_zonas(_trabajos('idealista', 4), {'idealista': fabrica}, {'idealista': 2}, pausa=(0, 0))
+    assert all(not r.error for r in resultados) and len(resultados) == 4
+    assert creados[1].cerrado
+
+    resultados = ejecutar_zonas(_trabajos('fotocasa', 3), {'fotocasa': lambda n: TrabajadorFalso('fotocasa', n, False)},
+                                {'fotocasa': 2}, pausa=(0, 0))
+    assert [r.error for r in resultados] == ['sin navegador disponible'] * 3
+
+
+def test_escritura_concurrente_de_zona(tmp_path):
+    """Lectura, fusión y escritura bajo bloqueo_zona no pierden registros"""
+    ruta = tmp_path / 'viviendas_idealista_Anoia.json'
+    escribir_json_atomico(str(ruta), {'viviendas': []})
+
+    def agregar(i):
+        with bloqueo_zona(str(ruta)):
+            data = json.loads(ruta.read_text(encoding='utf-8'))
+            data['viviendas'].append({'url': f'https://www.idealista.com/inmueble/{i}/'})
+            escribir_json_atomico(str(ruta), data)
+
+    hilos = [threading.Thread(target=agregar, args=(i,)) for i in range(20)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    assert len(json.loads(ruta.read_text(encoding='utf-8'))['viviendas']) == 20
+    assert bloqueo_zona(str(ruta)) is bloqueo_zona(str(tmp_path / '.' / ruta.name))
@@ -0,0 +1,55 @@
+"""
+Pruebas del modo de extracción por estado embebido de Fotocasa
+Compara los particulares del estado (__INITIAL_PROPS__) con los del parseo del DOM
+sobre la página guardada en debug_fotocasa.html
+"""
+
+import os
+
+import pytest
+from bs4 import BeautifulSoup
+
+import fotocasa_estado
+from fotocasa_scraper_firefox import FotocasaScraperFirefox
+
+
+RUTA_DEBUG = os.path.join(os.path.dirname(os.path.abspath(__file__)), "debug_fotocasa.html")
+
+
+@pytest.fixture(scope="module")
+def html_fotocasa():
+    if not os.path.exists(RUTA_DEBUG):
+        pytest.skip("debug_fotocasa.html no disponible")
+    with open(RUTA_DEBUG, 'r', encoding='utf-8') as f:
+        return f.read()
+
+
+def test_estado_desde_html(html_fotocasa):
+    """El estado embebido incluye anuncios y totales de paginación"""
+    estado = fotocasa_estado.estado_desde_html(html_fotocasa)
+    assert estado is not None
+    assert len(estado['realEstates']) == estado['page']['size']
+    assert fotocasa_estado.total_paginas(estado) == -(-estado['totalItems'] // estado['page']['size'])
+
+
+def test_particulares_coinciden_con_dom(html_fotocasa):
+    """Los particulares del DOM aparecen en el estado con los mismos datos"""
+    scraper = FotocasaScraperFirefox()
+    soup = BeautifulSoup(html_fotocasa, 'html.parser')
+    dom = [v for v in map(scraper.extraer_vivienda, soup.find_all('article')) if v]
+
+    estado = fotocasa_estado.estado_desde_html(html_fotocasa)
+    por_url = {p['url']: p for p in fotocasa_estado.particulares(estado)}
+
+    assert dom
+    for vivienda in dom:
+        campos = por_url[vivienda.url]
+        for campo in ('precio', 'habitaciones', 'metros', 'descripcion', 'telefono'):
+            assert campos[campo] == getattr(vivienda, campo)
+        # El DOM pierde el espacio entre <strong>tipo</strong> y "en ..." en el título
+        assert campos['titulo'].replace(' ', '') == vivienda.titulo.replace(' ', '')
+
+
+def test_sin_estado():
+    """Sin __INITIAL_PROPS__ no hay estado (el scraper usa el DOM)"""
+    assert fotocasa_estado.estado_desde_html('<html><body><article></article></body></html>') is None
@@ -0,0 +1,87 @@
+"""
+Pruebas de los fragmentos de precio
+Bisección con sondeo hasta caber en la paginación, URLs de cada franja y plan guardado
+"""
+
+import os
+
+from fragmentos_precio import (
+    MAX_SONDEOS, PRECIO_CORTE_MAXIMO, Fragmento, cargar_plan, guardar_plan, planificar,
+    total_desde_titulo, url_fragmento,
+)
+
+
+RUTA_DEBUG = os.path.join(os.path.dirname(os.path.abspath(__file__)), "debug_pagina1.html")
+
+
+def test_biseccion_hasta_caber():
+    """Cada franja cabe en la capacidad, no se solapan y cubren todos los precios"""
+    precios = [1000 * i for i in range(1, 1500)] + [2500000] * 30
+    sondeos = []
+
+    def contar(fragmento):
+        sondeos.append(fragmento)
+        return sum(fragmento.desde <= p and (fragmento.hasta is None or p < fragmento.hasta) for p in precios)
+
+    fragmentos = planificar(contar, capacidad=400)
+    assert all(f.total <= 400 for f in fragmentos)
+    assert sum(f.total for f in fragmentos) == len(precios)
+    assert fragmentos[0].desde == 0 and fragmentos[-1].hasta is None
+    assert all(a.hasta == b.desde for a, b in zip(fragmentos, fragmentos[1:]))
+    assert len(sondeos) < 4 * len(fragmentos)
+
+    # Todos los anuncios en una franja estrecha: las mitades vacías se descartan y se sigue partiendo
+    concentrados = [250000 + 16 * i for i in range(3000)]
+    fragmentos = planificar(lambda f: sum(f.desde <= p and (f.hasta is None or p < f.hasta)
+                                          for p in concentrados), capacidad=1440)
+    assert len(fragmentos) > 1 and all(f.total <= 1440 for f in fragmentos)
+    assert sum(f.total for f in fragmentos) == len(concentrados)
+
+    assert planificar(lambda f: 120, capacidad=400) == [Fragmento(total=120)]
+    assert planificar(lambda f: None, capacidad=400) == [Fragmento()]
+
+
+def test_biseccion_acotada():
+    """Un total que no baja al estrechar la franja no se sigue partiendo; los sondeos tienen tope"""
+    sondeos = []
+
+    def constante(fragmento):
+        sondeos.append(fragmento)
+        return 5000
+
+    assert planificar(constante, capacidad=400) == [Fragmento(total=5000)]
+    assert len(sondeos) == 3
+
+    # Un total que baja un poco en cada sondeo: el corte acaba por el tope de sondeos
+    sondeos.clear()
+
+    def decreciente(fragmento):
+        sondeos.append(fragmento)
+        return 5000 - len(sondeos)
+
+    fragmentos = planificar(decreciente, capacidad=10)
+    assert len(sondeos) <= MAX_SONDEOS
+    assert all(f.desde <= PRECIO_CORTE_MAXIMO for f in fragmentos)
+    assert fragmentos[0].desde == 0 and fragmentos[-1].hasta is None
+    assert all(a.hasta == b.desde for a, b in zip(fragmentos, fragmentos[1:]))
+
+
+def test_urls_titulo_y_plan(tmp_path):
+    """Filtros de precio inclusivos en ambos portales; el plan se reutiliza hasta caducar"""
+    fragmento = Fragmento(200000, 400000)
+    assert fragmento.nombre == 'precio-200000-399999'
+    assert url_fragmento('idealista', 'https://www.idealista.com/venta-viviendas/barcelona/eixample/', fragmento) == \
+        'https://www.idealista.com/venta-viviendas/barcelona/eixample/con-precio-desde_200000,precio-hasta_399999/'
+    assert url_fragmento('fotocasa', 'https://www.fotocasa.es/es/comprar/viviendas/igualada/todas-las-zonas/l?sortType=publicationDate',
+                         Fragmento(0, 200000)).endswith('/l?sortType=publicationDate&maxPrice=199999')
+    assert url_fragmento('idealista', 'https://x/', Fragmento()) == 'https://x/'
+
+    with open(RUTA_DEBUG, 'r', encoding='utf-8') as f:
+        assert total_desde_titulo(f.read()) == 1793
+    assert total_desde_titulo('<html></html>') is None
+
+    ruta_json = str(tmp_path / 'viviendas_idealista_Eixample.json')
+    assert cargar_plan(ruta_json, 168) is None
+    guardar_plan(ruta_json, [Fragmento(0, 200000, 900), Fragmento(200000, None, 700)])
+    assert [f.nombre for f in cargar_plan(ruta_json, 168)] == ['precio-0-199999', 'precio-200000-']
+    assert cargar_plan(ruta_json, 0) is None
@@ -0,0 +1,79 @@
+"""
+Pruebas del índice global de anuncios
+ID por portal en ambas formas de URL, archivo binario y deduplicación entre zonas
+"""
+
+from indice_global import IndiceGlobal, copias_descatalogadas, id_anuncio, separar_duplicadas
+
+
+def _fotocasa(slug, anuncio_id):
+    return f'https://www.fotocasa.es/es/comprar/vivienda/{slug}/{anuncio_id}/d?from=list'
+
+
+def test_id_y_archivo_binario(tmp_path):
+    """El slug de Fotocasa no cambia el ID, y el índice se guarda y carga en binario"""
+    assert id_anuncio('https://www.idealista.com/pro/finquestrimar/inmueble/110652482/') == ('idealista', 110652482)
+    assert id_anuncio(_fotocasa('igualada/calefaccion', 184629394)) == ('fotocasa', 184629394)
+    assert id_anuncio('https://otro.portal/anuncio') is None
+
+    ruta = tmp_path / 'indice_global.bin'
+    indice = IndiceGlobal(str(ruta))
+    assert not indice.cargado
+    assert indice.registrar([
+        'https://www.idealista.com/inmueble/110805744/',
+        _fotocasa('igualada/calefaccion', 184629394),
+        _fotocasa('igualada/terraza-ascensor', 184629394),
+    ]) == 2
+
+    cargado = IndiceGlobal(str(ruta))
+    assert cargado.cargado and len(cargado) == 2
+    assert ruta.stat().st_size == 4 + 8 * 2 + 8 * 2
+    assert _fotocasa('anoia/piscina', 184629394) in cargado
+    assert 'https://www.idealista.com/inmueble/1/' not in cargado
+
+    assert cargado.quitar(['https://www.idealista.com/inmueble/110805744/']) == 1
+    assert cargado.total('idealista') == 0
+
+
+def test_procesos_comparten_archivo(tmp_path):
+    """Cada guardado aplica sus altas y bajas sobre el disco sin borrar las de otro proceso"""
+    ruta = str(tmp_path / 'indice_global.bin')
+    IndiceGlobal(ruta).registrar(['https://www.idealista.com/inmueble/1/'])
+    idealista = IndiceGlobal(ruta)
+    fotocasa = IndiceGlobal(ruta)
+
+    idealista.registrar(['https://www.idealista.com/inmueble/2/'])
+    fotocasa.registrar([_fotocasa('igualada/terraza', 184629394)])
+    assert len(fotocasa) == 3
+
+    idealista.quitar(['https://www.idealista.com/inmueble/1/'])
+    idealista.guardar()
+    final = IndiceGlobal(ruta)
+    assert final.total('idealista') == 1 and final.total('fotocasa') == 1
+    assert 'https://www.idealista.com/inmueble/2/' in final
+
+    final.reemplazar(['https://www.idealista.com/inmueble/3/'])
+    final.guardar()
+    assert len(IndiceGlobal(ruta)) == 1
+
+
+def test_duplicadas_entre_zonas():
+    """Cada anuncio se queda en su primer archivo y la baja se aplica a sus copias"""
+    anoia = {'archivo': 'viviendas_idealista_Anoia.json', 'viviendas': [
+        {'url': 'https://www.idealista.com/inmueble/1/'},
+        {'url': 'https://www.idealista.com/inmueble/2/'},
+    ]}
+    central = {'archivo': 'viviendas_idealista_Catalunya_Central.json', 'viviendas': [
+        {'url': 'https://www.idealista.com/inmueble/2/'},
+        {'url': 'https://www.idealista.com/inmueble/3/'},
+    ]}
+
+    duplicadas = separar_duplicadas([anoia, central])
+    assert [v['url'] for v in central['viviendas']] == ['https://www.idealista.com/inmueble/3/']
+    assert len(anoia['viviendas']) == 2
+
+    copias = copias_descatalogadas(duplicadas, ['https://www.idealista.com/inmueble/2/'])
+    assert [(d['archivo'], v['url']) for d, v in copias] == [
+        ('viviendas_idealista_Catalunya_Central.json', 'https://www.idealista.com/inmueble/2/')
+    ]
+    assert copias_descatalogadas(duplicadas, ['https://www.idealista.com/inmueble/1/']) == []
@@ -0,0 +1,52 @@
+"""
+Pruebas de las lápidas de anuncios descatalogados
+Filtro de Bloom, marcas de parada por zona y reconstrucción desde el JSON de descatalogadas
+"""
+
+import json
+import os
+
+from lapidas import FiltroBloom, Lapidas, abrir_lapidas
+
+
+def _fotocasa(slug, anuncio_id):
+    return f'https://www.fotocasa.es/es/comprar/vivienda/{slug}/{anuncio_id}/d'
+
+
+DETALLE = [
+    {'url': 'https://www.idealista.com/inmueble/110805744/', 'ubicacion': 'Anoia', 'portal': 'idealista'},
+    {'url': _fotocasa('mediona/parking', 188750593), 'ubicacion': 'AltPenedès', 'portal': 'fotocasa'},
+]
+
+
+def test_filtro_y_paradas_por_zona():
+    """Toda baja entra en el filtro; solo para el listado de la zona de la que salió"""
+    filtro = FiltroBloom.para(1000)
+    for i in range(1000):
+        filtro.agregar(f'idealista:{i}')
+    assert all(f'idealista:{i}' in filtro for i in range(1000))
+    assert sum(f'fotocasa:{i}' in filtro for i in range(10000)) < 50
+
+    lapidas = Lapidas.desde_descatalogadas(DETALLE)
+    assert _fotocasa('mediona/jardin-terraza', 188750593) in lapidas
+    assert 'https://www.idealista.com/inmueble/1/' not in lapidas
+    assert lapidas.parada(_fotocasa('mediona/jardin-terraza', 188750593), 'AltPenedès')
+    assert not lapidas.parada(_fotocasa('mediona/parking', 188750593), 'Anoia')
+    assert not lapidas.parada(DETALLE[0]['url'], None)
+
+
+def test_persistencia_y_reconstruccion(tmp_path):
+    """lapidas.bin se reutiliza hasta que viviendas_descatalogadas.json cambia"""
+    descatalogadas = tmp_path / 'viviendas_descatalogadas.json'
+    ruta = tmp_path / 'lapidas.bin'
+    descatalogadas.write_text(json.dumps({'detalle': DETALLE[:1]}), encoding='utf-8')
+
+    lapidas = abrir_lapidas(str(descatalogadas), str(ruta))
+    assert ruta.exists() and len(lapidas) == 1
+    cargadas = Lapidas.cargar(str(ruta))
+    assert cargadas.recientes == lapidas.recientes
+    assert DETALLE[0]['url'] in cargadas
+
+    descatalogadas.write_text(json.dumps({'detalle': DETALLE}), encoding='utf-8')
+    os.utime(descatalogadas, (os.path.getmtime(ruta) + 10,) * 2)
+    assert len(abrir_lapidas(str(descatalogadas), str(ruta))) == 2
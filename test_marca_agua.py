@@ -0,0 +1,95 @@
+"""
+Pruebas de la marca de agua por zona
+Regla de parada con tolerancia y persistencia en SQLite y en marcas_agua.json
+"""
+
+import json
+
+from almacen_viviendas import AlmacenViviendas, guardar_marca_agua, leer_marca_agua
+from marca_agua import CONSECUTIVOS_PARADA, CorteMarcaAgua, MarcaAgua, MarcasPendientes, tolerancia_ids
+
+
+HORA_MS = 3600 * 1000
+
+
+def test_parada_tras_anuncios_anteriores():
+    """Un destacado antiguo suelto no para; CONSECUTIVOS_PARADA seguidos sí"""
+    corte = CorteMarcaAgua(MarcaAgua(max_id=110000000))
+    assert not corte.observar(110002000)
+    assert not corte.observar(100)               # destacado antiguo
+    assert not corte.observar('110999500')       # dentro de la tolerancia de IDs
+    assert not any(corte.observar(109000000 - i) for i in range(CONSECUTIVOS_PARADA - 1))
+    assert corte.observar(108000000)
+    assert corte.nueva_marca().max_id == 110999500
+
+    # Con fecha de publicación manda la fecha: un ID bajo publicado hace poco es nuevo
+    ahora = 1772600000000
+    corte = CorteMarcaAgua(MarcaAgua(max_id=190000000, max_publicacion=ahora), consecutivos=2)
+    assert not corte.observar(1000, ahora - HORA_MS)
+    assert not corte.observar(189000000, ahora - 7 * HORA_MS)
+    assert corte.observar(189000001, ahora - 8 * HORA_MS)
+    assert corte.nueva_marca().max_publicacion == ahora
+
+    assert CorteMarcaAgua().nueva_marca() is None
+    assert MarcaAgua.desde_dict({}) is None
+
+
+def test_ultimo_completo_solo_al_final():
+    """Un rastreo sin ventana solo cuenta como completo si llegó al final del listado"""
+    anterior = MarcaAgua(110000000, None, '2026-03-09T12:00:00', '2026-03-01T12:00:00')
+    corte = CorteMarcaAgua(anterior)
+    corte.observar(110005000)
+    assert corte.nueva_marca(completo=True).ultimo_completo == '2026-03-01T12:00:00'
+
+    corte.fin_listado = True
+    assert corte.nueva_marca(completo=False).ultimo_completo == '2026-03-01T12:00:00'
+    assert corte.nueva_marca(completo=True).ultimo_completo > '2026-03-09'
+
+
+def test_persistencia_en_ambos_backends(tmp_path):
+    """La marca se guarda por zona en la tabla marcas_agua o en marcas_agua.json"""
+    marca = MarcaAgua(110805744, None, '2026-03-04T11:13:56').a_dict()
+
+    almacen = AlmacenViviendas(str(tmp_path / 'viviendas.db'))
+    assert almacen.marca_agua('viviendas_idealista_Anoia.json') is None
+    almacen.guardar_marca_agua('viviendas_idealista_Anoia.json', marca)
+    assert MarcaAgua.desde_dict(almacen.marca_agua('viviendas_idealista_Anoia.json')).max_id == 110805744
+
+    config = tmp_path / 'config.json'
+    config.write_text(json.dumps({'almacen': {'backend': 'json'}}), encoding='utf-8')
+    ruta_json = str(tmp_path / 'viviendas_fotocasa_Anoia.json')
+    assert leer_marca_agua(ruta_json, str(config)) is None
+    guardar_marca_agua(ruta_json, marca, str(config))
+    guardar_marca_agua(str(tmp_path / 'viviendas_idealista_Anoia.json'), marca, str(config))
+    assert leer_marca_agua(ruta_json, str(config)) == marca
+    assert sorted(json.loads((tmp_path / 'marcas_agua.json').read_text(encoding='utf-8'))) == [
+        'viviendas_fotocasa_Anoia.json', 'viviendas_idealista_Anoia.json'
+    ]
+
+
+def test_tolerancia_por_portal_y_marcas_pendientes(tmp_path):
+    """La tolerancia de IDs es por portal (configurable); las marcas esperan al JSON de su zona"""
+    config = tmp_path / 'config.json'
+    assert tolerancia_ids('idealista', str(config)) == 20000
+    config.write_text(json.dumps({'almacen': {'backend': 'json'},
+                                  'marca_agua': {'tolerancia_ids': {'fotocasa': 5000}}}), encoding='utf-8')
+    assert tolerancia_ids('fotocasa', str(config)) == 5000
+    assert tolerancia_ids('idealista', str(config)) == 20000
+
+    corte = CorteMarcaAgua(MarcaAgua(max_id=110000000), consecutivos=1, tolerancia_ids=20000)
+    assert not corte.observar(109990000)
+    assert corte.observar(109970000)
+
+    anoia = str(tmp_path / 'viviendas_idealista_Anoia.json')
+    bages = str(tmp_path / 'viviendas_idealista_Bages.json')
+    pendientes = MarcasPendientes(str(config))
+    pendientes.registrar(anoia, anoia + '#precio-0-199999', MarcaAgua(1, None, 'a'), hay_viviendas=True)
+    pendientes.registrar(bages, bages, MarcaAgua(2, None, 'b'), hay_viviendas=True)
+    pendientes.registrar(bages, bages + '#sin-viviendas', MarcaAgua(3, None, 'c'), hay_viviendas=False)
+    assert leer_marca_agua(anoia + '#precio-0-199999', str(config)) is None
+    assert leer_marca_agua(bages + '#sin-viviendas', str(config))['max_id'] == 3
+
+    pendientes.confirmar(anoia)
+    assert leer_marca_agua(anoia + '#precio-0-199999', str(config))['max_id'] == 1
+    pendientes.descartar(bages)
+    assert len(pendientes) == 0 and leer_marca_agua(bages, str(config)) is None
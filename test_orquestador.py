@@ -0,0 +1,57 @@
+"""
+Pruebas del orquestador de portales
+Un proceso por portal, progreso por la cola e informe conjunto
+"""
+
+import json
+import os
+import time
+
+import orquestador
+
+
+class TrabajadorFalso:
+    """Trabajador sin navegador: anota el PID del proceso que procesa la zona"""
+
+    def __init__(self, portal, indice):
+        self.portal = portal
+
+    def iniciar(self):
+        return True
+
+    def procesar(self, trabajo):
+        time.sleep(0.3)
+        if trabajo.nombre == 'rota':
+            raise RuntimeError('captcha')
+        with open(trabajo.url, 'a', encoding='utf-8') as f:
+            f.write(f"{os.getpid()}\n")
+        return 2
+
+    def cerrar(self):
+        pass
+
+
+def test_procesos_por_portal_e_informe(tmp_path, monkeypatch):
+    """Cada portal corre en su proceso, a la vez, y el informe suma ambos"""
+    monkeypatch.setattr(orquestador, '_fabrica', lambda portal, debug, paginas: (lambda n: TrabajadorFalso(portal, n)))
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / 'config.json').write_text(json.dumps({'ejecucion_paralela': {'pausa_entre_zonas': [0, 0]}}))
+    zonas = {
+        'idealista': [{'nombre': f'I{i}', 'url': str(tmp_path / 'idealista.pids')} for i in range(3)],
+        'fotocasa': [{'nombre': f'F{i}', 'url': str(tmp_path / 'fotocasa.pids')} for i in range(3)]
+                    + [{'nombre': 'rota', 'url': ''}],
+    }
+    ruta_informe = tmp_path / 'informe.json'
+
+    informe = orquestador.orquestar(zonas, ruta_informe=str(ruta_informe))
+    duraciones = [p['segundos'] for p in informe['portales'].values()]
+    assert informe['segundos'] < sum(duraciones)  # el más lento, no la suma
+
+    pids = {p: set((tmp_path / f'{p}.pids').read_text().split()) for p in ('idealista', 'fotocasa')}
+    assert len(pids['idealista']) == len(pids['fotocasa']) == 1
+    assert pids['idealista'] != pids['fotocasa'] and str(os.getpid()) not in pids['idealista']
+
+    assert informe['portales']['idealista']['nuevas'] == 6
+    assert informe['portales']['fotocasa']['nuevas'] == 6
+    assert [z['nombre'] for z in informe['zonas'] if z['error']] == ['rota']
+    assert json.loads(ruta_informe.read_text(encoding='utf-8'))['portales'].keys() == {'idealista', 'fotocasa'}
@@ -0,0 +1,137 @@
+"""
+Prueba diferencial de los motores de parser_idealista (BeautifulSoup vs lxml)
+Ambos motores deben producir exactamente los mismos registros y Viviendas
+"""
+
+import os
+from dataclasses import asdict
+
+import pytest
+from bs4 import BeautifulSoup
+
+from parser_idealista import (
+    LXML_DISPONIBLE, extraer_utag_data, parsear_listado, parsear_listado_bs4, parsear_listado_lxml
+)
+from idealista_scraper import IdealistaScraper
+
+
+RUTA_DEBUG = os.path.join(os.path.dirname(os.path.abspath(__file__)), "debug_pagina1.html")
+
+# Listado mínimo con la estructura real de Idealista (article.item + utag_data)
+HTML_LISTADO = """
+<html><head>
+<script>var utag_data = {"list": {"ads": [
+  {"adId": "101", "owner": {"type": "1"}},
+  {"adId": "102", "owner": {"type": "2"}},
+  {"adId": "103", "owner": {"type": "1"}}
+]}};</script>
+</head><body>
+<section class="items-container">
+  <article class="item extended-item item-multimedia-container" data-element-id="101">
+    <div class="item-info-container">
+      <a href="/inmueble/101/" class="item-link" title="Piso en Calle de Sants, Sants - Badal, Barcelona">
+        Piso en Calle de Sants
+      </a>
+      <div class="price-row"><span class="item-price h2-simulated">245.000<span class="txt-big">€</span></span></div>
+      <div class="item-detail-char">
+        <span class="item-detail">3 <small>hab.</small></span>
+        <span class="item-detail">85 <small>m²</small></span>
+        <span class="item-detail">Planta 2ª <!-- exterior --> exterior</span>
+      </div>
+      <div class="item-description description">
+        <p class="ellipsis">Vendo mi piso   sin intermediarios.<script>track()</script> Muy luminoso.</p>
+      </div>
+      <button class="see-phones-btn">Ver teléfono</button>
+    </div>
+  </article>
+  <article class="item item-multimedia-container" data-element-id="102">
+    <picture class="logo-branding"><img src="logo.png" alt="Agencia"></picture>
+    <a href="/inmueble/102/" class="item-link" title="Casa en Igualada">Casa</a>
+    <span class="item-price">310.000€</span>
+    <span class="item-detail">120 m²</span>
+  </article>
+  <article class="item" data-element-id="103">
+    <a href="https://www.idealista.com/inmueble/103/" class="item-link">Ático</a>
+  </article>
+  <article class="item-destacado" data-element-id="999">
+    <a href="/inmueble/999/" class="item-link" title="No es un item">No</a>
+  </article>
+  <article class="item"><span class="item-price">sin id</span></article>
+</section>
+</body></html>
+"""
+
+
+def _viviendas(pagina):
+    """Viviendas de particulares (sin fecha_scraping) como las construye el scraper"""
+    scraper = IdealistaScraper()
+    resultado = []
+    for art in pagina.articulos:
+        if art['id'] is None:
+            continue
+        info = dict(art)
+        info['url'] = f"https://www.idealista.com/inmueble/{art['id']}/"
+        info['ubicacion'] = IdealistaScraper._ubicacion_desde_titulo(art['titulo'])
+        datos = asdict(scraper._construir_vivienda_particular(info))
+        datos.pop('fecha_scraping')
+        resultado.append(datos)
+    return resultado
+
+
+def _comparar(html):
+    bs4 = parsear_listado_bs4(html)
+    lxml = parsear_listado_lxml(html)
+    assert lxml.articulos == bs4.articulos
+    assert lxml.script_utag == bs4.script_utag
+    assert _viviendas(lxml) == _viviendas(bs4)
+    return bs4
+
+
+@pytest.mark.skipif(not LXML_DISPONIBLE, reason="lxml no instalado")
+def test_motores_listado_sintetico():
+    """Ambos motores coinciden en un listado con estructura de Idealista"""
+    pagina = _comparar(HTML_LISTADO)
+
+    assert [a['id'] for a in pagina.articulos] == ['101', '102', '103', None]
+    piso = pagina.articulos[0]
+    assert piso['precio'] == '245.000€'
+    assert piso['habitaciones'] == '3hab.'
+    assert piso['metros'] == '85m²'
+    assert piso['descripcion'] == 'Vendo mi piso   sin intermediarios.Muy luminoso.'
+    assert not piso['tiene_logo']
+    assert pagina.articulos[1]['tiene_logo']
+    assert pagina.articulos[2]['titulo'] == 'Sin título'
+    assert pagina.articulos[3]['href'] is None
+    assert 'utag_data' in pagina.script_utag
+
+
+@pytest.mark.skipif(not LXML_DISPONIBLE, reason="lxml no instalado")
+@pytest.mark.skipif(not os.path.exists(RUTA_DEBUG), reason="debug_pagina1.html no disponible")
+def test_motores_debug_pagina1():
+    """Ambos motores coinciden sobre la página guardada en debug_pagina1.html"""
+    with open(RUTA_DEBUG, 'r', encoding='utf-8') as f:
+        html = f.read()
+    _comparar(html)
+
+
+def test_utag_data_sin_parsear_dom():
+    """utag_data se decodifica del código fuente sin construir el DOM"""
+    data = extraer_utag_data(HTML_LISTADO)
+    assert [ad['adId'] for ad in data['list']['ads']] == ['101', '102', '103']
+    assert [ad['owner']['type'] for ad in data['list']['ads']] == ['1', '2', '1']
+
+    # Llaves y ';' dentro de cadenas no cortan el JSON (la regex antigua sí lo hacía)
+    html = '<script>var utag_data = {"a": "x}; y", "list": {"ads": []}};</script>'
+    assert extraer_utag_data(html) == {"a": "x}; y", "list": {"ads": []}}
+    assert extraer_utag_data('<html><body>sin datos</body></html>') is None
+
+
+def test_fragmentos_particulares():
+    """Los fragmentos outerHTML de los particulares dan los mismos registros que la página"""
+    completa = {art['id']: art for art in parsear_listado(HTML_LISTADO).articulos}
+    soup = BeautifulSoup(HTML_LISTADO, 'html.parser')
+    fragmentos = ''.join(
+        str(soup.find('article', attrs={'data-element-id': ad_id})) for ad_id in ('101', '103')
+    )
+    parciales = {art['id']: art for art in parsear_listado(fragmentos).articulos}
+    assert parciales == {ad_id: completa[ad_id] for ad_id in ('101', '103')}
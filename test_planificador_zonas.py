@@ -0,0 +1,54 @@
+"""
+Pruebas del planificador de frecuencia por zona
+Media exponencial de nuevas por día, intervalo entre visitas y zonas pendientes del batch
+"""
+
+import json
+from datetime import datetime, timedelta
+
+from planificador_zonas import CONFIG_POR_DEFECTO, FrecuenciaZona, registrar_rastreo, zonas_pendientes
+
+
+AHORA = datetime(2026, 3, 2, 12, 0)
+
+
+def test_tasa_e_intervalo():
+    """La tasa sigue a los rastreos y el intervalo queda entre min_horas y max_horas"""
+    config = dict(CONFIG_POR_DEFECTO)
+    frecuencia = FrecuenciaZona(tasa=10.0)
+    frecuencia.observar(4, AHORA, config)                  # primer rastreo: solo la fecha
+    assert frecuencia.tasa == 10.0 and frecuencia.ultimo_acierto == AHORA.isoformat()
+    frecuencia.observar(0, AHORA + timedelta(days=1), config)
+    assert frecuencia.tasa == 7.0
+    assert frecuencia.intervalo_horas(config, AHORA + timedelta(days=1)) == config['min_horas']
+
+    lenta = FrecuenciaZona(tasa=0.01, rastreos=5, ultimo_rastreo=AHORA.isoformat())
+    assert lenta.intervalo_horas(config, AHORA) == config['max_horas']
+    # Un acierto hace dos días pone la tasa en al menos 0.5 al día
+    lenta.ultimo_acierto = (AHORA - timedelta(days=2)).isoformat()
+    assert lenta.intervalo_horas(config, AHORA) == 48
+    assert FrecuenciaZona().proxima(config, AHORA) is None
+
+
+def test_zonas_pendientes(tmp_path, monkeypatch):
+    """Solo las zonas a las que les toca, las más atrasadas primero; la primera vez parte del historial"""
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / 'config.json').write_text(json.dumps({'planificador_zonas': {'activo': True}}))
+    # Moianès: stock inicial hace 20 días y nada después; Eixample: 3 nuevas al día
+    viviendas = [{'url': f'm{i}', 'fecha_scraping': (AHORA - timedelta(days=20)).isoformat()} for i in range(30)]
+    (tmp_path / 'viviendas_idealista_Moianès.json').write_text(json.dumps({'viviendas': viviendas}))
+    viviendas = [{'url': f'e{i}', 'fecha_scraping': (AHORA - timedelta(hours=8 * (i + 1))).isoformat()}
+                 for i in range(60)]
+    (tmp_path / 'viviendas_idealista_Eixample.json').write_text(json.dumps({'viviendas': viviendas}))
+    zonas = [{'nombre': n, 'url': n} for n in ('Moianès', 'Eixample', 'Nueva')]
+
+    pendientes = zonas_pendientes('idealista', zonas, ahora=AHORA, directorio=str(tmp_path))
+    assert [z['nombre'] for z in pendientes] == ['Nueva', 'Moianès', 'Eixample']
+
+    for nombre in ('Moianès', 'Eixample', 'Nueva'):
+        # Ruta relativa, como la pasan los scrapers: se resuelve en directorio
+        registrar_rastreo(f'viviendas_idealista_{nombre}.json', 0, ahora=AHORA, directorio=str(tmp_path))
+    despues = AHORA + timedelta(hours=12)
+    assert [z['nombre'] for z in zonas_pendientes('idealista', zonas, ahora=despues, directorio=str(tmp_path))] == ['Eixample']
+    frecuencias = json.loads((tmp_path / 'frecuencia_zonas.json').read_text(encoding='utf-8'))
+    assert frecuencias['viviendas_idealista_Eixample.json']['tasa'] > 2
@@ -0,0 +1,61 @@
+"""
+Pruebas del registro persistente de verificaciones
+TTL, orden por prioridad y escritura atómica del JSON
+"""
+
+import json
+from datetime import datetime, timedelta
+
+from registro_verificaciones import RegistroVerificaciones, clave_anuncio
+
+
+AHORA = datetime(2026, 3, 10, 12, 0)
+
+
+def _vivienda(anuncio_id, dias_publicado):
+    return {
+        'url': f'https://www.idealista.com/inmueble/{anuncio_id}/',
+        'fecha_scraping': (AHORA - timedelta(days=dias_publicado)).isoformat(),
+    }
+
+
+def test_clave_por_portal_e_id():
+    """La misma vivienda da la misma clave aunque cambie la forma de la URL"""
+    assert clave_anuncio('https://www.idealista.com/inmueble/110805744/') == 'idealista:110805744'
+    assert clave_anuncio('https://www.idealista.com/pro/finquestrimar/inmueble/110652482/') == 'idealista:110652482'
+    assert clave_anuncio(
+        'https://www.fotocasa.es/es/comprar/vivienda/igualada/calefaccion/184629394/d?from=list'
+    ) == 'fotocasa:184629394'
+    assert clave_anuncio('https://otro.portal/anuncio') == 'https://otro.portal/anuncio'
+
+
+def test_ttl_y_prioridad(tmp_path):
+    """Se saltan las activas dentro del TTL; las nunca vistas y antiguas van primero"""
+    registro = RegistroVerificaciones(str(tmp_path / 'registro.json'), ttl_horas=48)
+    reciente, caducada, baja, antigua, nueva = (
+        _vivienda(1, 5), _vivienda(2, 5), _vivienda(3, 5), _vivienda(4, 60), _vivienda(5, 1)
+    )
+    registro.registrar(reciente['url'], True, AHORA - timedelta(hours=10))
+    registro.registrar(caducada['url'], True, AHORA - timedelta(hours=72))
+    registro.registrar(baja['url'], False, AHORA - timedelta(hours=10))
+    registro.registrar(antigua['url'], True, AHORA - timedelta(hours=72))
+
+    pendientes, saltadas = registro.planificar([reciente, caducada, baja, antigua, nueva], AHORA)
+    assert saltadas == 1
+    assert [v['url'] for v in pendientes] == [nueva['url'], antigua['url'], caducada['url'], baja['url']]
+
+
+def test_guardado_atomico(tmp_path):
+    """El registro se reescribe completo y se vuelve a cargar igual"""
+    ruta = tmp_path / 'registro.json'
+    registro = RegistroVerificaciones(str(ruta))
+    url = 'https://www.idealista.com/inmueble/7/'
+    registro.registrar(url, True, AHORA)
+    registro.registrar(url, True, AHORA)
+    registro.guardar()
+
+    assert [p.name for p in tmp_path.iterdir()] == ['registro.json']
+    assert json.loads(ruta.read_text(encoding='utf-8'))['total'] == 1
+    entrada = RegistroVerificaciones(str(ruta)).entrada(url)
+    assert entrada['activas_consecutivas'] == 2
+    assert entrada['estado'] == 'activa'
@@ -0,0 +1,97 @@
+"""
+Pruebas del monitor de salud de páginas
+Reciclaje por umbral de memoria, contador fijo sin métricas y línea temporal por ejecución
+"""
+
+import json
+
+from salud_pagina import MOTIVO_CONTADOR, MonitorSalud, cargar_config_salud, leer_ejecuciones
+
+
+class SesionCDPFalsa:
+    """Sesión CDP sin navegador: Performance.getMetrics con el heap que se le diga"""
+
+    def __init__(self):
+        self.heap_mb = 50
+        self.enviados = []
+
+    def send(self, metodo, params=None):
+        self.enviados.append(metodo)
+        if metodo == 'Performance.getMetrics':
+            return {'metrics': [{'name': 'JSHeapUsedSize', 'value': self.heap_mb * 1_048_576},
+                                {'name': 'Nodes', 'value': 1500},
+                                {'name': 'Timestamp', 'value': 1.0}]}
+        return {}
+
+
+class PaginaFalsa:
+    def __init__(self):
+        self.cdp = SesionCDPFalsa()
+        self.context = self
+
+    def new_cdp_session(self, page):
+        return page.cdp
+
+
+def _config(tmp_path, activo=True):
+    ruta_config = tmp_path / 'config.json'
+    ruta_config.write_text(json.dumps({'salud_pagina': {
+        'activo': activo, 'muestrear_cada': 5, 'max_operaciones': 100,
+        'umbrales': {'heap_mb': 200}}}), encoding='utf-8')
+    return cargar_config_salud(str(ruta_config))
+
+
+def test_reciclaje_por_umbral(tmp_path):
+    """Solo se pide reciclar cuando una muestra pasa del umbral (o tras max_operaciones)"""
+    config = _config(tmp_path)
+    assert config['umbrales']['nodos'] == 100_000
+    monitor = MonitorSalud('fotocasa', 'scraper', config)
+    pagina = PaginaFalsa()
+    monitor.conectar(pagina)
+    assert pagina.cdp.enviados == ['Performance.enable']
+
+    for _ in range(40):
+        monitor.operacion()
+        assert monitor.revisar() is None
+    assert len(monitor.muestras) == 8 and monitor.muestras[0]['heap_mb'] == 50.0
+    assert monitor.muestras[0]['nodos'] == 1500 and 'objetos' in monitor.muestras[0]
+
+    pagina.cdp.heap_mb = 300
+    monitor.operacion(5)
+    assert monitor.revisar() == 'heap_mb=300>200'
+
+    monitor.reciclado('heap_mb=300>200', pagina)
+    assert monitor.operaciones == 0 and monitor.reciclajes[0]['operaciones'] == 45
+    pagina.cdp.heap_mb = 50
+    monitor.operacion(100)
+    assert monitor.revisar() == 'max_operaciones=100'
+
+
+def test_contador_fijo_sin_metricas(tmp_path):
+    """Inactivo (o sin CDP) se recicla cada reciclar_cada operaciones de su origen"""
+    monitor = MonitorSalud('idealista', 'verificacion', _config(tmp_path, activo=False))
+    pagina = PaginaFalsa()
+    monitor.conectar(pagina)
+    assert not pagina.cdp.enviados
+
+    monitor.operacion(49)
+    assert monitor.revisar() is None
+    monitor.operacion()
+    assert monitor.revisar() == MOTIVO_CONTADOR
+    assert MonitorSalud('fotocasa', 'scraper', _config(tmp_path, activo=False)).fijo == 15
+
+
+def test_linea_temporal_por_ejecucion(tmp_path):
+    """Cada ejecución guarda sus muestras y reciclajes; sin nada que contar no se guarda"""
+    ruta = str(tmp_path / 'salud.json')
+    monitor = MonitorSalud('fotocasa', 'scraper', _config(tmp_path))
+    monitor.conectar(PaginaFalsa())
+    monitor.muestrear()
+    monitor.reciclado('heap_mb=300>200')
+    monitor.guardar(ruta)
+    MonitorSalud('fotocasa', 'scraper', _config(tmp_path)).guardar(ruta)
+
+    ejecuciones = leer_ejecuciones(ruta)
+    assert len(ejecuciones) == 1
+    assert ejecuciones[0]['heap_mb_max'] == 50.0
+    assert [r['motivo'] for r in ejecuciones[0]['reciclajes']] == ['heap_mb=300>200']
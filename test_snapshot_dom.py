@@ -0,0 +1,55 @@
+"""
+Pruebas del snapshot del DOM (base_scraper.SnapshotDOM)
+Todos los consumidores de una misma navegación comparten una única lectura
+"""
+
+from base_scraper import SnapshotDOM
+
+
+class NavegadorFalso:
+    """Cuenta las lecturas de page_source / current_url"""
+
+    def __init__(self, html, url="https://www.idealista.com/venta-viviendas/"):
+        self.html = html
+        self.url = url
+        self.lecturas_html = 0
+        self.lecturas_url = 0
+
+    def page_source(self):
+        self.lecturas_html += 1
+        return self.html
+
+    def current_url(self):
+        self.lecturas_url += 1
+        return self.url
+
+
+def test_una_lectura_por_navegacion():
+    """HTML, minúsculas, árbol y URL salen de una sola lectura cada uno"""
+    nav = NavegadorFalso('<html><body><div class="Name">Particular</div></body></html>')
+    snapshot = SnapshotDOM(nav.page_source, nav.current_url)
+
+    assert 'particular' in snapshot.html_minusculas
+    assert snapshot.soup.find('div', class_='Name').get_text() == 'Particular'
+    assert snapshot.html == nav.html
+    assert snapshot.url == snapshot.url == nav.url
+
+    assert nav.lecturas_html == 1
+    assert nav.lecturas_url == 1
+    assert snapshot.lecturas == 2
+    assert snapshot.reutilizadas == 3
+
+
+def test_invalidar_tras_navegacion():
+    """Tras invalidar() se vuelve a leer la página nueva"""
+    nav = NavegadorFalso('<p>uno</p>')
+    snapshot = SnapshotDOM(nav.page_source)
+    soup_antes = snapshot.soup
+
+    nav.html = '<p>dos</p>'
+    assert snapshot.html == '<p>uno</p>'
+    snapshot.invalidar()
+    assert snapshot.html == '<p>dos</p>'
+    assert snapshot.soup is not soup_antes
+    assert nav.lecturas_html == 2
+    assert snapshot.epoca == 1
@@ -0,0 +1,55 @@
+"""
+Pruebas del módulo común de teléfonos
+La alternancia compilada debe elegir el mismo teléfono que la cascada original
+de cinco regex, y la clave normalizada debe ser igual entre formatos
+"""
+
+import re
+
+import telefonos
+
+
+def _cascada_original(texto):
+    """Implementación anterior de _extraer_telefono_de_texto"""
+    if not texto:
+        return None
+    for patron in telefonos._PATRONES:
+        match = re.search(patron, texto)
+        if match:
+            return match.group(0).strip()
+    return None
+
+
+def test_misma_prioridad_que_la_cascada():
+    """El patrón prioritario gana aunque otro candidato aparezca antes"""
+    textos = [
+        '', 'sin teléfono', '609 12 46 05', '+34 609124605', 'tel:+34609124605',
+        'Ref 123456789 - llamar al 609 12 46 05',
+        '{"adId":"108765432","formattedContactPhone1":"609 12 46 05"}',
+        'id 1612345678 y +34 612 345 678', '938 01 23 45', '123 456 789', '1234567890123',
+    ]
+    for texto in textos:
+        assert telefonos.extraer_de_texto(texto) == _cascada_original(texto), texto
+
+
+def test_json_solo_claves_de_telefono():
+    """Los IDs y otros números fuera de claves de teléfono se ignoran"""
+    data = {
+        'result': 'OK',
+        'data': {
+            'adId': '108765432',
+            'contact': {'name': 'Particular', 'phones': [{'number': '+44 20 7946 0958'}]},
+        },
+    }
+    assert telefonos.buscar_en_json(data) == '+44 20 7946 0958'
+    assert telefonos.buscar_en_json({'adId': '612345678', 'price': 245000}) is None
+    assert telefonos.buscar_en_json({'phone1': '609 12 46 05'}) == '609 12 46 05'
+
+
+def test_normalizacion_e164():
+    """Los formatos mostrados por los portales comparten la misma clave"""
+    for texto in ('609 12 46 05', '+34 609 124 605', '0034609124605', '34609124605', 'tel:609124605'):
+        assert telefonos.normalizar(texto) == '+34609124605'
+    assert telefonos.normalizar('+44 20 7946 0958') == '+442079460958'
+    assert telefonos.normalizar('12345') is None
+    assert telefonos.normalizar(None) is None
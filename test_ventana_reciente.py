@@ -0,0 +1,46 @@
+"""
+Pruebas de la ventana de publicación
+Reescritura de las URLs de ambos portales y elección de ventana o rastreo completo
+"""
+
+from datetime import datetime
+
+from marca_agua import MarcaAgua
+from ventana_reciente import (
+    CONFIG_POR_DEFECTO, VENTANAS_FOTOCASA, VENTANAS_IDEALISTA,
+    elegir_ventana, es_url_reciente, url_fotocasa_reciente, url_idealista_reciente,
+)
+
+
+def test_urls_con_ventana():
+    """El filtro se añade al segmento con-... de Idealista y a la query de Fotocasa"""
+    assert url_idealista_reciente(
+        'https://www.idealista.com/venta-viviendas/igualada-barcelona/?ordenado-por=fecha-publicacion-desc',
+        'publicado_ultimas-24-horas',
+    ) == 'https://www.idealista.com/venta-viviendas/igualada-barcelona/con-publicado_ultimas-24-horas/?ordenado-por=fecha-publicacion-desc'
+    assert url_idealista_reciente(
+        'https://www.idealista.com/venta-viviendas/anoia/con-precio-hasta_200000,publicado_ultimo-mes/pagina-2.htm',
+        'publicado_ultima-semana',
+    ) == 'https://www.idealista.com/venta-viviendas/anoia/con-precio-hasta_200000,publicado_ultima-semana/pagina-2.htm'
+    assert es_url_reciente('https://www.idealista.com/areas/venta-viviendas/con-publicado_ultimas-48-horas/?shape=x')
+    assert not es_url_reciente('https://www.idealista.com/venta-viviendas/anoia/')
+
+    url = 'https://www.fotocasa.es/es/comprar/viviendas/igualada/todas-las-zonas/l?sortType=publicationDate'
+    assert url_fotocasa_reciente(url, 7, 'dias') == f'{url}&dias=7'
+    assert url_fotocasa_reciente(f'{url}&dias=30&x=1', 1, 'dias') == f'{url}&x=1&dias=1'
+
+
+def test_elegir_ventana():
+    """La ventana menor que cubre desde el último rastreo; completo sin marca o por cadencia"""
+    ahora = datetime(2026, 3, 10, 12, 0)
+    config = dict(CONFIG_POR_DEFECTO, activo=True)
+
+    def marca(timestamp, ultimo_completo='2026-03-08T12:00:00'):
+        return MarcaAgua(110805744, None, timestamp, ultimo_completo)
+
+    assert elegir_ventana(marca('2026-03-10T02:00:00'), VENTANAS_IDEALISTA, config, ahora)[0] == 24
+    assert elegir_ventana(marca('2026-03-09T02:00:00'), VENTANAS_IDEALISTA, config, ahora)[0] == 48
+    assert elegir_ventana(marca('2026-03-09T02:00:00'), VENTANAS_FOTOCASA, config, ahora) == (24 * 7, 7)
+    assert elegir_ventana(None, VENTANAS_IDEALISTA, config, ahora) is None
+    assert elegir_ventana(marca('2026-03-10T02:00:00', None), VENTANAS_IDEALISTA, config, ahora) is None
+    assert elegir_ventana(marca('2026-03-10T02:00:00', '2026-03-01T12:00:00'), VENTANAS_IDEALISTA, config, ahora) is None
@@ -0,0 +1,130 @@
+"""
+Pruebas de los carriles de verificación
+Reparto por portal, lote de Idealista con bloqueo (verificación una a una) y salto por TTL con el registro
+"""
+
+import json
+import shutil
+import subprocess
+from types import SimpleNamespace
+
+import pytest
+
+import verificar_auto
+from control_ritmo import ControlRitmo, cargar_config_ritmo
+from registro_verificaciones import RegistroVerificaciones
+from verificar_auto import EstadoVerificacion, repartir_carriles, verificar_carril
+
+
+URL = 'https://www.idealista.com/inmueble/{}/'
+
+
+class SesionCDPFalsa:
+    """CDPSession sin navegador: el lote devuelve los estados que se le digan"""
+
+    def __init__(self, estados):
+        self.estados = estados
+        self.page = object()
+        self.lotes = []
+
+    def __call__(self, pagina_propia=False, portal='todos'):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def asegurar_contexto(self, portal, force=False):
+        pass
+
+    def _esta_bloqueado_cloudflare(self):
+        return False
+
+    def safe_evaluate(self, js, arg=None):
+        self.lotes.append(arg['ids'])
+        return self.estados
+
+
+def _args(**extra):
+    valores = dict(delay_idealista_min=0, delay_idealista_max=0, delay_fotocasa_min=0,
+                   delay_fotocasa_max=0, lote_idealista=10, concurrencia_idealista=2, verbose=False)
+    valores.update(extra)
+    return SimpleNamespace(**valores)
+
+
+def test_carriles_por_portal():
+    """Un carril por portal, Idealista primero; los archivos de otros portales van con Fotocasa"""
+    datos = [{'portal': 'fotocasa', 'archivo': 'f1'}, {'portal': 'idealista', 'archivo': 'i1'},
+             {'portal': 'desconocido', 'archivo': 'x1'}, {'portal': 'idealista', 'archivo': 'i2'}]
+    carriles = repartir_carriles(datos)
+    assert [(portal, [d['archivo'] for d in archivos]) for portal, archivos in carriles] == [
+        ('idealista', ['i1', 'i2']), ('fotocasa', ['f1', 'x1'])]
+    assert repartir_carriles([{'portal': 'fotocasa', 'archivo': 'f1'}]) == [
+        ('fotocasa', [{'portal': 'fotocasa', 'archivo': 'f1'}])]
+
+
+def test_lote_bloqueado_y_salto_por_ttl(tmp_path, monkeypatch):
+    """Tras BLOCKED las URLs sin estado concluyente se verifican una a una; las activas se saltan por TTL"""
+    ruta_config = tmp_path / 'config.json'
+    ruta_config.write_text(json.dumps({'control_ritmo': {'activo': True}}), encoding='utf-8')
+    control = ControlRitmo('idealista', cargar_config_ritmo(str(ruta_config)), ruta=None)
+    monkeypatch.setattr(verificar_auto, 'ritmo_portal', lambda portal: control)
+    monkeypatch.setattr(verificar_auto.LimitadorRitmo, 'dormir', lambda self, segundos: None)
+    monkeypatch.setattr(verificar_auto.time, 'sleep', lambda segundos: None)
+
+    # La API responde a 1 y 2, bloquea en 3 y el lote ya no pide 4
+    cdp = SesionCDPFalsa({'1': 'OK_API:', '2': 'NOTFOUND_API:', '3': 'BLOCKED:'})
+    monkeypatch.setattr(verificar_auto, 'CDPSession', cdp)
+    individuales = []
+
+    def verificar_idealista(url, page, cdp_session=None):
+        individuales.append(url)
+        return True
+
+    monkeypatch.setattr(verificar_auto, 'verificar_idealista', verificar_idealista)
+
+    viviendas = [{'url': URL.format(i), 'titulo': f'Piso {i}'} for i in range(1, 5)]
+    archivo = tmp_path / 'viviendas_idealista_Eixample.json'
+    archivo.write_text(json.dumps({'viviendas': viviendas}), encoding='utf-8')
+    ruta_registro = str(tmp_path / 'registro.json')
+    estado = EstadoVerificacion(str(tmp_path / 'descatalogadas.json'),
+                                registro=RegistroVerificaciones(ruta_registro))
+    datos = [{'archivo': str(archivo), 'portal': 'idealista', 'ubicacion': 'Eixample',
+              'viviendas': list(viviendas)}]
+
+    verificar_carril('idealista', datos, _args(), estado)
+
+    assert cdp.lotes == [['1', '2', '3', '4']]
+    assert individuales == [URL.format(3), URL.format(4)]
+    assert control.bloqueos == 1
+    assert estado.stats == {'verificadas': 4, 'activas': 3, 'descatalogadas': 1, 'errores': 0}
+    guardadas = json.loads(archivo.read_text(encoding='utf-8'))['viviendas']
+    assert [v['url'] for v in guardadas] == [URL.format(i) for i in (1, 3, 4)]
+
+    # Siguiente ejecución: las comprobadas activas se saltan, la baja no
+    pendientes, saltadas = RegistroVerificaciones(ruta_registro).planificar(viviendas)
+    assert saltadas == 3 and [v['url'] for v in pendientes] == [URL.format(2)]
+
+
+@pytest.mark.skipif(shutil.which('node') is None, reason='sin node para ejecutar el JS del lote')
+def test_js_del_lote_se_detiene_al_bloqueo(tmp_path):
+    """_JS_FETCH_IDEALISTA_LOTE no arranca más peticiones tras un 403"""
+    script = tmp_path / 'lote.js'
+    script.write_text(
+        'const pedidos = [];\n'
+        'globalThis.fetch = async (url) => {\n'
+        '    const id = url.split("adId=")[1];\n'
+        '    pedidos.push(id);\n'
+        '    if (id === "2") return {status: 403, ok: false, text: async () => ""};\n'
+        '    return {status: 200, ok: true, text: async () => \'{"result":"OK"}\'};\n'
+        '};\n'
+        f'const lote = {verificar_auto._JS_FETCH_IDEALISTA_LOTE};\n'
+        'lote({ids: ["1", "2", "3", "4"], concurrencia: 1, espaciadoMin: 0, espaciadoMax: 0})\n'
+        '    .then(r => console.log(JSON.stringify({resultados: r, pedidos})));\n',
+        encoding='utf-8')
+    salida = json.loads(subprocess.run(['node', str(script)], capture_output=True, text=True,
+                                       check=True, timeout=30).stdout)
+    assert salida['pedidos'] == ['1', '2']
+    assert salida['resultados'] == {'1': 'OK_API:', '2': 'BLOCKED:'}
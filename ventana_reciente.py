@@ -0,0 +1,164 @@
+"""
+Ventana de publicación para el rastreo incremental
+Tras un rastreo reciente, las URLs de búsqueda se reescriben con el filtro
+"publicado en las últimas N horas/días" del portal, la ventana más pequeña que
+cubre el tiempo desde el último rastreo de la zona (marca de agua) más un
+margen. Así el listado tiene pocas páginas. Cada completo_cada_horas se hace
+un rastreo completo sin filtro: recorre el listado entero, sin parar en la
+marca de agua ni en los anuncios conocidos, y solo cuenta como completo (fecha
+ultimo_completo de la marca) si llega al final.
+
+Configuración en config.json (desactivado por defecto):
+    "rastreo_reciente": {
+        "activo": true,
+        "completo_cada_horas": 168,
+        "margen_horas": 6,
+        "fotocasa_parametro": "publicationDate"
+    }
+
+Idealista filtra con un segmento de la ruta (con-publicado_ultimas-24-horas/),
+Fotocasa con un parámetro de la query cuyo valor son días; el nombre del
+parámetro de Fotocasa es configurable.
+"""
+
+import json
+import re
+from datetime import datetime, timedelta
+from typing import List, Optional
+from urllib.parse import urlsplit, urlunsplit
+
+from almacen_viviendas import leer_marca_agua
+from marca_agua import MarcaAgua, clave_marca
+
+
+# (horas, filtro de la ruta) de menor a mayor
+VENTANAS_IDEALISTA = (
+    (24, 'publicado_ultimas-24-horas'),
+    (48, 'publicado_ultimas-48-horas'),
+    (24 * 7, 'publicado_ultima-semana'),
+    (24 * 30, 'publicado_ultimo-mes'),
+)
+
+# (horas, valor del parámetro en días) de menor a mayor
+VENTANAS_FOTOCASA = (
+    (24, 1),
+    (24 * 7, 7),
+    (24 * 30, 30),
+)
+
+PARAMETRO_FOTOCASA = 'publicationDate'
+
+CONFIG_POR_DEFECTO = {
+    'activo': False,
+    'completo_cada_horas': 24 * 7,
+    'margen_horas': 6,
+    'fotocasa_parametro': PARAMETRO_FOTOCASA,
+}
+
+PATRON_PAGINA_IDEALISTA = re.compile(r'^pagina-\d+(\.htm)?$')
+
+
+def cargar_config_ventana(config_file: str = "config.json") -> dict:
+    """Sección "rastreo_reciente" de config.json con los valores por defecto"""
+    config = dict(CONFIG_POR_DEFECTO)
+    try:
+        with open(config_file, 'r', encoding='utf-8') as f:
+            config.update(json.load(f).get('rastreo_reciente', {}))
+    except (OSError, ValueError, AttributeError):
+        pass
+    return config
+
+
+def elegir_ventana(marca: Optional[MarcaAgua], ventanas, config: dict,
+                   ahora: datetime = None) -> Optional[tuple]:
+    """(horas, valor) de la ventana más pequeña que cubre desde el último rastreo.
+
+    None si toca rastreo completo: zona sin marca o sin rastreo completo previo,
+    cadencia de completos cumplida o último rastreo más antiguo que la mayor ventana.
+    """
+    if marca is None or not marca.timestamp or not marca.ultimo_completo:
+        return None
+    ahora = ahora or datetime.now()
+    try:
+        ultimo = datetime.fromisoformat(marca.timestamp)
+        ultimo_completo = datetime.fromisoformat(marca.ultimo_completo)
+    except ValueError:
+        return None
+    if ahora - ultimo_completo >= timedelta(hours=config['completo_cada_horas']):
+        return None
+    horas = (ahora - ultimo).total_seconds() / 3600 + config['margen_horas']
+    for ventana in ventanas:
+        if horas <= ventana[0]:
+            return ventana
+    return None
+
+
+def url_idealista_filtros(url: str, nuevos: List[str]) -> str:
+    """Añade (o sustituye, por nombre) filtros "nombre_valor" en el segmento con-... de la ruta"""
+    partes = urlsplit(url)
+    segmentos = [s for s in partes.path.split('/') if s]
+    pagina = segmentos.pop() if segmentos and PATRON_PAGINA_IDEALISTA.match(segmentos[-1]) else None
+    nombres = {filtro.split('_', 1)[0] for filtro in nuevos}
+    filtros = []
+    if segmentos and segmentos[-1].startswith('con-'):
+        filtros = [f for f in segmentos.pop()[len('con-'):].split(',') if f.split('_', 1)[0] not in nombres]
+    segmentos.append('con-' + ','.join(filtros + list(nuevos)))
+    if pagina:
+        segmentos.append(pagina)
+    ruta = '/' + '/'.join(segmentos) + ('' if pagina and pagina.endswith('.htm') else '/')
+    return urlunsplit(partes._replace(path=ruta))
+
+
+def url_fotocasa_parametros(url: str, parametros: dict) -> str:
+    """Añade (o sustituye) parámetros de la query"""
+    for parametro in parametros:
+        url = re.sub(rf'([?&]){re.escape(parametro)}=[^&#]*&?', r'\1', url).rstrip('?&')
+    for parametro, valor in parametros.items():
+        url = f"{url}{'&' if '?' in url else '?'}{parametro}={valor}"
+    return url
+
+
+def url_idealista_reciente(url: str, filtro: str) -> str:
+    """Añade (o sustituye) el filtro de publicación en el segmento con-... de la ruta"""
+    return url_idealista_filtros(url, [filtro])
+
+
+def url_fotocasa_reciente(url: str, dias: int, parametro: str = PARAMETRO_FOTOCASA) -> str:
+    """Añade (o sustituye) el parámetro de publicación en la query"""
+    return url_fotocasa_parametros(url, {parametro: dias})
+
+
+def es_url_reciente(url: str, config_file: str = "config.json") -> bool:
+    """True si la URL lleva el filtro de publicación (el rastreo no es completo)"""
+    if not url:
+        return False
+    if 'idealista.com' in url:
+        return '/con-' in url and 'publicado_' in url
+    parametro = cargar_config_ventana(config_file)['fotocasa_parametro']
+    return re.search(rf'[?&]{re.escape(parametro)}=', url) is not None
+
+
+def es_rastreo_completo(url: str, config_file: str = "config.json") -> bool:
+    """True si toca recorrer el listado entero: rastreo reciente activo y URL sin ventana"""
+    return bool(cargar_config_ventana(config_file).get('activo')) and not es_url_reciente(url, config_file)
+
+
+def url_rastreo(portal: str, url: str, ruta_json: str, fragmento: str = None,
+                config_file: str = "config.json", ahora: datetime = None) -> str:
+    """URL de búsqueda para la zona (o su fragmento): con ventana de publicación si procede"""
+    config = cargar_config_ventana(config_file)
+    if not config.get('activo'):
+        return url
+
+    marca = MarcaAgua.desde_dict(leer_marca_agua(clave_marca(ruta_json, fragmento), config_file))
+    ventanas = VENTANAS_IDEALISTA if portal == 'idealista' else VENTANAS_FOTOCASA
+    ventana = elegir_ventana(marca, ventanas, config, ahora)
+    if ventana is None:
+        print("    🔁 Rastreo completo (sin ventana de publicación)")
+        return url
+
+    horas, valor = ventana
+    print(f"    🕒 Ventana de publicación: últimas {horas} h (último rastreo {marca.timestamp})")
+    if portal == 'idealista':
+        return url_idealista_reciente(url, valor)
+    return url_fotocasa_reciente(url, valor, config['fotocasa_parametro'])
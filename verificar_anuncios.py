@@ -23,6 +23,8 @@ try:
 except ModuleNotFoundError:
     _sync_playwright = None
 
+from indice_global import abrir_indice, copias_descatalogadas, separar_duplicadas
+
 
 # ─── Sesión Playwright para Fotocasa (CDP + Chrome externo) ─────────────────
 
@@ -915,6 +917,13 @@ def main():
         print("❌ No hay archivos para el portal seleccionado")
         return
     
+    # Un anuncio presente en varias zonas se verifica una sola vez
+    duplicadas = separar_duplicadas(datos)
+    n_copias = sum(len(copias) for copias in duplicadas.values())
+    if n_copias:
+        print(f"\n🔁 {n_copias} copias del mismo anuncio en otras zonas (se verifican una vez)")
+    datos = [d for d in datos if d['viviendas']]
+    
     total_viviendas = sum(len(d['viviendas']) for d in datos)
     
     # ─── Opción de VPN ────────────────────────────────────────────────
@@ -1002,13 +1011,31 @@ def main():
         if playwright_ctx:
             playwright_ctx.__exit__(None, None, None)
     
+    # Las copias en otras zonas de los descatalogados también se dan de baja
+    copias = copias_descatalogadas(duplicadas, [d['url'] for d in todas_descatalogadas])
+    for datos_json, vivienda in copias:
+        urls_por_ubicacion.setdefault(datos_json['ubicacion'], []).append(vivienda['url'])
+        todas_descatalogadas.append({
+            'url': vivienda['url'],
+            'ubicacion': datos_json['ubicacion'],
+            'portal': datos_json['portal'],
+            'titulo': vivienda.get('titulo', ''),
+        })
+    
+    if todas_descatalogadas:
+        indice = abrir_indice()
+        indice.quitar(d['url'] for d in todas_descatalogadas)
+        indice.guardar()
+    
     # ─── Resumen ──────────────────────────────────────────────────────────
     print(f"\n\n{'='*70}")
     print("📊 RESUMEN DE VERIFICACIÓN")
     print(f"{'='*70}")
     print(f"  Viviendas verificadas:   {total_viviendas}")
     print(f"  Descatalogadas:          {len(todas_descatalogadas)}")
-    print(f"  Activas:                 {total_viviendas - len(todas_descatalogadas)}")
+    print(f"  Activas:                 {total_viviendas - len(todas_descatalogadas) + len(copias)}")
+    if copias:
+        print(f"  Copias dadas de baja:    {len(copias)} (mismo anuncio en otras zonas)")
     
     if not todas_descatalogadas:
         print("\n✅ Todos los anuncios siguen activos")
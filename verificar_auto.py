@@ -4,6 +4,8 @@ Script automático para verificar periódicamente si los anuncios siguen activos
 
 Diseñado para ejecutarse en cron/systemd timer sin intervención manual.
 Comprueba todas las viviendas de los JSON y genera un JSON con las descatalogadas.
+Cada portal se verifica en su propio carril (hilo, pestaña y ritmo propios)
+y los carriles corren en paralelo sobre el mismo Chrome.
 
 Uso:
     # Verificar todo (idealista + fotocasa)
@@ -15,6 +17,9 @@ Uso:
     # Solo fotocasa, delay más alto
     ./verificar_auto.py --portal fotocasa --delay 3.0
 
+    # Portales uno tras otro (sin carriles paralelos)
+    ./verificar_auto.py --secuencial
+
     # Ejecutar con log
     ./verificar_auto.py 2>&1 | tee -a /var/log/homescraper_verify.log
 
@@ -33,6 +38,7 @@ import random
 import signal
 import logging
 import argparse
+import threading
 import subprocess
 import urllib.request
 from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeout
@@ -50,6 +56,14 @@ try:
 except ModuleNotFoundError:
     requests = None
 
+from almacen_viviendas import abrir_almacen
+from indice_global import abrir_indice, copias_descatalogadas, separar_duplicadas
+from registro_verificaciones import RegistroVerificaciones, TTL_HORAS
+from control_ritmo import ritmo_portal
+from consola import etiquetar, preguntar
+from bloqueo_recursos import BloqueoRecursos
+from salud_pagina import MOTIVO_CONTADOR, MonitorSalud
+
 # ─── Configuración ────────────────────────────────────────────────────────────
 
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -59,22 +73,26 @@ CHROMIUM_PATH = os.path.expanduser(
     '~/.cache/ms-playwright/chromium-1091/chrome-linux/chrome'
 )
 
-# Delays entre peticiones (segundos).
-# Cloudflare detecta ráfagas rápidas; necesitamos simular navegación humana.
-DELAY_IDEALISTA = (1.5, 3.5)    # API interna — parece rápida pero Cloudflare vigila
-DELAY_FOTOCASA  = (2.5, 5.0)    # Reese84 anti-bot, necesita calma
+# Delays entre peticiones y pausas largas: control_ritmo.py (ritmo adaptativo
+# por portal). Cloudflare detecta ráfagas rápidas y Reese84 necesita calma.
+TIPO_PETICION = {'idealista': 'api', 'fotocasa': 'detalle'}
 DELAY_ENTRE_ARCHIVOS = (5, 12)  # Pausa entre archivos JSON
 
-# Pausa larga cada N peticiones para simular "descanso humano"
+# Pausa larga cada N peticiones para simular "descanso humano" (con el control
+# de ritmo inactivo; activo, la pausa la marca el ritmo del portal)
 BATCH_SIZE = 25                  # cada 25 peticiones
 BATCH_PAUSE = (15, 30)           # pausa de 15-30s
+# Verificación de Idealista por lotes: anuncios por evaluate() y peticiones en
+# vuelo dentro de la página (el espaciado entre peticiones es el ritmo de la API)
+LOTE_IDEALISTA = 10
+CONCURRENCIA_IDEALISTA = 2
 
 # Máximo de reintentos ante bloqueo
 MAX_REINTENTOS = 3
 
-# Refrescar la página cada N evaluate() para evitar heap growth de Playwright
-# (Playwright GC-colecta el page object tras miles de evaluate() acumulados)
-REFRESH_PAGE_EVERY = 50
+# La página se refresca cuando su heap JS o los objetos de Playwright pasan de
+# los umbrales de salud_pagina.py (o cada 50 evaluate() si no hay métricas):
+# Playwright GC-colecta el page object tras miles de evaluate() acumulados
 
 # Guardar resultados intermedios cada N archivos procesados
 SAVE_EVERY_N_FILES = 5
@@ -312,12 +330,30 @@ def cargar_todos_los_json(directorio: str = None) -> list:
     """Carga todos los JSON de viviendas del directorio.
 
     Retorna lista de dicts: [{archivo, portal, ubicacion, url_busqueda, viviendas}]
+    Con el almacén SQLite las zonas se leen de la base de datos (archivo = nombre
+    del JSON equivalente).
     """
     if directorio is None:
         directorio = SCRIPT_DIR
-    archivos = sorted(glob.glob(os.path.join(directorio, 'viviendas_*.json')))
     datos = []
 
+    almacen = abrir_almacen(os.path.join(SCRIPT_DIR, 'config.json'))
+    if almacen is not None:
+        for zona in almacen.zonas():
+            if not zona['total']:
+                continue
+            data = almacen.exportar_zona(zona['archivo'])
+            datos.append({
+                'archivo': os.path.join(directorio, zona['archivo']),
+                'portal': zona['portal'],
+                'ubicacion': data['ubicacion'],
+                'url_busqueda': data['url'],
+                'viviendas': data['viviendas'],
+            })
+        return datos
+
+    archivos = sorted(glob.glob(os.path.join(directorio, 'viviendas_*.json')))
+
     for archivo in archivos:
         nombre = os.path.basename(archivo)
         # No cargar el fichero de descatalogadas
@@ -358,7 +394,8 @@ class CDPSession:
     real, evitando bloqueos de Cloudflare (Idealista) y Reese84 (Fotocasa).
     """
 
-    def __init__(self):
+    def __init__(self, pagina_propia: bool = False, portal: str = 'todos'):
+        self._pagina_propia = pagina_propia  # pestaña nueva en vez de la primera
         self._playwright = None
         self._browser = None
         self._chrome_process = None
@@ -366,7 +403,8 @@ class CDPSession:
         self.page = None
         self._port_used = None
         self._current_portal = None  # 'idealista' | 'fotocasa'
-        self._eval_count = 0          # contador de evaluate() para refresh periódico
+        self.salud = MonitorSalud(portal, origen='verificacion')  # heap y reciclajes de la página
+        self.recursos = {}            # portal → BloqueoRecursos (perfil de page.route y medidas)
 
     def __enter__(self):
         if _sync_playwright is None:
@@ -431,14 +469,34 @@ class CDPSession:
                 timezone_id='Europe/Madrid',
             )
         )
-        pages = ctx.pages
-        self.page = pages[0] if pages else ctx.new_page()
+        self.page = self._abrir_pagina(ctx)
         self.page.add_init_script(
             "Object.defineProperty(navigator, 'webdriver', {get: () => undefined})"
         )
+        self.salud.conectar(self.page)
         return self
 
+    def _abrir_pagina(self, ctx):
+        """Primera pestaña del contexto, o una nueva si la sesión lleva pestaña propia."""
+        pages = ctx.pages
+        if pages and not self._pagina_propia:
+            return pages[0]
+        return ctx.new_page()
+
     def __exit__(self, *args):
+        for perfil in self.recursos.values():
+            if perfil.cargas:
+                log.info('[%s] Recursos: %s', perfil.portal, perfil.texto_resumen())
+                perfil.guardar()
+        if self.salud.reciclajes:
+            log.info('Reciclajes de pagina: %s', ', '.join(r['motivo'] for r in self.salud.reciclajes))
+        self.salud.guardar()
+        if self._pagina_propia and not self._owns_process:
+            try:
+                if self.page:
+                    self.page.close()
+            except BaseException:
+                pass
         if self._owns_process:
             try:
                 if self._browser:
@@ -464,12 +522,36 @@ class CDPSession:
         """Navega al dominio del portal si la pestaña no está ya allí."""
         if not force and self._current_portal == portal:
             return
+        self._aplicar_bloqueo(portal)
         if portal == 'fotocasa':
             self._navegar_fotocasa(force)
         elif portal == 'idealista':
             self._navegar_idealista(force)
         self._current_portal = portal
 
+    def _aplicar_bloqueo(self, portal: str) -> None:
+        """Perfil de bloqueo de recursos del portal en la pestaña (retira el de otro portal)."""
+        if portal not in self.recursos:
+            self.recursos[portal] = BloqueoRecursos(portal, origen='verificacion')
+        for otro, perfil in self.recursos.items():
+            if otro != portal:
+                perfil.retirar(self.page)
+        try:
+            self.recursos[portal].aplicar(self.page)
+        except Exception as e:
+            log.debug('No se pudo aplicar el bloqueo de recursos: %s', e)
+
+    def registrar_carga(self, portal: str, segundos: float) -> None:
+        """Anota el tiempo de carga de una navegación del portal."""
+        if portal in self.recursos:
+            self.recursos[portal].registrar_carga(segundos)
+
+    def _registrar_reciclaje(self, motivo: str, portal: str = None) -> None:
+        self.salud.reciclado(motivo, self.page)
+        perfil = self.recursos.get(portal or self._current_portal)
+        if perfil and motivo != MOTIVO_CONTADOR:
+            perfil.registrar_reciclaje()
+
     def _esta_bloqueado_cloudflare(self) -> bool:
         """Detecta si la pestaña muestra un challenge de Cloudflare."""
         try:
@@ -491,6 +573,7 @@ class CDPSession:
 
         log.warning('Cloudflare challenge detectado. Esperando resolución '
                     '(max %ds)...', CLOUDFLARE_WAIT_MAX)
+        ritmo_portal(portal).bloqueo('challenge de Cloudflare')
         log.warning('Si ves un captcha en el navegador Chrome, resuélvelo manualmente.')
 
         inicio = time.time()
@@ -542,7 +625,7 @@ class CDPSession:
 
     # ── Gestión de heap / page refresh ──────────────────────────────
 
-    def refresh_page(self) -> None:
+    def refresh_page(self, motivo: str = MOTIVO_CONTADOR) -> None:
         """Navega a about:blank para liberar contextos JS acumulados.
 
         Cada page.evaluate()/page.goto() crea un execution context en V8 que
@@ -551,7 +634,8 @@ class CDPSession:
         Navegar a about:blank destruye todos esos contextos de golpe.
         """
         log.info('Refrescando pagina para liberar memoria JS '
-                 '(eval_count=%d)...', self._eval_count)
+                 '(%s, %d operaciones)...', motivo, self.salud.operaciones)
+        self._registrar_reciclaje(motivo)
 
         def _do_blank():
             self.page.goto('about:blank', timeout=10000, wait_until='load')
@@ -568,15 +652,27 @@ class CDPSession:
             return
         except Exception as e:
             log.debug('Error en refresh_page: %s', e)
-        self._eval_count = 0
         self._current_portal = None  # forzar re-navegación al portal
 
     def maybe_refresh(self) -> None:
-        """Refresca la página si hemos superado el umbral de evaluate()."""
-        if self._eval_count >= REFRESH_PAGE_EVERY:
-            self.refresh_page()
+        """Recicla la página si el monitor de salud lo pide.
+
+        Primero se refresca (about:blank). Si la memoria sigue por encima del
+        umbral, lo acumulado está en la conexión de Playwright y se reconecta.
+        """
+        motivo = self.salud.revisar()
+        if not motivo:
+            return
+        self.refresh_page(motivo)
+        if motivo == MOTIVO_CONTADOR:
+            return
+        muestra = self.salud.muestrear()
+        persiste = muestra and self.salud.excedido(muestra)
+        if persiste:
+            log.warning('La memoria sigue alta tras refrescar (%s): reconectando...', persiste)
+            self._recover_page(persiste)
 
-    def _recover_page(self) -> bool:
+    def _recover_page(self, motivo: str = 'error de conexion') -> bool:
         """Recupera la conexión tras GC/crash de Playwright.
 
         Cuando Playwright GC-colecta el page object, toda la conexión interna
@@ -585,6 +681,7 @@ class CDPSession:
         completa y reconectar desde cero vía CDP.
         """
         log.warning('Intentando recuperar conexion completa (playwright restart)...')
+        portal = self._current_portal
 
         # 1. Cerrar la conexión Playwright actual (sin tocar Chrome)
         try:
@@ -620,8 +717,7 @@ class CDPSession:
                     timezone_id='Europe/Madrid',
                 )
             )
-            pages = ctx.pages
-            page = pages[0] if pages else ctx.new_page()
+            page = self._abrir_pagina(ctx)
             page.add_init_script(
                 "Object.defineProperty(navigator, 'webdriver', "
                 "{get: () => undefined})"
@@ -636,8 +732,11 @@ class CDPSession:
             self._playwright = pw
             self._browser = browser
             self.page = page
-            self._eval_count = 0
             self._current_portal = None
+            self._registrar_reciclaje(motivo, portal)
+            if portal:
+                # La pestaña nueva no tiene las rutas de la anterior
+                self._aplicar_bloqueo(portal)
             log.info('Reconexion CDP completa exitosa.')
             return True
 
@@ -672,7 +771,7 @@ class CDPSession:
             with ThreadPoolExecutor(max_workers=1) as pool:
                 future = pool.submit(_do_goto)
                 result = future.result(timeout=outer_timeout)
-            self._eval_count += 5  # goto = ~5 contextos JS
+            self.salud.operacion(5)  # goto = ~5 contextos JS
             return result
         except FuturesTimeout:
             raise RuntimeError(
@@ -715,7 +814,7 @@ class CDPSession:
                     result = self.page.evaluate(js_code, arg)
                 else:
                     result = self.page.evaluate(js_code)
-                self._eval_count += 1
+                self.salud.operacion()
                 return result
             except Exception as e:
                 err_msg = str(e).lower()
@@ -809,10 +908,72 @@ _JS_FETCH_IDEALISTA = """
     }
 """
 
+# Idealista por lotes: misma API, varios anuncios por evaluate().
+# Las peticiones arrancan espaciadas (espaciadoMin-espaciadoMax ms) con como
+# mucho `concurrencia` en vuelo. Ante un bloqueo no se lanzan más: los IDs sin
+# estado se verifican después uno a uno.
+# Retorna {adId: 'OK_API:' | 'NOTFOUND_API:' | 'BLOCKED:' | 'FETCH_ERROR:...'}
+_JS_FETCH_IDEALISTA_LOTE = """
+    async ({ids, concurrencia, espaciadoMin, espaciadoMax}) => {
+        const API = 'https://www.idealista.com/es/ajax/listingController/adContactInfoForDetail.ajax?adId=';
+        const resultados = {};
+        const pendientes = ids.slice();
+        let siguiente = 0;      // instante mínimo de arranque de la siguiente petición
+        let bloqueado = false;
+        const dormir = ms => new Promise(r => setTimeout(r, ms));
+
+        async function comprobar(id) {
+            const ctrl = new AbortController();
+            const timer = setTimeout(() => ctrl.abort(), 15000);
+            try {
+                const r = await fetch(API + id, {
+                    method: 'GET', credentials: 'include', signal: ctrl.signal
+                });
+                const t = await r.text();
+                const inicio = t.slice(0, 3000).toLowerCase();
+                if (r.status === 403 || r.status === 429 ||
+                    inicio.includes('please enable js') ||
+                    inicio.includes('var dd=') ||
+                    inicio.includes('_cf_chl')) return 'BLOCKED:';
+                if (!r.ok) return 'FETCH_ERROR:HTTP ' + r.status;
+                if (t.includes('"result":"ERROR"')) return 'NOTFOUND_API:';
+                if (t.includes('"result":"OK"')) return 'OK_API:';
+                return 'FETCH_ERROR:respuesta inesperada';
+            } catch(e) {
+                return 'FETCH_ERROR:' + e.toString();
+            } finally {
+                clearTimeout(timer);
+            }
+        }
+
+        async function trabajador() {
+            while (pendientes.length && !bloqueado) {
+                const id = pendientes.shift();
+                const ahora = Date.now();
+                const espera = Math.max(0, siguiente - ahora);
+                siguiente = Math.max(siguiente, ahora) + espaciadoMin +
+                            Math.random() * (espaciadoMax - espaciadoMin);
+                if (espera) await dormir(espera);
+                if (bloqueado) break;
+                const estado = await comprobar(id);
+                resultados[id] = estado;
+                if (estado === 'BLOCKED:') bloqueado = true;
+            }
+        }
+
+        const n = Math.max(1, Math.min(concurrencia, ids.length));
+        await Promise.all(Array.from({length: n}, trabajador));
+        return resultados;
+    }
+"""
+
 # Fotocasa: ya no usa fetch JS — usa page.goto() directa (ver verificar_fotocasa)
 # Reese84 bloquea fetch() pero la navegación real del browser pasa siempre.
 
 
+_PATRON_ID_IDEALISTA = re.compile(r'/inmueble/(\d+)')
+
+
 # ─── Funciones de verificación ─────────────────────────────────────────────────
 
 def verificar_idealista(url: str, page, cdp_session=None) -> bool:
@@ -834,7 +995,7 @@ def verificar_idealista(url: str, page, cdp_session=None) -> bool:
             log.warning('2. Pulsa ENTER aqui para continuar')
             log.warning('=' * 60)
             try:
-                input('>>> Pulsa ENTER cuando hayas resuelto el captcha... ')
+                preguntar('>>> Pulsa ENTER cuando hayas resuelto el captcha... ')
             except EOFError:
                 # Si estamos en un entorno sin stdin (cron), esperar y reintentar
                 log.warning('Sin terminal interactivo — esperando %ds...', CLOUDFLARE_WAIT_MAX)
@@ -868,6 +1029,7 @@ def verificar_idealista(url: str, page, cdp_session=None) -> bool:
         if result == 'BLOCKED:':
             log.warning('Bloqueado por Cloudflare (intento %d/%d)',
                         intento + 1, MAX_REINTENTOS)
+            ritmo_portal('idealista').bloqueo('BLOCKED: en la API')
             # Navegar a la home para exponer el challenge al usuario
             try:
                 page.goto('https://www.idealista.com/', timeout=25000,
@@ -877,7 +1039,7 @@ def verificar_idealista(url: str, page, cdp_session=None) -> bool:
             # Esperar a que Cloudflare se resuelva (manual o auto JS challenge)
             if cdp_session and cdp_session.esperar_desbloqueo_cloudflare('idealista'):
                 log.info('Cloudflare resuelto, reintentando...')
-                time.sleep(random.uniform(3, 6))
+                ritmo_portal('idealista').esperar(TIPO_PETICION['idealista'], descansar=False)
                 continue
             else:
                 # Sin cdp_session o timeout: backoff exponencial
@@ -892,6 +1054,69 @@ def verificar_idealista(url: str, page, cdp_session=None) -> bool:
     return True
 
 
+def verificar_idealista_lote(urls: list, page, cdp_session=None,
+                             concurrencia: int = CONCURRENCIA_IDEALISTA,
+                             espaciado: tuple = None) -> dict:
+    """Verifica un lote de URLs de Idealista con una sola llamada evaluate().
+
+    Args:
+        urls: URLs del lote
+        concurrencia: peticiones en vuelo como máximo dentro de la página
+        espaciado: (min, max) segundos entre arranques de petición (por
+            defecto, el ritmo actual de la API de Idealista)
+
+    Returns:
+        {url: True=activa / False=descatalogada}. Las URLs sin respuesta
+        concluyente de la API (bloqueo, error, sin ID) se verifican una a una
+        con verificar_idealista.
+    """
+    espaciado = espaciado or ritmo_portal('idealista').rango(TIPO_PETICION['idealista'])
+    ids = {}
+    for url in urls:
+        match = _PATRON_ID_IDEALISTA.search(url)
+        if match:
+            ids[url] = match.group(1)
+
+    estados = {}
+    if ids:
+        arg = {
+            'ids': list(dict.fromkeys(ids.values())),
+            'concurrencia': concurrencia,
+            'espaciadoMin': int(espaciado[0] * 1000),
+            'espaciadoMax': int(espaciado[1] * 1000),
+        }
+        try:
+            if cdp_session:
+                cdp_session.asegurar_contexto('idealista')
+                estados = cdp_session.safe_evaluate(_JS_FETCH_IDEALISTA_LOTE, arg) or {}
+            else:
+                estados = page.evaluate(_JS_FETCH_IDEALISTA_LOTE, arg) or {}
+        except Exception as e:
+            # Errores de conexión incluidos: la verificación individual los gestiona
+            log.debug('Error evaluando lote Idealista: %s', e)
+            estados = {}
+
+    concluyentes = {'OK_API:': True, 'NOTFOUND_API:': False}
+    if 'BLOCKED:' in estados.values():
+        pendientes = sum(1 for url in urls if estados.get(ids.get(url)) not in concluyentes)
+        log.warning('Lote Idealista bloqueado por Cloudflare — %d de %d URLs '
+                    'se verifican una a una.', pendientes, len(urls))
+        ritmo_portal('idealista').bloqueo('BLOCKED: en el lote')
+
+    resultados = {}
+    for url in urls:
+        estado = estados.get(ids.get(url))
+        if estado in concluyentes:
+            resultados[url] = concluyentes[estado]
+        else:
+            log.debug('Idealista %s → %s (verificacion individual)',
+                      ids.get(url), estado[:40] if estado else 'sin estado')
+            time.sleep(random.uniform(*espaciado))
+            pagina = cdp_session.page if cdp_session else page
+            resultados[url] = verificar_idealista(url, pagina, cdp_session=cdp_session)
+    return resultados
+
+
 def _fotocasa_esta_bloqueada(page) -> bool:
     """Comprueba si la página actual muestra un challenge Reese84."""
     try:
@@ -933,8 +1158,10 @@ def verificar_fotocasa(url: str, page, cdp_session=None) -> bool:
             cdp_session.maybe_refresh()
 
         try:
+            inicio = time.monotonic()
             if cdp_session:
                 cdp_session.safe_goto(url)
+                cdp_session.registrar_carga('fotocasa', time.monotonic() - inicio)
             else:
                 page.goto(url, timeout=30000, wait_until='domcontentloaded')
         except RuntimeError as e:
@@ -954,7 +1181,7 @@ def verificar_fotocasa(url: str, page, cdp_session=None) -> bool:
             log.warning('2. Pulsa ENTER aqui para continuar')
             log.warning('=' * 60)
             try:
-                input('>>> Pulsa ENTER para continuar... ')
+                preguntar('>>> Pulsa ENTER para continuar... ')
             except EOFError:
                 time.sleep(60)
             if cdp_session and cdp_session._recover_page():
@@ -978,6 +1205,7 @@ def verificar_fotocasa(url: str, page, cdp_session=None) -> bool:
             else:
                 log.warning('Bloqueado por Reese84 (intento %d/%d) — '
                             'refrescando tokens...', intento + 1, MAX_REINTENTOS)
+                ritmo_portal('fotocasa').bloqueo('challenge de Reese84')
                 try:
                     if cdp_session:
                         cdp_session.safe_goto('https://www.fotocasa.es/es/',
@@ -990,7 +1218,7 @@ def verificar_fotocasa(url: str, page, cdp_session=None) -> bool:
                 time.sleep(5)
                 if _fotocasa_esta_bloqueada(page):
                     _fotocasa_esperar_challenge(page, max_wait=25)
-                time.sleep(random.uniform(3, 6))
+                ritmo_portal('fotocasa').esperar(TIPO_PETICION['fotocasa'], descansar=False)
                 continue
 
         # Comprobar URL final tras redirects + posible resolución de challenge
@@ -1096,6 +1324,15 @@ def limpiar_archivo_json(archivo: str, urls_descatalogadas: set) -> int:
     if not urls_descatalogadas:
         return 0
 
+    almacen = abrir_almacen(os.path.join(SCRIPT_DIR, 'config.json'))
+    if almacen is not None:
+        # Baja en la base de datos: sin reescribir la zona completa
+        marcadas = almacen.marcar_descatalogadas(urls_descatalogadas, archivo)
+        if marcadas:
+            log.info('  Marcadas %d viviendas como descatalogadas en %s',
+                     marcadas, os.path.basename(archivo))
+        return marcadas
+
     try:
         with open(archivo, 'r', encoding='utf-8') as f:
             data = json.load(f)
@@ -1159,6 +1396,295 @@ def guardar_progreso_intermedio(output_file: str, todas_descatalogadas: list,
              output_file, len(todas_merged), len(nuevas))
 
 
+# ─── Carriles de verificación ─────────────────────────────────────────────────
+
+class LimitadorRitmo:
+    """Ritmo de peticiones de un carril (un portal).
+
+    Cada carril sigue el control de ritmo de su portal (control_ritmo.py):
+    delay con jitter humano entre peticiones, pausa larga periódica (cada
+    BATCH_SIZE peticiones con el control inactivo), enfriamiento tras un
+    bloqueo y pausa entre archivos. Con delay_range (--delay-*) el delay
+    entre peticiones es fijo. Las esperas se cortan en cuanto se pide la parada
+    (Ctrl+C en el hilo principal).
+    """
+
+    def __init__(self, portal: str, parada: threading.Event = None, delay_range: tuple = None):
+        self.control = ritmo_portal(portal)
+        self.tipo = TIPO_PETICION.get(portal, 'detalle')
+        self.delay_range = delay_range
+        self.peticiones = 0
+        self._parada = parada or threading.Event()
+
+    def dormir(self, segundos: float) -> None:
+        self._parada.wait(segundos)
+
+    def rango(self) -> tuple:
+        """(min, max) segundos entre peticiones: fijo o el del ritmo actual del portal."""
+        return self.delay_range or self.control.rango(self.tipo)
+
+    def antes_de_peticion(self, n: int = 1) -> bool:
+        """Cuenta n peticiones. Retorna True si ha tocado pausa anti-detección."""
+        previas = self.peticiones
+        self.peticiones += n
+        toca_pausa = self.control.exito(n, self.tipo)
+        if not self.control.adaptativo:
+            toca_pausa = self.peticiones // BATCH_SIZE > previas // BATCH_SIZE
+        if toca_pausa:
+            pausa_batch = (self.control.descanso() if self.control.adaptativo
+                           else random.uniform(*BATCH_PAUSE))
+            log.info('  Pausa anti-deteccion de %.0fs tras %d peticiones (%.1f/min)...',
+                     pausa_batch, self.peticiones, self.control.ritmo)
+            self.dormir(pausa_batch)
+            return True
+        return False
+
+    def tras_peticion(self) -> None:
+        """Delay entre peticiones (con jitter humano y el enfriamiento de un bloqueo)."""
+        base_delay = max(random.uniform(*self.rango()), self.control.pendiente())
+        # Añadir jitter extra aleatorio (a veces más lento, como un humano)
+        if random.random() < 0.15:  # 15% de las veces, pausa extra
+            base_delay += random.uniform(2, 5)
+        self.dormir(base_delay)
+
+    def entre_archivos(self) -> None:
+        pausa = random.uniform(*DELAY_ENTRE_ARCHIVOS)
+        log.debug('Pausa de %.0fs antes del siguiente archivo...', pausa)
+        self.dormir(pausa)
+
+
+class EstadoVerificacion:
+    """Resultados compartidos por los carriles, protegidos con un lock."""
+
+    def __init__(self, output_file: str, no_merge: bool = False,
+                 registro: RegistroVerificaciones = None):
+        self.output_file = output_file
+        self.no_merge = no_merge
+        self.registro = registro
+        self.lock = threading.Lock()
+        self.todas_descatalogadas = []              # [{url, ubicacion, portal, titulo}]
+        self.urls_por_ubicacion = {}                # {ubicacion: [urls]}
+        self.descatalogadas_por_archivo = {}        # {ruta: set(urls)}
+        self.archivos_procesados = 0
+        self.stats = {
+            'verificadas': 0,
+            'activas': 0,
+            'descatalogadas': 0,
+            'errores': 0,
+        }
+
+    def contar(self, clave: str) -> None:
+        with self.lock:
+            self.stats[clave] += 1
+
+    def registrar_descatalogada(self, url: str, ubicacion: str, portal: str,
+                                titulo: str) -> None:
+        with self.lock:
+            self.stats['descatalogadas'] += 1
+            self.todas_descatalogadas.append({
+                'url': url,
+                'ubicacion': ubicacion,
+                'portal': portal,
+                'titulo': titulo,
+            })
+
+    def cerrar_archivo(self, archivo: str, ubicacion: str, desc_archivo: list) -> None:
+        """Registra las descatalogadas de un archivo y guarda cada SAVE_EVERY_N_FILES."""
+        with self.lock:
+            if desc_archivo:
+                self.urls_por_ubicacion.setdefault(ubicacion, []).extend(desc_archivo)
+                self.descatalogadas_por_archivo[archivo] = set(desc_archivo)
+            self.archivos_procesados += 1
+            if self.archivos_procesados % SAVE_EVERY_N_FILES == 0 and self.todas_descatalogadas:
+                guardar_progreso_intermedio(self.output_file, self.todas_descatalogadas,
+                                            no_merge=self.no_merge)
+        if self.registro is not None:
+            self.registro.guardar()
+
+    def propagar_a_copias(self, duplicadas: dict) -> int:
+        """Da de baja las copias en otras zonas de los anuncios descatalogados.
+
+        duplicadas es el resultado de separar_duplicadas. Retorna las copias dadas de baja.
+        """
+        with self.lock:
+            urls = [d['url'] for d in self.todas_descatalogadas]
+        por_archivo = {}
+        for datos_json, vivienda in copias_descatalogadas(duplicadas, urls):
+            por_archivo.setdefault(datos_json['archivo'], (datos_json, []))[1].append(vivienda)
+
+        for archivo, (datos_json, viviendas) in por_archivo.items():
+            urls_copias = [v['url'] for v in viviendas]
+            limpiar_archivo_json(archivo, set(urls_copias))
+            for vivienda in viviendas:
+                self.registrar_descatalogada(vivienda['url'], datos_json['ubicacion'],
+                                             datos_json['portal'], vivienda.get('titulo', ''))
+            with self.lock:
+                self.urls_por_ubicacion.setdefault(datos_json['ubicacion'], []).extend(urls_copias)
+        return sum(len(viviendas) for _, viviendas in por_archivo.values())
+
+    def guardar_progreso(self) -> None:
+        with self.lock:
+            if self.todas_descatalogadas:
+                guardar_progreso_intermedio(self.output_file, self.todas_descatalogadas,
+                                            no_merge=self.no_merge)
+
+
+def verificar_carril(portal: str, datos_portal: list, args, estado: EstadoVerificacion,
+                     vpn: ProtonVPNRotator = None, parada: threading.Event = None,
+                     pagina_propia: bool = False) -> None:
+    """Verifica todos los archivos de un portal con su propia sesión CDP.
+
+    Cada carril abre su propia conexión Playwright (la API síncrona está ligada
+    al hilo que la crea) y, si pagina_propia, su propia pestaña en el mismo
+    navegador, de modo que comparte cookies con el resto de carriles.
+    """
+    parada = parada or threading.Event()
+    delay_range = (
+        (args.delay_idealista_min, args.delay_idealista_max)
+        if portal == 'idealista'
+        else (args.delay_fotocasa_min, args.delay_fotocasa_max)
+    )
+    limitador = LimitadorRitmo(portal, parada, delay_range if delay_range[0] is not None else None)
+    verificar_fn = verificar_idealista if portal == 'idealista' else verificar_fotocasa
+    total_archivos = len(datos_portal)
+    # Idealista se verifica por lotes en la página (el espaciado sigue siendo el del limitador)
+    tam_lote = max(1, args.lote_idealista) if portal == 'idealista' else 1
+
+    def verificar_bloque(urls: list) -> dict:
+        if tam_lote > 1:
+            return verificar_idealista_lote(urls, cdp.page, cdp_session=cdp,
+                                            concurrencia=args.concurrencia_idealista,
+                                            espaciado=limitador.rango())
+        return {url: verificar_fn(url, cdp.page, cdp_session=cdp) for url in urls}
+
+    log.info('[%s] Conectando al navegador via CDP...', portal)
+    cdp = CDPSession(pagina_propia=pagina_propia, portal=portal)
+    cdp.__enter__()
+
+    try:
+        for i, datos_json in enumerate(datos_portal, 1):
+            if parada.is_set():
+                break
+            ubicacion = datos_json['ubicacion']
+            viviendas = datos_json['viviendas']
+            archivo = datos_json['archivo']
+            n_viviendas = len(viviendas)
+            nombre_archivo = os.path.basename(archivo)
+
+            log.info('-' * 60)
+            log.info('[%s %d/%d] %s — %d viviendas [%s]',
+                     portal, i, total_archivos, ubicacion, n_viviendas, nombre_archivo)
+
+            cdp.asegurar_contexto(portal)
+
+            desc_archivo = []
+
+            for inicio in range(0, n_viviendas, tam_lote):
+                if parada.is_set():
+                    break
+                bloque = [
+                    (j, vivienda)
+                    for j, vivienda in enumerate(viviendas[inicio:inicio + tam_lote], inicio + 1)
+                    if vivienda.get('url', '')
+                ]
+                if not bloque:
+                    continue
+
+                # Pausa larga periódica (simular humano)
+                if limitador.antes_de_peticion(len(bloque)):
+                    # Re-verificar que no nos han bloqueado durante la pausa
+                    if cdp._esta_bloqueado_cloudflare():
+                        cdp.esperar_desbloqueo_cloudflare(portal)
+
+                try:
+                    resultados = verificar_bloque([vivienda['url'] for _, vivienda in bloque])
+                except RuntimeError as e:
+                    # Ultimo recurso: la reconexion fallo incluso tras pausa manual
+                    log.error('  [%d/%d] ERROR irrecuperable: %s', bloque[0][0], n_viviendas, e)
+                    log.warning('Marcando %d vivienda(s) como activas (conservador) y continuando.',
+                                len(bloque))
+                    for _ in bloque:
+                        estado.contar('errores')
+                    resultados = {}
+
+                for j, vivienda in bloque:
+                    url = vivienda['url']
+                    titulo = vivienda.get('titulo', 'Sin título')[:60]
+                    activo = resultados.get(url)
+                    if activo is None:
+                        activo = True  # error irrecuperable: activa sin anotar en el registro
+                    elif estado.registro is not None:
+                        estado.registro.registrar(url, activo)
+
+                    estado.contar('verificadas')
+
+                    if activo:
+                        estado.contar('activas')
+                        if args.verbose:
+                            log.debug('  [%d/%d] OK: %s', j, n_viviendas, titulo)
+                        else:
+                            # Mostrar progreso cada 10 viviendas activas
+                            if j % 10 == 0:
+                                log.info('  [%s %d/%d] progreso... (%d desc hasta ahora)',
+                                         portal, j, n_viviendas, len(desc_archivo))
+                    else:
+                        log.info('  [%d/%d] DESCATALOGADA: %s', j, n_viviendas, titulo)
+                        desc_archivo.append(url)
+                        estado.registrar_descatalogada(url, ubicacion, datos_json['portal'],
+                                                       vivienda.get('titulo', ''))
+
+                    # Rotación VPN (solo Idealista)
+                    if vpn and portal == 'idealista':
+                        vpn.tick()
+                        # Tras cambio de IP, re-establecer contexto del portal
+                        # porque Cloudflare puede requerir nuevo handshake
+                        if vpn._contador == 0:  # acaba de cambiar
+                            cdp.asegurar_contexto('idealista', force=True)
+
+                limitador.tras_peticion()
+
+            if desc_archivo:
+                log.info('  >> %d descatalogadas en %s', len(desc_archivo), ubicacion)
+                # Eliminar descatalogadas del JSON fuente inmediatamente
+                limpiar_archivo_json(archivo, set(desc_archivo))
+            else:
+                log.info('  >> Todas activas en %s', ubicacion)
+
+            # Guardado intermedio cada SAVE_EVERY_N_FILES archivos (entre todos los carriles)
+            estado.cerrar_archivo(archivo, ubicacion, desc_archivo)
+
+            # Pausa entre archivos
+            if i < total_archivos:
+                limitador.entre_archivos()
+    finally:
+        cdp.__exit__(None, None, None)
+
+
+def repartir_carriles(datos: list) -> list:
+    """[(portal, archivos)]: un carril por portal, primero idealista (API rápida) y luego fotocasa.
+
+    Los archivos de otros portales se verifican como fotocasa (navegación directa).
+    """
+    por_carril = {}
+    for d in datos:
+        por_carril.setdefault('idealista' if d['portal'] == 'idealista' else 'fotocasa', []).append(d)
+    return [(portal, por_carril[portal]) for portal in ('idealista', 'fotocasa') if portal in por_carril]
+
+
+def _ejecutar_carril(portal: str, datos_portal: list, args, estado: EstadoVerificacion,
+                     vpn, parada: threading.Event, pagina_propia: bool) -> None:
+    """Cuerpo del hilo de un carril: los errores se cuentan, no se propagan."""
+    etiquetar(f'[carril {portal}]')
+    try:
+        verificar_carril(portal, datos_portal, args, estado, vpn=vpn, parada=parada,
+                         pagina_propia=pagina_propia)
+    except Exception as e:
+        log.error('[%s] Error inesperado durante la verificacion: %s', portal, e, exc_info=True)
+        estado.contar('errores')
+        log.info('Guardando progreso tras error...')
+        estado.guardar_progreso()
+
+
 # ─── Bucle principal ──────────────────────────────────────────────────────────
 
 def ejecutar_verificacion(args) -> int:
@@ -1178,6 +1704,19 @@ def ejecutar_verificacion(args) -> int:
             log.error('No hay archivos para el portal "%s"', args.portal)
             return 1
 
+    # Un anuncio presente en varias zonas se verifica una sola vez
+    duplicadas = separar_duplicadas(datos)
+    n_copias = sum(len(copias) for copias in duplicadas.values())
+
+    # Saltar las verificadas hace menos del TTL y ordenar el resto por prioridad
+    registro = RegistroVerificaciones(
+        os.path.join(args.output_dir, 'registro_verificaciones.json'), ttl_horas=args.ttl_horas)
+    saltadas = 0
+    for d in datos:
+        d['viviendas'], n_saltadas = registro.planificar(d['viviendas'])
+        saltadas += n_saltadas
+    datos = [d for d in datos if d['viviendas']]
+
     total_archivos = len(datos)
     total_viviendas = sum(len(d['viviendas']) for d in datos)
     portales_presentes = sorted(set(d['portal'] for d in datos))
@@ -1186,25 +1725,41 @@ def ejecutar_verificacion(args) -> int:
     log.info('VERIFICACION AUTOMATICA DE ANUNCIOS')
     log.info('=' * 60)
     log.info('Archivos JSON: %d', total_archivos)
-    log.info('Viviendas totales: %d', total_viviendas)
+    log.info('Viviendas a verificar: %d', total_viviendas)
+    log.info('Saltadas por TTL: %d (verificadas activas hace < %gh, registro de %d anuncios)',
+             saltadas, args.ttl_horas, len(registro))
+    log.info('Copias en otras zonas: %d (se verifica una vez cada anuncio)', n_copias)
     log.info('Portales: %s', ', '.join(portales_presentes))
-    log.info('Delay configurado: %.1f-%.1fs (idealista) / %.1f-%.1fs (fotocasa)',
-             args.delay_idealista_min, args.delay_idealista_max,
-             args.delay_fotocasa_min, args.delay_fotocasa_max)
-
-    # Ordenar: primero idealista (API rápida), luego fotocasa (más lenta)
-    datos.sort(key=lambda d: 0 if d['portal'] == 'idealista' else 1)
-
-    # Resultados
-    todas_descatalogadas = []              # [{url, ubicacion, portal, titulo}]
-    urls_por_ubicacion = {}                # {ubicacion: [urls]}
-    descatalogadas_por_archivo = {}        # {ruta: set(urls)}
-    stats = {
-        'verificadas': 0,
-        'activas': 0,
-        'descatalogadas': 0,
-        'errores': 0,
-    }
+    for portal in ('idealista', 'fotocasa'):
+        fijo = getattr(args, f'delay_{portal}_min')
+        if fijo is not None:
+            log.info('Delay %s: %.1f-%.1fs (fijo)', portal, fijo, getattr(args, f'delay_{portal}_max'))
+        else:
+            control = ritmo_portal(portal)
+            log.info('Delay %s: %.1f-%.1fs (%.1f peticiones/min%s)', portal,
+                     *control.rango(TIPO_PETICION[portal]), control.ritmo,
+                     ', adaptativo' if control.adaptativo else '')
+
+    carriles = repartir_carriles(datos)
+
+    secuencial = args.secuencial or len(carriles) < 2
+    if not secuencial and not chrome_debug_disponible(CHROME_DEBUG_PORT):
+        # El Chromium de respaldo lo lanza y lo cierra cada sesión: no se comparte
+        log.warning('Chrome real no disponible — carriles en secuencia.')
+        secuencial = True
+    if not secuencial and args.vpn:
+        # ProtonVPN cambia la IP de todo el sistema: al rotar por Idealista
+        # cortaría las conexiones del carril de Fotocasa
+        log.warning('Rotación VPN activa — carriles en secuencia.')
+        secuencial = True
+
+    estado = EstadoVerificacion(
+        os.path.join(args.output_dir, 'viviendas_descatalogadas.json'),
+        no_merge=args.no_merge,
+        registro=registro,
+    )
+    parada = threading.Event()
+    hilos = []
 
     # Inicializar VPN si se ha pedido
     vpn = None
@@ -1223,145 +1778,53 @@ def ejecutar_verificacion(args) -> int:
         else:
             vpn = None
 
-    # Conectar al navegador
-    log.info('Conectando al navegador via CDP...')
-    cdp = CDPSession()
-    cdp.__enter__()
-
     try:
-        for i, datos_json in enumerate(datos, 1):
-            portal = datos_json['portal']
-            ubicacion = datos_json['ubicacion']
-            viviendas = datos_json['viviendas']
-            archivo = datos_json['archivo']
-            n_viviendas = len(viviendas)
-            nombre_archivo = os.path.basename(archivo)
-
-            log.info('-' * 60)
-            log.info('[%d/%d] %s (%s) — %d viviendas [%s]',
-                     i, total_archivos, ubicacion, portal, n_viviendas, nombre_archivo)
-
-            # Cambiar contexto de portal si necesario
-            cdp.asegurar_contexto(portal)
-
-            verificar_fn = verificar_idealista if portal == 'idealista' else verificar_fotocasa
-            delay_range = (
-                (args.delay_idealista_min, args.delay_idealista_max)
-                if portal == 'idealista'
-                else (args.delay_fotocasa_min, args.delay_fotocasa_max)
+        if secuencial:
+            for portal, datos_portal in carriles:
+                _ejecutar_carril(portal, datos_portal, args, estado, vpn, parada,
+                                 pagina_propia=False)
+        else:
+            log.info('Carriles en paralelo: %s', ', '.join(p for p, _ in carriles))
+            hilos.extend(
+                threading.Thread(
+                    target=_ejecutar_carril, name=f'carril-{portal}', daemon=True,
+                    args=(portal, datos_portal, args, estado, vpn, parada, n > 0),
+                )
+                for n, (portal, datos_portal) in enumerate(carriles)
             )
-
-            desc_archivo = []
-            peticiones_archivo = 0
-
-            for j, vivienda in enumerate(viviendas, 1):
-                url = vivienda.get('url', '')
-                if not url:
-                    continue
-
-                # Pausa larga cada BATCH_SIZE peticiones (simular humano)
-                peticiones_archivo += 1
-                if peticiones_archivo > 1 and peticiones_archivo % BATCH_SIZE == 0:
-                    pausa_batch = random.uniform(*BATCH_PAUSE)
-                    log.info('  Pausa anti-deteccion de %.0fs tras %d peticiones...',
-                             pausa_batch, peticiones_archivo)
-                    time.sleep(pausa_batch)
-                    # Re-verificar que no nos han bloqueado durante la pausa
-                    if cdp._esta_bloqueado_cloudflare():
-                        cdp.esperar_desbloqueo_cloudflare(portal)
-
-                titulo = vivienda.get('titulo', 'Sin título')[:60]
-
-                try:
-                    activo = verificar_fn(url, cdp.page, cdp_session=cdp)
-                except RuntimeError as e:
-                    # Ultimo recurso: la reconexion fallo incluso tras pausa manual
-                    log.error('  [%d/%d] ERROR irrecuperable: %s', j, n_viviendas, e)
-                    log.warning('Marcando vivienda como activa (conservador) y continuando.')
-                    stats['errores'] += 1
-                    activo = True
-
-                stats['verificadas'] += 1
-
-                if activo:
-                    stats['activas'] += 1
-                    if args.verbose:
-                        log.debug('  [%d/%d] OK: %s', j, n_viviendas, titulo)
-                    else:
-                        # Mostrar progreso cada 10 viviendas activas
-                        if j % 10 == 0:
-                            log.info('  [%d/%d] progreso... (%d desc hasta ahora)',
-                                     j, n_viviendas, len(desc_archivo))
-                else:
-                    stats['descatalogadas'] += 1
-                    log.info('  [%d/%d] DESCATALOGADA: %s', j, n_viviendas, titulo)
-                    desc_archivo.append(url)
-                    todas_descatalogadas.append({
-                        'url': url,
-                        'ubicacion': ubicacion,
-                        'portal': portal,
-                        'titulo': vivienda.get('titulo', ''),
-                    })
-
-                # Rotación VPN (solo Idealista)
-                if vpn and portal == 'idealista':
-                    vpn.tick()
-                    # Tras cambio de IP, re-establecer contexto del portal
-                    # porque Cloudflare puede requerir nuevo handshake
-                    if vpn._contador == 0:  # acaba de cambiar
-                        cdp.asegurar_contexto('idealista', force=True)
-
-                # Delay entre peticiones (con jitter humano)
-                base_delay = random.uniform(*delay_range)
-                # Añadir jitter extra aleatorio (a veces más lento, como un humano)
-                if random.random() < 0.15:  # 15% de las veces, pausa extra
-                    base_delay += random.uniform(2, 5)
-                time.sleep(base_delay)
-
-            if desc_archivo:
-                urls_por_ubicacion.setdefault(ubicacion, []).extend(desc_archivo)
-                descatalogadas_por_archivo[archivo] = set(desc_archivo)
-                log.info('  >> %d descatalogadas en %s', len(desc_archivo), ubicacion)
-                # Eliminar descatalogadas del JSON fuente inmediatamente
-                limpiar_archivo_json(archivo, set(desc_archivo))
-            else:
-                log.info('  >> Todas activas en %s', ubicacion)
-
-            # Guardado intermedio cada SAVE_EVERY_N_FILES archivos
-            if i % SAVE_EVERY_N_FILES == 0 and todas_descatalogadas:
-                output_file_tmp = os.path.join(args.output_dir, 'viviendas_descatalogadas.json')
-                guardar_progreso_intermedio(output_file_tmp, todas_descatalogadas,
-                                            no_merge=args.no_merge)
-
-            # Pausa entre archivos
-            if i < total_archivos:
-                pausa = random.uniform(*DELAY_ENTRE_ARCHIVOS)
-                log.debug('Pausa de %.0fs antes del siguiente archivo...', pausa)
-                time.sleep(pausa)
+            for hilo in hilos:
+                hilo.start()
+            for hilo in hilos:
+                while hilo.is_alive():
+                    hilo.join(0.5)
 
     except KeyboardInterrupt:
         log.warning('Verificacion interrumpida por el usuario (SIGINT)')
+        parada.set()
+        # Los carriles se detienen al terminar la petición en curso
+        for hilo in hilos:
+            hilo.join(60)
         # Guardar progreso antes de salir
-        if todas_descatalogadas:
-            output_file_tmp = os.path.join(args.output_dir, 'viviendas_descatalogadas.json')
-            log.info('Guardando progreso antes de salir...')
-            guardar_progreso_intermedio(output_file_tmp, todas_descatalogadas,
-                                        no_merge=args.no_merge)
-    except Exception as e:
-        log.error('Error inesperado durante la verificacion: %s', e, exc_info=True)
-        stats['errores'] += 1
-        # Guardar progreso ante crash
-        if todas_descatalogadas:
-            output_file_tmp = os.path.join(args.output_dir, 'viviendas_descatalogadas.json')
-            log.info('Guardando progreso tras error...')
-            guardar_progreso_intermedio(output_file_tmp, todas_descatalogadas,
-                                        no_merge=args.no_merge)
+        log.info('Guardando progreso antes de salir...')
+        estado.guardar_progreso()
     finally:
-        cdp.__exit__(None, None, None)
+        registro.guardar()
         # Desconectar VPN al terminar
         if vpn:
             vpn.cleanup()
 
+    # El resultado de cada anuncio se aplica también a sus copias en otras zonas,
+    # y las bajas salen del índice global
+    copias_baja = estado.propagar_a_copias(duplicadas)
+    if estado.todas_descatalogadas:
+        indice = abrir_indice()
+        indice.quitar(d['url'] for d in estado.todas_descatalogadas)
+        indice.guardar()
+
+    stats = estado.stats
+    todas_descatalogadas = estado.todas_descatalogadas
+    urls_por_ubicacion = estado.urls_por_ubicacion
+
     # ─── Resumen ──────────────────────────────────────────────────────
     log.info('=' * 60)
     log.info('RESUMEN DE VERIFICACION')
@@ -1369,6 +1832,8 @@ def ejecutar_verificacion(args) -> int:
     log.info('Viviendas verificadas: %d / %d', stats['verificadas'], total_viviendas)
     log.info('Activas:               %d', stats['activas'])
     log.info('Descatalogadas:        %d', stats['descatalogadas'])
+    log.info('Saltadas (TTL):        %d', saltadas)
+    log.info('Copias en otras zonas: %d (%d dadas de baja)', n_copias, copias_baja)
     if stats['errores']:
         log.info('Errores:               %d', stats['errores'])
 
@@ -1432,6 +1897,7 @@ Ejemplos:
   %(prog)s --portal idealista --vpn  # Idealista con rotación VPN
   %(prog)s --vpn --vpn-on 25 --vpn-off 15  # VPN: 25 con, 15 sin, repite
   %(prog)s --send-api                # Enviar a API (limpieza automática)
+  %(prog)s --secuencial              # Un portal tras otro, sin carriles paralelos
   %(prog)s --verbose                 # Modo debug
   %(prog)s --dry-run                 # Solo mostrar qué se haría
 
@@ -1460,11 +1926,32 @@ Códigos de salida:
     )
     parser.add_argument(
         '--delay-idealista', type=float, default=None,
-        help='Delay medio entre peticiones Idealista en segundos (default: 2.5)',
+        help='Delay medio fijo entre peticiones Idealista en segundos '
+             '(default: el ritmo de control_ritmo, 2.5s al ritmo inicial)',
     )
     parser.add_argument(
         '--delay-fotocasa', type=float, default=None,
-        help='Delay medio entre peticiones Fotocasa en segundos (default: 3.7)',
+        help='Delay medio fijo entre peticiones Fotocasa en segundos '
+             '(default: el ritmo de control_ritmo, 3.7s al ritmo inicial)',
+    )
+    parser.add_argument(
+        '--lote-idealista', type=int, default=LOTE_IDEALISTA,
+        help=f'Anuncios de Idealista por evaluate(); 1 = uno a uno (default: {LOTE_IDEALISTA})',
+    )
+    parser.add_argument(
+        '--concurrencia-idealista', type=int, default=CONCURRENCIA_IDEALISTA,
+        help='Peticiones de Idealista en vuelo dentro de la página; el espaciado '
+             f'entre ellas es --delay-idealista (default: {CONCURRENCIA_IDEALISTA})',
+    )
+    parser.add_argument(
+        '--ttl-horas', type=float, default=TTL_HORAS,
+        help='No re-verificar anuncios comprobados activos hace menos de N horas; '
+             f'0 = verificar todo (default: {TTL_HORAS})',
+    )
+    parser.add_argument(
+        '--secuencial', action='store_true',
+        help='Verificar los portales uno tras otro (por defecto, un carril por portal en paralelo; '
+             'con --vpn siempre en secuencia)',
     )
     parser.add_argument(
         '-v', '--verbose', action='store_true',
@@ -1492,20 +1979,18 @@ Códigos de salida:
 
     args = parser.parse_args()
 
-    # Calcular rangos de delay
+    # Calcular rangos de delay fijos (None: el del control de ritmo del portal)
+    args.delay_idealista_min = args.delay_idealista_max = None
     if args.delay_idealista is not None:
         d = args.delay_idealista
         args.delay_idealista_min = max(0.1, d * 0.6)
         args.delay_idealista_max = d * 1.4
-    else:
-        args.delay_idealista_min, args.delay_idealista_max = DELAY_IDEALISTA
 
+    args.delay_fotocasa_min = args.delay_fotocasa_max = None
     if args.delay_fotocasa is not None:
         d = args.delay_fotocasa
         args.delay_fotocasa_min = max(0.5, d * 0.6)
         args.delay_fotocasa_max = d * 1.4
-    else:
-        args.delay_fotocasa_min, args.delay_fotocasa_max = DELAY_FOTOCASA
 
     return args
 
@@ -1520,6 +2005,11 @@ def main():
         datos = cargar_todos_los_json(SCRIPT_DIR)
         if args.portal != 'todos':
             datos = [d for d in datos if d['portal'] == args.portal]
+        separar_duplicadas(datos)
+        registro = RegistroVerificaciones(
+            os.path.join(args.output_dir, 'registro_verificaciones.json'), ttl_horas=args.ttl_horas)
+        for d in datos:
+            d['viviendas'], _ = registro.planificar(d['viviendas'])
         total = sum(len(d['viviendas']) for d in datos)
         log.info('[DRY-RUN] Se verificarian %d viviendas de %d archivos', total, len(datos))
         for d in datos: